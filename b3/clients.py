@@ -83,10 +83,12 @@ import traceback
 
 
 class ClientVar(object):
+    """
+    A variable stored by a plugin in a client object (see Client.setvar).
+    """
+    __slots__ = ('value',)
 
-    value = None
-
-    def __init__(self, value):
+    def __init__(self, value=None):
         """
         Object constructor.
         :param value: The variable value.
@@ -97,83 +99,185 @@ class ClientVar(object):
         """
         Return the current variable as an integer.
         """
-        if self.value is None:
+        value = self.value
+        if value is None:
             return 0
-        return int(self.value)
+        return int(value)
 
     def toString(self):
         """
         Return the current variable as a string.
         """
-        if self.value is None:
+        value = self.value
+        if value is None:
             return ''
-        return str(self.value)
+        return str(value)
 
     def items(self):
         """
         Return the elements contained in the variable.
         """
-        if self.value is None:
+        value = self.value
+        if value is None:
             return ()
-        return self.value.items()
+        return value.items()
 
     def length(self):
         """
         Return the length of the variable.
         """
-        if self.value is None:
+        value = self.value
+        if value is None:
             return 0
-        return len(self.value)
+        return len(value)
 
-class Client(object):
 
-    ## PVT
-    _autoLogin = 1
-    _data = None
-    _exactName = ''
-    _greeting = ''
-    _groupBits = 0
-    _groups = None
-    _guid = ''
-    _id = 0
-    _ip = ''
-    _lastVisit = None
-    _login = ''
-    _maskGroup = None
-    _maskLevel = 0
-    _maxGroup = None
-    _maxLevel = None
-    _name = ''
-    _password = ''
-    _pluginData = None
-    _pbid = ''
-    _team = b3.TEAM_UNKNOWN
-    _tempLevel = None
-    _timeAdd = 0
-    _timeEdit = 0
+class PluginVars(object):
+    """
+    The variables a plugin stores in a client object (see Client.pluginVars).
+    Variables are plain attributes:
 
-    # PUB
-    authed = False
-    authorizing = False
-    bot = False
-    cid = None
-    connected = True
-    console = None
-    hide = False
-    state = None
+    >> v = client.pluginVars(self)
+    >> v.points = v.get('points', 0) + 1
+
+    Variables stored with Client.var/Client.setvar are ClientVar objects: they are read and assigned like the
+    attributes, and an attribute read with Client.var is moved into a ClientVar.
+    """
+    __slots__ = ('__dict__', '_clientVars')
+
+    def __init__(self, client_vars):
+        """
+        Object constructor.
+        :param client_vars: The dict of the ClientVar objects of the plugin (see Client.setvar)
+        """
+        object.__setattr__(self, '_clientVars', client_vars)
+
+    def __setattr__(self, key, value):
+        var = self._clientVars.get(key)
+        if var is None:
+            self.__dict__[key] = value
+        else:
+            var.value = value
+
+    def __getattr__(self, key):
+        # only called for the names which are not attributes
+        if key.startswith('__') or key == '_clientVars':
+            raise AttributeError(key)
+        try:
+            return self._clientVars[key].value
+        except KeyError:
+            raise AttributeError(key)
+
+    def get(self, key, default=None):
+        """
+        Return a variable value.
+        :param key: The variable key.
+        :param default: The value to return if the variable is not set.
+        """
+        attributes = self.__dict__
+        if key in attributes:
+            return attributes[key]
+        var = self._clientVars.get(key)
+        return default if var is None else var.value
+
+    def items(self):
+        """
+        Return the list of (key, value) of the variables.
+        """
+        items = dict((k, v.value) for k, v in self._clientVars.iteritems())
+        items.update(self.__dict__)
+        return items.items()
+
+    def clear(self):
+        """
+        Delete all the variables.
+        """
+        self.__dict__.clear()
+        self._clientVars.clear()
+
+    def var(self, key):
+        """
+        Move an attribute into a ClientVar and return it.
+        :param key: The attribute name.
+        """
+        var = self._clientVars[key] = ClientVar(self.__dict__.pop(key, None))
+        return var
+
+    def __contains__(self, key):
+        return key in self.__dict__ or key in self._clientVars
+
+    def __delitem__(self, key):
+        self.__dict__.pop(key, None)
+        self._clientVars.pop(key, None)
+
+    def __delattr__(self, key):
+        if key in self.__dict__:
+            object.__delattr__(self, key)
+        elif self._clientVars.pop(key, None) is None:
+            raise AttributeError(key)
+
+    def __repr__(self):
+        return 'PluginVars(%r)' % dict(self.items())
+
+
+class Client(object):
+
+    # core fields live in slots: extra attributes (set by parsers or plugins) go into the instance dict
+    __slots__ = ('_autoLogin', '_connections', '_data', '_exactName', '_greeting', '_groupBits', '_groups', '_guid',
+                 '_id', '_ip', '_lastVisit', '_login', '_maskGroup', '_maskLevel', '_maxGroup', '_maxLevel', '_name',
+                 '_password', '_penalties', '_pluginData', '_pluginVars', '_pbid', '_registry', '_state', '_team', '_tempLevel', '_timeAdd',
+                 '_timeEdit', 'authed', 'authorizing', 'bot', 'cid', 'connected', 'console', 'hide',
+                 '__dict__', '__weakref__')
 
     def __init__(self, **kwargs):
         """
         Object constructor.
         :param kwargs: A dict containing client object attributes.
         """
-        self._pluginData = {}
+        ## PVT
+        self._registry = None  # the Clients instance indexing this client
+        self._autoLogin = 1
+        self._connections = 0
+        self._data = {}
+        self._exactName = ''
+        self._greeting = ''
+        self._groupBits = 0
+        self._groups = None
+        self._guid = ''
+        self._id = 0
+        self._ip = ''
+        self._lastVisit = None
+        self._login = ''
+        self._maskGroup = None
+        self._maskLevel = 0
+        self._maxGroup = None
+        self._maxLevel = None
+        self._name = ''
+        self._password = ''
+        self._penalties = None  # PenaltySummary of the active penalties (loaded once per connection)
+        self._pluginData = {}  # id(plugin) => {key: ClientVar} (see setvar)
+        self._pluginVars = {}  # id(plugin) => PluginVars (see pluginVars)
+        self._pbid = ''
+        self._state = None
+        self._team = b3.TEAM_UNKNOWN
+        self._tempLevel = None
+        self._timeAdd = 0
+        self._timeEdit = 0
+
+        # PUB
+        self.authed = False
+        self.authorizing = False
+        self.bot = False
+        self.cid = None
+        self.connected = True
+        self.hide = False
         self.state = b3.STATE_UNKNOWN
-        self._data = {}        
 
         # make sure to set console before anything else
         if 'console' in kwargs:
             self.console = kwargs['console']
+        elif getattr(self, 'console', None) is None:
+            self.console = None
             
         for k, v in kwargs.iteritems():
             setattr(self, k, v)
@@ -184,6 +288,30 @@ class Client(object):
     #                                                                                                                  #
     ####################################################################################################################
 
+    def pluginVars(self, plugin):
+        """
+        Return the namespace holding the variables a plugin stores in this client object.
+        :param plugin: The plugin storing the variables.
+        :return: A PluginVars instance.
+        """
+        plugin_vars = self._pluginVars.get(id(plugin))
+        if plugin_vars is None:
+            client_vars = self._pluginData.get(id(plugin))
+            if client_vars is None:
+                client_vars = self._pluginData[id(plugin)] = {}
+            plugin_vars = self._pluginVars[id(plugin)] = PluginVars(client_vars)
+        return plugin_vars
+
+    def getPluginVars(self):
+        """
+        Return a dict of the namespaces of all the plugins which stored variables in this client object.
+        :return: A dict id(plugin) => PluginVars
+        """
+        for key, client_vars in self._pluginData.items():
+            if key not in self._pluginVars:
+                self._pluginVars[key] = PluginVars(client_vars)
+        return dict(self._pluginVars)
+
     def isvar(self, plugin, key):
         """
         Check whether the given plugin stored a variable under the given key.
@@ -191,11 +319,10 @@ class Client(object):
         :param key: The key associated to the value.
         :return True if there is a value, False otherwise
         """
-        try:
-            d = self._pluginData[id(plugin)][key]
+        if key in self._pluginData.get(id(plugin), ()):
             return True
-        except Exception:
-            return False
+        plugin_vars = self._pluginVars.get(id(plugin))
+        return plugin_vars is not None and key in plugin_vars.__dict__
 
     def setvar(self, plugin, key, value=None):
         """
@@ -206,16 +333,21 @@ class Client(object):
         :return The stored variable.
         """
         try:
-            self._pluginData[id(plugin)]
-        except Exception:
-            self._pluginData[id(plugin)] = {}
+            client_vars = self._pluginData[id(plugin)]
+        except KeyError:
+            client_vars = self._pluginData[id(plugin)] = {}
 
         try:
-            self._pluginData[id(plugin)][key].value = value
-        except Exception:
-            self._pluginData[id(plugin)][key] = ClientVar(value)
+            var = client_vars[key]
+            var.value = value
+        except KeyError:
+            var = client_vars[key] = ClientVar(value)
+            plugin_vars = self._pluginVars.get(id(plugin))
+            if plugin_vars is not None:
+                # the variable may have been an attribute of the plugin namespace
+                plugin_vars.__dict__.pop(key, None)
 
-        return self._pluginData[id(plugin)][key]
+        return var
 
     def var(self, plugin, key, default=None):
         """
@@ -227,7 +359,10 @@ class Client(object):
         """
         try:
             return self._pluginData[id(plugin)][key]
-        except Exception:
+        except KeyError:
+            plugin_vars = self._pluginVars.get(id(plugin))
+            if plugin_vars is not None and key in plugin_vars.__dict__:
+                return plugin_vars.var(key)
             return self.setvar(plugin, key, default)
 
     def varlist(self, plugin, key, default=None):
@@ -246,10 +381,10 @@ class Client(object):
         :param plugin: The plugin that stored the variable.
         :param key: The key of the variable.
         """
-        try:
-            del self._pluginData[id(plugin)][key]
-        except Exception:
-            pass
+        self._pluginData.get(id(plugin), {}).pop(key, None)
+        plugin_vars = self._pluginVars.get(id(plugin))
+        if plugin_vars is not None:
+            plugin_vars.__dict__.pop(key, None)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -285,7 +420,7 @@ class Client(object):
     def _get_firstWarn(self):
         if not self.id:
             return None
-        return self.console.storage.getClientFirstPenalty(self, 'Warning')
+        return self.getPenaltySummary().first('Warning')
 
     firstWarning = property(_get_firstWarn)
 
@@ -329,7 +464,7 @@ class Client(object):
     def _get_lastBan(self):
         if not self.id:
             return None
-        return self.console.storage.getClientLastPenalty(self, ('Ban', 'TempBan'))
+        return self.getPenaltySummary().last(('Ban', 'TempBan'))
 
     lastBan = property(_get_lastBan)
 
@@ -338,7 +473,7 @@ class Client(object):
     def _get_lastWarn(self):
         if not self.id:
             return None
-        return self.console.storage.getClientLastPenalty(self, 'Warning')
+        return self.getPenaltySummary().last('Warning')
 
     lastWarning = property(_get_lastWarn)
 
@@ -377,7 +512,7 @@ class Client(object):
     def _get_numBans(self):
         if not self.id:
             return 0
-        return self.console.storage.numPenalties(self, ('Ban', 'TempBan'))
+        return self.getPenaltySummary().count(('Ban', 'TempBan'))
 
     numBans = property(_get_numBans)
 
@@ -386,16 +521,46 @@ class Client(object):
     def _get_numWarns(self):
         if not self.id:
             return 0
-        return self.console.storage.numPenalties(self, 'Warning')
+        return self.getPenaltySummary().count('Warning')
 
     numWarnings = property(_get_numWarns)
 
     # -----------------------
 
+    def getPenaltySummary(self):
+        """
+        Return the summary of the active bans and warnings of this client.
+        The summary is fetched from the storage once per connection (along with the client record when the client
+        gets authed) and kept up to date as penalties are saved.
+        """
+        summary = self._penalties
+        if summary is None:
+            penalties = self.console.storage.getClientsActivePenalties([self], PenaltySummary.types)
+            summary = self._penalties = PenaltySummary(penalties.get(self.id, []))
+        return summary
+
+    def updatePenalty(self, penalty):
+        """
+        Update the summary of the active penalties of this client after a penalty got saved.
+        :param penalty: The saved penalty
+        """
+        if self._penalties is not None:
+            self._penalties.update(penalty)
+
+    def refreshPenalties(self):
+        """
+        Discard the summary of the active penalties: it will be fetched again from the storage when needed.
+        """
+        self._penalties = None
+
+    # -----------------------
+
     def _set_team(self, team):
         if self._team != team:
             previous_team = self.team
             self._team = team
+            if self._registry is not None:
+                self._registry.reindex(self, 'team')
             if self.console:
                 self.console.queueEvent(self.console.getEvent('EVT_CLIENT_TEAM_CHANGE', self.team, self))
                 self.console.queueEvent(self.console.getEvent('EVT_CLIENT_TEAM_CHANGE2', {'previous': previous_team,
@@ -408,6 +573,19 @@ class Client(object):
 
     # -----------------------
 
+    def _set_state(self, state):
+        if self._state != state:
+            self._state = state
+            if self._registry is not None:
+                self._registry.reindex(self, 'state')
+
+    def _get_state(self):
+        return self._state
+
+    state = property(_get_state, _set_state)
+
+    # -----------------------
+
     def getWarnings(self):
         return self.console.storage.getClientPenalties(self, type='Warning')
 
@@ -434,7 +612,6 @@ class Client(object):
 
     # -----------------------
 
-    _connections = 0
     def _set_connections(self, v):
         self._connections = int(v)
 
@@ -485,9 +662,14 @@ class Client(object):
                 self.authed = False
             elif not self._guid:
                 self._guid = guid
+                if self._registry is not None:
+                    self._registry.reindex(self, 'guid')
         else:
             self.authed = False
-            self._guid = ''
+            if self._guid:
+                self._guid = ''
+                if self._registry is not None:
+                    self._registry.reindex(self, 'guid')
 
     def _get_guid(self):
         return self._guid
@@ -501,6 +683,8 @@ class Client(object):
             self._id = 0
         else:
             self._id = int(v)
+        if self._registry is not None:
+            self._registry.reindex(self, 'id')
 
     def _get_id(self):
         return self._id
@@ -566,6 +750,8 @@ class Client(object):
     def _set_maskLevel(self, v):
         self._maskLevel = int(v)
         self._maskGroup = None
+        if self._registry is not None:
+            self._registry.reindex(self, 'level')
 
     def _get_maskLevel(self):
         return self._maskLevel
@@ -603,6 +789,8 @@ class Client(object):
         self.makeAlias(self._name)
         self._name = newName
         self._exactName = name + '^7'
+        if self._registry is not None:
+            self._registry.reindex(self, 'name')
 
         if self.console and self.authed:
             self.console.queueEvent(self.console.getEvent('EVT_CLIENT_NAME_CHANGE', self.name, self))
@@ -668,6 +856,8 @@ class Client(object):
         """
         self._maxLevel = None
         self._groups = None
+        if self._registry is not None:
+            self._registry.reindex(self, 'level')
 
     def disconnect(self):
         """
@@ -726,6 +916,7 @@ class Client(object):
             ban.reason = reason
             ban.timeExpire = -1
             ban.save(self.console)
+            self.updatePenalty(ban)
 
     def reBan(self, ban):
         """
@@ -747,6 +938,7 @@ class Client(object):
         for ban in self.bans:
             ban.inactive = 1
             ban.save(self.console)
+            self.updatePenalty(ban)
 
     def tempban(self, reason='', keyword=None, duration=2, admin=None, silent=False, data='', *kwargs):
         """
@@ -776,6 +968,7 @@ class Client(object):
             ban.reason = reason
             ban.timeExpire = self.console.time() + (duration * 60)
             ban.save(self.console)
+            self.updatePenalty(ban)
 
     def message(self, msg, *args):
         """
@@ -810,6 +1003,7 @@ class Client(object):
             warn.reason = warning
             warn.timeExpire = self.console.time() + (duration * 60)
             warn.save(self.console)
+            self.updatePenalty(warn)
 
             if self.console:
                 self.console.queueEvent(self.console.getEvent('EVT_CLIENT_WARN', data={
@@ -902,6 +1096,8 @@ class Client(object):
     def save(self, console=None):
         """
         Save the current client in the storage.
+        Existing records are updated in the background: the storage reads of the record (getClient) wait for the
+        update to be written, other reads must call storage.waitPending('clients', id) first.
         """
         self.timeEdit = time.time()
         if self.guid is None or str(self.guid) == '0':
@@ -914,7 +1110,12 @@ class Client(object):
                 self.pbid = ''
             if console:
                 self.console.queueEvent(self.console.getEvent('EVT_CLIENT_UPDATE', data=self, client=self))
-            return self.console.storage.setClient(self)
+            storage = self.console.storage
+            if self.id > 0:
+                # existing record: no need to wait for the update to be written
+                storage.submitCall(storage.setClient, (self,), key=('clients', self.id))
+                return self.id
+            return storage.setClient(self)
 
     def auth(self):
         """
@@ -926,16 +1127,19 @@ class Client(object):
             name = self.name
             ip = self.ip
             try:
-                inStorage = self.console.storage.getClient(self)
+                # fetch the client record along with its active penalties in a single round trip
+                inStorage, penalties = self.console.storage.getClientAndPenalties(self, PenaltySummary.types)
             except KeyError, msg:
                 self.console.debug('Client not found %s: %s', self.guid, msg)
-                inStorage = False
+                inStorage, penalties = False, []
             except Exception, e:
-                self.console.error('Auth self.console.storage.getClient(client) - %s\n%s', e,
+                self.console.error('Auth self.console.storage.getClientAndPenalties(client) - %s\n%s', e,
                                    traceback.extract_tb(sys.exc_info()[2]))
                 self.authorizing = False
                 return False
 
+            self._penalties = PenaltySummary(penalties) if penalties is not None else None
+
             if inStorage:
                 self.console.bot('Client found in storage %s: welcome back %s', str(self.id), self.name)
                 self.lastVisit = self.timeEdit
@@ -1062,12 +1266,23 @@ class Penalty(Struct):
     def save(self, console):
         """
         Save the penalty in the storage.
+        Existing records are updated in the background: the storage penalty reads wait for the update to be
+        written, other reads must call storage.waitPending('penalties', client_id) first.
         :param console: The console instance
         """
         self.timeEdit = console.time()
         if not self.id:
             self.timeAdd = console.time()
-        return console.storage.setClientPenalty(self)
+            penalty_id = console.storage.setClientPenalty(self)
+        else:
+            # existing record: no need to wait for the update to be written
+            # keyed by client: the updates of the penalties of a client are written in order
+            console.storage.submitCall(console.storage.setClientPenalty, (self,), key=('penalties', self.clientId))
+            penalty_id = self.id
+        if isinstance(getattr(console, 'clients', None), Clients):
+            # keep the penalty summaries of the connected clients up to date
+            console.clients.updatePenalty(self)
+        return penalty_id
 
 
 class ClientWarning(Penalty):
@@ -1117,6 +1332,76 @@ class ClientKick(Penalty):
     type = 'Kick'
 
 
+class PenaltySummary(object):
+    """
+    The active bans and warnings of a client, indexed by penalty id.
+    Answer the numBans/numWarnings/lastBan/lastWarning/firstWarning client properties without querying the storage:
+    penalties expiring while the client is connected are filtered out when the summary is read.
+    """
+    types = ('Ban', 'TempBan', 'Warning')
+
+    def __init__(self, penalties=()):
+        """
+        Object constructor.
+        :param penalties: The active penalties of the client
+        """
+        self._penalties = {}
+        for penalty in penalties:
+            self.update(penalty)
+
+    def update(self, penalty):
+        """
+        Add, replace or remove a penalty according to its state.
+        :param penalty: The penalty
+        """
+        if not penalty.id or penalty.type not in self.types:
+            return
+        if penalty.inactive:
+            self._penalties.pop(penalty.id, None)
+        else:
+            self._penalties[penalty.id] = penalty
+
+    def _active(self, types):
+        """
+        Return the active penalties of the given types.
+        """
+        if isinstance(types, basestring):
+            types = (types,)
+        now = time.time()
+        return [p for p in self._penalties.values()
+                if p.type in types and not p.inactive and (p.timeExpire == -1 or p.timeExpire > now)]
+
+    def count(self, types):
+        """
+        Return the amount of active penalties of the given types.
+        :param types: A penalty type or a tuple of penalty types
+        """
+        return len(self._active(types))
+
+    def last(self, types):
+        """
+        Return the last added active penalty of the given types (None if there is none).
+        :param types: A penalty type or a tuple of penalty types
+        """
+        penalties = self._active(types)
+        if not penalties:
+            return None
+        return max(penalties, key=lambda p: (p.timeAdd, p.id))
+
+    def first(self, types):
+        """
+        Return the active penalty of the given types expiring last (the oldest one if several expire together).
+        :param types: A penalty type or a tuple of penalty types
+        """
+        penalties = self._active(types)
+        if not penalties:
+            return None
+        return min(penalties, key=lambda p: (-p.timeExpire, p.timeAdd, p.id))
+
+    def __len__(self):
+        return len(self._penalties)
+
+
 class Alias(Struct):
     """
     Represent an Alias.
@@ -1309,12 +1594,17 @@ class Group(Struct):
         return "Group(%r)" % self.__dict__
 
 
-class Clients(dict):
+# some parsers replace Client.state with a property querying the game server: such states are not indexed
+_indexedState = Client.state
 
+
+class Clients(dict):
+    """
+    The online clients, indexed by slot number.
+    Secondary indexes (by name, exact name, guid, database id, team, state and level) are updated by the client
+    objects themselves whenever one of the indexed fields changes, so that lookups never scan the whole list.
+    """
     _authorizing = False
-    _exactNameIndex = None
-    _guidIndex = None
-    _nameIndex = None
 
     console = None
 
@@ -1323,11 +1613,187 @@ class Clients(dict):
         Object constructor.
         :param console: The console implementation
         """
+        # imported here since b3.storage imports this module
+        from b3.storage.nameindex import NameIndex
         super(Clients, self).__init__()
         self.console = console
-        self._exactNameIndex = {}
-        self._guidIndex = {}
-        self._nameIndex = {}
+        self._lock = threading.RLock()
+        self._keys = {}                 # slot number => {index name: key the client is indexed under}
+        self._exactNameIndex = {}       # lowercase exact name => set of slot numbers
+        self._guidIndex = {}            # uppercase guid => set of slot numbers
+        self._idIndex = {}              # database id => set of slot numbers
+        self._nameIndex = {}            # lowercase name => set of slot numbers
+        self._stateIndex = {}           # state => set of slot numbers
+        self._teamIndex = {}            # team => set of slot numbers
+        self._levelIndex = {}           # max level => set of slot numbers
+        self._maskedLevelIndex = {}     # mask level (max level if not masked) => set of slot numbers
+        self._dirtyLevels = set()       # slot numbers of the clients whose level changed since last indexed
+        self._nameTrigrams = NameIndex()
+        self._indexes = {'name': self._nameIndex, 'exactName': self._exactNameIndex, 'guid': self._guidIndex,
+                         'id': self._idIndex, 'state': self._stateIndex, 'team': self._teamIndex,
+                         'level': self._levelIndex, 'maskedLevel': self._maskedLevelIndex}
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   INDEXES                                                                                                        #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def __setitem__(self, cid, client):
+        with self._lock:
+            previous = dict.get(self, cid)
+            if previous is not None:
+                self._unindex(cid, previous)
+            dict.__setitem__(self, cid, client)
+            if client is not None:
+                self._index(cid, client)
+
+    def __delitem__(self, cid):
+        with self._lock:
+            client = dict.get(self, cid)
+            dict.__delitem__(self, cid)
+            if client is not None:
+                self._unindex(cid, client)
+
+    def _getKey(self, name, client):
+        """
+        Return the key a client is indexed under in the given index (None if not to be indexed).
+        """
+        if name == 'name':
+            return client.name.lower() if client.name else None
+        elif name == 'exactName':
+            return client.exactName.lower() if client.exactName else None
+        elif name == 'guid':
+            return client.guid.upper() if client.guid else None
+        elif name == 'id':
+            return client.id or None
+        elif name == 'team':
+            return client.team
+        elif name == 'state':
+            return client.state if Client.state is _indexedState else None
+        return None
+
+    def _add(self, name, key, cid):
+        if key is not None:
+            index = self._indexes[name]
+            try:
+                index[key].add(cid)
+            except KeyError:
+                index[key] = set([cid])
+
+    def _drop(self, name, key, cid):
+        if key is not None:
+            index = self._indexes[name]
+            cids = index.get(key)
+            if cids is not None:
+                cids.discard(cid)
+                if not cids:
+                    del index[key]
+
+    def _index(self, cid, client):
+        """
+        Add a client to the indexes (must be called with the lock held).
+        """
+        keys = self._keys[cid] = {}
+        for name in ('name', 'exactName', 'guid', 'id', 'team', 'state'):
+            keys[name] = self._getKey(name, client)
+            self._add(name, keys[name], cid)
+        self._nameTrigrams.add(cid, client.name)
+        self._dirtyLevels.add(cid)
+        client._registry = self
+
+    def _unindex(self, cid, client):
+        """
+        Remove a client from the indexes (must be called with the lock held).
+        """
+        for name, key in self._keys.pop(cid, {}).iteritems():
+            self._drop(name, key, cid)
+        self._nameTrigrams.remove(cid)
+        self._dirtyLevels.discard(cid)
+        if getattr(client, '_registry', None) is self:
+            client._registry = None
+
+    def reindex(self, client, field):
+        """
+        Update the indexes after a client field changed.
+        Called by the client objects: there should be no need to call it from elsewhere.
+        :param client: The client object
+        :param field: The name of the field which changed ('name', 'guid', 'id', 'team', 'state' or 'level')
+        """
+        with self._lock:
+            cid = client.cid
+            if dict.get(self, cid) is not client:
+                return
+            if field == 'level':
+                # computing the level may require storage queries: do it the next time the level is looked up
+                self._dirtyLevels.add(cid)
+                return
+            keys = self._keys[cid]
+            for name in ('name', 'exactName') if field == 'name' else (field,):
+                self._drop(name, keys.get(name), cid)
+                keys[name] = self._getKey(name, client)
+                self._add(name, keys[name], cid)
+            if field == 'name':
+                self._nameTrigrams.remove(cid)
+                self._nameTrigrams.add(cid, client.name)
+
+    def _refreshLevels(self):
+        """
+        Index the clients whose level changed (must be called with the lock held).
+        """
+        dirty, self._dirtyLevels = self._dirtyLevels, set()
+        for cid in dirty:
+            client = dict.get(self, cid)
+            if client is None:
+                continue
+            keys = self._keys[cid]
+            self._drop('level', keys.get('level'), cid)
+            self._drop('maskedLevel', keys.get('maskedLevel'), cid)
+            keys['level'] = client.maxLevel
+            keys['maskedLevel'] = client.maskLevel or keys['level']
+            self._add('level', keys['level'], cid)
+            self._add('maskedLevel', keys['maskedLevel'], cid)
+
+    def _getClients(self, cids, hidden=False):
+        """
+        Return the clients occupying the given slots ordered by slot number.
+        :param cids: The slot numbers
+        :param hidden: Whether to include hidden clients
+        """
+        clist = []
+        for cid in sorted(cids, key=lambda x: (len(str(x)), str(x))):
+            client = dict.get(self, cid)
+            if client is not None and (hidden or not client.hide):
+                clist.append(client)
+        return clist
+
+    def _getCandidates(self, name):
+        """
+        Return the slot numbers of the clients whose normalized name contains the given one once normalized
+        (must be called with the lock held).
+        """
+        if not self._nameTrigrams.normalize(name):
+            # nothing left to look up once normalized
+            return self.keys()
+        return self._nameTrigrams.containing(name)
+
+    def resetIndex(self):
+        """
+        Rebuild the indexes.
+        The indexes are kept up to date: this is only needed if clients were added bypassing this object.
+        """
+        with self._lock:
+            for cid, client in self._keys.items():
+                self._unindex(cid, dict.get(self, cid))
+            for cid, client in dict.items(self):
+                if client is not None:
+                    self._index(cid, client)
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   LOOKUPS                                                                                                        #
+    #                                                                                                                  #
+    ####################################################################################################################
 
     def find(self, handle, maxres=None):
         """
@@ -1348,34 +1814,18 @@ class Clients(dict):
         Search a client by matching his name.
         :param name: The name to use for the search
         """
-        name = name.lower()
-        try:
-            return self[self._nameIndex[name]]
-        except Exception:
-            for cid, c in self.items():
-                if c.name and c.name.lower() == name:
-                    # self.console.debug('found client by name %s = %s', name, c.name)
-                    self._nameIndex[name] = c.cid
-                    return c
-        return None
+        with self._lock:
+            clist = self._getClients(self._nameIndex.get(name.lower(), ()), hidden=True)
+        return clist[0] if clist else None
 
     def getByExactName(self, name):
         """
         Search a client by matching his exact name.
         :param name: The name to use for the search
         """
-        name = name.lower() + '^7'
-        try:
-            c = self[self._exactNameIndex[name]]
-            # self.console.debug('found client by exact name in index %s = %s : %s', name, c.exactName, c.__class__.__name__)
-            return c
-        except Exception:
-            for cid, c in self.items():
-                if c.exactName and c.exactName.lower() == name:
-                    #self.console.debug('Found client by exact name %s = %s', name, c.exactName)
-                    self._exactNameIndex[name] = c.cid
-                    return c
-        return None
+        with self._lock:
+            clist = self._getClients(self._exactNameIndex.get(name.lower() + '^7', ()), hidden=True)
+        return clist[0] if clist else None
 
     def getList(self):
         """
@@ -1394,32 +1844,23 @@ class Clients(dict):
         :param max: The maximum level
         :param masked: Whether or not to match masked levels
         """
-        clist = []
         minlevel, maxlevel = int(min), int(max)
-        for cid, c in self.items():
-            if c.hide:
-                continue
-            elif not masked and c.maskGroup and minlevel <= c.maskGroup.level <= maxlevel:
-                clist.append(c)
-            elif not masked and c.maskGroup:
-                continue
-            elif minlevel <= c.maxLevel <= maxlevel:
-                # self.console.debug('getClientsByLevel hidden = %s', c.hide)
-                clist.append(c)
-        return clist
+        with self._lock:
+            self._refreshLevels()
+            index = self._levelIndex if masked else self._maskedLevelIndex
+            cids = [cid for level, x in index.iteritems() if minlevel <= level <= maxlevel for cid in x]
+            return self._getClients(cids)
 
     def getClientsByName(self, name):
         """
         Return a list of clients matching the given name.
         :param name: The name to match
         """
-        clist = []
         needle = re.sub(r'\s', '', name.lower())
-        for cid,c in self.items():
-            cleanname = re.sub(r'\s', '', c.name.lower())
-            if not c.hide and needle in cleanname:
-                clist.append(c)
-        return clist
+        with self._lock:
+            # the trigram index matches normalized names: check the candidates against the actual names
+            clist = self._getClients(self._getCandidates(needle))
+        return [c for c in clist if needle in re.sub(r'\s', '', c.name.lower())]
 
     def getClientLikeName(self, name):
         """
@@ -1427,8 +1868,10 @@ class Clients(dict):
         :param name: The name to match
         """
         name = name.lower()
-        for cid,c in self.items():
-            if not c.hide and string.find(c.name.lower(), name) != -1:
+        with self._lock:
+            clist = self._getClients(self._getCandidates(name))
+        for c in clist:
+            if name in c.name.lower():
                 return c
         return None
 
@@ -1437,11 +1880,33 @@ class Clients(dict):
         Return a list ofclients matching the given state.
         :param state: The clients state
         """
-        clist = []
-        for cid,c in self.items():
-            if not c.hide and c.state == state:
-                clist.append(c)
-        return clist
+        if Client.state is not _indexedState:
+            return [c for c in self.getList() if c.state == state]
+        with self._lock:
+            return self._getClients(self._stateIndex.get(state, ()))
+
+    def getClientsByTeam(self, team):
+        """
+        Return a list of clients matching the given team.
+        :param team: The team
+        """
+        with self._lock:
+            return self._getClients(self._teamIndex.get(team, ()))
+
+    def updatePenalty(self, penalty):
+        """
+        Update the penalty summary of the connected client a penalty belongs to.
+        Called when a penalty is saved: there should be no need to call it from elsewhere.
+        :param penalty: The saved penalty
+        """
+        try:
+            client_id = int(penalty.clientId)
+        except (TypeError, ValueError):
+            return
+        with self._lock:
+            clist = self._getClients(self._idIndex.get(client_id, ()), hidden=True)
+        for client in clist:
+            client.updatePenalty(penalty)
 
     def getByDB(self, client_id):
         """
@@ -1449,6 +1914,10 @@ class Clients(dict):
         """
         m = re.match(r'^@([0-9]+)$', client_id)
         if m:
+            with self._lock:
+                clist = self._getClients(self._idIndex.get(int(m.group(1)), ()), hidden=True)
+            if clist:
+                return clist[:1]
             try:
                 sclient = self.console.storage.getClientsMatching({'id': m.group(1)})
                 if not sclient:
@@ -1501,17 +1970,15 @@ class Clients(dict):
         :param guid: The GUID to match
         """
         guid = guid.upper()
-        try:
-            return self[self._guidIndex[guid]]
-        except Exception:
-            for cid,c in self.items():
-                if c.guid and c.guid == guid:
-                    self._guidIndex[guid] = c.cid
-                    return c
-                elif functions.fuzzyGuidMatch(c.guid, guid):
-                    # found by fuzzy matching: don't index
-                    return c
-        return None
+        with self._lock:
+            clist = self._getClients(self._guidIndex.get(guid, ()), hidden=True)
+            if not clist:
+                # fuzzy matching (truncated guids)
+                for key, cids in self._guidIndex.items():
+                    if functions.fuzzyGuidMatch(key, guid):
+                        clist = self._getClients(cids, hidden=True)
+                        break
+        return clist[0] if clist else None
 
     def getByCID(self, cid):
         """
@@ -1543,7 +2010,7 @@ class Clients(dict):
         if c and not c.hide:
             return [c]
 
-        sclient = self.console.storage.getClientsMatching({'%name%': name})
+        sclient = self.console.storage.getClientsMatchingName(name)
 
         if not sclient:
             return []
@@ -1591,6 +2058,10 @@ class Clients(dict):
         :param client: The client to disconnect.
         """
         client.connected = False
+        if self.console._timers:
+            # delayed actions about this client are now pointless
+            self.console._timers.cancelClient(client)
+
         if client.cid is None:
             return
         
@@ -1600,16 +2071,6 @@ class Clients(dict):
             del self[cid]
             self.console.queueEvent(self.console.getEvent('EVT_CLIENT_DISCONNECT', data=cid, client=client))
 
-        self.resetIndex()
-
-    def resetIndex(self):
-        """
-        Reset the indexes.
-        """
-        self._nameIndex    = {}
-        self._guidIndex    = {}
-        self._exactNameIndex = {}
-
     def newClient(self, cid, **kwargs):
         """
         Create a new client.
@@ -1618,7 +2079,6 @@ class Clients(dict):
         """
         client = Client(console=self.console, cid=cid, timeAdd=self.console.time(), **kwargs)
         self[client.cid] = client
-        self.resetIndex()
         self.console.debug('Client connected: [%s] %s - %s (%s)', self[client.cid].cid,
                            self[client.cid].name, self[client.cid].guid, self[client.cid].data)
         self.console.queueEvent(self.console.getEvent('EVT_CLIENT_CONNECT', data=client, client=client))
@@ -1637,9 +2097,8 @@ class Clients(dict):
 
     def clear(self):
         """
-        Empty the clients list and reset the indexes.
+        Empty the clients list.
         """
-        self.resetIndex()
         for cid, c in self.items():
             if not c.hide:
                 del self[cid]
@@ -1664,8 +2123,7 @@ class Clients(dict):
             # it will also allow us to batch the lookups if several players
             # are joining at once
             self._authorizing = True
-            t = threading.Timer(5, self._authorizeClients)
-            t.start()
+            self.console.timers.schedule(5, self._authorizeClients)
 
     def _authorizeClients(self):
         """
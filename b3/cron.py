@@ -27,8 +27,11 @@
 # 21/07/2014 - 1.5   - Fenix      - syntax cleanup
 #
 __author__ = 'ThorN, Courgette'
-__version__ = '1.5'
+__version__ = '1.7'
 
+import Queue
+import calendar
+import heapq
 import re
 import thread
 import threading
@@ -70,6 +73,8 @@ class CronTab(object):
     maxRuns = 0
     numRuns = 0
 
+    _cron = None  # the Cron this tab was added to
+
     def __init__(self, command, second=0, minute='*', hour='*', day='*', month='*', dow='*'):
         """
         Object constructor.
@@ -90,36 +95,42 @@ class CronTab(object):
 
     def _set_second(self, value):
         self._second = self._getRate(value, 60)
+        self._changed()
 
     def _get_second(self):
         return self._second
 
     def _set_minute(self, value):
         self._minute = self._getRate(value, 60)
+        self._changed()
 
     def _get_minute(self):
         return self._minute
 
     def _set_hour(self, value):
         self._hour = self._getRate(value, 24)
+        self._changed()
 
     def _get_hour(self):
         return self._hour
 
     def _set_day(self, value):
         self._day = self._getRate(value, 31)
+        self._changed()
 
     def _get_day(self):
         return self._day
 
     def _set_month(self, value):
         self._month = self._getRate(value, 12)
+        self._changed()
 
     def _get_month(self):
         return self._month
 
     def _set_dow(self, value):
         self._dow = self._getRate(value, 7)
+        self._changed()
 
     def _get_dow(self):
         return self._dow
@@ -131,6 +142,13 @@ class CronTab(object):
     month = property(_get_month, _set_month)
     dow = property(_get_dow, _set_dow)
 
+    def _changed(self):
+        """
+        Tell the cron this tab was added to that its schedule changed.
+        """
+        if self._cron:
+            self._cron.reschedule(self)
+
     def _getRate(self, rate, maxrate=None):
         """
         >>> o = CronTab(lambda: None)
@@ -233,6 +251,33 @@ class CronTab(object):
         timematch = timematch and self._match(self.dow, timetuple[6])
         return timematch
 
+    def getNextTime(self, after, limit=366 * 86400 * 5):
+        """
+        Return the first timestamp following the given one matching this crontab.
+        Whole months, days, hours and minutes not matching are skipped at once.
+        :param after: The timestamp to start looking from
+        :param limit: The amount of seconds to look ahead
+        :return: The next timestamp (in whole seconds) or None if the crontab will not match within the limit
+        """
+        t = int(after) + 1
+        end = t + limit
+        while t < end:
+            tt = time.gmtime(t)
+            if not self._match(self.month, tt[1]):
+                # first second of the following month
+                t = calendar.timegm((tt[0] + 1, 1, 1, 0, 0, 0) if tt[1] == 12 else (tt[0], tt[1] + 1, 1, 0, 0, 0))
+            elif not self._match(self.day, tt[2]) or not self._match(self.dow, tt[6]):
+                t += 86400 - tt[3] * 3600 - tt[4] * 60 - tt[5]
+            elif not self._match(self.hour, tt[3]):
+                t += 3600 - tt[4] * 60 - tt[5]
+            elif not self._match(self.minute, tt[4]):
+                t += 60 - tt[5]
+            elif not self._match(self.second, tt[5]):
+                t += 1
+            else:
+                return t
+        return None
+
 class OneTimeCronTab(CronTab):
 
     def __init__(self, command, second=0, minute='*', hour='*', day='*', month='*', dow='*'):
@@ -272,12 +317,27 @@ class PluginCronTab(CronTab):
             CronTab.run(self)
 
 class Cron(object):
-
-    def __init__(self, console):
+    """
+    Run crontabs when they are due.
+    The next fire time of every crontab is computed when it is added and kept in a heap: the scheduler thread sleeps
+    until the first of them is due. Due crontabs are run by a fixed pool of worker threads so that a slow crontab
+    does not delay the others. A crontab still running when it is due again is skipped (overrun).
+    """
+    def __init__(self, console, workers=2):
         """
         Object constructor.
+        :param console: The console instance
+        :param workers: The number of threads running the crontabs
         """
         self._tabs = {}
+        self._entries = {}  # tab id => heap entry [next fire time, sequence, tab] (tab is None once removed)
+        self._heap = []
+        self._sequence = 0
+        self._stats = {}  # tab id => crontab statistics
+        self._lastTime = None
+        self._cond = threading.Condition()
+        self._queue = Queue.Queue()
+        self.workers = max(1, workers)
         self.console = console
 
         # thread will stop if this event gets set
@@ -294,7 +354,13 @@ class Cron(object):
         """
         Add a CronTab to the list of active cron tabs.
         """
-        self._tabs[id(tab)] = tab
+        with self._cond:
+            self._tabs[id(tab)] = tab
+            self._stats[id(tab)] = {'runs': 0, 'overruns': 0, 'failures': 0, 'running': False, 'total': 0.0,
+                                    'last': 0.0, 'max': 0.0, 'max_lag': 0.0}
+            tab._cron = self
+            self._unschedule(id(tab))
+            self._schedule(tab, self.time())
         self.console.verbose('Added crontab %s (%s) - %ss %sm %sh %sd %sM %sDOW' % (tab.command, id(tab), tab.second,
                                                                                     tab.minute, tab.hour, tab.day,
                                                                                     tab.month, tab.dow))
@@ -304,11 +370,26 @@ class Cron(object):
         """
         Remove a CronTab from the list of active cron tabs.
         """
-        try:
-            del self._tabs[tab_id]
-            self.console.verbose('Removed crontab %s' % tab_id)
-        except KeyError:
+        with self._cond:
+            try:
+                tab = self._tabs.pop(tab_id)
+            except KeyError:
+                tab = None
+            else:
+                self._forget(tab)
+        if tab is None:
             self.console.verbose('Crontab %s not found' % tab_id)
+        else:
+            self.console.verbose('Removed crontab %s' % tab_id)
+
+    def reschedule(self, tab):
+        """
+        Compute again the next fire time of a CronTab (called when its schedule is changed).
+        """
+        with self._cond:
+            if self._tabs.get(id(tab)) is tab:
+                self._unschedule(id(tab))
+                self._schedule(tab, self.time())
 
     def __add__(self, tab):
         self.add(tab)
@@ -318,8 +399,10 @@ class Cron(object):
 
     def start(self):
         """
-        Start the cron scheduler in a separate thread.
+        Start the cron scheduler and its workers in separate threads.
         """
+        for i in range(self.workers):
+            thread.start_new_thread(self._work, ())
         thread.start_new_thread(self.run, ())
 
     @staticmethod
@@ -333,7 +416,76 @@ class Cron(object):
         """
         Stop the cron scheduler.
         """
-        self._stopEvent.set()
+        with self._cond:
+            self._stopEvent.set()
+            self._cond.notify_all()
+        for i in range(self.workers):
+            self._queue.put(None)
+
+    def getStats(self, tab_ids=None):
+        """
+        Return the statistics of the active crontabs.
+        :param tab_ids: The ids of the crontabs to return the statistics of (all of them if omitted)
+        :return: A dict crontab name => dict with the number of runs, overruns and failures and the average, last and
+                 maximum run durations and maximum delay between the fire time and the start of the run (in seconds)
+        """
+        result = {}
+        with self._cond:
+            for tab_id, tab in self._tabs.items():
+                if tab_ids is not None and tab_id not in tab_ids:
+                    continue
+                stats = dict(self._stats[tab_id])
+                stats['avg'] = stats['total'] / stats['runs'] if stats['runs'] else 0.0
+                del stats['total']
+                result['%s (%s)' % (getattr(tab.command, '__name__', tab.command), tab_id)] = stats
+        return result
+
+    def dumpStats(self):
+        """
+        Dump crontab statistics into the B3 log file.
+        """
+        self._dumpStats(self.console, self.getStats())
+
+    @staticmethod
+    def _dumpStats(console, tab_stats):
+        """
+        Log crontab statistics as returned by getStats().
+        """
+        for name, stats in sorted(tab_stats.items()):
+            console.verbose('%s crontab : runs(%s), overruns(%s), failures(%s), avg(%0.3fs), last(%0.3fs), '
+                            'max(%0.3fs), max lag(%0.3fs)', name, stats['runs'], stats['overruns'],
+                            stats['failures'], stats['avg'], stats['last'], stats['max'], stats['max_lag'])
+
+    def _schedule(self, tab, after):
+        """
+        Push a CronTab in the heap according to its next fire time (must be called with the lock held).
+        """
+        nexttime = tab.getNextTime(after)
+        if nexttime is not None:
+            self._sequence += 1
+            entry = [nexttime, self._sequence, tab]
+            self._entries[id(tab)] = entry
+            heapq.heappush(self._heap, entry)
+            if self._heap[0] is entry:
+                self._cond.notify()
+
+    def _forget(self, tab):
+        """
+        Forget a CronTab removed from the active cron tabs (must be called with the lock held).
+        A run already queued still updates the statistics it was queued with.
+        """
+        self._unschedule(id(tab))
+        self._stats.pop(id(tab), None)
+        if tab._cron is self:
+            tab._cron = None
+
+    def _unschedule(self, tab_id):
+        """
+        Mark the heap entry of a CronTab as removed (must be called with the lock held).
+        """
+        entry = self._entries.pop(tab_id, None)
+        if entry:
+            entry[2] = None
 
     def run(self):
         """
@@ -341,38 +493,177 @@ class Cron(object):
         Will terminate when stop event is set.
         """
         self.console.info("Cron scheduler started")
-        nexttime = self.getNextTime()
         while not self._stopEvent.isSet():
-            now = self.time()
-            if now < nexttime:
-                self._stopEvent.wait(nexttime - now + .1)
-
-            # Check if the time has changed by more than two minutes. This
-            # case arises when the system clock is changed. We must reset the timer.
-            if abs(self.time() - nexttime) > 120:
-                nexttime = self.getNextTime()
-
-            t = time.gmtime(nexttime)
-            for k, c in self._tabs.items():
-                if c.match(t):
-                    if 0 < c.maxRuns < c.numRuns + 1:
+            due = []
+            with self._cond:
+                now = self.time()
+                # Check if the time has changed by more than two minutes. This
+                # case arises when the system clock is changed. We must reset the timer.
+                if self._lastTime is not None and (now < self._lastTime - 1 or
+                                                   (self._heap and self._heap[0][0] < now - 120)):
+                    self.console.info("System clock changed: rescheduling crontabs")
+                    self._entries.clear()
+                    self._heap = []
+                    for tab in self._tabs.values():
+                        self._schedule(tab, now - 1)
+                self._lastTime = now
+                while self._heap and self._heap[0][0] <= now:
+                    firetime, _, tab = heapq.heappop(self._heap)
+                    if tab is None:
+                        continue
+                    del self._entries[id(tab)]
+                    if tab.match(time.gmtime(firetime)):
+                        # inactive crontabs (e.g. of disabled plugins) do not count as runs
+                        due.append((firetime, tab, self._stats[id(tab)]))
+                        tab.numRuns += 1
+                    if 0 < tab.maxRuns <= tab.numRuns:
                         # reached max executions, remove tab
-                        del self._tabs[k]
+                        del self._tabs[id(tab)]
+                        self._forget(tab)
+                    else:
+                        self._schedule(tab, max(firetime, int(now)))
+                if not due:
+                    # wake up at least every minute to notice system clock changes
+                    delay = min(60, self._heap[0][0] - now) if self._heap else 60
+                    self._cond.wait(delay + .01)
+                    continue
+                for firetime, tab, stats in due:
+                    if stats['running']:
+                        stats['overruns'] += 1
+                        self.console.warning('Crontab %s is still running: skipping this run', tab.command)
                     else:
-                        c.numRuns += 1
-                        try:
-                            c.run()
-                        except Exception, msg:
-                            self.console.error('Exception raised while executing crontab %s: %s\n%s', c.command,
-                                               msg, traceback.extract_tb(sys.exc_info()[2]))
-            nexttime += 1
+                        stats['running'] = True
+                        self._queue.put((firetime, tab, stats))
 
         self.console.info("Cron scheduler ended")
 
+    def _work(self):
+        """
+        Worker thread main loop: run the due crontabs.
+        """
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            firetime, tab, stats = item
+            start = time.time()
+            failed = False
+            try:
+                tab.run()
+            except Exception, msg:
+                failed = True
+                self.console.error('Exception raised while executing crontab %s: %s\n%s', tab.command,
+                                   msg, traceback.extract_tb(sys.exc_info()[2]))
+            duration = time.time() - start
+            with self._cond:
+                stats['running'] = False
+                stats['runs'] += 1
+                stats['failures'] += failed
+                stats['total'] += duration
+                stats['last'] = duration
+                stats['max'] = max(stats['max'], duration)
+                stats['max_lag'] = max(stats['max_lag'], start - firetime)
+
     @staticmethod
     def getNextTime():
         # store the time first, we don't want it to change on us
         t = time.time()
         # current time, minus it's 1 second remainder, plus 1 seconds
         # will round to the next nearest 1 seconds
-        return (t - t % 1) + 1
\ No newline at end of file
+        return (t - t % 1) + 1
+
+
+class CronView(object):
+    """
+    The crontabs of a parser sharing the Cron of the hosting process with other parsers (see b3.host).
+    Crontabs are scheduled and run by the shared Cron: the view keeps track of the ones added through it so that they
+    can be listed, accounted for and removed when the parser stops, without touching those of the other parsers.
+    """
+    def __init__(self, cron, console):
+        """
+        Object constructor.
+        :param cron: The shared Cron instance
+        :param console: The console instance
+        """
+        self.cron = cron
+        self.console = console
+        self._lock = threading.Lock()
+        self._own = {}  # tab id => tab
+
+    def _get_tabs(self):
+        """
+        Return the active crontabs added through this view (tab id => tab).
+        """
+        with self.cron._cond:
+            with self._lock:
+                for tab_id in [x for x in self._own if x not in self.cron._tabs]:
+                    # removed by the cron itself (reached its max runs)
+                    del self._own[tab_id]
+                return dict(self._own)
+
+    _tabs = property(_get_tabs)
+
+    def create(self, command, second=0, minute='*', hour='*', day='*', month='*', dow='*'):
+        """
+        Create a new CronTab and add it to the active cron tabs.
+        """
+        t = CronTab(command, second, minute, hour, day, month, dow)
+        return self.add(t)
+
+    def add(self, tab):
+        """
+        Add a CronTab to the list of active cron tabs.
+        """
+        with self._lock:
+            self._own[id(tab)] = tab
+        return self.cron.add(tab)
+
+    def cancel(self, tab_id):
+        """
+        Remove a CronTab from the list of active cron tabs.
+        """
+        with self._lock:
+            self._own.pop(tab_id, None)
+        self.cron.cancel(tab_id)
+
+    def reschedule(self, tab):
+        """
+        Compute again the next fire time of a CronTab (called when its schedule is changed).
+        """
+        self.cron.reschedule(tab)
+
+    def __add__(self, tab):
+        self.add(tab)
+
+    def __sub__(self, tab):
+        self.cancel(id(tab))
+
+    def start(self):
+        """
+        Nothing to do: the shared Cron is started by the hosting process.
+        """
+        pass
+
+    def stop(self):
+        """
+        Remove the crontabs added through this view.
+        """
+        with self._lock:
+            tab_ids, self._own = self._own.keys(), {}
+        for tab_id in tab_ids:
+            self.cron.cancel(tab_id)
+
+    def getStats(self):
+        """
+        Return the statistics of the active crontabs added through this view (see Cron.getStats).
+        """
+        return self.cron.getStats(self._tabs)
+
+    def dumpStats(self):
+        """
+        Dump crontab statistics into the B3 log file.
+        """
+        Cron._dumpStats(self.console, self.getStats())
+
+    time = staticmethod(Cron.time)
+    getNextTime = staticmethod(Cron.getNextTime)
@@ -38,12 +38,15 @@
 #                                     time.time() instead (changed after reply mode removal)
 
 __author__ = 'ThorN, xlr8or, Courgette'
-__version__ = '1.8.2'
+__version__ = '1.10'
 
+import Queue
 import re
+import threading
 import time
 
 from b3.functions import meanstdv
+from b3.functions import percentile
 from b3.decorators import Memoize
 from b3.output import VERBOSE
 from collections import deque
@@ -230,14 +233,37 @@ class EventsStats(object):
         :param milliseconds_wait: The amount of milliseconds to wait
         """
         self._queue_wait.append(milliseconds_wait)
+
+    def get_queue_wait_percentiles(self, percentiles=(50, 90, 99)):
+        """
+        Return the time events spent waiting in the queue.
+        :param percentiles: The percentiles to compute
+        :return: A dict percentile => milliseconds
+        """
+        samples = list(self._queue_wait)
+        return dict((p, percentile(samples, p)) for p in percentiles)
+
+    def get_handling_stats(self):
+        """
+        Return the time plugins spent handling events.
+        :return: A dict plugin name => dict event name => (samples, mean, max) in milliseconds
+        """
+        stats = {}
+        for plugin_name, plugin_timers in self._handling_timers.items():
+            for event_name, event_timers in plugin_timers.items():
+                samples = list(event_timers)
+                if samples:
+                    stats.setdefault(plugin_name, {})[event_name] = (len(samples), meanstdv(samples)[0], max(samples))
+        return stats
         
     def dumpStats(self):
         """
         Print event stats in the log file.
         """
         if self.console.log.isEnabledFor(VERBOSE):
-            for plugin_name, plugin_timers in self._handling_timers.iteritems():
-                for event_name, event_timers in plugin_timers.iteritems():
+            # plugin event workers can add timers while we are iterating
+            for plugin_name, plugin_timers in self._handling_timers.items():
+                for event_name, event_timers in plugin_timers.items():
                     mean, stdv = meanstdv(event_timers)
                     if len(event_timers):
                         self.console.verbose("%s %s : (ms) min(%0.1f), max(%0.1f), mean(%0.1f), "
@@ -251,6 +277,108 @@ class EventsStats(object):
                                    "stddev(%0.1f)", min(self._queue_wait), max(self._queue_wait), mean, stdv)
     
 
+class EventWorker(object):
+    """
+    Hand events over to a single event handler (a plugin) from a dedicated thread.
+    Events wait in a bounded inbox: when the inbox is full the event is dropped rather than blocking the event
+    handler thread (and thus every other plugin).
+    """
+    def __init__(self, console, handler, inbox_size=100):
+        """
+        Object constructor.
+        :param console: The console implementation
+        :param handler: The event handler (usually a plugin instance)
+        :param inbox_size: The maximum number of events waiting to be handled
+        """
+        self.console = console
+        self.handler = handler
+        self.name = handler.__class__.__name__
+        self.inbox = Queue.Queue(inbox_size)
+        self.received = 0
+        self.handled = 0
+        self.dropped = 0
+        self.expired = 0
+        self.max_depth = 0
+        self._thread = None
+
+    def start(self):
+        """
+        Start the worker thread.
+        """
+        self._thread = threading.Thread(target=self._work, name='events-%s' % self.name)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        Stop the worker thread once it has handled the events already in its inbox.
+        :param timeout: The maximum amount of seconds to wait for the thread to terminate
+        """
+        if not self._thread:
+            return
+        try:
+            self.inbox.put(None, True, timeout)
+        except Queue.Full:
+            self.console.warning('%s: could not stop event worker: %s events still waiting', self.name,
+                                 self.inbox.qsize())
+            return
+        if self._thread is not threading.current_thread():
+            self._thread.join(timeout)
+        self._thread = None
+
+    def put(self, added, expire, event):
+        """
+        Queue an event for the handler.
+        :param added: The time the event was queued at
+        :param expire: The time after which the event must be discarded
+        :param event: The event to queue
+        :return: False if the event got dropped because the inbox is full
+        """
+        try:
+            self.inbox.put_nowait((added, expire, event))
+        except Queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 100 == 0:
+                self.console.warning('%s: event inbox full (%s events): %s events dropped so far', self.name,
+                                     self.inbox.qsize(), self.dropped)
+            return False
+        self.received += 1
+        self.max_depth = max(self.max_depth, self.inbox.qsize())
+        return True
+
+    def stats(self):
+        """
+        Return the worker counters.
+        """
+        return {
+            'depth': self.inbox.qsize(),
+            'max_depth': self.max_depth,
+            'received': self.received,
+            'handled': self.handled,
+            'dropped': self.dropped,
+            'expired': self.expired,
+        }
+
+    def _work(self):
+        """
+        Worker thread main loop.
+        """
+        while True:
+            item = self.inbox.get()
+            if item is None:
+                break
+            added, expire, event = item
+            event_name = self.console.getEventName(event.type)
+            if self.console.time() >= expire:
+                self.expired += 1
+                self.console.error('**** Event sat in %s inbox too long: %s', self.name, event_name)
+                continue
+            if self.console.runEventHandler(self.handler, event, event_name):
+                self.console.warning('%s vetoed event %s from its event worker: the veto is ignored (plugins '
+                                     'vetoing events must set vetoesEvents)', self.name, event_name)
+            self.handled += 1
+
+
 class VetoEvent(Exception):
     """
     Raised to cancel event processing.
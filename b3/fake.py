@@ -47,7 +47,7 @@ with fakeConsole and joe which can be used to say commands
 as if it where a player.
 """
 
-__version__ = '1.18'
+__version__ = '1.20'
 
 import b3.events
 import b3.output
@@ -143,7 +143,6 @@ class FakeConsole(b3.parser.Parser):
 
             try:
                 hfunc.parseEvent(event)
-                time.sleep(0.001)
             except b3.events.VetoEvent:
                 # plugin called for event hault, do not continue processing
                 self.bot('Event %s vetoed by %s', self.Events.getName(event.type), str(hfunc))
@@ -166,6 +165,8 @@ class FakeConsole(b3.parser.Parser):
                 self._handleEvent(self.getEvent('EVT_STOP'))
                 if self._cron:
                     self._cron.stop()
+                if self._timers:
+                    self._timers.stop()
                 self.bot('shutting down database connections...')
                 self.storage.shutdown()
         except Exception, e:
@@ -325,7 +326,6 @@ class FakeClient(b3.clients.Client):
         #self.console.clients.newClient(cid)
         clients = self.console.clients
         clients[self.cid] = self
-        clients.resetIndex()
 
         self.console.debug('client connected: [%s] %s - %s (%s)', clients[self.cid].cid,
                            clients[self.cid].name, clients[self.cid].guid, clients[self.cid].data)
@@ -343,6 +343,7 @@ class FakeClient(b3.clients.Client):
         self.cid = None
         self.authed = False
         self._pluginData = {}
+        self._pluginVars = {}
         self.state = b3.STATE_UNKNOWN
     
     def says(self, msg):
@@ -54,9 +54,10 @@
 # 13/07/2015 - 1.23  - Fenix          - added clamp function
 
 __author__    = 'ThorN, xlr8or, courgette'
-__version__   = '1.23'
+__version__   = '1.26'
 
 import collections
+import copy
 import os
 import re
 import sys
@@ -393,6 +394,21 @@ def meanstdv(x):
     return mean, std
 
 
+def percentile(x, p):
+    """
+    Calculate the p-th percentile of data x[] (linear interpolation between the closest ranks).
+    :param x: The data
+    :param p: The percentile (between 0 and 100)
+    """
+    values = sorted(x)
+    if not values:
+        return 0
+    rank = (len(values) - 1) * min(max(p, 0), 100) / 100.0
+    low = int(rank)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
 def fuzzyGuidMatch(a, b):
     """
     Matches guid using the levenshtein distance if necessary,
@@ -710,4 +726,40 @@ def topological_sort(source):
         if not next_emitted: # all entries have unmet deps, one of two things is wrong...
             raise ProgrammingError("cyclic or missing dependancy detected: %r" % (next_pending,))
         pending = next_pending
-        emitted = next_emitted
\ No newline at end of file
+        emitted = next_emitted
+
+def copyClassContainers(obj):
+    """
+    Give an object instance its own copy of the dicts, lists and sets declared as class attributes, so that changes
+    made in place to those containers are not seen by the other instances of the class.
+    :param obj: The object instance
+    """
+    seen = set(obj.__dict__)
+    for cls in type(obj).__mro__:
+        for name, value in vars(cls).items():
+            if name in seen or name.startswith('__'):
+                continue
+            seen.add(name)
+            if isinstance(value, (dict, list, set)):
+                try:
+                    value = copy.deepcopy(value)
+                except Exception:
+                    value = copy.copy(value)
+                setattr(obj, name, value)
+
+
+def getAttributes(obj):
+    """
+    Return the names of the attributes set on the given object instance.
+    Works like vars() but also lists the attributes stored in __slots__.
+    :param obj: The object instance
+    """
+    names = []
+    for cls in type(obj).__mro__:
+        for name in cls.__dict__.get('__slots__', ()):
+            if name not in ('__dict__', '__weakref__') and name not in names and hasattr(obj, name):
+                names.append(name)
+    for name in getattr(obj, '__dict__', ()):
+        if name not in names:
+            names.append(name)
+    return names
@@ -0,0 +1,525 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""
+Run several game servers in a single B3 process.
+
+Each server listed in the hosting configuration file gets its own parser, with its own main configuration file,
+log file, clients and plugin instances, while the expensive resources are shared among all of them:
+    - the database connection pool, the storage worker threads and the client name index
+    - the cron scheduler and its worker threads
+    - the timer wheel and its worker threads
+    - the plugin modules, which are imported only once
+
+The memory and the database connections used by the process hence grow with the number of online players rather
+than with the number of hosted servers. The resource usage of each server (clients, plugins, crontabs, timers,
+queued events and database queries) is written in the hosting log file at regular intervals.
+"""
+
+__version__ = '1.1'
+
+import argparse
+import imp
+import os
+import signal
+import sys
+import threading
+import time
+import traceback
+
+import b3
+import b3.config
+import b3.cron
+import b3.events
+import b3.output
+import b3.storage
+import b3.timer
+
+from b3.functions import getBytes
+from b3.functions import splitDSN
+from b3.storage.shared import SharedStorage
+from collections import OrderedDict
+from ConfigParser import NoOptionError
+from ConfigParser import NoSectionError
+
+try:
+    import resource
+except ImportError:
+    # not available on Windows
+    resource = None
+
+
+def getMemoryUsage():
+    """
+    Return the amount of memory used by the process (in bytes) or None if it cannot be measured on this platform.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, IndexError, ValueError, AttributeError):
+        pass
+    if resource is not None:
+        # peak resident set size: kilobytes on Linux, bytes on OSX
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if b3.getPlatform() == 'darwin' else maxrss * 1024
+    return None
+
+
+class HostedServer(object):
+    """
+    A game server run by the host.
+    """
+    def __init__(self, name, configfile):
+        """
+        Object constructor.
+        :param name: The server name
+        :param configfile: The path of the server main configuration file
+        """
+        self.name = name
+        self.configfile = configfile
+        self.console = None
+        self.thread = None
+        self.exitcode = None
+        self.restarts = 0
+        self.started = None
+
+    def isRunning(self):
+        """
+        Whether the server parser is running.
+        """
+        return self.thread is not None and self.thread.isAlive()
+
+
+class Host(object):
+    """
+    Run the parsers of several game servers sharing the storage, the scheduling services and the plugin modules.
+    """
+    def __init__(self, config, options):
+        """
+        Object constructor.
+        :param config: The hosting configuration file instance
+        :param options: command line options
+        """
+        self.config = config
+        self.options = options
+        self.servers = OrderedDict()
+        self.working = True
+        self.storage = None
+        self.log = None
+        self._modules = {}  # plugin module path => module
+        self._modulesLock = threading.Lock()
+        self._exiting = threading.Lock()
+
+        # set up logging
+        logfile = b3.getWritableFilePath(self.getOption('getpath', 'logfile', '@home/hosting.log'), True)
+        logsize = getBytes(self.getOption('get', 'logsize', '10MB'))
+        self.log = b3.output.getInstance(logfile, self.getOption('getint', 'log_level', 9), logsize)
+
+        # save screen output to self.screen: the hosted servers share it
+        self.screen = sys.stdout
+        self.screen.write('Activating log   : %s\n' % b3.getShortPath(os.path.abspath(logfile)))
+        self.screen.flush()
+
+        sys.stdout = b3.output.STDOutLogger(self.log)
+        sys.stderr = b3.output.STDErrLogger(self.log)
+
+        self.setupStorage()
+        self.cron = b3.cron.Cron(self, workers=self.getOption('getint', 'cron_workers', 2))
+        self.cron.start()
+        self.timers = b3.timer.TimerWheel(self, workers=self.getOption('getint', 'timer_workers', 2))
+
+        stats_interval = self.getOption('getint', 'stats_interval', 5)
+        if stats_interval > 0:
+            self.cron.add(b3.cron.CronTab(self.dumpStats, second=0, minute='*/%s' % min(stats_interval, 59)))
+
+        for name in self.config.options('servers'):
+            self.addServer(name, self.config.getpath('servers', name))
+
+    def getOption(self, getter, option, default):
+        """
+        Return the value of an option of the [b3] section of the hosting configuration file.
+        :param getter: The name of the config getter method to use (get, getint, getpath...)
+        :param option: The option name
+        :param default: The value to return when the option is missing or invalid
+        """
+        try:
+            value = getattr(self.config, getter)('b3', option)
+        except (NoOptionError, NoSectionError):
+            return default
+        except ValueError, err:
+            if self.log:
+                self.warning(err)
+            return default
+        return default if value in (None, '') else value
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   SHARED RESOURCES                                                                                               #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def setupStorage(self):
+        """
+        Setup the storage module shared by the hosted servers and connect to the database.
+        """
+        dsn = self.getOption('get', 'database', None)
+        if not dsn:
+            self.critical('Missing database option in the hosting configuration file')
+        try:
+            self.storage = b3.storage.getStorage(dsn=dsn, dsnDict=splitDSN(dsn), console=self)
+        except (AttributeError, ImportError), e:
+            self.critical('Could not setup storage module: %s', e)
+
+        self.storage.setupPool(size=self.getOption('getint', 'database_pool_size', None),
+                               timeout=self.getOption('getfloat', 'database_pool_timeout', None))
+        self.storage.setupExecutor(workers=self.getOption('getint', 'storage_workers', 2),
+                                   queue_size=self.getOption('getint', 'storage_queue_size', 1000))
+        self.storage.connect()
+        if self.getOption('getboolean', 'name_index', True):
+            self.storage.setupNameIndex()
+
+    def getStorage(self, console):
+        """
+        Return the storage of a hosted server.
+        :param console: The parser of the hosted server
+        """
+        return b3.storage.getSharedStorage(self.storage, console)
+
+    def getCron(self, console):
+        """
+        Return the cron of a hosted server.
+        :param console: The parser of the hosted server
+        """
+        return b3.cron.CronView(self.cron, console)
+
+    def getTimers(self, console):
+        """
+        Return the timer wheel of a hosted server.
+        :param console: The parser of the hosted server
+        """
+        return b3.timer.TimerView(self.timers, console)
+
+    def loadModule(self, name, fp, pathname, description):
+        """
+        Load a plugin module found by imp.find_module, unless another hosted server already did.
+        Loading a module again would replace the classes the plugins of the other servers are instances of.
+        """
+        with self._modulesLock:
+            module = self._modules.get(pathname)
+            if module is None:
+                module = imp.load_module(name, fp, pathname, description)
+                self._modules[pathname] = module
+            return module
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   HOSTED SERVERS                                                                                                 #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def addServer(self, name, configfile):
+        """
+        Create the parser of a game server: a server failing to start is logged and left out.
+        :param name: The server name
+        :param configfile: The path of the server main configuration file
+        :return: The HostedServer instance or None if its parser could not be created
+        """
+        server = self.servers.get(name) or HostedServer(name, configfile)
+        self.servers[name] = server
+        try:
+            server.console = self.createParser(name, configfile)
+        except SystemExit, e:
+            self.error('Could not start server %s: exit code %s', name, e.code)
+            server.console = None
+        except Exception, e:
+            self.error('Could not start server %s: %s\n%s', name, e, traceback.extract_tb(sys.exc_info()[2]))
+            server.console = None
+        return server if server.console else None
+
+    def createParser(self, name, configfile):
+        """
+        Instantiate the parser of a game server.
+        :param name: The server name
+        :param configfile: The path of the server main configuration file
+        """
+        self.bot('Loading server %s: %s', name, configfile)
+        mainconfig = b3.config.MainConfig(b3.config.load(configfile))
+        analysis = mainconfig.analyze()
+        if analysis:
+            raise b3.config.ConfigFileNotValid('invalid configuration file: %s' % ', '.join(analysis))
+
+        options = argparse.Namespace(**vars(self.options))
+        options.autorestart = False
+        options.host = self
+        options.server = name
+
+        parsertype = mainconfig.get('b3', 'parser')
+        self.screen.write('Loading server   : %s (%s)\n' % (name, parsertype))
+        self.screen.flush()
+        return b3.loadParser(parsertype)(mainconfig, options)
+
+    def runServer(self, server):
+        """
+        Run the parser of a game server till it stops, creating a new one when a restart is requested.
+        :param server: The HostedServer instance
+        """
+        while self.working and server.console:
+            server.started = time.time()
+            try:
+                server.console.start()
+                server.exitcode = server.console.exitcode
+            except SystemExit, e:
+                server.exitcode = e.code
+            except Exception, e:
+                self.error('Server %s crashed: %s\n%s', server.name, e, traceback.extract_tb(sys.exc_info()[2]))
+                server.console.shutdown()
+                server.exitcode = 223
+
+            self.bot('Server %s exited with status %s', server.name, server.exitcode)
+            if server.exitcode != 221 or not self.working:
+                break
+
+            server.restarts += 1
+            self.bot('Restarting server %s (%s)', server.name, server.restarts)
+            self.addServer(server.name, server.configfile)
+
+    def start(self):
+        """
+        Run the hosted servers, each one in its own thread, till all of them stop.
+        """
+        for server in self.servers.values():
+            if not server.console:
+                continue
+            server.thread = threading.Thread(target=self.runServer, args=(server,), name='server-%s' % server.name)
+            server.thread.daemon = True
+            server.thread.start()
+
+        while self.working and any(server.isRunning() for server in self.servers.values()):
+            time.sleep(1)
+
+        self.shutdown()
+
+    def shutdown(self):
+        """
+        Shutdown the hosted servers and release the shared resources.
+        """
+        if not self._exiting.acquire(False):
+            return
+        self.bot('Shutting down...')
+        self.working = False
+        for server in self.servers.values():
+            if server.console:
+                server.console.shutdown()
+                # wake the event handler thread up: it releases the lock the parser waits for to stop reading
+                server.console.queueEvent(b3.events.Event(server.console.getEventID('EVT_EXIT'), None))
+        for server in self.servers.values():
+            if server.thread and server.thread is not threading.current_thread():
+                server.thread.join(10)
+        self.bot('Stopping cron')
+        self.cron.stop()
+        self.bot('Stopping timers')
+        self.timers.stop()
+        if self.storage:
+            self.bot('Writing pending database changes')
+            self.storage.stopExecutor()
+            self.bot('Shutting down database connection')
+            self.storage.shutdown()
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   RESOURCE ACCOUNTING                                                                                            #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def getServerStats(self, server):
+        """
+        Return the resources used by a hosted server.
+        :param server: The HostedServer instance
+        """
+        stats = OrderedDict(running=server.isRunning(), restarts=server.restarts)
+        console = server.console
+        if console is None:
+            return stats
+        stats['uptime'] = int(time.time() - server.started) if server.started else 0
+        stats['clients'] = len(console.clients)
+        stats['plugins'] = len(console._plugins)
+        stats['events_queued'] = console.queue.qsize()
+        stats['crontabs'] = len(console._cron.getStats()) if console._cron else 0
+        stats['timers'] = console._timers.stats()['pending'] if console._timers else 0
+        if isinstance(console.storage, SharedStorage):
+            for key, value in console.storage.getStats().items():
+                stats['db_%s' % key] = value
+        return stats
+
+    def getStats(self):
+        """
+        Return the resources used by the hosted servers and by the shared services.
+        :return: A dict with the 'servers' (server name => resources used) and the 'shared' resources
+        """
+        servers = OrderedDict((name, self.getServerStats(server)) for name, server in self.servers.items())
+        shared = OrderedDict()
+        shared['servers'] = len([x for x in servers.values() if x['running']])
+        shared['threads'] = threading.active_count()
+        shared['plugin_modules'] = len(self._modules)
+        shared['crontabs'] = len(self.cron.getStats())
+        shared['timers'] = self.timers.stats()['pending']
+        memory = getMemoryUsage()
+        if memory is not None:
+            shared['memory'] = memory
+            shared['memory_per_server'] = memory / max(1, shared['servers'])
+        if self.storage:
+            for key, value in self.storage.status().items():
+                shared['db_%s' % key] = value
+        return {'servers': servers, 'shared': shared}
+
+    def dumpStats(self):
+        """
+        Write the resource usage in the log file.
+        """
+        stats = self.getStats()
+        self.verbose('Shared resources : %s', ', '.join('%s: %s' % x for x in stats['shared'].items()))
+        for name, server in stats['servers'].items():
+            self.verbose('Server %-10s : %s', name, ', '.join('%s: %s' % x for x in server.items()))
+
+    ####################################################################################################################
+    #                                                                                                                  #
+    #   LOGGING                                                                                                        #
+    #                                                                                                                  #
+    ####################################################################################################################
+
+    def error(self, msg, *args, **kwargs):
+        """
+        Log an ERROR message.
+        """
+        self.log.error(msg, *args, **kwargs)
+
+    def debug(self, msg, *args, **kwargs):
+        """
+        Log a DEBUG message.
+        """
+        self.log.debug(msg, *args, **kwargs)
+
+    def bot(self, msg, *args, **kwargs):
+        """
+        Log a BOT message.
+        """
+        self.log.bot(msg, *args, **kwargs)
+
+    def verbose(self, msg, *args, **kwargs):
+        """
+        Log a VERBOSE message.
+        """
+        self.log.verbose(msg, *args, **kwargs)
+
+    def verbose2(self, msg, *args, **kwargs):
+        """
+        Log an EXTRA VERBOSE message.
+        """
+        self.log.verbose2(msg, *args, **kwargs)
+
+    def console(self, msg, *args, **kwargs):
+        """
+        Log a CONSOLE message.
+        """
+        self.log.console(msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        """
+        Log a WARNING message.
+        """
+        self.log.warning(msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        """
+        Log an INFO message.
+        """
+        self.log.info(msg, *args, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        """
+        Log an EXCEPTION message.
+        """
+        self.log.exception(msg, *args, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        """
+        Log a CRITICAL message and shutdown the host.
+        """
+        self.log.critical(msg, *args, **kwargs)
+        raise SystemExit(220)
+
+    @staticmethod
+    def time():
+        """
+        Return the current time in GMT/UTC.
+        """
+        return int(time.time())
+
+
+def analyze(config):
+    """
+    Analyze the hosting configuration file checking for common mistakes.
+    :param config: The hosting configuration file instance
+    :return: A list of problems (empty if the configuration file is valid)
+    """
+    problems = []
+    if not config.has_option('b3', 'database') or not config.get('b3', 'database'):
+        problems.append('missing database option in section [b3]')
+    if not config.has_section('servers') or not config.options('servers'):
+        problems.append('no server listed in section [servers]')
+    else:
+        for name in config.options('servers'):
+            path = config.getpath('servers', name)
+            if not os.path.isfile(path):
+                problems.append('configuration file of server %s not found: %s' % (name, path))
+    return problems
+
+
+def start(config, options):
+    """
+    Main B3 hosting startup.
+    :param config: The hosting configuration file instance
+    :param options: command line options
+    """
+    # plugin configuration files using the @conf prefix are looked for next to the hosting configuration file
+    b3.confdir = os.path.dirname(config.fileName)
+
+    sys.stdout.write('Starting B3      : %s\n' % b3.getB3versionString())
+    sys.stdout.write('Hosting mode     : %s\n' % b3.getShortPath(config.fileName, True))
+    sys.stdout.flush()
+
+    host = Host(config, options)
+
+    def termSignalHandler(signum, frame):
+        """
+        Define the signal handler so to handle B3 shutdown properly.
+        """
+        host.bot("TERM signal received: shutting down")
+        host.shutdown()
+        raise SystemExit(222)
+
+    try:
+        signal.signal(signal.SIGTERM, termSignalHandler)
+    except Exception:
+        pass
+
+    try:
+        host.start()
+    except KeyboardInterrupt:
+        host.shutdown()
+        print 'Goodbye'
@@ -0,0 +1,577 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__version__ = '1.2'
+
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+from collections import deque
+
+
+class PollingWatcher(object):
+    """
+    Wait for a file to change by sleeping: used where file change notifications are not available.
+    """
+    name = 'polling'
+
+    def wait(self, timeout):
+        """
+        Wait for the watched file to change.
+        :param timeout: The maximum amount of seconds to wait for
+        :return: True if the file changed, False if the timeout expired (always False here)
+        """
+        time.sleep(timeout)
+        return False
+
+    def close(self):
+        """
+        Release the watcher resources.
+        """
+        pass
+
+
+class InotifyWatcher(object):
+    """
+    Wait for a file to change using the Linux inotify API.
+    The directory holding the file is watched so that the file being rotated (renamed, deleted or re-created)
+    is noticed as well.
+    """
+    name = 'inotify'
+
+    IN_MODIFY = 0x00000002
+    IN_ATTRIB = 0x00000004
+    IN_CLOSE_WRITE = 0x00000008
+    IN_MOVED_FROM = 0x00000040
+    IN_MOVED_TO = 0x00000080
+    IN_CREATE = 0x00000100
+    IN_DELETE = 0x00000200
+    IN_DELETE_SELF = 0x00000400
+    IN_MOVE_SELF = 0x00000800
+    IN_Q_OVERFLOW = 0x00004000
+    IN_NONBLOCK = 0x00000800
+    IN_CLOEXEC = 0x00080000
+
+    _mask = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | \
+            IN_DELETE_SELF | IN_MOVE_SELF
+    _header = struct.Struct('iIII')
+    _libc = None
+
+    def __init__(self, path):
+        """
+        Object constructor.
+        :param path: The path of the file to watch
+        :raise OSError: If inotify is not available
+        """
+        libc = self._loadLibc()
+        self.filename = os.path.basename(path)
+        self.fd = libc.inotify_init1(self.IN_NONBLOCK | self.IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(libc.get_errno(), 'inotify_init1 failed')
+        directory = os.path.dirname(os.path.abspath(path))
+        if libc.inotify_add_watch(self.fd, directory, self._mask) < 0:
+            err = libc.get_errno()
+            os.close(self.fd)
+            self.fd = None
+            raise OSError(err, 'cannot watch %s' % directory)
+
+    @classmethod
+    def _loadLibc(cls):
+        """
+        Load the C library exposing the inotify functions.
+        :raise OSError: If inotify is not available on this system
+        """
+        if cls._libc is None:
+            if not sys.platform.startswith('linux'):
+                raise OSError(errno.ENOSYS, 'inotify is only available on Linux')
+            import ctypes
+            import ctypes.util
+            libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            if not hasattr(libc, 'inotify_init1'):
+                raise OSError(errno.ENOSYS, 'inotify is not supported by the C library')
+            libc.get_errno = ctypes.get_errno
+            cls._libc = libc
+        return cls._libc
+
+    def wait(self, timeout):
+        """
+        Wait for the watched file to change.
+        :param timeout: The maximum amount of seconds to wait for
+        :return: True if the file changed, False if the timeout expired
+        """
+        deadline = time.time() + timeout
+        while True:
+            try:
+                readable = select.select([self.fd], [], [], max(0, deadline - time.time()))[0]
+            except select.error, e:
+                if e[0] == errno.EINTR:
+                    continue
+                raise
+            if not readable:
+                return False
+            if self._drain():
+                return True
+
+    def _drain(self):
+        """
+        Consume the pending notifications.
+        :return: True if one of them is about the watched file
+        """
+        changed = False
+        while True:
+            try:
+                data = os.read(self.fd, 65536)
+            except OSError, e:
+                if e.errno in (errno.EAGAIN, errno.EWOULDBLOCK):
+                    return changed
+                if e.errno == errno.EINTR:
+                    continue
+                raise
+            if not data:
+                return changed
+            offset = 0
+            while offset < len(data):
+                wd, mask, cookie, length = self._header.unpack_from(data, offset)
+                offset += self._header.size
+                name = data[offset:offset + length].rstrip('\0')
+                offset += length
+                if not name or name == self.filename or mask & self.IN_Q_OVERFLOW:
+                    changed = True
+
+    def close(self):
+        """
+        Release the watcher resources.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+def getWatcher(path, method='auto'):
+    """
+    Return the best available watcher for the given file.
+    :param path: The path of the file to watch
+    :param method: 'auto' to use file change notifications when available, 'polling' to always poll
+    """
+    if method == 'polling':
+        return PollingWatcher()
+    try:
+        return InotifyWatcher(path)
+    except (OSError, IOError, AttributeError):
+        return PollingWatcher()
+
+
+class LogTailer(object):
+    """
+    Follow a growing log file.
+    Data is read in large chunks straight from the file descriptor and only complete lines are returned: a line
+    still being written by the game server is kept until its end shows up. A log file getting smaller is followed
+    from its new end, a log file being replaced (rotated) is reopened and read from its beginning.
+    """
+    def __init__(self, path, fileobj=None, watcher=None, chunk_size=65536, console=None):
+        """
+        Object constructor.
+        :param path: The path of the log file
+        :param fileobj: The already open log file (reading starts at its current position)
+        :param watcher: The object used to wait for the file to change (a PollingWatcher if not given)
+        :param chunk_size: The amount of bytes requested by each read
+        :param console: The console to use for logging
+        """
+        self.path = path
+        self.file = fileobj if fileobj is not None else open(path, 'rb')
+        self.position = self.file.tell()
+        self.watcher = watcher or PollingWatcher()
+        self.chunk_size = chunk_size
+        self.console = console
+        self._partial = ''
+        self.bytes_read = 0
+        self.lines_read = 0
+        self.rotations = 0
+        self.truncations = 0
+
+    def read(self):
+        """
+        Return the complete lines added to the log file since the last call.
+        """
+        lines = self._readLines()
+        if self._rotated():
+            # get what got written to the old file before it got replaced
+            lines.extend(self._readLines())
+            if self._partial:
+                lines.append(self._partial)
+                self._partial = ''
+            self._reopen()
+            lines.extend(self._readLines())
+        self.lines_read += len(lines)
+        return lines
+
+    def wait(self, timeout):
+        """
+        Wait for the log file to change.
+        :param timeout: The maximum amount of seconds to wait for
+        :return: True if a change was notified before the timeout expired
+        """
+        return self.watcher.wait(timeout)
+
+    def seekEnd(self):
+        """
+        Skip everything written to the log file so far.
+        """
+        self.position = os.lseek(self.file.fileno(), 0, os.SEEK_END)
+        self.file.seek(self.position)
+        self._partial = ''
+
+    def close(self):
+        """
+        Close the log file and release the watcher resources.
+        """
+        self.watcher.close()
+        self.file.close()
+
+    def _readLines(self):
+        """
+        Read the data available in the current file and split it into lines.
+        """
+        fd = self.file.fileno()
+        size = os.fstat(fd).st_size
+        if self.position > size:
+            self.debug('game log is suddenly smaller than it was before (%s bytes, now %s), the log was probably '
+                       'either rotated or emptied. B3 will now re-adjust to the new size of the log',
+                       self.position, size)
+            self.truncations += 1
+            self.position = size
+            self._partial = ''
+            self.file.seek(size)
+            return []
+
+        if self.position == size:
+            return []
+
+        chunks = [self._partial]
+        os.lseek(fd, self.position, os.SEEK_SET)
+        while True:
+            chunk = os.read(fd, self.chunk_size)
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self.bytes_read += len(chunk)
+            if len(chunk) < self.chunk_size:
+                break
+
+        # keep the file object position in sync for code using it directly
+        self.position = os.lseek(fd, 0, os.SEEK_CUR)
+        self.file.seek(self.position)
+
+        lines = ''.join(chunks).split('\n')
+        self._partial = lines.pop()
+        return lines
+
+    def _rotated(self):
+        """
+        Tell whether the log file path now points to another file.
+        """
+        try:
+            stats = os.stat(self.path)
+        except OSError:
+            # the new file is not created yet
+            return False
+        current = os.fstat(self.file.fileno())
+        return (stats.st_ino, stats.st_dev) != (current.st_ino, current.st_dev)
+
+    def _reopen(self):
+        """
+        Switch to the file now found at the log file path.
+        """
+        self.debug('game log file was replaced: reopening %s', self.path)
+        self.rotations += 1
+        self.file.close()
+        self.file = open(self.path, 'rb')
+        self.position = 0
+
+    def debug(self, msg, *args):
+        if self.console:
+            self.console.debug('LogTailer: ' + msg, *args)
+
+
+# StreamTailer buffer markers: the next data does not follow the data received so far
+_RESTART = 0  # the next data starts at the beginning of a line
+_SKIP = 1  # the next data starts in the middle of a line
+
+
+class StreamTailer(object):
+    """
+    Follow a remote game log whose data is pushed by a remote log plugin (ftpytail, sftpytail, httpytail).
+    Data is kept in a bounded in-memory buffer until the parser reads it: no local copy of the game log is written.
+    When the parser falls more than max_size bytes behind, the oldest data is dropped along with the line it cuts
+    so that no truncated line ever gets parsed.
+    """
+    name = 'stream'
+
+    def __init__(self, max_size=1048576, console=None):
+        """
+        Object constructor.
+        :param max_size: The maximum amount of bytes kept waiting for the parser
+        :param console: The console to use for logging
+        """
+        self.max_size = max_size
+        self.console = console
+        self._chunks = deque()  # received data and markers
+        self._size = 0  # amount of bytes in self._chunks
+        self._partial = ''
+        self._skipping = False  # data is dropped up to the next line end
+        self._overflowing = False
+        self._cond = threading.Condition(threading.Lock())
+        self._closed = False
+        self.bytes_received = 0
+        self.bytes_dropped = 0
+        self.lines_read = 0
+        self.resets = 0
+
+    def feed(self, data):
+        """
+        Add data received from the remote game log.
+        :param data: The received bytes
+        """
+        if not data:
+            return
+        with self._cond:
+            if self._closed:
+                return
+            self._chunks.append(data)
+            self._size += len(data)
+            self.bytes_received += len(data)
+            if self._size > self.max_size:
+                self._drop()
+            self._cond.notify_all()
+
+    def reset(self, aligned=True):
+        """
+        Tell that the next data does not follow the data received so far (the remote game log got rotated or
+        some of it got skipped): the line being received is discarded.
+        :param aligned: Whether the next data starts at the beginning of a line
+        """
+        with self._cond:
+            self._chunks.append(_RESTART if aligned else _SKIP)
+            self.resets += 1
+
+    def read(self):
+        """
+        Return the complete lines received since the last call.
+        """
+        with self._cond:
+            chunks, self._chunks = self._chunks, deque()
+            self._size = 0
+            self._overflowing = False
+            lines = []
+            segment = [self._partial]
+            for chunk in chunks:
+                if chunk is _RESTART or chunk is _SKIP:
+                    lines.extend(self._split(''.join(segment)))
+                    segment = []
+                    self._partial = ''
+                    self._skipping = chunk is _SKIP
+                else:
+                    segment.append(chunk)
+            lines.extend(self._split(''.join(segment)))
+            self.lines_read += len(lines)
+            return lines
+
+    def wait(self, timeout):
+        """
+        Wait for data to be received.
+        :param timeout: The maximum amount of seconds to wait for
+        :return: True if data is waiting to be read
+        """
+        with self._cond:
+            if not self._size and not self._closed:
+                self._cond.wait(timeout)
+            return self._size > 0
+
+    def seekEnd(self):
+        """
+        Skip everything received so far.
+        """
+        with self._cond:
+            self._chunks.clear()
+            self._size = 0
+            self._partial = ''
+            self._skipping = False
+
+    def close(self):
+        """
+        Stop buffering data and wake up the reader.
+        """
+        with self._cond:
+            self._closed = True
+            self._chunks.clear()
+            self._size = 0
+            self._cond.notify_all()
+
+    def stats(self):
+        """
+        Return the buffer usage statistics.
+        """
+        with self._cond:
+            return {
+                'buffered': self._size,
+                'received': self.bytes_received,
+                'dropped': self.bytes_dropped,
+                'lines': self.lines_read,
+                'resets': self.resets,
+            }
+
+    def _split(self, data):
+        """
+        Split data into complete lines, keeping the trailing partial line (must be called with the lock held).
+        """
+        if self._skipping:
+            end = data.find('\n')
+            if end == -1:
+                self._partial = ''
+                return []
+            data = data[end + 1:]
+            self._skipping = False
+        lines = data.split('\n')
+        self._partial = lines.pop()
+        return lines
+
+    def _drop(self):
+        """
+        Drop the oldest data until the buffer fits max_size (must be called with the lock held).
+        """
+        if not self._overflowing:
+            self._overflowing = True
+            self.debug('parser is more than %s bytes behind the remote game log: dropping the oldest data',
+                       self.max_size)
+        while self._size > self.max_size:
+            chunk = self._chunks.popleft()
+            if chunk is _RESTART or chunk is _SKIP:
+                continue
+            excess = self._size - self.max_size
+            if len(chunk) > excess:
+                self._chunks.appendleft(chunk[excess:])
+                chunk = chunk[:excess]
+            self._size -= len(chunk)
+            self.bytes_dropped += len(chunk)
+        # the line being received got cut
+        self._chunks.appendleft(_SKIP)
+
+    def debug(self, msg, *args):
+        if self.console:
+            self.console.debug('StreamTailer: ' + msg, *args)
+
+
+class PollDelay(object):
+    """
+    Adaptive delay between two polls of a remote game log: poll again quickly while data keeps coming and slow
+    down while the game log is idle.
+    """
+    def __init__(self, minimum, maximum, factor=2.0):
+        """
+        Object constructor.
+        :param minimum: The delay (in seconds) used when the last poll got data
+        :param maximum: The delay (in seconds) the polls slow down to while the game log is idle
+        :param factor: How much the delay grows after each poll not getting data
+        """
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.factor = factor
+        self.delay = minimum
+
+    def update(self, received):
+        """
+        Compute the delay to wait for before the next poll.
+        :param received: The amount of bytes the last poll got
+        :return: The delay in seconds
+        """
+        if received:
+            self.delay = self.minimum
+        else:
+            self.delay = min(self.maximum, self.delay * self.factor)
+        return self.delay
+
+
+class RemoteLogWriter(object):
+    """
+    Destination of the data downloaded by the remote log plugins: either the parser StreamTailer, either a local
+    copy of the remote game log the parser is reading.
+    """
+    def __init__(self, stream=None, path=None, append=False):
+        """
+        Object constructor.
+        :param stream: The StreamTailer to feed (if None data is written to the local file)
+        :param path: The path of the local game log file
+        :param append: Whether to keep the local game log content when the connection is lost
+        """
+        self.stream = stream
+        self.path = path
+        self.append = append
+        self.file = None
+        if self.stream is None:
+            self.file = open(self.path, 'ab')
+            self.file.write('\r\nB3 has been restarted\r\n\r\n')
+            self.file.flush()
+
+    def write(self, data):
+        """
+        Pass on downloaded data.
+        :param data: The downloaded bytes
+        """
+        if self.stream is not None:
+            self.stream.feed(data)
+        else:
+            self.file.write(data)
+            self.file.flush()
+
+    def skip(self, aligned=True):
+        """
+        Tell that the next data does not follow the data written so far (remote game log rotation or gap).
+        :param aligned: Whether the next data starts at the beginning of a line
+        """
+        if self.stream is not None:
+            self.stream.reset(aligned)
+
+    def reset(self):
+        """
+        Start over after a lost connection.
+        """
+        if self.stream is not None:
+            self.stream.reset()
+            return
+        self.file.close()
+        if self.append:
+            try:
+                self.file = open(self.path, 'ab')
+                self.file.write('\r\nB3 has restarted writing the log file\r\n\r\n')
+                self.file.flush()
+                return
+            except IOError:
+                pass
+        self.file = open(self.path, 'wb')
+
+    def close(self):
+        """
+        Release the local game log file.
+        """
+        if self.file is not None:
+            self.file.close()
@@ -28,7 +28,7 @@
 # 04/07/2015 - 1.7.2 - Fenix     - changed log formatter to keep the same width for log levels
 
 __author__  = 'ThorN'
-__version__ = '1.7.2'
+__version__ = '1.8'
 
 import sys
 import logging
@@ -58,6 +58,9 @@ logging._srcfile = None
 # logger object instance
 __output = None
 
+# named logger instances (K=>name, V=>logger)
+__named = {}
+
 
 class OutputHandler(logging.Logger):
 
@@ -151,42 +154,56 @@ class STDErrLogger:
 logging.setLoggerClass(OutputHandler)
 
 
-def getInstance(logfile='b3.log', loglevel=21, logsize=10485760, log2console=False):
+def getInstance(logfile='b3.log', loglevel=21, logsize=10485760, log2console=False, name=None):
     """
     Return a Logger instance.
     :param logfile: The logfile name.
     :param loglevel: The logging level.
     :param logsize: The size of the log file (in bytes)
     :param log2console: Whether or not to extend logging to the console.
+    :param name: The name of a logger writing to its own log file (the main logger is returned if omitted)
     """
     global __output
 
-    if __output is None:
+    if name is not None:
+        if name not in __named:
+            logger = logging.getLogger('output.%s' % name)
+            logger.propagate = False
+            _setupLogger(logger, logfile, loglevel, logsize, log2console)
+            __named[name] = logger
+        return __named[name]
 
+    if __output is None:
         __output = logging.getLogger('output')
+        _setupLogger(__output, logfile, loglevel, logsize, log2console)
 
-        # FILE HANDLER
-        file_formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)r', '%y%m%d %H:%M:%S')
-        handler = handlers.RotatingFileHandler(logfile, maxBytes=logsize, backupCount=5, encoding="UTF-8")
-        handler.doRollover()
-        handler.setFormatter(file_formatter)
+    return __output
 
-        __output.addHandler(handler)
 
-        if log2console:
-            # CONSOLE HANDLER
-            console_formatter = logging.Formatter('%(asctime)s\t%(levelname)s\t%(message)r', '%M:%S')
-            handler2 = logging.StreamHandler(sys.stdout)
-            handler2.setFormatter(console_formatter)
+def _setupLogger(logger, logfile, loglevel, logsize, log2console):
+    """
+    Add the file handler (and the console handlers if requested) to a logger and set its logging level.
+    """
+    # FILE HANDLER
+    file_formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)r', '%y%m%d %H:%M:%S')
+    handler = handlers.RotatingFileHandler(logfile, maxBytes=logsize, backupCount=5, encoding="UTF-8")
+    handler.doRollover()
+    handler.setFormatter(file_formatter)
+
+    logger.addHandler(handler)
 
-            __output.addHandler(handler2)
+    if log2console:
+        # CONSOLE HANDLER
+        console_formatter = logging.Formatter('%(asctime)s\t%(levelname)s\t%(message)r', '%M:%S')
+        handler2 = logging.StreamHandler(sys.stdout)
+        handler2.setFormatter(console_formatter)
 
-            handler_error = logging.StreamHandler(sys.stderr)
-            handler_error.setFormatter(console_formatter)
-            handler_error.setLevel(logging.ERROR)
+        logger.addHandler(handler2)
 
-            __output.addHandler(handler_error)
+        handler_error = logging.StreamHandler(sys.stderr)
+        handler_error.setFormatter(console_formatter)
+        handler_error.setLevel(logging.ERROR)
 
-        __output.setLevel(loglevel)
+        logger.addHandler(handler_error)
 
-    return __output
\ No newline at end of file
+    logger.setLevel(loglevel)
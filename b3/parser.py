@@ -193,7 +193,7 @@
 #                                       - added warning, info, exception, and critical log handlers
 
 __author__ = 'ThorN, Courgette, xlr8or, Bakes, Ozon, Fenix'
-__version__ = '1.43.6'
+__version__ = '1.45.1'
 
 
 import os
@@ -216,6 +216,8 @@ import b3.events
 import b3.output
 import b3.game
 import b3.cron
+import b3.logtailer
+import b3.timer
 import b3.parsers.q3a.rcon
 import b3.timezones
 
@@ -226,6 +228,8 @@ from b3.clients import Clients
 from b3.clients import Group
 from b3.decorators import Memoize
 from b3.exceptions import MissingRequirement
+from b3.functions import copyClassContainers
+from b3.functions import getAttributes
 from b3.functions import getModule
 from b3.functions import vars2printf
 from b3.functions import main_is_frozen
@@ -250,8 +254,14 @@ class Parser(object):
 
     _commands = {}  # will hold RCON commands for the current game
     _cron = None  # cron instance
+    _cronWorkers = 2  # number of threads running the crontabs
+    _timers = None  # timer wheel instance
     _events = {}  # available events (K=>EVENT)
     _eventNames = {}  # available event names (K=>NAME)
+    _eventBatchSize = 1  # max number of events dispatched per queue drain (1 = one event at a time)
+    _eventDispatch = 'serial'  # how events are handed to plugins (serial, threadsafe or threaded)
+    _eventInboxSize = 100  # max number of events waiting in a plugin event worker inbox
+    _eventWorkers = None  # event workers (K=>handler, V=>EventWorker)
     _eventsStats_cronTab = None  # crontab used to log event statistics
     _handlers = {}  # event handlers
     _lineTime = None  # used to track log file time changes
@@ -279,9 +289,11 @@ class Parser(object):
     config = None  # parser configuration file instance
     delay = 0.33  # time between each game log lines fetching
     delay2 = 0.02  # time between each game log line processing: max number of lines processed in one second
+    _logTailer = None  # follows the game log file when it is read through b3.logtailer
     encoding = 'latin-1'
     game = None
     gameName = None # console name
+    host = None  # the b3.host.Host instance running this parser along with other ones (None when running alone)
     log = None  # logger instance
     logTime = 0  # time in seconds of epoch of game log
     name = 'b3'  # bot name
@@ -291,6 +303,7 @@ class Parser(object):
     rconTest = False  # whether to perform RCON testing or not
     remoteLog = False
     screen = None
+    serverName = None  # name of the server in the hosting configuration file (when hosted)
     storage = None  # storage module instance
     type = None
     working = True  # whether B3 is running or not
@@ -369,6 +382,16 @@ class Parser(object):
         # plugins can react on this and perform different operations
         self.autorestart = options.autorestart
 
+        # several parsers may run in the same process (see b3.host): keep their state apart
+        self.host = getattr(options, 'host', None)
+        self.serverName = getattr(options, 'server', None)
+        self.exiting = thread.allocate_lock()
+        self._handlers = {}
+        self._messages = {}
+        if self.host is not None:
+            # game parsers keep some state in class attributes (e.g. the clients being authenticated)
+            copyClassContainers(self)
+
         if not self.loadConfig(conf):
             print('CRITICAL ERROR : COULD NOT LOAD CONFIG')
             raise SystemExit(220)
@@ -390,16 +413,24 @@ class Parser(object):
         except (TypeError, NoOptionError):
             logsize = b3.functions.getBytes('10MB')
 
-        # create the main logger instance
-        self.log = b3.output.getInstance(logfile, self.config.getint('b3', 'log_level'), logsize, log2console)
+        if self.host:
+            # hosted servers write their own log file while the standard output is redirected by the host
+            self.log = b3.output.getInstance(logfile, self.config.getint('b3', 'log_level'), logsize, log2console,
+                                             name=self.serverName)
+            self.screen = self.host.screen
+            self.screen.write('Activating log   : %s\n' % b3.getShortPath(os.path.abspath(b3.getAbsolutePath(logfile, True))))
+            self.screen.flush()
+        else:
+            # create the main logger instance
+            self.log = b3.output.getInstance(logfile, self.config.getint('b3', 'log_level'), logsize, log2console)
 
-        # save screen output to self.screen
-        self.screen = sys.stdout
-        self.screen.write('Activating log   : %s\n' % b3.getShortPath(os.path.abspath(b3.getAbsolutePath(logfile, True))))
-        self.screen.flush()
+            # save screen output to self.screen
+            self.screen = sys.stdout
+            self.screen.write('Activating log   : %s\n' % b3.getShortPath(os.path.abspath(b3.getAbsolutePath(logfile, True))))
+            self.screen.flush()
 
-        sys.stdout = b3.output.STDOutLogger(self.log)
-        sys.stderr = b3.output.STDErrLogger(self.log)
+            sys.stdout = b3.output.STDOutLogger(self.log)
+            sys.stderr = b3.output.STDErrLogger(self.log)
 
         # setup ip addresses
         if self.gameName in 'bf3':
@@ -451,6 +482,7 @@ class Parser(object):
         # get events
         self.Events = b3.events.eventManager
         self._eventsStats = b3.events.EventsStats(self)
+        self._eventWorkers = {}
 
         self.bot('--------------------------------------------')
 
@@ -479,17 +511,11 @@ class Parser(object):
             if delay2 > 0:
                 self.delay2 = 1/delay2
 
-        try:
-            # setup storage module
-            dsn = self.config.get('b3', 'database')
-            self.storage = b3.storage.getStorage(dsn=dsn, dsnDict=splitDSN(dsn), console=self)
-        except (AttributeError, ImportError), e:
-            # exit if we don't manage to setup the storage module: B3 will stop working upon Admin
-            # Plugin loading so it makes no sense to keep going with the console initialization
-            self.critical('Could not setup storage module: %s', e)
-
-        # establish a connection with the database
-        self.storage.connect()
+        if self.host:
+            # the connection pool, the storage threads and the name index are shared among the hosted servers
+            self.storage = self.host.getStorage(self)
+        else:
+            self.setupStorage()
 
         if self.config.has_option('server', 'game_log'):
             # open log file
@@ -497,48 +523,62 @@ class Parser(object):
             if game_log[0:6] == 'ftp://' or game_log[0:7] == 'sftp://' or game_log[0:7] == 'http://':
                 self.remoteLog = True
                 self.bot('Working in remote-log mode: %s', game_log)
-                
-                if self.config.has_option('server', 'local_game_log'):
-                    f = self.config.getpath('server', 'local_game_log')
-                else:
-                    logext = str(self._rconIp.replace('.', '_'))
-                    logext = 'games_mp_' + logext + '_' + str(self._port) + '.log'
-                    f = os.path.normpath(os.path.expanduser(logext))
 
-                # make sure game log file can be written
-                f = b3.getWritableFilePath(f, True)
+                try:
+                    remote_log_mode = self.config.get('server', 'remote_log_mode').lower()
+                except NoOptionError:
+                    remote_log_mode = 'file'
+
+                if remote_log_mode not in ('file', 'stream'):
+                    self.warning('Invalid value for remote_log_mode (%s): using file', remote_log_mode)
+                    remote_log_mode = 'file'
 
-                if self.config.has_option('server', 'log_append'):
-                    if not (self.config.getboolean('server', 'log_append') and os.path.isfile(f)):
+                if remote_log_mode == 'stream':
+                    self.setupLogStream()
+                else:
+                    if self.config.has_option('server', 'local_game_log'):
+                        f = self.config.getpath('server', 'local_game_log')
+                    else:
+                        logext = str(self._rconIp.replace('.', '_'))
+                        logext = 'games_mp_' + logext + '_' + str(self._port) + '.log'
+                        f = os.path.normpath(os.path.expanduser(logext))
+
+                    # make sure game log file can be written
+                    f = b3.getWritableFilePath(f, True)
+
+                    if self.config.has_option('server', 'log_append'):
+                        if not (self.config.getboolean('server', 'log_append') and os.path.isfile(f)):
+                            self.screen.write('Creating gamelog : %s\n' % b3.getShortPath(os.path.abspath(f)))
+                            ftptempfile = open(f, "w")
+                            ftptempfile.close()
+                        else:
+                            self.screen.write('Append to gamelog: %s\n' % b3.getShortPath(os.path.abspath(f)))
+                    else:
                         self.screen.write('Creating gamelog : %s\n' % b3.getShortPath(os.path.abspath(f)))
                         ftptempfile = open(f, "w")
                         ftptempfile.close()
-                    else:
-                        self.screen.write('Append to gamelog: %s\n' % b3.getShortPath(os.path.abspath(f)))
-                else:
-                    self.screen.write('Creating gamelog : %s\n' % b3.getShortPath(os.path.abspath(f)))
-                    ftptempfile = open(f, "w")
-                    ftptempfile.close()
-                    
+
             else:
                 self.bot('Game log is: %s', game_log)
                 f = self.config.getpath('server', 'game_log')
 
-            self.bot('Starting bot reading file: %s', os.path.abspath(f))
-            self.screen.write('Using gamelog    : %s\n' % b3.getShortPath(os.path.abspath(f)))
+            if self.getLogStream() is None:
+                self.bot('Starting bot reading file: %s', os.path.abspath(f))
+                self.screen.write('Using gamelog    : %s\n' % b3.getShortPath(os.path.abspath(f)))
 
-            if os.path.isfile(f):
-                self.input = file(f, 'r')
-                if self.config.has_option('server', 'seek'):
-                    seek = self.config.getboolean('server', 'seek')
-                    if seek:
+                if os.path.isfile(f):
+                    self.input = file(f, 'r')
+                    if self.config.has_option('server', 'seek'):
+                        seek = self.config.getboolean('server', 'seek')
+                        if seek:
+                            self.input.seek(0, os.SEEK_END)
+                    else:
                         self.input.seek(0, os.SEEK_END)
+                    self.setupLogTailer(f)
                 else:
-                    self.input.seek(0, os.SEEK_END)
-            else:
-                self.screen.write(">>> Cannot read file: %s\n" % os.path.abspath(f))
-                self.screen.flush()
-                self.critical("Cannot read file: %s", os.path.abspath(f))
+                    self.screen.write(">>> Cannot read file: %s\n" % os.path.abspath(f))
+                    self.screen.flush()
+                    self.critical("Cannot read file: %s", os.path.abspath(f))
 
         try:
             # setup rcon
@@ -615,8 +655,109 @@ class Parser(object):
         self.debug("Creating the event queue with size %s", queuesize)
         self.queue = Queue.Queue(queuesize)
 
+        try:
+            self._eventBatchSize = max(1, self.config.getint('b3', 'event_batch_size'))
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+
+        if self._eventBatchSize > 1:
+            self.debug("Using batched event dispatching: up to %s events per batch", self._eventBatchSize)
+
+        if self.config.has_option('b3', 'event_dispatch'):
+            dispatch = self.config.get('b3', 'event_dispatch').strip().lower()
+            if dispatch in ('serial', 'threadsafe', 'threaded'):
+                self._eventDispatch = dispatch
+            else:
+                self.warning("Unknown value for b3::event_dispatch (%s): using default (%s)", dispatch,
+                             self._eventDispatch)
+
+        try:
+            self._eventInboxSize = max(1, self.config.getint('b3', 'event_inbox_size'))
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+
+        if self._eventDispatch != 'serial':
+            self.debug("Using %s event dispatching: plugin event inboxes hold up to %s events", self._eventDispatch,
+                       self._eventInboxSize)
+
+        try:
+            self._cronWorkers = max(1, self.config.getint('b3', 'cron_workers'))
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+
         atexit.register(self.shutdown)
 
+    def setupStorage(self):
+        """
+        Setup the storage module, its connection pool and worker threads and connect to the database.
+        """
+        try:
+            # setup storage module
+            dsn = self.config.get('b3', 'database')
+            self.storage = b3.storage.getStorage(dsn=dsn, dsnDict=splitDSN(dsn), console=self)
+        except (AttributeError, ImportError), e:
+            # exit if we don't manage to setup the storage module: B3 will stop working upon Admin
+            # Plugin loading so it makes no sense to keep going with the console initialization
+            self.critical('Could not setup storage module: %s', e)
+
+        # setup the database connection pool
+        pool_size = pool_timeout = None
+        try:
+            pool_size = self.config.getint('b3', 'database_pool_size')
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+
+        try:
+            pool_timeout = self.config.getfloat('b3', 'database_pool_timeout')
+        except NoOptionError:
+            pass
+        except ValueError, err:
+            self.warning(err)
+
+        self.storage.setupPool(size=pool_size, timeout=pool_timeout)
+
+        # setup the storage worker threads running the asynchronous writes
+        try:
+            storage_workers = self.config.getint('b3', 'storage_workers')
+        except NoOptionError:
+            storage_workers = 2
+        except ValueError, err:
+            storage_workers = 2
+            self.warning(err)
+
+        try:
+            storage_queue_size = self.config.getint('b3', 'storage_queue_size')
+        except NoOptionError:
+            storage_queue_size = 1000
+        except ValueError, err:
+            storage_queue_size = 1000
+            self.warning(err)
+
+        self.storage.setupExecutor(workers=storage_workers, queue_size=storage_queue_size)
+
+        # establish a connection with the database
+        self.storage.connect()
+
+        # index client names and aliases in memory to search them without scanning the database tables
+        try:
+            name_index = self.config.getboolean('b3', 'name_index')
+        except NoOptionError:
+            name_index = True
+        except ValueError, err:
+            name_index = True
+            self.warning(err)
+
+        if name_index:
+            self.storage.setupNameIndex()
+
     def getAbsolutePath(self, path, decode=False):
         """
         Return an absolute path name and expand the user prefix (~)
@@ -629,6 +770,11 @@ class Parser(object):
         Dump event statistics into the B3 log file.
         """
         self._eventsStats.dumpStats()
+        for name, stats in sorted(self.getEventWorkersStats().items()):
+            self.debug("%s event inbox : depth(%s), max depth(%s), received(%s), handled(%s), dropped(%s), "
+                       "expired(%s)", name, stats['depth'], stats['max_depth'], stats['received'], stats['handled'],
+                       stats['dropped'], stats['expired'])
+        self.cron.dumpStats()
 
     def start(self):
         """
@@ -718,7 +864,10 @@ class Parser(object):
         """
         self._paused = False
         self._pauseNotice = False
-        self.input.seek(0, os.SEEK_END)
+        if self._logTailer:
+            self._logTailer.seekEnd()
+        else:
+            self.input.seek(0, os.SEEK_END)
 
     def loadEvents(self):
         """
@@ -1073,7 +1222,7 @@ class Parser(object):
             self.info('Loading plugin from specified path: %s', path)
             fp, pathname, description = imp.find_module(name, [path])
             try:
-                return imp.load_module(name, fp, pathname, description)
+                return self.loadModule(name, fp, pathname, description)
             finally:
                 if fp:
                     fp.close()
@@ -1082,16 +1231,25 @@ class Parser(object):
 
         try:
             fp, pathname, description = imp.find_module(name, [os.path.join(b3.getB3Path(True), 'plugins')])
-            return imp.load_module(name, fp, pathname, description)
+            return self.loadModule(name, fp, pathname, description)
         except ImportError, m:
             self.verbose('%s is not a built-in plugin (%s)' % (name.title(), m))
             self.verbose('Trying external plugin directory : %s', self.config.get_external_plugins_dir())
             fp, pathname, description = imp.find_module(name, [self.config.get_external_plugins_dir()])
-            return imp.load_module(name, fp, pathname, description)
+            return self.loadModule(name, fp, pathname, description)
         finally:
             if fp:
                 fp.close()
 
+    def loadModule(self, name, fp, pathname, description):
+        """
+        Load a plugin module found by imp.find_module.
+        Hosted servers share the plugin modules: each of them is loaded only once by the host.
+        """
+        if self.host:
+            return self.host.loadModule(name, fp, pathname, description)
+        return imp.load_module(name, fp, pathname, description)
+
     def startPlugins(self):
         """
         Start all loaded plugins.
@@ -1181,7 +1339,7 @@ class Parser(object):
                 if obj not in variables:
                     variables[obj] = obj
             else:
-                for attr in vars(obj):
+                for attr in getAttributes(obj):
                     pattern = re.compile('[\W_]+')
                     cleanattr = pattern.sub('', attr)  # trim any underscore or any non alphanumeric character
                     variables[cleanattr] = getattr(obj, attr)
@@ -1196,7 +1354,7 @@ class Parser(object):
             #elif type(obj).__name__ == 'instance':
                 #self.debug('Classname of object %s: %s' % (key, obj.__class__.__name__))
             else:
-                for attr in vars(obj):
+                for attr in getAttributes(obj):
                     pattern = re.compile('[\W_]+')
                     cleanattr = pattern.sub('', attr)  # trim any underscore or any non alphanumeric character
                     currkey = ''.join([key, cleanattr])
@@ -1339,15 +1497,24 @@ class Parser(object):
                                 raise
                             except Exception, msg:
                                 self.error('Could not parse line %s: %s', msg, extract_tb(sys.exc_info()[2]))
-                            
-                            time.sleep(self.delay2)
 
-            time.sleep(self.delay)
+                            if self._eventBatchSize == 1:
+                                # batched dispatching is meant to keep up with the game log: do not throttle it
+                                time.sleep(self.delay2)
+
+            if self._logTailer and not self._paused:
+                # wake up as soon as the game server writes to its log
+                self._logTailer.wait(self.delay)
+            else:
+                time.sleep(self.delay)
 
         self.bot('Stop reading')
 
         with self.exiting:
-            self.input.close()
+            if self._logTailer:
+                self._logTailer.close()
+            else:
+                self.input.close()
             self.output.close()
 
             if self.exitcode:
@@ -1389,8 +1556,8 @@ class Parser(object):
         elif event.type in self._handlers:  # queue only if there are handlers to listen for this event
             self.verbose('Queueing event %s : %s', self.getEventName(event.type), event.data)
             try:
-                time.sleep(0.001)  # wait a bit so event doesnt get jumbled
-                self.queue.put((self.time(), self.time() + expire, event), True, 2)
+                # the queueing time is kept with sub-second precision for the queue wait statistics
+                self.queue.put((time.time(), self.time() + expire, event), True, 2)
                 return True
             except Queue.Full:
                 self.error('**** Event queue was full (%s)', self.queue.qsize())
@@ -1401,48 +1568,117 @@ class Parser(object):
     def handleEvents(self):
         """
         Event handler thread.
+        When event_batch_size is greater than 1 the queue is drained in batches: events are still dispatched
+        one at a time and in the same order they have been queued.
         """
         while self.working:
-            added, expire, event = self.queue.get(True)
-            if event.type == self.getEventID('EVT_EXIT') or event.type == self.getEventID('EVT_STOP'):
-                self.working = False
+            batch = [self.queue.get(True)]
+            while len(batch) < self._eventBatchSize:
+                try:
+                    batch.append(self.queue.get_nowait())
+                except Queue.Empty:
+                    break
+
+            for added, expire, event in batch:
+                self._dispatchEvent(added, expire, event)
+                if not self.working:
+                    break
 
-            event_name = self.getEventName(event.type)
-            self._eventsStats.add_event_wait((self.time() - added)*1000)
-            if self.time() >= expire:  # events can only sit in the queue until expire time
-                self.error('**** Event sat in queue too long: %s %s', event_name, self.time() - expire)
-            else:
-                nomore = False
-                for hfunc in self._handlers[event.type]:
-                    if not hfunc.isEnabled():
-                        continue
-                    elif nomore:
-                        break
-
-                    self.verbose('Parsing event: %s: %s', event_name, hfunc.__class__.__name__)
-                    timer_plugin_begin = time.clock()
-                    try:
-                        hfunc.parseEvent(event)
-                        time.sleep(0.001)
-                    except b3.events.VetoEvent:
-                        # plugin called for event hault, do not continue processing
-                        self.bot('Event %s vetoed by %s', event_name, str(hfunc))
-                        nomore = True
-                    except SystemExit, e:
-                        self.exitcode = e.code
-                    except Exception, msg:
-                        self.error('Handler %s could not handle event %s: %s: %s %s', hfunc.__class__.__name__,
-                                   event_name, msg.__class__.__name__, msg, extract_tb(sys.exc_info()[2]))
-                    finally:
-                        elapsed = time.clock() - timer_plugin_begin
-                        self._eventsStats.add_event_handled(hfunc.__class__.__name__, event_name, elapsed * 1000)
-                    
         self.bot('Shutting down event handler')
 
         # releasing lock if it was set by self.shutdown() for instance
         if self.exiting.locked():
             self.exiting.release()
 
+    def _dispatchEvent(self, added, expire, event):
+        """
+        Dispatch a queued event to the registered handlers.
+        :param added: The time the event was queued at
+        :param expire: The time after which the event must be discarded
+        :param event: The event to dispatch
+        """
+        if event.type == self.getEventID('EVT_EXIT') or event.type == self.getEventID('EVT_STOP'):
+            self.working = False
+
+        event_name = self.getEventName(event.type)
+        self._eventsStats.add_event_wait((time.time() - added) * 1000)
+        now = self.time()
+        if now >= expire:  # events can only sit in the queue until expire time
+            self.error('**** Event sat in queue too long: %s %s', event_name, now - expire)
+            return
+
+        for hfunc in self._handlers[event.type]:
+            if not hfunc.isEnabled():
+                continue
+
+            worker = self.getEventWorker(hfunc)
+            if worker:
+                worker.put(added, expire, event)
+            elif self.runEventHandler(hfunc, event, event_name):
+                # plugin called for event hault, do not continue processing
+                self.bot('Event %s vetoed by %s', event_name, str(hfunc))
+                break
+
+    def runEventHandler(self, hfunc, event, event_name):
+        """
+        Hand an event over to an event handler.
+        :param hfunc: The event handler
+        :param event: The event to handle
+        :param event_name: The event name
+        :return: True if the event handler vetoed the event
+        """
+        self.verbose('Parsing event: %s: %s', event_name, hfunc.__class__.__name__)
+        timer_plugin_begin = time.clock()
+        try:
+            hfunc.parseEvent(event)
+        except b3.events.VetoEvent:
+            return True
+        except SystemExit, e:
+            self.exitcode = e.code
+        except Exception, msg:
+            self.error('Handler %s could not handle event %s: %s: %s %s', hfunc.__class__.__name__,
+                       event_name, msg.__class__.__name__, msg, extract_tb(sys.exc_info()[2]))
+        finally:
+            elapsed = time.clock() - timer_plugin_begin
+            self._eventsStats.add_event_handled(hfunc.__class__.__name__, event_name, elapsed * 1000)
+        return False
+
+    def getEventWorker(self, hfunc):
+        """
+        Return the worker handing events over to the given event handler from its own thread.
+        Return None if the event handler must be called from the event handler thread: this is always the case
+        when event_dispatch is 'serial' and for plugins which may veto events.
+        :param hfunc: The event handler
+        """
+        if self._eventDispatch == 'serial':
+            return None
+        worker = self._eventWorkers.get(hfunc)
+        if worker is None and hfunc not in self._eventWorkers:
+            if getattr(hfunc, 'vetoesEvents', False) or \
+                    (self._eventDispatch == 'threadsafe' and not getattr(hfunc, 'threadSafe', False)):
+                self._eventWorkers[hfunc] = None
+            else:
+                self.debug('Starting event worker for %s', hfunc.__class__.__name__)
+                worker = self._eventWorkers[hfunc] = b3.events.EventWorker(self, hfunc, self._eventInboxSize)
+                worker.start()
+        return worker
+
+    def getEventWorkersStats(self):
+        """
+        Return the event workers counters (K=>event handler name, V=>dict of counters).
+        """
+        return dict((worker.name, worker.stats()) for worker in (self._eventWorkers or {}).values() if worker)
+
+    def stopEventWorkers(self, timeout=5):
+        """
+        Stop the event workers once they handled the events waiting in their inbox.
+        :param timeout: The maximum amount of seconds to wait for each worker
+        """
+        workers, self._eventWorkers = self._eventWorkers or {}, {}
+        for worker in workers.values():
+            if worker:
+                worker.stop(timeout)
+
     def write(self, msg, maxRetries=None, socketTimeout=None):
         """
         Write a message to Rcon/Console
@@ -1484,6 +1720,12 @@ class Parser(object):
             self.critical("Cannot read game log file: check that you have a correct "
                           "value for the 'game_log' setting in your main config file")
 
+        if self._logTailer:
+            lines = self._logTailer.read()
+            # the log file gets reopened when rotated
+            self.input = getattr(self._logTailer, 'file', self._logTailer)
+            return lines
+
         # Getting the stats of the game log (we are looking for the size)
         filestats = os.fstat(self.input.fileno())
         # Compare the current cursor position against the current file size,
@@ -1497,6 +1739,55 @@ class Parser(object):
         # NOTE: __read is defined at runtime in __new__
         return self.__read(self.input)
 
+    def setupLogStream(self):
+        """
+        Receive the remote game log data straight from the remote log plugin (ftpytail, sftpytail, httpytail)
+        through an in-memory buffer instead of a local copy of the game log.
+        """
+        try:
+            max_size = self.config.getint('server', 'remote_log_buffer')
+        except NoOptionError:
+            max_size = 1048576
+        except ValueError, err:
+            max_size = 1048576
+            self.warning(err)
+
+        self._logTailer = b3.logtailer.StreamTailer(max_size=max_size, console=self)
+        self.input = self._logTailer
+        self.bot('Streaming remote game log (buffer size: %s bytes)', max_size)
+        self.screen.write('Using gamelog    : in-memory stream\n')
+
+    def getLogStream(self):
+        """
+        Return the StreamTailer the remote log plugins have to feed.
+        :return: The StreamTailer or None if the remote game log data is to be written into a local file
+        """
+        if isinstance(self._logTailer, b3.logtailer.StreamTailer):
+            return self._logTailer
+        return None
+
+    def setupLogTailer(self, path):
+        """
+        Follow the game log file with a LogTailer, waking up on file change notifications when available.
+        :param path: The path of the game log file (already open as self.input)
+        """
+        try:
+            method = self.config.get('server', 'game_log_watch').lower()
+        except NoOptionError:
+            method = 'auto'
+
+        if method not in ('auto', 'polling', 'legacy'):
+            self.warning('Invalid value for game_log_watch (%s): using auto', method)
+            method = 'auto'
+
+        if method == 'legacy':
+            self.bot('Reading game log with the legacy polling loop')
+            return
+
+        watcher = b3.logtailer.getWatcher(path, method)
+        self._logTailer = b3.logtailer.LogTailer(path, self.input, watcher=watcher, console=self)
+        self.bot('Following game log using %s', watcher.name)
+
     def shutdown(self):
         """
         Shutdown B3.
@@ -1505,12 +1796,20 @@ class Parser(object):
             if self.working and self.exiting.acquire():
                 self.bot('Shutting down...')
                 self.working = False
+                if self._eventWorkers:
+                    self.bot('Stopping plugin event workers')
+                    self.stopEventWorkers()
                 for k, plugin in self._plugins.items():
                     plugin.parseEvent(b3.events.Event(self.getEventID('EVT_STOP'), ''))
                 if self._cron:
                     self.bot('Stopping cron')
                     self._cron.stop()
+                if self._timers:
+                    self.bot('Stopping timers')
+                    self._timers.stop()
                 if self.storage:
+                    self.bot('Writing pending database changes')
+                    self.storage.stopExecutor()
                     self.bot('Shutting down database connection')
                     self.storage.shutdown()
         except Exception, e:
@@ -1563,7 +1862,7 @@ class Parser(object):
                     wrapped_text.extend( self.wrapper.wrap(line) )
         # Apply only wrap
         else:
-            wrapped_text = self.wrapper.wrap(line)
+            wrapped_text = self.wrapper.wrap(text)
 
         if self._use_color_codes:
             lines = []
@@ -1666,12 +1965,30 @@ class Parser(object):
         Instantiate the main Cron object.
         """
         if not self._cron:
-            self._cron = b3.cron.Cron(self)
-            self._cron.start()
+            if self.host:
+                # hosted servers add their crontabs to the cron of the host
+                self._cron = self.host.getCron(self)
+            else:
+                self._cron = b3.cron.Cron(self, workers=self._cronWorkers)
+                self._cron.start()
         return self._cron
 
     cron = property(_get_cron)
 
+    def _get_timers(self):
+        """
+        Instantiate the TimerWheel object used to run delayed functions.
+        """
+        if not self._timers:
+            if self.host:
+                # hosted servers schedule their timers on the timer wheel of the host
+                self._timers = self.host.getTimers(self)
+            else:
+                self._timers = b3.timer.TimerWheel(self)
+        return self._timers
+
+    timers = property(_get_timers)
+
     def stripColors(self, text):
         """
         Remove color codes from the given text.
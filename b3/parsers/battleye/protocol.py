@@ -35,20 +35,21 @@
 # 1.2.1 - Fenix          - removed deprecated usage of dict.has_key (us 'in dict' instead)
 
 import binascii
+import errno
 import logging
-import Queue
 import select
 import socket
+import struct
 import sys
 import time
 
 from collections import deque
-from threading import Thread
+from threading import Condition
 from threading import Event
-from threading import Lock
+from threading import Thread
 
 __author__ = '82ndab-Bravo17, Courgette'
-__version__ = '1.2.1'
+__version__ = '1.3'
 
 ########################################################################################################################
 ##
@@ -85,12 +86,26 @@ __version__ = '1.2.1'
 ##
 ##   and you will be prompted for the BattlEye server ip, port and password.
 ##
+##   A single thread owns the UDP socket: it waits for incoming packets (or for the next command to resend or to
+##   expire), acknowledges server messages and hands command responses over to the threads waiting for them.
+##   Commands are sent right away by the calling thread under a free sequence number, so several threads can have
+##   commands waiting for their response at the same time.
+##
 ########################################################################################################################
 
 
 # tuple of BattlEye command for which we should not expect any response
 COMMANDS_WITH_NO_RESPONSE = ('say', )
 
+# BattlEye packet types
+PACKET_LOGIN = 0
+PACKET_COMMAND = 1
+PACKET_MESSAGE = 2
+PACKET_INVALID = 255
+
+# errors raised when reading a non blocking socket having no more data
+WOULD_BLOCK = (errno.EAGAIN, errno.EWOULDBLOCK)
+
 
 class BattleyeError(Exception):
     pass
@@ -112,8 +127,56 @@ class CommandFailedError(CommandError):
     pass
 
 
+class BattleyeCommand(object):
+    """
+    A command sent to the BattlEye server, waiting for its response.
+    """
+    def __init__(self, cmd, seq, packet, timeout, retry):
+        """
+        Object constructor.
+        :param cmd: The command sent
+        :param seq: The sequence number of the command packet
+        :param packet: The encoded command packet
+        :param timeout: The amount of seconds to wait for the response
+        :param retry: The amount of seconds after which the command packet is sent again
+        """
+        self.cmd = cmd
+        self.seq = seq
+        self.packet = packet
+        self.sent = time.time()
+        self.expires = self.sent + timeout
+        self.resend = self.sent + retry
+        self.parts = None  # multi packet response parts, by index
+        self.missing = 0  # amount of multi packet response parts not received yet
+        self.response = None
+        self._done = Event()
+
+    def done(self):
+        """
+        Return True if the response has been received (or is not expected anymore).
+        """
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the response and return it (None if it did not come).
+        :param timeout: The maximum amount of seconds to wait for
+        """
+        self._done.wait(timeout)
+        return self.response
+
+
 class BattleyeServer(Thread):
 
+    command_timeout = 3     # after how long should the thread waiting for the command response decides that no
+                            # response will ever come
+    command_retry = 1       # after how long should a command not replied to be sent again
+    keepalive = 30          # after how long without sending anything should an empty command be sent (the
+                            # BattlEye server drops clients not sending anything for 45 seconds)
+    login_timeout = 3       # after how long should we give up waiting for the login response
+    select_timeout = 1      # maximum amount of seconds spent waiting for packets (so that stop() is noticed)
+    max_errors = 10         # stop after that many consecutive CRC errors or commands not replied to
+
     def __init__(self, host, port, password):
         """
         Object constructor.
@@ -122,218 +185,231 @@ class BattleyeServer(Thread):
         :param password: The battleye server password
         """
         Thread.__init__(self, name="BattleyeServerThread")
-        #self.logger = logging.getLogger(__name__)
-        #hdlr = logging.FileHandler('G:/b3-182/arma/logs/battleye.log')
-        #formatter = logging.Formatter('%(asctime)s %(levelname)s %(message)s')
-        #hdlr.setFormatter(formatter)
-        #self.logger.addHandler(hdlr)
-        #self.logger.setLevel(logging.DEBUG)
+        self.setDaemon(True)
         self.host = host
         self.port = port
         self.password = password
 
-        self.command_queue = Queue.Queue([])    # put here commands to be sent
         self.observers = set()                  # functions to call when a BattleEye event is received
-        self.read_queue = Queue.Queue([])       # get here packets received
-        self.sent_data_seq = []
         self.server = None
-        self.write_queue = deque([])            # put here packets to be sent
 
-        self._command_lock = Lock()             # only one command than be managed at once
         self._isconnected = False               # whether we are connected or not
-        self._multi_packet_response = {}        # some responses comes in multiple parts which are hold in this dict
-        self._stopEvent = Event()               # can make the threads stop
-        self._command_reply_event = Event()     # thread event used to notify the thread waiting for a response
-
-
-        self.pending_command = None             # holds the current command we are waitting a response for
-        self.pending_command_response = None    # holds the current command full response once received
-        self.command_timeout = 3                # after how long should the thread waiting for the command response
-                                                # decides that no response will ever come
+        self._stopEvent = Event()               # can make the thread stop
+        self._loginEvent = Event()              # set once the login response has been received (or did not come)
+        self._pending = {}                      # commands waiting for their response, by sequence number
+        self._pending_cond = Condition()        # protects self._pending and notifies free sequence numbers
+        self._messages = deque(maxlen=128)      # sequence numbers of the latest server messages (to skip resent ones)
 
         self.write_seq = 0
         self.last_write_time = 0
         self.crc_error_count = 0
-        self.read_thread = None
-        self.write_thread = None
-
-        self.server_thread = Thread(target=self.polling_thread, name="BE_polling")
-        self.server_thread.setDaemon(True)
-        self.server_thread.start()
-        time.sleep(.5)
+        self.timeout_count = 0
 
         self.getLogger().info("start running BattleyeServer v%s" % __version__)
         self.start()
-        time.sleep(1)
-
-
-    def polling_thread(self):
-        """
-        Starts a thread for reading/writing to the Battleye server.
-        """
-        self.getLogger().info("connecting to BattlEye server at %s:%s" % (self.host, self.port))
-        self._isconnected = False
-        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        self.server.connect((self.host, self.port))
-        self.server.settimeout(0.0001)
-
-        while not self.isStopped():
-            #self.getLogger().debug("Is socket ready")
-            readable, writable, exception = select.select([self.server],[self.server],[self.server], .5)
-            
-            if not exception:
-                if readable:
-                    try:
-                        while True:
-                            data = self.server.recv(8192)
-                            self.read_queue.put(data)
-                            # self.getLogger().debug("Read data: %s" % repr(data))
-                    except socket.timeout:
-                        # We've read all the data that there is currently, so move on.
-                        pass
-                    except socket.error, err: 
-                        self.getLogger().error("socket error %s" % err)
-                        self.stop()
-                elif writable:
-                    if len(self.write_queue):
-                        data = self.write_queue.popleft()
-                        self.getLogger().debug("data to send: %s" % repr(data))
-                        try:
-                            self.server.send(data)
-                        except Exception, err:
-                            self.getLogger().error("data send error, trying again: %s" % err, exc_info=err)
-                            self.write_queue.appendleft(data)
-                        else:
-                            #store seq_no, type, data
-                            if data[7:8] == chr(1):
-                                seq = ord(data[8:9])
-                                self.getLogger().debug("sent sequence was %s" % seq)
-                                self.sent_data_seq.append(seq)
-                    readable, writable, exception = select.select([self.server],[],[], .05)
-            else:
-                self.stop()
+        self._loginEvent.wait(self.login_timeout + 1)
 
-        self.getLogger().debug("ending polling thread")
+    @property
+    def connected(self):
+        return self._isconnected
 
     def run(self):
         """
-        Threaded code.
+        Threaded code: connect, login and then handle the BattlEye server packets till the connection is stopped.
         """
-        self.crc_error_count = 0
-        self._isconnected = self.login()
-        if self._isconnected:
-            self.read_thread = Thread(target=self.reading_thread, name="BE_read")
-            self.read_thread.setDaemon(True)
-            self.read_thread.start()
-
-            self.write_thread = Thread(target=self.writing_thread, name="BE_write")
-            self.write_thread.setDaemon(True)
-            self.write_thread.start()
-
-        while self._isconnected and not self.isStopped():
-            if self.crc_error_count > 10 or len(self.sent_data_seq) > 10:
-                self.getLogger().debug('CRC errors %s: commands not replied to %s' % (self.crc_error_count, self.sent_data_seq))
-                # 10 + consecutive crc errors or 10 commands not replied to
-                self.stop()
-            time.sleep(10)
-
-        self.getLogger().debug("ending server thread")
+        try:
+            self._isconnected = self.login()
+        except socket.error, err:
+            self.getLogger().error("could not connect to BattlEye server: %s" % err)
+        finally:
+            self._loginEvent.set()
 
-    def reading_thread(self):
-        self.getLogger().info("starting reading thread")
         while self._isconnected and not self.isStopped():
             try:
-                packet = self.read_queue.get(timeout=2)
-                tp, sequence, data = self.decode_server_packet(packet)
-                if tp == 2:
-                    # Acknowledge server message receipt
-                    packet = self.encode_packet(2, sequence, None)
-                    self.getLogger().debug("server message sequence was %s" % sequence)
-                    self.write_queue.append(packet)
-                    self._on_event(data.decode('UTF-8', 'replace'))
-                elif tp == 1:
-                    #self.getLogger().debug('Command Response : %s' % repr(data))
-                    try:
-                        self.sent_data_seq.remove(sequence)
-                    except ValueError:
-                        pass
-                    self.crc_error_count = 0
-                    if data[0:1] == chr(0):
-                        data = self._handle_multipacket_part(ord(data[1]), ord(data[2]), data[3:])
-                    if data:
-                        self._on_command_response(data.decode('UTF-8', 'replace'))
-                elif tp == 255:
-                    #CRC Error
-                    self.crc_error_count += 1
-            except Queue.Empty:
-                pass
-            except Exception, err:
-                self.getLogger().error("error in reading_thread", exc_info=err)
-                
-        self.getLogger().info("ending reading thread")
-
-
-    def writing_thread(self):
-        self.getLogger().info("starting writing thread")
-        self.write_seq = 0
-        self.last_write_time = time.time()
-
-        def enqueue_packet(data):
-            self.write_queue.append(self.encode_packet(1, self.write_seq, data))
-            self.last_write_time = time.time()
-            self.write_seq += 1
-            if self.write_seq > 255:
-                self.write_seq -= 256
-
-        while self._isconnected and not self.isStopped():
+                readable, writable, exception = select.select([self.server], [], [self.server], self._next_timeout())
+            except (select.error, socket.error, ValueError), err:
+                # the socket got closed by stop()
+                if not self.isStopped():
+                    self.getLogger().error("socket error %s" % err)
+                break
+            if exception:
+                break
             try:
-                enqueue_packet(self.command_queue.get(timeout=2))
-            except Queue.Empty:
-                if self.last_write_time + 30 < time.time():
-                    enqueue_packet(None) # keep connection alive
+                if readable:
+                    self._read_packets()
+                self._check_commands()
             except Exception, err:
-                self.getLogger().error("error in writing_thread", exc_info=err)
+                self.getLogger().error("error in server thread", exc_info=err)
+                break
 
-        self.getLogger().info("ending writing thread")
+        self.stop()
+        self.getLogger().debug("ending server thread")
 
     def login(self):
         """
         Authenticate on the Battleye server with given password.
         """
+        self.getLogger().info("connecting to BattlEye server at %s:%s" % (self.host, self.port))
+        self.server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.server.connect((self.host, self.port))
+        self.server.setblocking(0)
+
         self.getLogger().info("starting login")
-        request =  self.encode_packet(0, None, self.password)
-        self.write_queue.append(request)
-        login_response = False
-        t = time.time()
-        logged_in = None
-        while time.time() < t+3 and not login_response:
+        self._send(self.encode_packet(PACKET_LOGIN, None, self.password))
+        deadline = time.time() + self.login_timeout
+        while not self.isStopped():
+            timeout = deadline - time.time()
+            if timeout <= 0 or not select.select([self.server], [], [], timeout)[0]:
+                break
             try:
-                packet = self.read_queue.get(timeout = 0.1)
-                tp, logged_in, data =  self.decode_server_packet(packet)
-                self.getLogger().debug("login response was %s %s %s" % (tp, logged_in, data))
-                if tp == chr(255):
-                    self.getLogger().warning('invalid packet')
-                elif tp == 0:
-                    login_response = True
-            except Queue.Empty:
-                pass
-
-        if login_response:
-            if logged_in == 1:
-                self.getLogger().info("login successful")
-                return True
-        else:
-            self.getLogger().warning("login failed")
-            return False
+                packet = self.server.recv(8192)
+            except socket.error, err:
+                if err.args[0] in WOULD_BLOCK:
+                    continue
+                raise
+            tp, logged_in, data = self.decode_server_packet(packet)
+            self.getLogger().debug("login response was %s %s %s" % (tp, logged_in, repr(data)))
+            if tp == PACKET_INVALID:
+                self.getLogger().warning('invalid packet')
+            elif tp == PACKET_LOGIN:
+                if logged_in == 1:
+                    self.getLogger().info("login successful")
+                    self.last_write_time = time.time()
+                    return True
+                break
+
+        self.getLogger().warning("login failed")
+        return False
 
     def _disconnect(self):
         self.getLogger().info("disconnecting")
-        if self._isconnected:
+        self._isconnected = False
+        if self.server:
             try:
                 self.server.close()
             except:
                 pass
-            self._isconnected = False
+
+    def _send(self, packet):
+        """
+        Send a packet to the BattlEye server.
+        """
+        self.server.send(packet)
+
+    def _read_packets(self):
+        """
+        Handle all the packets waiting to be read on the socket.
+        """
+        while True:
+            try:
+                packet = self.server.recv(8192)
+            except socket.error, err:
+                if err.args[0] not in WOULD_BLOCK:
+                    self.getLogger().error("socket error %s" % err)
+                    self.stop()
+                return
+            try:
+                self._handle_packet(packet)
+            except Exception, err:
+                self.getLogger().error("error handling packet %s" % repr(packet), exc_info=err)
+
+    def _handle_packet(self, packet):
+        """
+        Handle a packet received from the BattlEye server.
+        """
+        tp, sequence, data = self.decode_server_packet(packet)
+        if tp == PACKET_MESSAGE:
+            # acknowledge server message receipt (every time: the acknowledgement may be what got lost)
+            self._send(self.encode_packet(PACKET_MESSAGE, sequence, None))
+            if sequence in self._messages:
+                self.getLogger().debug("server message sequence %s received again" % sequence)
+                return
+            self._messages.append(sequence)
+            self._on_event(data.decode('UTF-8', 'replace'))
+        elif tp == PACKET_COMMAND:
+            self.crc_error_count = 0
+            self._on_command_packet(sequence, data)
+        elif tp == PACKET_INVALID:
+            self.crc_error_count += 1
+            if self.crc_error_count > self.max_errors:
+                self.getLogger().debug('CRC errors %s' % self.crc_error_count)
+                self.stop()
+
+    def _on_command_packet(self, sequence, data):
+        """
+        A command response packet (type 1) was received: complete the command once the full response is there.
+        """
+        with self._pending_cond:
+            command = self._pending.get(sequence)
+            if command is None:
+                self.getLogger().debug("discarding response to sequence %s: no command is waiting for it" % sequence)
+                return
+            if data[0:1] == '\x00' and len(data) >= 3:
+                # part of a multi packet response: 0x00 | number of packets | index of this packet | data
+                total, index = ord(data[1]), ord(data[2])
+                if command.parts is None or len(command.parts) != total:
+                    command.parts = [None] * total
+                    command.missing = total
+                if index >= total:
+                    return
+                if command.parts[index] is None:
+                    command.missing -= 1
+                command.parts[index] = data[3:]
+                if command.missing:
+                    return
+                data = ''.join(command.parts)
+            self._complete(command, data.decode('UTF-8', 'replace'))
+            self.timeout_count = 0
+
+    def _complete(self, command, response):
+        """
+        Store a command response and wake up the thread waiting for it (the caller must hold self._pending_cond).
+        """
+        if self._pending.get(command.seq) is command:
+            del self._pending[command.seq]
+            self._pending_cond.notify()
+        command.response = response
+        command._done.set()
+
+    def _next_timeout(self):
+        """
+        Return the amount of seconds to wait for a packet before a command has to be sent again or to expire.
+        """
+        deadlines = [self.last_write_time + self.keepalive]
+        with self._pending_cond:
+            for command in self._pending.itervalues():
+                deadlines.append(min(command.resend, command.expires))
+        return min(self.select_timeout, max(0, min(deadlines) - time.time()))
+
+    def _check_commands(self):
+        """
+        Send again the commands not replied to, give up on the expired ones and keep the connection alive.
+        """
+        now = time.time()
+        resend = []
+        with self._pending_cond:
+            for command in self._pending.values():
+                if command.expires <= now:
+                    self._expire(command)
+                elif command.resend <= now:
+                    command.resend = now + self.command_retry
+                    resend.append(command)
+        for command in resend:
+            self.getLogger().debug("sending again command %s: %s" % (command.seq, command.cmd))
+            self._send(command.packet)
+        if self.timeout_count > self.max_errors:
+            self.getLogger().debug('commands not replied to: %s' % self.timeout_count)
+            self.stop()
+        elif self.last_write_time + self.keepalive <= now:
+            self._send_command('', self.command_timeout)  # keep connection alive
+
+    def _expire(self, command):
+        """
+        Give up waiting for a command response (the caller must hold self._pending_cond).
+        """
+        if self._pending.get(command.seq) is command:
+            self.timeout_count += 1
+            self._complete(command, None)
 
     def command(self, cmd, timeout=None):
         if not cmd:
@@ -343,13 +419,14 @@ class BattleyeServer(Thread):
         if self.isStopped():
             raise BattleyeError("BattlEye server stopped")
 
-        self._command_lock.acquire() # this will eventually wait for the lock to be released
+        wait = timeout or not any(filter(lambda x: cmd.startswith(x + ' '), COMMANDS_WITH_NO_RESPONSE))
+        if timeout is None:
+            timeout = self.command_timeout
 
         try:
-            if timeout or not any(filter(lambda x: cmd.startswith(x + ' '), COMMANDS_WITH_NO_RESPONSE)):
-                return self._command_and_wait(cmd, timeout)
-            else:
-                return self._command_no_wait(cmd)
+            command = self._send_command(cmd, timeout)
+            if wait:
+                return self._wait_for_response(command, timeout)
         except CommandTimeoutError:
             raise
         except BattleyeError:
@@ -357,147 +434,92 @@ class BattleyeServer(Thread):
         except Exception, err:
             tp, value, traceback = sys.exc_info()
             raise CommandFailedError, ("command \"%s\" failed: %s" % (cmd, err), tp, value), traceback
-        finally:
-            self._command_lock.release() # release the lock so another command can be sent
 
-    def _command_no_wait(self, cmd):
+    def _send_command(self, cmd, timeout):
         """
-        Send a command and do not expect any response.
+        Send a command under the next free sequence number, without waiting for the response.
+        Blocks while 256 commands are already waiting for their response.
+        :return: A BattleyeCommand
         """
-        self.command_queue.put(cmd)
-
-    def _command_and_wait(self, cmd, timeout=None):
+        deadline = time.time() + timeout
+        with self._pending_cond:
+            while len(self._pending) > 255:
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    raise CommandTimeoutError("no free sequence number for command : %s" % cmd)
+                self._pending_cond.wait(remaining)
+            while self.write_seq in self._pending:
+                self.write_seq = (self.write_seq + 1) % 256
+            seq = self.write_seq
+            self.write_seq = (self.write_seq + 1) % 256
+            command = BattleyeCommand(cmd, seq, self.encode_packet(PACKET_COMMAND, seq, cmd), timeout,
+                                      self.command_retry)
+            self._pending[seq] = command
+            self.last_write_time = command.sent
+
+        self.getLogger().debug("sending command %s: %s" % (seq, cmd))
+        self._send(command.packet)
+        return command
+
+    def _wait_for_response(self, command, timeout):
         """
-        Send command to the BattlEye server in a synchronous way.
-        Calling this method will block until we receive the command response from the server or until we reach the timeout.
+        Block until the command response has been received or until timeout is reached.
         """
-        self.pending_command = cmd
-        self.pending_command_response = None
-        self._command_no_wait(cmd)
-        response = self._wait_for_response(timeout)
+        self.getLogger().debug("waiting response for command: %s " % command.cmd)
+        response = command.wait(timeout)
+        if response is None:
+            with self._pending_cond:
+                self._expire(command)
+            # then we stopped waiting because the timeout is reached
+            raise CommandTimeoutError("no response for command : %s" % command.cmd)
         if response == "Unknown command":
-            raise CommandFailedError("unknown command: %s" % cmd)
+            raise CommandFailedError("unknown command: %s" % command.cmd)
+        # we have our response \o/
         return response
 
-    def _wait_for_response(self, timeout):
+    def compute_crc(self, data):
         """
-        Block until response to for the current command has been received or until timeout is reached.
+        Return the CRC32 checksum of the given data, packed the BattlEye way (4 bytes, little endian).
         """
-        if self.isStopped():
-            return
-
-        if timeout is None:
-            timeout = self.command_timeout
-
-        self.getLogger().debug("waiting response for command: %s " % self.pending_command)
-        self._command_reply_event.clear()
-        self._command_reply_event.wait(timeout)
-
-        cmd = self.pending_command
-        self.pending_command = None
-
-        response = self.pending_command_response
-        self.pending_command_response = None
-
-        if not response:
-            # then we stopped waitting because the timeout is reached
-            raise CommandTimeoutError("no response for command : %s" % cmd)
-        else:
-            # we have our response \o/
-            return response
-
-    def compute_crc(self, data):
-        buf = buffer(data)
-        crc = binascii.crc32(buf) & 0xffffffff
-        crc32 = '0x%08x' % crc
-        # self.getLogger().debug("crc32 = %s" % crc)
-        return int(crc32[8:10], 16), int(crc32[6:8], 16), int(crc32[4:6], 16), int(crc32[2:4], 16)
+        return struct.pack('<I', binascii.crc32(data) & 0xffffffff)
 
     def decode_server_packet(self, packet):
-        if packet[0:2] != b'BE':
-            return 255, '', ''
-
-        packet_crc = packet[2:6]
-        #self.getLogger().debug("Packet crc: %s" % repr(packet_crc))
-        crc1, crc2, crc3, crc4 =  self.compute_crc(packet[6:])
-        computed_crc = chr(crc1) + chr(crc2) + chr(crc3) + chr(crc4)
-        # self.getLogger().debug("Computed crc: %s" % repr(computed_crc))
-        if packet_crc != computed_crc:
+        """
+        Decode a packet received from the BattlEye server.
+        :return: A tuple (packet type, sequence number, data), the type being 255 for invalid packets
+        """
+        if len(packet) < 9 or packet[0:2] != 'BE' or packet[6:7] != '\xff':
+            return PACKET_INVALID, '', ''
+        # checksum the payload in place instead of slicing a copy of it
+        if packet[2:6] != self.compute_crc(buffer(packet, 6)):
             self.getLogger().debug('invalid CRC')
-            return 255, '', ''
-
-        tp = ord(packet[7:8])
-        sequence_no = ord(packet[8:9])
-        data = packet[9:]
-        return tp, sequence_no, data
+            return PACKET_INVALID, '', ''
+        return ord(packet[7]), ord(packet[8]), packet[9:]
 
     def encode_packet(self, packet_type, seq, data):
-        data_to_send = bytearray()
-        #self.getLogger().debug('Encoded data is %s' % data)
-        #data_to_send = data_to_send + chr(255) + packet_type + bytearray(data, 'Latin-1', 'ignore')
-        data_to_send.append(255)
-        data_to_send.append(packet_type)
+        """
+        Encode a packet to be sent to the BattlEye server.
+        :param packet_type: The packet type (0: login, 1: command, 2: server message acknowledgement)
+        :param seq: The packet sequence number (None for login packets)
+        :param data: The packet data
+        """
+        payload = chr(255) + chr(packet_type)
         if seq is not None:
-            data_to_send.append(seq)
+            payload += chr(seq)
         if data:
-            data_to_send.extend(unicode(data).encode('UTF-8', 'replace'))
-        crc1, crc2, crc3, crc4 = self.compute_crc(data_to_send)
-        # request =  "B" + "E" + chr(crc1) + chr(crc2) + chr(crc3) + chr(crc4) + data_to_send
-        request = bytearray(b'BE')
-        request.append(crc1)
-        request.append(crc2)
-        request.append(crc3)
-        request.append(crc4)
-        request.extend(data_to_send)
-        #self.getLogger().debug("Request is type : %s" % type(request))
-        return request
-
-    def _handle_multipacket_part(self, total_num_packets, current_packet_index, data):
-        """
-        Command responses can be received over multiple packest.
-        """
-        self._multi_packet_response[current_packet_index] = data
-        if current_packet_index == total_num_packets - 1:
-            # we got all the packets that make a full command response
-            data = ''
-            for p in range(0, total_num_packets):
-                if p in self._multi_packet_response:
-                    data = data + self._multi_packet_response[p]
-                else:
-                    self.getLogger().debug('part #%s of multi packet response is missing' % p)
-                    for pp in range(0, total_num_packets-1):
-                        self._multi_packet_response[pp] = ''
-                    return 'Error retrieving Bans list from server'
-
-            # Packet reconstituted, so delete segments
-            for pp in range(0, total_num_packets-1):
-                del self._multi_packet_response[pp]
-
-            return data
-        else:
-            return
+            payload += unicode(data).encode('UTF-8', 'replace')
+        return 'BE' + self.compute_crc(payload) + payload
 
     def _on_event(self, message):
         """
         We received a full Server message packet (type 2 BattlEye packet).
         """
         self.getLogger().debug("received BattlEye event : %s" % message)
-        for func in self.observers:
-            func(message)
-
-    def _on_command_response(self, message):
-        """
-        We received a full Command response message (one or more type 1 BattlEye packets).
-        """
-        self.getLogger().debug("received BattlEye command response : %s" % message)
-        self.pending_command_response = message
-        self._command_reply_event.set() # notify the waitting thread that a response is ready
-
-    def __getattr__(self, name):
-        if name == 'connected':
-            return self._isconnected
-        else:
-            return self.name
+        for func in list(self.observers):
+            try:
+                func(message)
+            except Exception, err:
+                self.getLogger().error("error in BattlEye event listener %s" % func, exc_info=err)
 
     def getLogger(self):
         return logging.getLogger("BattleyeServer")
@@ -517,9 +539,13 @@ class BattleyeServer(Thread):
         self.observers.remove(func)
 
     def stop(self):
-        self.getLogger().debug("stopping threads...")
+        self.getLogger().debug("stopping thread...")
         self._stopEvent.set()
         self._disconnect()
+        with self._pending_cond:
+            # do not keep threads waiting for responses that will never come
+            for command in self._pending.values():
+                self._complete(command, None)
 
     def isStopped(self):
         return self._stopEvent.is_set()
@@ -45,7 +45,7 @@
 #                                 - do not raise FrostbiteConnection since it's not an exception class
 
 __author__  = 'Courgette'
-__version__ = '2.1'
+__version__ = '2.2'
 
 debug = True
 
@@ -108,7 +108,7 @@ class FrostbiteConnection(object):
         """
         try:
             self.console.debug('opening FrostbiteConnection socket')
-            self._receiveBuffer = ''
+            self._receiveBuffer = protocol.PacketBuffer()
             self._serverSocket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
             self._serverSocket.connect((self._host, self._port))
         except Exception, err:
@@ -147,7 +147,7 @@ class FrostbiteConnection(object):
 
         try:
             self._serverSocket.sendall(request)
-            [response, self._receiveBuffer] = protocol.receivePacket(self._serverSocket, self._receiveBuffer)
+            response = self._receiveBuffer.read_packet(self._serverSocket)
         except socket.error, detail:
             raise FrostbiteNetworkException(detail)
         
@@ -210,7 +210,7 @@ class FrostbiteConnection(object):
                     self._connect()
                     self._auth()
                     self.subscribeToEvents()
-                [tmppacket, self._receiveBuffer] = protocol.receivePacket(self._serverSocket, self._receiveBuffer)
+                tmppacket = self._receiveBuffer.read_packet(self._serverSocket)
                 [isFromServer, isResponse, sequence, words] = protocol.DecodePacket(tmppacket)
                 if isFromServer and not isResponse:
                     packet = tmppacket
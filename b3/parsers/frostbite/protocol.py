@@ -21,7 +21,7 @@
 # 2010/07/23 - xlr8or - 1.0.1 - fixed infinite loop in a python socket thread in receive_packet() on gameserver restart
 # 2014/08/05 - Fenix  - 1.1   - syntax cleanup
 
-__version__ = '1.1'
+__version__ = '1.2'
 
 import socket
 
@@ -34,6 +34,13 @@ except ImportError:
     from md5 import new as newmd5
 
 
+_int32 = Struct('<I')
+_header = Struct('<III')
+
+# size of the packet header: sequence, packet size and number of words
+HEADER_SIZE = 12
+
+
 def EncodeHeader(isFromServer, isResponse, sequence):
     header = sequence & 0x3fffffff
     if isFromServer:
@@ -54,30 +61,40 @@ def EncodeInt32(size):
 
 def DecodeInt32(data):
     return unpack('<I', data[0 : 4])[0]
-    
-    
+
+
 def EncodeWords(words):
+    parts = []
     size = 0
-    encodedWords = ''
     for word in words:
         strWord = str(word)
-        encodedWords += EncodeInt32(len(strWord))
-        encodedWords += strWord
-        encodedWords += '\x00'
+        parts.append(EncodeInt32(len(strWord)))
+        parts.append(strWord)
+        parts.append('\x00')
         size += len(strWord) + 5
-    
-    return size, encodedWords
+
+    return size, ''.join(parts)
 
 
-def DecodeWords(size, data):
-    numWords = DecodeInt32(data[0:])
+def DecodeWords(size, data, offset=0):
+    """
+    Decode the words of a packet, reading them in place.
+    :param size: The size of the encoded words
+    :param data: A string or bytearray holding the encoded words
+    :param offset: The offset of the first encoded word in data
+    """
+    if not isinstance(data, str):
+        # a single copy of the packet out of the receive buffer: the words are then sliced out of it
+        data = str(buffer(data, offset, size))
+        offset = 0
     words = []
-    offset = 0
-    while offset < size:
-        wordLen = DecodeInt32(data[offset : offset + 4])        
-        word = data[offset + 4 : offset + 4 + wordLen]
-        words.append(word)
-        offset += wordLen + 5
+    end = offset + size
+    unpack_from = _int32.unpack_from
+    while offset < end:
+        wordLen = unpack_from(data, offset)[0]
+        offset += 4
+        words.append(data[offset:offset + wordLen])
+        offset += wordLen + 1
 
     return words
 
@@ -101,10 +118,131 @@ def DecodePacket(data):
         sequence = sequence number
         words = list of words
     """
-    [isFromServer, isResponse, sequence] = DecodeHeader(data)
-    wordsSize = DecodeInt32(data[4:8]) - 12
-    words = DecodeWords(wordsSize, data[12:])
-    return [isFromServer, isResponse, sequence, words]
+    if not isinstance(data, Packet):
+        data = Packet(data)
+    return [data.isFromServer, data.isResponse, data.sequence, data.words]
+
+
+class Packet(object):
+    """
+    A Frostbite packet read in place out of a string or a receive buffer.
+    The header is decoded right away while the words are only decoded when first needed: a packet read out of a
+    PacketBuffer must have its words decoded before the buffer receives more data.
+    """
+    __slots__ = ('isFromServer', 'isResponse', 'sequence', 'size', '_data', '_offset', '_words')
+
+    def __init__(self, data, offset=0):
+        """
+        Object constructor.
+        :param data: A string or bytearray holding the packet
+        :param offset: The offset of the packet in data
+        """
+        header, self.size = _header.unpack_from(data, offset)[:2]
+        self.isFromServer = header & 0x80000000
+        self.isResponse = header & 0x40000000
+        self.sequence = header & 0x3fffffff
+        self._data = data
+        self._offset = offset
+        self._words = None
+
+    @property
+    def words(self):
+        if self._words is None:
+            self._words = DecodeWords(self.size - HEADER_SIZE, self._data, self._offset + HEADER_SIZE)
+            self._data = None
+        return self._words
+
+    def __repr__(self):
+        return repr([self.isFromServer, self.isResponse, self.sequence, self.words])
+
+
+class PacketBuffer(object):
+    """
+    Receive buffer cutting Frostbite packets out of the data received from the game server.
+    Data is received straight into a reusable bytearray and packets are decoded in place: consumed data is dropped
+    by moving the offset of the first unread byte, and the unread bytes are only moved back to the start of the
+    buffer when more room is needed.
+    """
+    def __init__(self, size=65536):
+        """
+        Object constructor.
+        :param size: The initial size of the buffer (it grows to fit bigger packets)
+        """
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0  # offset of the first unread byte
+        self._end = 0  # offset of the end of the received data
+
+    def __len__(self):
+        return self._end - self._start
+
+    def _reserve(self, size):
+        """
+        Make room for size more bytes at the end of the buffer.
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
+        if len(self._buf) - self._end >= size:
+            return
+        unread = self._end - self._start
+        if len(self._buf) - unread >= size:
+            self._buf[:unread] = self._view[self._start:self._end].tobytes()
+        else:
+            buf = bytearray(max(2 * len(self._buf), unread + size))
+            buf[:unread] = self._view[self._start:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        self._start = 0
+        self._end = unread
+
+    def feed(self, data):
+        """
+        Append data to the buffer.
+        """
+        self._reserve(len(data))
+        self._buf[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def recv_into(self, sock, size=16384):
+        """
+        Receive data from a socket straight into the buffer.
+        :return: The amount of bytes received (0 when the remote end closed the connection)
+        """
+        self._reserve(size)
+        received = sock.recv_into(self._view[self._end:self._end + size], size)
+        self._end += received
+        return received
+
+    def next_packet(self):
+        """
+        Return the next complete packet or None if more data is needed.
+        """
+        available = self._end - self._start
+        if available < 8:
+            return None
+        size = _int32.unpack_from(self._buf, self._start + 4)[0]
+        if size < HEADER_SIZE:
+            raise socket.error('invalid packet size: %s' % size)
+        if available < size:
+            if size > len(self._buf):
+                self._reserve(size - available)
+            return None
+        packet = Packet(self._buf, self._start)
+        self._start += size
+        return packet
+
+    def read_packet(self, sock):
+        """
+        Receive data from a socket till a full packet is available and return it.
+        """
+        packet = self.next_packet()
+        while packet is None:
+            if not self.recv_into(sock, 4096):
+                # make sure we raise a socket error when the socket is hanging
+                # on a loose end (receiving no data after server restart)
+                raise socket.error('no data received - Remote end unexpectedly closed socket')
+            packet = self.next_packet()
+        return packet
 
 clientSequenceNr = 0
 
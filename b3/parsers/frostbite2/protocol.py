@@ -22,7 +22,7 @@
 # 2014/01/02 - Courgette - 1.1   - fix FrostbiteServer not closing properly the asyncore connection when the server is unreachable
 # 2014/08/05 - Fenix     - 1.2   - syntax cleanup
 
-__version__ = '1.2'
+__version__ = '1.4'
 
 import logging
 import time
@@ -31,10 +31,18 @@ import socket
 import threading
 import hashlib
 
+from struct import Struct
 from struct import pack
 from struct import unpack
 
 
+_int32 = Struct('<I')
+_header = Struct('<III')
+
+# size of the packet header: sequence, packet size and number of words
+HEADER_SIZE = 12
+
+
 def EncodeHeader(isFromServer, isResponse, sequence):
     header = sequence & 0x3fffffff
     if isFromServer:
@@ -55,30 +63,40 @@ def EncodeInt32(size):
 
 def DecodeInt32(data):
     return unpack('<I', data[0 : 4])[0]
-    
-    
+
+
 def EncodeWords(words):
+    parts = []
     size = 0
-    encodedWords = ''
     for word in words:
         strWord = str(word)
-        encodedWords += EncodeInt32(len(strWord))
-        encodedWords += strWord
-        encodedWords += '\x00'
+        parts.append(EncodeInt32(len(strWord)))
+        parts.append(strWord)
+        parts.append('\x00')
         size += len(strWord) + 5
-    
-    return size, encodedWords
+
+    return size, ''.join(parts)
 
 
-def DecodeWords(size, data):
-    numWords = DecodeInt32(data[0:])
+def DecodeWords(size, data, offset=0):
+    """
+    Decode the words of a packet, reading them in place.
+    :param size: The size of the encoded words
+    :param data: A string or bytearray holding the encoded words
+    :param offset: The offset of the first encoded word in data
+    """
+    if not isinstance(data, str):
+        # a single copy of the packet out of the receive buffer: the words are then sliced out of it
+        data = str(buffer(data, offset, size))
+        offset = 0
     words = []
-    offset = 0
-    while offset < size:
-        wordLen = DecodeInt32(data[offset : offset + 4])        
-        word = data[offset + 4 : offset + 4 + wordLen]
-        words.append(word)
-        offset += wordLen + 5
+    end = offset + size
+    unpack_from = _int32.unpack_from
+    while offset < end:
+        wordLen = unpack_from(data, offset)[0]
+        offset += 4
+        words.append(data[offset:offset + wordLen])
+        offset += wordLen + 1
 
     return words
 
@@ -102,10 +120,131 @@ def DecodePacket(data):
         sequence = sequence number
         words = list of words
     """
-    [isFromServer, isResponse, sequence] = DecodeHeader(data)
-    wordsSize = DecodeInt32(data[4:8]) - 12
-    words = DecodeWords(wordsSize, data[12:])
-    return [isFromServer, isResponse, sequence, words]
+    if not isinstance(data, Packet):
+        data = Packet(data)
+    return [data.isFromServer, data.isResponse, data.sequence, data.words]
+
+
+class Packet(object):
+    """
+    A Frostbite packet read in place out of a string or a receive buffer.
+    The header is decoded right away while the words are only decoded when first needed: a packet read out of a
+    PacketBuffer must have its words decoded before the buffer receives more data.
+    """
+    __slots__ = ('isFromServer', 'isResponse', 'sequence', 'size', '_data', '_offset', '_words')
+
+    def __init__(self, data, offset=0):
+        """
+        Object constructor.
+        :param data: A string or bytearray holding the packet
+        :param offset: The offset of the packet in data
+        """
+        header, self.size = _header.unpack_from(data, offset)[:2]
+        self.isFromServer = header & 0x80000000
+        self.isResponse = header & 0x40000000
+        self.sequence = header & 0x3fffffff
+        self._data = data
+        self._offset = offset
+        self._words = None
+
+    @property
+    def words(self):
+        if self._words is None:
+            self._words = DecodeWords(self.size - HEADER_SIZE, self._data, self._offset + HEADER_SIZE)
+            self._data = None
+        return self._words
+
+    def __repr__(self):
+        return repr([self.isFromServer, self.isResponse, self.sequence, self.words])
+
+
+class PacketBuffer(object):
+    """
+    Receive buffer cutting Frostbite packets out of the data received from the game server.
+    Data is received straight into a reusable bytearray and packets are decoded in place: consumed data is dropped
+    by moving the offset of the first unread byte, and the unread bytes are only moved back to the start of the
+    buffer when more room is needed.
+    """
+    def __init__(self, size=65536):
+        """
+        Object constructor.
+        :param size: The initial size of the buffer (it grows to fit bigger packets)
+        """
+        self._buf = bytearray(size)
+        self._view = memoryview(self._buf)
+        self._start = 0  # offset of the first unread byte
+        self._end = 0  # offset of the end of the received data
+
+    def __len__(self):
+        return self._end - self._start
+
+    def _reserve(self, size):
+        """
+        Make room for size more bytes at the end of the buffer.
+        """
+        if self._start == self._end:
+            self._start = self._end = 0
+        if len(self._buf) - self._end >= size:
+            return
+        unread = self._end - self._start
+        if len(self._buf) - unread >= size:
+            self._buf[:unread] = self._view[self._start:self._end].tobytes()
+        else:
+            buf = bytearray(max(2 * len(self._buf), unread + size))
+            buf[:unread] = self._view[self._start:self._end]
+            self._buf = buf
+            self._view = memoryview(buf)
+        self._start = 0
+        self._end = unread
+
+    def feed(self, data):
+        """
+        Append data to the buffer.
+        """
+        self._reserve(len(data))
+        self._buf[self._end:self._end + len(data)] = data
+        self._end += len(data)
+
+    def recv_into(self, sock, size=16384):
+        """
+        Receive data from a socket straight into the buffer.
+        :return: The amount of bytes received (0 when the remote end closed the connection)
+        """
+        self._reserve(size)
+        received = sock.recv_into(self._view[self._end:self._end + size], size)
+        self._end += received
+        return received
+
+    def next_packet(self):
+        """
+        Return the next complete packet or None if more data is needed.
+        """
+        available = self._end - self._start
+        if available < 8:
+            return None
+        size = _int32.unpack_from(self._buf, self._start + 4)[0]
+        if size < HEADER_SIZE:
+            raise socket.error('invalid packet size: %s' % size)
+        if available < size:
+            if size > len(self._buf):
+                self._reserve(size - available)
+            return None
+        packet = Packet(self._buf, self._start)
+        self._start += size
+        return packet
+
+    def read_packet(self, sock):
+        """
+        Receive data from a socket till a full packet is available and return it.
+        """
+        packet = self.next_packet()
+        while packet is None:
+            if not self.recv_into(sock, 4096):
+                # make sure we raise a socket error when the socket is hanging
+                # on a loose end (receiving no data after server restart)
+                raise socket.error('no data received - Remote end unexpectedly closed socket')
+            packet = self.next_packet()
+        return packet
 
 
 clientSequenceNr = 0
@@ -223,8 +362,13 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         :param host: The Frostbite2 server host
         :param port: The Frostbite2 server port
         """
-        asyncore.dispatcher_with_send.__init__(self)
-        self._buffer_in = ''
+        # each connection gets its own socket map so that it can be looped over on its own
+        self.socket_map = {}
+        asyncore.dispatcher_with_send.__init__(self, map=self.socket_map)
+        self._buffer_in = PacketBuffer()
+        self._sequence = 0
+        self._send_lock = threading.RLock()
+        self.connected_event = threading.Event()
         self.getLogger().info("connecting")
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         asyncore.dispatcher_with_send.connect(self, (host, port))
@@ -248,7 +392,7 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         Register a function that will be called when the Frosbite server sends us a command reply.
         """
         self._frostbite_command_response_handler = func
-        
+
     def send_command(self, *command):
         """
         Send a command to the Frosbite server and return the command
@@ -260,11 +404,11 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         else:
             words = command
 
-        request = EncodeClientRequest(words)
-        [sequence, words] = DecodePacket(request)[2:]
-
-        self.getLogger().debug("sending command request #%i: %s " % (sequence, words))
-        asyncore.dispatcher_with_send.send(self, request)
+        with self._send_lock:
+            sequence = self._sequence
+            self._sequence = (self._sequence + 1) & 0x3fffffff
+            self.getLogger().debug("sending command request #%i: %s " % (sequence, words))
+            self.send(EncodePacket(False, False, sequence, words))
 
         return sequence
 
@@ -276,10 +420,11 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
 
     def getLogger(self):
         return logging.getLogger("FrostbiteDispatcher")
-    
+
     def handle_connect(self):
         self.getLogger().debug("handle_connect")
-    
+        self.connected_event.set()
+
     def handle_close(self):
         """
         Called when the socket is closed.
@@ -287,43 +432,71 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         self.getLogger().debug("handle_close")
         self.close()
 
+    def send(self, data):
+        """
+        Queue data to be sent (commands are sent by the threads calling FrostbiteServer.command() while the
+        asyncore loop thread sends acknowledgements and what is left to send).
+        """
+        with self._send_lock:
+            self.out_buffer += data
+            self.initiate_send()
+
+    def initiate_send(self):
+        """
+        Send as much of the queued data as the socket accepts (the rest is sent once the socket is writable).
+        """
+        with self._send_lock:
+            if self.out_buffer and self.connected:
+                num_sent = asyncore.dispatcher.send(self, self.out_buffer[:65536])
+                self.out_buffer = self.out_buffer[num_sent:]
+
     def handle_read(self):
         """
         Called when the asynchronous loop detects that a read() call on the channel's socket will succeed.
         """
-        # received raw data
-        data = self.recv(8192)
-        self._buffer_in += data
-        self.getLogger().debug('read %s char from Frostbite2 gameserver' % len(data))
+        # received raw data, straight into the receive buffer
+        try:
+            received = self._buffer_in.recv_into(self.socket)
+        except socket.error, why:
+            if why.args[0] in asyncore._DISCONNECTED:
+                self.handle_close()
+                return
+            raise
+        if not received:
+            self.handle_close()
+            return
+        self.getLogger().debug('read %s char from Frostbite2 gameserver' % received)
 
         # cook it into Frosbite packets
-        while containsCompletePacket(self._buffer_in):
-            packetSize = DecodeInt32(self._buffer_in[4:8])
-            packet = self._buffer_in[0:packetSize]
-            self._buffer_in = self._buffer_in[packetSize:len(self._buffer_in)]
+        packet = self._buffer_in.next_packet()
+        while packet is not None:
             self.handle_packet(packet)
-            
+            packet = self._buffer_in.next_packet()
+
     def handle_packet(self, packet):
         """
         Called when a full Frosbite packet has been received.
         """
-        [originServer, isResponse, sequence, words] = DecodePacket(packet)
-        self.getLogger().info("handle_packet(%s)" % repr([originServer, isResponse, sequence, words]))
+        if not isinstance(packet, Packet):
+            packet = Packet(packet)
+        originServer, isResponse, sequence = packet.isFromServer, packet.isResponse, packet.sequence
+        if self.getLogger().isEnabledFor(logging.DEBUG):
+            self.getLogger().debug("handle_packet(%r)" % packet)
         if not isResponse:
             # acknowledge the server
             self.send(EncodePacket(originServer, True, sequence, ("OK",)))
         if originServer:
             if isResponse:
                 self.getLogger().warn("received a bad packet from frosbite server pretending being a "
-                                      "response for a server request: %s" % repr(packet))
+                                      "response for a server request: %r" % packet)
             else:
-                self.handle_frostbite_event(words)
+                self.handle_frostbite_event(packet.words)
         else:
             if isResponse:
-                self.handle_frostbite_command_response(sequence, words)
+                self.handle_frostbite_command_response(sequence, packet.words)
             else:
                 self.getLogger().warn("received a bad packet from frosbite server pretending "
-                                      "being a request from us: %s" % repr(DecodePacket(packet)))
+                                      "being a request from us: %r" % packet)
 
     def handle_frostbite_event(self, words):
         self.getLogger().debug("received a game event from frosbite server: %s" % repr(words))
@@ -334,12 +507,46 @@ class FrostbiteDispatcher(asyncore.dispatcher_with_send):
         self.getLogger().debug("received a response for command #%i from frosbite server: %s" % (command_id, repr(words)))
         if self._frostbite_command_response_handler is not None:
             self._frostbite_command_response_handler(command_id, words)
-    
+
+
+class FrostbiteCommand(object):
+    """
+    A command sent to the Frostbite server, waiting for its response.
+    """
+    def __init__(self, words):
+        """
+        Object constructor.
+        :param words: The command words
+        """
+        self.words = words
+        self.sequence = None
+        self.sent = time.time()
+        self.response = None
+        self.error = None
+        self._done = threading.Event()
+
+    def done(self):
+        """
+        Return True if the response has been received (or is not expected anymore).
+        """
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the response.
+        :param timeout: The maximum amount of seconds to wait for
+        :return: True if the response has been received (or is not expected anymore)
+        """
+        self._done.wait(timeout)
+        return self._done.isSet()
+
 
 class FrostbiteServer(threading.Thread):
     """
     Thread opening a connection to a Frostbite game server and providing
-    means of observing Frostbite events and sending commands
+    means of observing Frostbite events and sending commands.
+    Commands are sent as soon as they are requested and matched with their response by sequence number, so that
+    any amount of commands can be waiting for their response at the same time.
     """
     def __init__(self, host, port, password=None, command_timeout=5.0):
         threading.Thread.__init__(self, name="FrosbiteServerThread")
@@ -351,12 +558,14 @@ class FrostbiteServer(threading.Thread):
         self.command_timeout = command_timeout
         self.frostbite_dispatcher.set_frostbite_event_hander(self._on_event)
         self.frostbite_dispatcher.set_frostbite_command_response_handler(self._on_command_response)
-        self.pending_commands = {}
-        self.__command_reply_event = threading.Event()
+        self.pending_commands = {}  # commands waiting for their response, by sequence number
+        self._pending_lock = threading.Lock()
+        self._stats = {}
+        self._started = time.time()
         self.observers = set()
         # ok start working
         self.start()
-        time.sleep(1.5)
+        self.frostbite_dispatcher.connected_event.wait(1.5)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -369,7 +578,7 @@ class FrostbiteServer(threading.Thread):
         Add func from Frosbite events listeners.
         """
         self.observers.add(func)
-        
+
     def unsubscribe(self, func):
         """
         Remove func from Frosbite events listeners.
@@ -384,24 +593,65 @@ class FrostbiteServer(threading.Thread):
         """
         if not self.connected:
             raise NetworkError("not connected")
-        
+
         self.getLogger().info("command : %s " % repr(command))
         if command is None:
             return None
 
-        command_id = self.frostbite_dispatcher.send_command(*command)
-        self.pending_commands[command_id] = None
-        self.getLogger().debug("command #%i sent. %s " % (command_id, repr(command)))
-        
-        response = self._wait_for_response(command_id)
-        if response[0] in ('CommandDisallowedOnRanked', 'CommandDisallowedOnOfficial'):
-            raise CommandDisallowedError(response)
-        elif response[0] == 'UnknownCommand':
-            raise CommandUnknownCommandError(response)
-        elif response[0] != "OK":
-            raise CommandFailedError(response)
-        else:
-            return response[1:]
+        return self._get_response(self.send(*command), self.command_timeout)
+
+    def send(self, *command):
+        """
+        Send command to the Frostbite server without waiting for the response.
+        :return: A FrostbiteCommand
+        """
+        if not self.connected:
+            raise NetworkError("not connected")
+
+        if len(command) == 1 and type(command[0]) == tuple:
+            command = command[0]
+        request = FrostbiteCommand(command)
+        with self._pending_lock:
+            # hold the lock while sending so that the response cannot be handled before the command is registered
+            request.sequence = self.frostbite_dispatcher.send_command(*command)
+            self.pending_commands[request.sequence] = request
+        self.getLogger().debug("command #%i sent. %s " % (request.sequence, repr(command)))
+        return request
+
+    def command_batch(self, commands, timeout=None):
+        """
+        Send several commands at once and gather their responses.
+        :param commands: The list of commands to send (a command being a tuple of words or a single word)
+        :param timeout: The amount of seconds to wait for all the responses (defaults to command_timeout)
+        :return: A list holding, for each command, either its response or the CommandError it raised
+        """
+        if timeout is None:
+            timeout = self.command_timeout
+        expire_time = time.time() + timeout
+        requests = [self.send(*(cmd if type(cmd) == tuple else (cmd,))) for cmd in commands]
+        results = []
+        for request in requests:
+            try:
+                results.append(self._get_response(request, max(0, expire_time - time.time())))
+            except CommandError, err:
+                results.append(err)
+        return results
+
+    def getStats(self):
+        """
+        Return the per command word statistics: amount of commands sent and commands per second since the connection
+        started, amount of errors and timeouts, average and maximum response times (in milliseconds).
+        """
+        elapsed = max(time.time() - self._started, 0.001)
+        with self._pending_lock:
+            return dict((name, {
+                'count': x['count'],
+                'rate': x['count'] / elapsed,
+                'errors': x['errors'],
+                'timeouts': x['timeouts'],
+                'avg': x['total'] * 1000 / x['count'],
+                'max': x['max'] * 1000,
+            }) for name, x in self._stats.iteritems())
 
     def auth(self):
         """
@@ -423,7 +673,7 @@ class FrostbiteServer(threading.Thread):
     def stop(self):
         self._stopEvent.set()
         self.close()
-    
+
     ####################################################################################################################
     #                                                                                                                  #
     #   OTHER METHODS                                                                                                  #
@@ -434,7 +684,7 @@ class FrostbiteServer(threading.Thread):
     def test_connectivity(host, port):
         sock = socket.create_connection((host, port), timeout=2)
         sock.close()
-    
+
     def __getattr__(self, name):
         if name == 'connected':
             return self.frostbite_dispatcher.connected
@@ -453,47 +703,84 @@ class FrostbiteServer(threading.Thread):
         """
         self.getLogger().info('start loop')
         try:
-            while not self.isStopped():
-                asyncore.loop(count=1, timeout=1)
+            # the loop ends once the dispatcher is closed (it then leaves the socket map)
+            while not self.isStopped() and self.frostbite_dispatcher.socket_map:
+                asyncore.loop(count=1, timeout=1, map=self.frostbite_dispatcher.socket_map)
         except KeyboardInterrupt:
             pass
         finally:
             self.frostbite_dispatcher.close()
+            self._fail_pending(NetworkError("Lost connection to Frostbite2 server"))
         self.getLogger().info('end loop')
 
     def _on_event(self, words):
         self.getLogger().debug("received Frostbite event : %s" % repr(words))
-        for func in self.observers:
+        for func in list(self.observers):
             func(words)
 
     def _on_command_response(self, command_id, words):
         self.getLogger().debug("received Frostbite command #%i response: %s" % (command_id, repr(words)))
-        if command_id not in self.pending_commands:
-            self.getLogger().warn("dropping Frostbite command #%i response as we are not waiting for it anymore" % command_id)
+        with self._pending_lock:
+            request = self.pending_commands.pop(command_id, None)
+            if request is None:
+                self.getLogger().warn("dropping Frostbite command #%i response as we are not waiting for it anymore" % command_id)
+                return
+            request.response = words
+            self._record(request, error=not words or words[0] != 'OK')
+            request._done.set()
+
+    def _fail_pending(self, error):
+        """
+        Wake up the threads waiting for responses which will never come.
+        """
+        with self._pending_lock:
+            requests = self.pending_commands.values()
+            self.pending_commands.clear()
+        for request in requests:
+            request.error = error
+            request._done.set()
+
+    def _record(self, request, error=False, timeout=False):
+        """
+        Update the statistics of a command word (the caller must hold self._pending_lock).
+        """
+        elapsed = time.time() - request.sent
+        name = str(request.words[0]) if request.words else ''
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = {'count': 0, 'errors': 0, 'timeouts': 0, 'total': 0.0, 'max': 0.0}
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        if error:
+            stats['errors'] += 1
+        if timeout:
+            stats['timeouts'] += 1
+
+    def _get_response(self, request, timeout):
+        """
+        Block until the response to the given command has been received or until timeout is reached.
+        :return: The response words following the status word
+        """
+        if not request.wait(timeout):
+            with self._pending_lock:
+                if self.pending_commands.pop(request.sequence, None) is request:
+                    self._record(request, timeout=True)
+            if not request.done():
+                raise CommandTimeoutError("did not receive any response for sequence #%i" % request.sequence)
+        if request.error:
+            raise request.error
+        response = request.response
+        if not response:
+            raise CommandFailedError(response)
+        elif response[0] in ('CommandDisallowedOnRanked', 'CommandDisallowedOnOfficial'):
+            raise CommandDisallowedError(response)
+        elif response[0] == 'UnknownCommand':
+            raise CommandUnknownCommandError(response)
+        elif response[0] != "OK":
+            raise CommandFailedError(response)
         else:
-            self.pending_commands[command_id] = words
-            self.__command_reply_event.set()
-
-    def _wait_for_response(self, command_id):
-        """
-        Block until response to for given command_id has been received or until timeout is reached.
-        """
-        expire_time = time.time() + self.command_timeout
-        while not self.isStopped() and command_id in self.pending_commands and self.pending_commands[command_id] is None:
-            if not self.connected:
-                raise NetworkError("Lost connection to Frostbite2 server")
-            if time.time() >= expire_time:
-                del self.pending_commands[command_id]
-                raise CommandTimeoutError("did not receive any response for sequence #%i" % command_id)
-            self.getLogger().debug("waiting for some command reply #%i: %r " % (command_id, self.pending_commands))
-            self.__command_reply_event.clear()
-            self.__command_reply_event.wait(self.command_timeout)
-        try:
-            response = self.pending_commands[command_id]
-            del self.pending_commands[command_id]
-            return response
-        except KeyError:
-            raise CommandTimeoutError("did not receive any response for sequence #%i" % command_id)
+            return response[1:]
 
 ########################################################################################################################
 # EXAMPLE PROGRAM                                                                                                      #
@@ -32,7 +32,7 @@ Then you can expect this class to work like the other Rcon classes
 """
 
 __author__ = 'Courgette'
-__version__ = '1.1'
+__version__ = '1.2'
 
 
 class Rcon(object):
@@ -51,10 +51,15 @@ class Rcon(object):
     def writelines(self, lines):
         """
         Write multiple RCON commands to the Frostbite2 server.
+        Commands are all sent at once, without waiting for the previous one response.
         :param lines: A list of commands to send
         """
-        for line in lines:
-            self.write(line)
+        if not self.frostbite_server:
+            return
+        self.console.verbose(u'RCON :\t %s' % repr(lines))
+        responses = self.frostbite_server.command_batch(lines)
+        self.console.verbose(u'RCON response:\t %s' % repr(responses))
+        return responses
 
     def write(self, cmd, *args, **kwargs):
         """
@@ -111,7 +111,7 @@ from b3.plugins.spamcontrol import SpamcontrolPlugin
 
 
 __author__ = 'Courgette, Fenix'
-__version__ = '1.35'
+__version__ = '1.36'
 
 
 class Iourt42Client(Client):
@@ -1414,7 +1414,6 @@ class Iourt42Parser(Iourt41Parser):
             """
             client = Iourt42Client(console=self.console, cid=cid, timeAdd=self.console.time(), **kwargs)
             self[client.cid] = client
-            self.resetIndex()
 
             self.console.debug('Urt42 Client Connected: [%s] %s - %s (%s)',  self[client.cid].cid, self[client.cid].name,
                                                                              self[client.cid].guid, self[client.cid].data)
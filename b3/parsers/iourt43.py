@@ -33,7 +33,7 @@ from b3.plugins.spamcontrol import SpamcontrolPlugin
 
 
 __author__ = 'Courgette, Fenix, ptitbigorneau'
-__version__ = '0.01'
+__version__ = '0.02'
 
     
 class Iourt43Client(Client):
@@ -1408,7 +1408,6 @@ class Iourt43Parser(Iourt41Parser):
             """
             client = Iourt43Client(console=self.console, cid=cid, timeAdd=self.console.time(), **kwargs)
             self[client.cid] = client
-            self.resetIndex()
 
             self.console.debug('Urt43 Client Connected: [%s] %s - %s (%s)',  self[client.cid].cid, self[client.cid].name,
                                                                              self[client.cid].guid, self[client.cid].data)
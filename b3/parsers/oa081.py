@@ -333,14 +333,10 @@ class Oa081Parser(AbstractParser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                self.debug('XLR--------> line matched %s' % f.pattern)
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.getLineDispatcher().match(line)
         if m:
+            self.debug('XLR--------> line matched %s' % m.re.pattern)
             client = None
             target = None
             try:
@@ -67,7 +67,7 @@
 # 23/07/2005 - 1.0.1 - ThorN          - added log message for when ban() decides to do a tempban
 
 __author__ = 'ThorN, xlr8or'
-__version__ = '1.8.1'
+__version__ = '1.9'
 
 
 import re
@@ -86,6 +86,88 @@ from b3.parsers.punkbuster import PunkBuster
 from b3.functions import prefixText
 
 
+class LineDispatcher(object):
+    """
+    Match log lines against an ordered collection of line formats.
+    Formats starting with an action group made only of letters (ie: '(?P<action>Kill)' or '(?P<action>[a-z]+)') are
+    only tried on lines whose leading word can match the action; the other formats are tried on every line. The formats
+    to try are computed once per leading word, keeping the original precedence.
+    """
+    _maxTokens = 1000
+    _reToken = re.compile(r'[a-z]*', re.IGNORECASE)
+    _reLettersOnly = re.compile(r'^(?:[a-z|()?:+*]|\[(?:a-z|A-Z)+\])+$', re.IGNORECASE)
+
+    def __init__(self, formats):
+        """
+        Object constructor.
+        :param formats: The line formats (compiled regular expressions)
+        """
+        self.formats = formats
+        self._actions = [self._getActionPattern(f) for f in formats]
+        self._byToken = {}
+
+    @classmethod
+    def _getActionPattern(cls, f):
+        """
+        Return a compiled pattern matching the action of the given line format or None if the format cannot be routed.
+        """
+        pattern = f.pattern
+        start = '^(?P<action>'
+        if not pattern.startswith(start):
+            return None
+
+        # look for the parenthesis closing the action group
+        depth = 1
+        i = len(start)
+        while i < len(pattern):
+            char = pattern[i]
+            if char == '\\':
+                i += 1
+            elif char == '[':
+                i = pattern.find(']', i + 1)
+                if i == -1:
+                    return None
+            elif char == '(':
+                depth += 1
+            elif char == ')':
+                depth -= 1
+                if depth == 0:
+                    break
+            i += 1
+        else:
+            return None
+
+        action = pattern[len(start):i]
+        if not action or not cls._reLettersOnly.match(action):
+            return None
+        return re.compile(action, f.flags)
+
+    def getFormats(self, token):
+        """
+        Return the line formats which may match a line starting with the given word.
+        """
+        try:
+            return self._byToken[token]
+        except KeyError:
+            formats = tuple(f for f, action in zip(self.formats, self._actions)
+                            if action is None or action.match(token))
+            if len(self._byToken) < self._maxTokens:
+                self._byToken[token] = formats
+            return formats
+
+    def match(self, line):
+        """
+        Match a log line (stripped of its time) against the line formats.
+        :param line: The line to match
+        :return: The match object of the first matching format or None
+        """
+        for f in self.getFormats(self._reToken.match(line).group()):
+            m = f.match(line)
+            if m:
+                return m
+        return None
+
+
 class AbstractParser(b3.parser.Parser):
     """
     An abstract base class to help with developing q3a parsers.
@@ -97,6 +179,8 @@ class AbstractParser(b3.parser.Parser):
     PunkBuster = None
 
     _clientConnectID = None
+    _lineDispatcher = None
+    _lineHandlers = None
     _logSync = 2
 
     _commands = {
@@ -226,13 +310,8 @@ class AbstractParser(b3.parser.Parser):
         Parse a log line returning extracted tokens.
         :param line: The line to be parsed
         """
-        line = re.sub(self._lineClear, '', line, 1)
-        m = None
-        for f in self._lineFormats:
-            m = re.match(f, line)
-            if m:
-                #self.debug('line matched %s' % f.pattern)
-                break
+        line = self._lineClear.sub('', line, 1)
+        m = self.getLineDispatcher().match(line)
         if m:
             client = None
             target = None
@@ -250,9 +329,9 @@ class AbstractParser(b3.parser.Parser):
             return False
 
         match, action, data, client, target = m
-        func = 'On%s' % string.capwords(action).replace(' ', '')
-        
-        if hasattr(self, func):
+        func = self.getLineHandler(action)
+
+        if func:
             func = getattr(self, func)
             event = func(action, data, match)
             if event:
@@ -264,6 +343,29 @@ class AbstractParser(b3.parser.Parser):
             data = str(action) + ': ' + str(data)
             self.queueEvent(self.getEvent('EVT_UNKNOWN', data=data, client=client, target=target))
 
+    def getLineDispatcher(self):
+        """
+        Return the LineDispatcher matching log lines against this parser line formats.
+        """
+        if self._lineDispatcher is None or self._lineDispatcher.formats is not self._lineFormats:
+            self._lineDispatcher = LineDispatcher(self._lineFormats)
+        return self._lineDispatcher
+
+    def getLineHandler(self, action):
+        """
+        Return the name of the method handling the given log line action (None if there is no such method).
+        Action names may contain spaces: action 'Flag return' is handled by the method named 'OnFlagReturn'.
+        :param action: The action name, lowercase
+        """
+        if self._lineHandlers is None:
+            self._lineHandlers = {}
+        try:
+            return self._lineHandlers[action]
+        except KeyError:
+            func = 'On%s' % string.capwords(action).replace(' ', '')
+            func = self._lineHandlers[action] = func if hasattr(self, func) else None
+            return func
+
     def parseUserInfo(self, info):
         """
         Parse an infostring.
@@ -43,7 +43,7 @@
 # 2015/03/07 - 1.11   - 82ndab.Bravo17  - replace beaker status caching with built-in caching
 #
 __author__ = 'ThorN'
-__version__ = '1.11'
+__version__ = '1.13'
 
 import re
 import socket
@@ -53,6 +53,42 @@ import thread
 import threading
 import Queue
 
+from collections import OrderedDict
+
+
+class RconRequest(object):
+    """
+    A command sent to the game server, waiting for its response.
+    """
+    def __init__(self, cmd, timeout):
+        """
+        Object constructor.
+        :param cmd: The command sent
+        :param timeout: The amount of seconds to wait for the response to start or to continue
+        """
+        self.id = None
+        self.cmd = cmd
+        self.timeout = timeout
+        self.sent = time.time()
+        self.data = ''
+        self.timedout = False
+        self._done = threading.Event()
+
+    def done(self):
+        """
+        Return True if the response has been received (or is not expected anymore).
+        """
+        return self._done.isSet()
+
+    def wait(self, timeout=None):
+        """
+        Wait for the response and return it.
+        :param timeout: The maximum amount of seconds to wait for
+        """
+        self._done.wait(timeout)
+        return self.data
+
+
 class Rcon(object):
 
     host = ()
@@ -66,6 +102,17 @@ class Rcon(object):
     rconreplystring = '\377\377\377\377print\n'
     qserversendstring = '\377\377\377\377%s\n'
 
+    # command sent after each RCON command when pipelining is enabled: the server echoes the marker back once the
+    # command output has been sent so the end of the response is known without waiting for socket_timeout. None makes
+    # pipelining unavailable
+    rconmarkerstring = 'echo %s'
+    # maximum amount of commands sent and waiting for their response: each command takes 2 packets and game servers
+    # drop RCON packets coming in larger bursts (ioquake3 accepts bursts of 10)
+    max_inflight = 4
+    # consecutive responses ending without their marker after which commands are sent one at a time again
+    max_marker_timeouts = 3
+    _reMarker = re.compile(r'^(?:\^\d)?B3RCON(?P<id>\d+)(?:\^\d)?\s*$')
+
     # default expiretime for the status cache in seconds and cache type
     status_cache_expire_time = 2
     status_cache = False
@@ -103,7 +150,28 @@ class Rcon(object):
         self.socket.settimeout(2)
         self.socket.connect(self.host)
 
+        self.pipelining = False
+        if self.rconmarkerstring is not None and self.console.config.has_option('server', 'rcon_pipelining'):
+            self.pipelining = self.console.config.getboolean('server', 'rcon_pipelining')
+
         self._stopEvent = threading.Event()
+        self._lock = threading.Lock()
+        self._sendLock = threading.Lock()
+        self._statusLock = threading.Lock()
+        self._inflight = threading.BoundedSemaphore(self.max_inflight)
+        self._pending = OrderedDict()  # RCON requests waiting for their response, in sending order
+        self._qserverPending = []  # connectionless requests waiting for their response
+        self._buffer = []  # response packets received since the last marker
+        self._lastPacket = 0
+        self._nextId = 0
+        self._markers = 0  # amount of markers received
+        self._markerTimeouts = 0  # consecutive responses which ended without their marker
+        self._stats = {}
+
+        if self.pipelining:
+            self.console.bot('RCON pipelining enabled')
+            thread.start_new_thread(self._readResponses, ())
+
         thread.start_new_thread(self._writelines, ())
 
     def encode_data(self, data, source):
@@ -140,6 +208,11 @@ class Rcon(object):
             data = self.encode_data(data, 'QSERVER')
 
         self.console.verbose('QSERVER sending (%s:%s) %r', self.host[0], self.host[1], data)
+        if self.pipelining:
+            response = self._sendQserver(data, maxRetries, socketTimeout)
+            if response is not None:
+                return response
+
         start_time = time.time()
 
         retries = 0
@@ -192,6 +265,25 @@ class Rcon(object):
             data = self.encode_data(data, 'RCON')
 
         self.console.verbose('RCON sending (%s:%s) %r', self.host[0], self.host[1], data)
+        if self.pipelining:
+            request = self._submit(data, maxRetries, socketTimeout)
+            if request is not None:
+                data = request.wait(5 + request.timeout)
+                self.console.verbose2('RCON: received %r' % data)
+                return data
+            # pipelining got disabled meanwhile: the caller does not hold the lock serializing the commands
+            with self.lock:
+                return self._sendRcon(data, maxRetries, socketTimeout)
+
+        return self._sendRcon(data, maxRetries, socketTimeout)
+
+    def _sendRcon(self, data, maxRetries, socketTimeout):
+        """
+        Send an (already encoded) RCON command and wait for its response, reading the socket directly.
+        :param data: The command to be sent
+        :param maxRetries: How many times we have to retry the sending upon failure
+        :param socketTimeout: The socket timeout value
+        """
         start_time = time.time()
 
         retries = 0
@@ -234,6 +326,246 @@ class Rcon(object):
         self.console.debug('RCON: did not send any data')
         return ''
 
+    def _submit(self, data, maxRetries=None, socketTimeout=None):
+        """
+        Send an (already encoded) RCON command followed by its marker, without waiting for the response.
+        Blocks while max_inflight commands are already waiting for their response.
+        :param data: The command to be sent
+        :param maxRetries: How many times we have to retry the sending upon failure
+        :param socketTimeout: The amount of seconds to wait for the response to start or to continue
+        :return: A RconRequest, or None if pipelining got disabled meanwhile
+        """
+        if socketTimeout is None:
+            socketTimeout = self.socket_timeout
+        if maxRetries is None:
+            maxRetries = 2
+
+        self._inflight.acquire()
+        request = RconRequest(data, socketTimeout)
+        retries = 0
+        while True:
+            with self._sendLock:
+                with self._lock:
+                    if not self.pipelining:
+                        self._inflight.release()
+                        return None
+                    self._nextId += 1
+                    request.id = self._nextId
+                    request.sent = time.time()
+                    self._pending[request.id] = request
+                try:
+                    self.socket.send(self.rconsendstring % (self.password, data))
+                    marker = self.rconmarkerstring % ('B3RCON%s' % request.id)
+                    self.socket.send(self.rconsendstring % (self.password, marker))
+                except Exception, msg:
+                    self.console.warning('RCON: error sending: %r', msg)
+                    with self._lock:
+                        self._pending.pop(request.id, None)
+                else:
+                    return request
+
+            if re.match(r'^quit|map(_rotate)?.*', data):
+                # do not retry quits and map changes since they prevent the server from responding
+                self.console.verbose2('RCON: no retry for %r', data)
+                break
+
+            retries += 1
+            if retries >= maxRetries:
+                self.console.error('RCON: too many tries: aborting (%r)', data)
+                break
+
+            time.sleep(0.05)
+            self.console.verbose('RCON: retry sending %r (%s/%s)...', data, retries, maxRetries)
+
+        self.console.debug('RCON: did not send any data')
+        with self._lock:
+            self._complete(request, '')
+        return request
+
+    def _sendQserver(self, data, maxRetries=None, socketTimeout=None):
+        """
+        Send an (already encoded) connectionless command and wait for its response.
+        Return None if pipelining got disabled meanwhile.
+        """
+        if socketTimeout is None:
+            socketTimeout = self.socket_timeout
+        if maxRetries is None:
+            maxRetries = 2
+
+        for retries in range(maxRetries):
+            request = RconRequest(data, socketTimeout)
+            with self._lock:
+                if not self.pipelining:
+                    return None
+                self._qserverPending.append(request)
+            try:
+                self.socket.send(self.qserversendstring % data)
+            except Exception, msg:
+                self.console.warning('QSERVER: error sending: %r', msg)
+                with self._lock:
+                    self._qserverPending.remove(request)
+                time.sleep(0.05)
+                continue
+            data = request.wait(5 + socketTimeout)
+            self.console.verbose2('QSERVER: received %r' % data)
+            return data
+
+        self.console.error('QSERVER: too many tries: aborting (%r)', data)
+        return ''
+
+    def _readResponses(self):
+        """
+        Read the game server responses and hand them over to the requests waiting for them.
+        """
+        while not self._stopEvent.isSet() and self.pipelining:
+            try:
+                readables = select.select([self.socket], [], [], self._nextTimeout())[0]
+                if readables:
+                    self._handlePacket(self.socket.recv(65536))
+            except socket.error, msg:
+                # ie: connection refused when the game server is down
+                self.console.verbose('RCON: error reading: %r', msg)
+                time.sleep(0.05)
+            except Exception, msg:
+                self.console.error('RCON: unexpected error reading responses: %r', msg)
+                time.sleep(0.05)
+            self._expireRequests()
+
+    def _nextTimeout(self):
+        """
+        Return the amount of seconds to wait for a packet before checking the requests timeout.
+        """
+        with self._lock:
+            deadlines = [r.sent + r.timeout for r in self._qserverPending[:1]]
+            for request in self._pending.itervalues():
+                deadlines.append(max(request.sent, self._lastPacket) + request.timeout)
+                break
+        if not deadlines:
+            return 0.25
+        return min(0.25, max(0, min(deadlines) - time.time()))
+
+    def _handlePacket(self, packet):
+        """
+        Handle a packet received from the game server.
+        :param packet: The packet content
+        """
+        with self._lock:
+            self._lastPacket = time.time()
+            if packet.startswith(self.rconreplystring):
+                payload = packet[len(self.rconreplystring):]
+                match = self._reMarker.match(payload)
+                if not match:
+                    self._buffer.append(payload)
+                    return
+
+                # everything received since the previous marker is the response of the command this marker follows
+                rid = int(match.group('id'))
+                data, self._buffer = ''.join(self._buffer), []
+                self._markers += 1
+                self._markerTimeouts = 0
+                if rid not in self._pending:
+                    if data:
+                        self.console.verbose('RCON: discarding late response %r', data)
+                    return
+                lost = False
+                while self._pending:
+                    pid, request = next(self._pending.iteritems())
+                    if pid == rid:
+                        if lost:
+                            # the marker of a previous command got lost or arrived after this one (UDP packets can
+                            # be reordered): part of the data may belong to another command so drop all of it
+                            self.console.verbose('RCON: discarding mixed responses %r', data)
+                            self._complete(request, '', lost=True)
+                        else:
+                            self._complete(request, data)
+                        break
+                    self._complete(request, '', lost=True)
+                    lost = True
+            elif self._qserverPending:
+                self._completeQserver(self._qserverPending.pop(0), packet)
+            else:
+                self.console.verbose('RCON: unexpected packet %r', packet)
+
+    def _expireRequests(self):
+        """
+        Give up waiting for the responses which did not come in time.
+        """
+        now = time.time()
+        with self._lock:
+            while self._pending:
+                rid, request = next(self._pending.iteritems())
+                if now - max(request.sent, self._lastPacket) < request.timeout and now - request.sent < 5:
+                    break
+                # whatever got received since the last marker is the best we have
+                data, self._buffer = ''.join(self._buffer), []
+                self._complete(request, data, timedout=True)
+                if self._lastPacket >= request.sent:
+                    # the game server answered but the marker did not come back
+                    self._markerTimeouts += 1
+                    if not self._markers or self._markerTimeouts >= self.max_marker_timeouts:
+                        self._disablePipelining()
+                        return
+            while self._qserverPending and now - self._qserverPending[0].sent >= self._qserverPending[0].timeout:
+                self._completeQserver(self._qserverPending.pop(0), '', timedout=True)
+
+    def _disablePipelining(self):
+        """
+        Send the commands one at a time from now on (the caller must hold self._lock).
+        Called when the markers do not come back: the game server may not support the echo command.
+        """
+        self.console.warning('RCON: no end of response marker received from the game server: '
+                             'disabling RCON pipelining (set rcon_pipelining to off in the [server] section)')
+        self.pipelining = False
+        while self._pending:
+            rid, request = next(self._pending.iteritems())
+            self._complete(request, ''.join(self._buffer), timedout=True)
+            self._buffer = []
+        while self._qserverPending:
+            self._completeQserver(self._qserverPending.pop(0), '', timedout=True)
+
+    def _complete(self, request, data, timedout=False, lost=False):
+        """
+        Complete a RCON request (the caller must hold self._lock).
+        """
+        if request.id is not None:
+            self._pending.pop(request.id, None)
+        self._completeQserver(request, data, timedout, lost)
+        self._inflight.release()
+
+    def _completeQserver(self, request, data, timedout=False, lost=False):
+        """
+        Store a request response, update the statistics and wake up the thread waiting for it.
+        """
+        request.data = data
+        request.timedout = timedout
+        elapsed = time.time() - request.sent
+        name = request.cmd.split(' ', 1)[0].lower()
+        stats = self._stats.get(name)
+        if stats is None:
+            stats = self._stats[name] = {'count': 0, 'timeouts': 0, 'lost': 0, 'total': 0.0, 'max': 0.0}
+        stats['count'] += 1
+        stats['total'] += elapsed
+        stats['max'] = max(stats['max'], elapsed)
+        if timedout:
+            stats['timeouts'] += 1
+            self.console.verbose('RCON: no end of response for %r after %0.3f sec', request.cmd, elapsed)
+        if lost:
+            stats['lost'] += 1
+        request._done.set()
+
+    def getStats(self):
+        """
+        Return the per command latency statistics (times in milliseconds).
+        """
+        with self._lock:
+            return dict((name, {
+                'count': x['count'],
+                'timeouts': x['timeouts'],
+                'lost': x['lost'],
+                'avg': x['total'] * 1000 / x['count'],
+                'max': x['max'] * 1000,
+            }) for name, x in self._stats.iteritems())
+
     def stop(self):
         """
         Stop the rcon writelines queue.
@@ -246,6 +578,25 @@ class Rcon(object):
         """
         while not self._stopEvent.isSet():
             lines = self.queue.get(True)
+            if self.pipelining:
+                # send all the commands at once, then wait for their responses
+                requests = []
+                for cmd in lines:
+                    if not cmd:
+                        continue
+                    cmd = cmd.strip()
+                    if self.console.encoding:
+                        cmd = self.encode_data(cmd, 'RCON')
+                    self.console.verbose('RCON sending (%s:%s) %r', self.host[0], self.host[1], cmd)
+                    request = self._submit(cmd, maxRetries=1)
+                    if request is None:
+                        with self.lock:
+                            self._sendRcon(cmd, 1, self.socket_timeout)
+                    else:
+                        requests.append(request)
+                for request in requests:
+                    request.wait(5 + request.timeout)
+                continue
             for cmd in lines:
                 if not cmd:
                     continue
@@ -272,7 +623,10 @@ class Rcon(object):
                 self.console.verbose2('Using Status: Cached %s' % cmd)
                 return self.status_cache_data
             else:
-                with self.lock:
+                with self._statusLock if self.pipelining else self.lock:
+                    if self.pipelining and time.time() < self.status_cache_expired:
+                        # refreshed by another thread meanwhile
+                        return self.status_cache_data
                     data = self.sendRcon(cmd, maxRetries=maxRetries, socketTimeout=socketTimeout)
                     if data:
                         self.status_cache_data = data
@@ -284,8 +638,12 @@ class Rcon(object):
                         self.status_cache_data = ''
                 return self.status_cache_data
         
-        with self.lock:
+        if self.pipelining:
+            # commands from concurrent callers are sent without waiting for each other
             data = self.sendRcon(cmd, maxRetries=maxRetries, socketTimeout=socketTimeout)
+        else:
+            with self.lock:
+                data = self.sendRcon(cmd, maxRetries=maxRetries, socketTimeout=socketTimeout)
         return data if data else ''
 
     def flush(self):
@@ -345,22 +703,26 @@ class Rcon(object):
         return data
 
     def close(self):
-        pass
+        if self.pipelining:
+            self.stop()
+            for name, stats in sorted(self.getStats().iteritems()):
+                self.console.debug('RCON: %-12s %5s commands, %s timeouts, %s lost, latency (ms) avg(%0.1f) max(%0.1f)',
+                                   name, stats['count'], stats['timeouts'], stats['lost'], stats['avg'], stats['max'])
 
     def getRules(self):
-        self.lock.acquire()
-        try:
+        if self.pipelining:
             data = self.send('getstatus')
-        finally:
-            self.lock.release()
+        else:
+            with self.lock:
+                data = self.send('getstatus')
         return data if data else ''
 
     def getInfo(self):
-        self.lock.acquire()
-        try:
+        if self.pipelining:
             data = self.send('getinfo')
-        finally:
-            self.lock.release()
+        else:
+            with self.lock:
+                data = self.send('getinfo')
         return data if data else ''
 
 ########################################################################################################################
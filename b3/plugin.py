@@ -64,7 +64,7 @@
 # 14/07/2015 - 1.13  - Fenix     - added isSetting method (shortcut to config.has_option)
 
 __author__ = 'ThorN, Courgette'
-__version__ = '1.13'
+__version__ = '1.15'
 
 
 import re
@@ -142,6 +142,16 @@ class Plugin(object):
     _default_messages = {}
     """:type: dict"""
 
+    # Whether this plugin may veto events (by raising b3.events.VetoEvent). Plugins vetoing events always handle
+    # them in the event handler thread so that the plugins coming after them do not receive vetoed events.
+    vetoesEvents = False
+    """:type: bool"""
+
+    # Whether this plugin can handle events in its own thread, concurrently with the other plugins, when B3 is
+    # configured with event_dispatch set to 'threadsafe'. With 'threaded' every plugin not vetoing events does so.
+    threadSafe = False
+    """:type: bool"""
+
     ################################## PLUGIN DEVELOPERS: END PLUGIN CUSTOMIZATION #####################################
 
     _enabled = True
@@ -161,6 +171,10 @@ class Plugin(object):
         :param console: The console implementation
         :param config: The plugin configuration file
         """
+        if getattr(console, 'host', None) is not None:
+            # plugin classes are shared among the parsers running in the same process (see b3.host): plugins changing
+            # dicts, lists or sets declared as class attributes must not see the changes made by the other parsers
+            b3.functions.copyClassContainers(self)
         self.console = console
         self.eventmanager = b3.events.eventManager
         self.eventmap = dict()
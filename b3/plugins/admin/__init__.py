@@ -15,12 +15,11 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.35'
+__version__ = '1.39'
 __author__ = 'ThorN, xlr8or, Courgette, Ozon, Fenix'
 
 import re
 import time
-import threading
 import sys
 import traceback
 import thread
@@ -590,10 +589,10 @@ class AdminPlugin(b3.plugin.Plugin):
                     self.debug('vars for %s:', sclient.name)
 
                     try:
-                        for k, v in sclient._pluginData.items():
+                        for k, v in sclient.getPluginVars().items():
                             self.debug('\tplugin %s:', k)
                             for kk, vv in v.items():
-                                self.debug('\t\t%s = %s', kk, str(vv.value))
+                                self.debug('\t\t%s = %s', kk, str(vv))
                     except Exception, e:
                         self.debug('error getting vars: %s', e)
 
@@ -615,12 +614,12 @@ class AdminPlugin(b3.plugin.Plugin):
                     self.debug('teamkill info for %s:', sclient.name)
 
                     try:
-                        for k, v in sclient._pluginData.items():
+                        for k, v in sclient.getPluginVars().items():
 
                             for kk, vv in v.items():
                                 if kk == 'tkinfo':
                                     self.debug('\tplugin %s:', k)
-                                    tkinfo = vv.value
+                                    tkinfo = vv
                                     self.debug('\t\tcid = %s', tkinfo.cid)
                                     self.debug('\t\tattackers = %s', str(tkinfo.attackers))
                                     self.debug('\t\tattacked = %s', str(tkinfo.attacked))
@@ -934,6 +933,7 @@ class AdminPlugin(b3.plugin.Plugin):
             if admin is None or admin.maxLevel <= client.maxLevel:
                 w.inactive = 1
                 self.console.storage.setClientPenalty(w)
+                sclient.updatePenalty(w)
 
         self._tkPlugin = self.console.getPlugin('tk')
         if self._tkPlugin:
@@ -1073,8 +1073,7 @@ class AdminPlugin(b3.plugin.Plugin):
                                                              duration=duration, reason='Too many warnings'))
 
             sclient.setvar(self, 'checkWarn', True)
-            t = threading.Timer(25, self.checkWarnKick, (sclient, admin, data))
-            t.start()
+            self.console.timers.schedule(25, self.checkWarnKick, (sclient, admin, data))
 
         return warnrecord
 
@@ -1677,10 +1676,14 @@ class AdminPlugin(b3.plugin.Plugin):
         """
         - report status of bot
         """
-        if self.console.storage.status():
-            cmd.sayLoudOrPM(client, '^7Database appears to be ^2UP')
-        else:
+        status = self.console.storage.status()
+        if not status:
             cmd.sayLoudOrPM(client, '^7Database appears to be ^1DOWN')
+        elif isinstance(status, dict):
+            cmd.sayLoudOrPM(client, '^7Database appears to be ^2UP ^7(connections in use: %(pool_in_use)s/%(pool_size)s, '
+                                    'avg wait: %(wait_time_avg).1fms)' % status)
+        else:
+            cmd.sayLoudOrPM(client, '^7Database appears to be ^2UP')
 
     def cmd_scream(self, data, client=None, cmd=None):
         """
@@ -2122,6 +2125,7 @@ class AdminPlugin(b3.plugin.Plugin):
 
             w.inactive = 1
             self.console.storage.setClientPenalty(w)
+            sclient.updatePenalty(w)
 
             cmd.sayLoudOrPM(client, '%s ^7last warning cleared: ^3%s' % (sclient.exactName, w.reason))
 
@@ -2155,6 +2159,7 @@ class AdminPlugin(b3.plugin.Plugin):
                 cleared += 1
                 w.inactive = 1
                 self.console.storage.setClientPenalty(w)
+                sclient.updatePenalty(w)
 
             if failed and cleared:
                 cmd.sayLoudOrPM(client, '^7Cleared ^3%s ^7warnings and left ^3%s ^7warnings for %s' % (
@@ -2224,10 +2229,8 @@ class AdminPlugin(b3.plugin.Plugin):
         else:
             duration = functions.time2minutes(data)
             self.console.say('^7Sleeping for %s' % functions.minutesStr(duration))
-            unpause_task = threading.Timer(duration * 60, self.console.unpause)
-            unpause_task.daemon = True # won't block the bot in case of shutdown
             self.console.pause()
-            unpause_task.start()
+            self.console.timers.schedule(duration * 60, self.console.unpause)
 
     def cmd_spam(self, data, client=None, cmd=None):
         """
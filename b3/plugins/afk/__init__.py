@@ -18,10 +18,9 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = "Thomas LEVEIL"
-__version__ = "1.10"
+__version__ = "1.11"
 
 
-from threading import Timer
 from time import time
 from b3 import TEAM_SPEC
 from b3.config import NoOptionError
@@ -67,7 +66,7 @@ class AfkPlugin(Plugin):
         """:type : int"""
 
         self.kick_timers = WeakKeyDictionary()
-        """:type : dict[Client, threading.Timer]"""
+        """:type : dict[Client, b3.timer.TimerHandle]"""
 
         self.last_global_check_time = time()
         """:type : int"""
@@ -409,9 +408,8 @@ class AfkPlugin(Plugin):
         self.info("%r suspected of being AFK" % client)
         client.message(self.are_you_afk)
         self.console.say(self.suspicion_announcement.format(name=client.name, last_chance_delay=self.last_chance_delay))
-        t = Timer(self.last_chance_delay, self.kick_client, (client, ))
-        t.start()
-        self.kick_timers[client] = t
+        self.kick_timers[client] = self.console.timers.schedule(self.last_chance_delay, self.kick_client, (client, ),
+                                                               client=client)
 
     def kick_client(self, client):
         """
@@ -16,7 +16,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '2.8'
+__version__ = '2.9'
 __author__  = 'Courgette'
 
 import b3
@@ -337,7 +337,6 @@ class Banlist(object):
         :param config: the banlist plugin configuration file instance
         """
         self.plugin = plugin
-        self.file_content = ""  # the banlist file content
         self.cache = {}  # used to cache isBanned results. Must be cleared after banlist file change/update
         self.cache_time = 0  # holds the modifed time of the banlist file used to fill that cache
 
@@ -414,7 +413,9 @@ class Banlist(object):
             result = self.updateFromUrl()
             if result is not True:
                 raise BanlistException("failed to update '%s' from %s. (%s)" % (self.file, self.url, result))
-            self.plugin.checkConnectedPlayers()
+            if os.path.isfile(self.file) and self.refreshBanlistContent():
+                # only check players again if the banlist changed
+                self.plugin.checkConnectedPlayers()
         except BanlistException, e:
             self.plugin.warning("%s" % e.message)
 
@@ -449,6 +450,8 @@ class Banlist(object):
             localFile = open(self.file, 'w')
             localFile.write(result)
             localFile.close()
+            # reload the file even if its modification time did not change (1 second resolution)
+            self.cache_time = None
             return True
         except urllib2.HTTPError, err:
             if err.code == 304:
@@ -493,19 +496,65 @@ class Banlist(object):
         return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(self.getModifiedTime()))
 
     def refreshBanlistContent(self):
+        """
+        Load the banlist file into the banlist index if the file changed since it was last loaded.
+        :return: True if the banlist got reloaded
+        """
         if not self._checkFileExists():
-            return ""
+            return False
+
+        if self.cache_time == self.getModifiedTime():
+            return False
 
-        if self.cache_time != self.getModifiedTime():
-            with open(self.file) as f:
-                self.plugin.verbose("updating %s content cache from %s" % (self, self.file))
-                self.file_content = f.read()
-            self.clear_cache()
+        self.plugin.verbose("updating %s content cache from %s" % (self, self.file))
+        self.buildIndex(self.readFile())
+        self.clear_cache()
+        return True
+
+    def readFile(self):
+        """
+        Return the banlist file content.
+        """
+        with open(self.file) as f:
+            return f.read()
+
+    def buildIndex(self, content):
+        """
+        Parse the banlist file content into the structures used to look players up.
+        :param content: The banlist file content
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def buildIdIndex(content):
+        """
+        Index the entries of a GUID or PBID banlist.
+        An id matches a banlist line starting (leading spaces aside, case insensitive) with that id followed by a word
+        boundary, so the lowercase prefixes of each line first word ending on a word boundary are indexed.
+        :param content: The banlist file content
+        :return: A dict: lowercase id => first banlist line matching that id
+        """
+        index = {}
+        for line in content.split('\n'):
+            words = line.split(None, 1)
+            if not words:
+                continue
+            word = words[0]
+            previous = _isWordChar(word[0])
+            for i in xrange(1, len(word)):
+                current = _isWordChar(word[i])
+                if current != previous:
+                    index.setdefault(word[:i].lower(), line)
+                previous = current
+            if previous:
+                index.setdefault(word.lower(), line)
+        return index
 
 
 class IpBanlist(Banlist):
 
     _forceRange = None
+    _reLeadingIp = re.compile(r'^[\d.]+')
 
     def __init__(self, plugin, config):
         """
@@ -513,6 +562,8 @@ class IpBanlist(Banlist):
         :param plugin: the banlist plugin instance
         :param config: the banlist plugin configuration file instance
         """
+        self._ips = {}
+        self._ranges = {}
         Banlist.__init__(self, plugin, config)
         # set specific settings
         node = config.find('force_ip_range')
@@ -541,43 +592,57 @@ class IpBanlist(Banlist):
             self.plugin.verbose(msg)
         return rv
 
+    def buildIndex(self, content):
+        """
+        Index the banlist entries: each line starting with an IP address (or a range written as an IP address ending
+        with .0) is indexed by that address, and by its first 3 bytes for the forced range lookups.
+        :param content: The banlist file content
+        """
+        ips = {}
+        ranges = {}
+        for line in content.split('\n'):
+            m = self._reLeadingIp.match(line)
+            if not m:
+                continue
+            parts = m.group().split('.')
+            if len(parts) < 4:
+                continue
+            entry = line.strip()
+            ips.setdefault('.'.join(parts[:4]), entry)
+            if 1 <= len(parts[3]) <= 3:
+                ranges.setdefault('.'.join(parts[:3]), entry)
+        self._ips = ips
+        self._ranges = ranges
+
     def isIpInBanlist(self, ip):
         # search the exact ip
-        rStrict = re.compile(r'''^(?P<entry>%s(?:[^\d\n\r].*)?)$''' % re.escape(ip), re.MULTILINE)
-        m = rStrict.search(self.file_content)
-        if m:
-            return ip, "ip '%s' matches banlist entry %r (%s %s)" % (ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
-
-        # search the ip with .0 at the end
-        rRange = re.compile(r'''^(?P<entry>%s\.0(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:3])), re.MULTILINE)
-        m = rRange.search(self.file_content)
-        if m:
-            return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
-
-        # search the ip with .0.0 at the end
-        rRange = re.compile(r'''^(?P<entry>%s\.0\.0(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:2])), re.MULTILINE)
-        m = rRange.search(self.file_content)
-        if m:
-            return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
-
-        # search the ip with .0.0.0 at the end
-        rRange = re.compile(r'''^(?P<entry>%s\.0\.0\.0(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:1])), re.MULTILINE)
-        m = rRange.search(self.file_content)
-        if m:
-            return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
+        entry = self._ips.get(ip)
+        if entry is not None:
+            return ip, "ip '%s' matches banlist entry %r (%s %s)" % (ip, entry, self.name, self.getHumanModifiedTime())
+
+        # search the ip with .0, .0.0 and .0.0.0 at the end
+        parts = ip.split('.')
+        for size, suffix in ((3, '.0'), (2, '.0.0'), (1, '.0.0.0')):
+            entry = self._ips.get('.'.join(parts[0:size]) + suffix)
+            if entry is not None:
+                return ip, "ip '%s' matches (by range) banlist entry %r (%s %s)" % (ip, entry, self.name, self.getHumanModifiedTime())
 
         # if force range is set, enforce search by range even if banlist ip are not ending with ".0"
         if self._forceRange:
-            rForceRange = re.compile(r'''^(?P<entry>%s\.\d{1,3}(?:[^\d\n\r].*)?)$''' % re.escape('.'.join(ip.split('.')[0:3])), re.MULTILINE)
-            m = rForceRange.search(self.file_content)
-            if m:
-                return ip, "ip '%s' matches (by forced range) banlist entry %r (%s %s)" % (ip, m.group('entry').strip(), self.name, self.getHumanModifiedTime())
+            entry = self._ranges.get('.'.join(parts[0:3]))
+            if entry is not None:
+                return ip, "ip '%s' matches (by forced range) banlist entry %r (%s %s)" % (ip, entry, self.name, self.getHumanModifiedTime())
 
         return False, "ip '%s' not found in banlist (%s %s)" % (ip, self.name, self.getHumanModifiedTime())
 
 
 class GuidBanlist(Banlist):
 
+    _guids = {}
+
+    def buildIndex(self, content):
+        self._guids = self.buildIdIndex(content)
+
     def isBanned(self, client):
         """
         Check whether a client is banned
@@ -598,15 +663,19 @@ class GuidBanlist(Banlist):
         return rv
 
     def isGuidInBanlist(self, guid):
-        re_guid = re.compile(r'''^(?P<entry>\s*%s\b.*)$''' % re.escape(guid), re.IGNORECASE | re.MULTILINE)
-        m = re_guid.search(self.file_content)
-        if m:
-            return guid, "guid '%s' matches banlist entry %r (%s %s)" % (guid, m.group('entry'), self.name, self.getHumanModifiedTime())
+        entry = self._guids.get(guid.lower())
+        if entry is not None:
+            return guid, "guid '%s' matches banlist entry %r (%s %s)" % (guid, entry, self.name, self.getHumanModifiedTime())
         return False, "guid '%s' not found in banlist (%s %s)" % (guid, self.name, self.getHumanModifiedTime())
 
 
 class PbidBanlist(Banlist):
 
+    _pbids = {}
+
+    def buildIndex(self, content):
+        self._pbids = self.buildIdIndex(content)
+
     def isBanned(self, client):
         """
         Check whether a client is banned
@@ -627,15 +696,24 @@ class PbidBanlist(Banlist):
         return rv
 
     def isPbidInBanlist(self, pbid):
-        re_guid = re.compile(r'''^(?P<entry>\s*%s\b.*)$''' % re.escape(pbid), re.IGNORECASE | re.MULTILINE)
-        m = re_guid.search(self.file_content)
-        if m:
-            return pbid, "PBid '%s' matches banlist entry %r (%s %s)" % (pbid, m.group('entry'), self.name, self.getHumanModifiedTime())
+        entry = self._pbids.get(pbid.lower())
+        if entry is not None:
+            return pbid, "PBid '%s' matches banlist entry %r (%s %s)" % (pbid, entry, self.name, self.getHumanModifiedTime())
         return False, "PBid '%s' not found in banlist (%s %s)" % (pbid, self.name, self.getHumanModifiedTime())
 
 
 class RocBanlist(Banlist):
 
+    _bannedIds = frozenset()
+    _reBannedId = re.compile(r'BannedID="(?P<id>[^"]*)"')
+
+    def readFile(self):
+        with codecs.open(self.file, "r", "iso-8859-1") as f:
+            return f.read()
+
+    def buildIndex(self, content):
+        self._bannedIds = frozenset(m.group('id') for m in self._reBannedId.finditer(content))
+
     def isBanned(self, client):
         """
         Check whether a client is banned
@@ -643,20 +721,21 @@ class RocBanlist(Banlist):
         if not client.guid:
             return False
 
-        if not self._checkFileExists():
-            return False
-
-        f = codecs.open(self.file, "r", "iso-8859-1" )
-        banlist=f.read()
+        self.refreshBanlistContent()
         self.plugin.debug(u"checking %s" % client.guid)
-        if u'BannedID="%s"' % client.guid in banlist:
-            f.close()
+        if client.guid in self._bannedIds:
             return client.guid
 
-        f.close()
         return False
 
 
+def _isWordChar(char):
+    """
+    Tell whether a character is matched by \\w in regular expressions.
+    """
+    return char.isalnum() or char == '_'
+
+
 class BanlistException(Exception):
     def __init__(self, value):
         self.parameter = value
@@ -16,13 +16,14 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'ThorN, xlr8or, Bravo17, Courgette'
-__version__ = '3.3'
+__version__ = '3.4.2'
 
 import b3
 import re
+import sre_constants
+import sre_parse
 import traceback
 import sys
-import threading
 import b3.events
 import b3.plugin
 
@@ -56,6 +57,7 @@ class CensorData:
     name = None
     penalty = None
     regexp = None
+    word = None
 
     def __init__(self, **kwargs):
         for k, v in kwargs.iteritems():
@@ -65,6 +67,150 @@ class CensorData:
         return """CensorData(name=%r, penalty=%r, regexp=%r)""" % (self.name, self.penalty, self.regexp)
 
 
+class CensorMatcher(object):
+    """
+    Match a text against a whole list of censor rules at once, reporting the same rule the rules would report if
+    they were tried one after the other (the first rule of the list matching the raw text or the cleaned text wins).
+
+    Plain word rules (which match the word surrounded by whitespaces) are looked up in a dict of words using the
+    whitespace separated tokens of the text. Regular expression rules requiring a literal string to match are only
+    tried when the text contains that string. The remaining regular expression rules are joined into a few
+    alternations used as a filter: when none of them matches, none of those rules can match. Rules passing the
+    filters are then tried individually, in order, until one matches.
+    """
+    _maxGroups = 90  # python re patterns are limited to 100 groups
+    _minLiteral = 2
+    _reFlags = re.compile(r'\(\?[iLmsux]+\)')
+    _reUncombinable = re.compile(r'\\[1-9]|\(\?P[<=]|\(\?[iLmsux]+\)')
+
+    def __init__(self, rules):
+        """
+        Object constructor.
+        :param rules: The list of CensorData to match
+        """
+        self.rules = rules
+        self.size = len(rules)
+        self._words = {}  # lowercase word => index of the first rule matching it
+        self._literals = []  # list of (lowercase literal required by the rule, rule index)
+        self._chunks = []  # list of (compiled alternation, {group number: rule index}, [rule indexes])
+        self._single = []  # indexes of the regular expression rules which are always tried
+        pending = []
+        for index, rule in enumerate(rules):
+            if rule.word is not None and re.escape(rule.word) == rule.word:
+                self._words.setdefault(rule.word.lower(), index)
+                continue
+            literal = '' if self._reFlags.search(rule.regexp.pattern) else self.getRequiredLiteral(rule.regexp.pattern)
+            if len(literal) >= self._minLiteral:
+                self._literals.append((literal, index))
+            elif self._reUncombinable.search(rule.regexp.pattern):
+                self._single.append(index)
+            else:
+                if pending and sum(rules[i].regexp.groups + 1 for i in pending) + rule.regexp.groups + 1 > \
+                        self._maxGroups:
+                    self._addChunk(pending)
+                    pending = []
+                pending.append(index)
+        if pending:
+            self._addChunk(pending)
+
+    @staticmethod
+    def getRequiredLiteral(pattern):
+        """
+        Return the longest string any text matched by the given regular expression contains (lowercased).
+        :param pattern: The regular expression
+        """
+        def collect(items, found):
+            run = []
+            for op, av in items:
+                if op == sre_constants.LITERAL and 32 < av < 127:
+                    run.append(chr(av).lower())
+                    continue
+                found.append(''.join(run))
+                run = []
+                if op == sre_constants.SUBPATTERN:
+                    collect(av[-1], found)
+                elif op in (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT) and av[0] >= 1:
+                    collect(av[2], found)
+            found.append(''.join(run))
+            return found
+
+        try:
+            return max(collect(sre_parse.parse(pattern), []), key=len)
+        except Exception:
+            return ''
+
+    def _addChunk(self, indexes):
+        """
+        Join the given regular expression rules into a single alternation.
+        :param indexes: The indexes of the rules to join
+        """
+        groups = {}
+        group = 1
+        for index in indexes:
+            groups[group] = index
+            group += self.rules[index].regexp.groups + 1
+        try:
+            pattern = re.compile('|'.join('(%s)' % self.rules[i].regexp.pattern for i in indexes), re.IGNORECASE)
+        except (re.error, AssertionError, OverflowError):
+            self._single.extend(indexes)
+            self._single.sort()
+        else:
+            self._chunks.append((pattern, groups, indexes))
+
+    def isFor(self, rules):
+        """
+        Tell whether this matcher was built out of the given list of rules.
+        """
+        return rules is self.rules and len(rules) == self.size
+
+    def search(self, text, cleaned):
+        """
+        Find the first rule matching the raw text or the cleaned text.
+        :param text: The raw text
+        :param cleaned: The cleaned text
+        :return: A tuple (rule, matching text) or None
+        """
+        best = len(self.rules)
+        candidates = set()
+
+        if self._words:
+            for data in (text, cleaned):
+                for token in data.split():
+                    index = self._words.get(token.lower())
+                    if index is not None:
+                        candidates.add(index)
+
+        if self._literals:
+            lowered = text.lower() + '\n' + cleaned.lower()
+            candidates.update(index for literal, index in self._literals if literal in lowered)
+
+        for pattern, groups, indexes in self._chunks:
+            if indexes[0] >= best:
+                break
+            for data in (text, cleaned):
+                m = pattern.search(data)
+                if m:
+                    index = groups.get(m.lastindex)
+                    if index is None:
+                        # should not happen: try the whole chunk
+                        candidates.update(indexes)
+                    else:
+                        best = min(best, index)
+                        candidates.update(i for i in indexes if i <= best)
+
+        candidates.update(i for i in self._single if i < best)
+
+        for index in sorted(candidates):
+            if index > best:
+                break
+            rule = self.rules[index]
+            if rule.regexp.search(text):
+                return rule, text
+            if rule.regexp.search(cleaned):
+                return rule, cleaned
+        return None
+
+
 class CensorPlugin(b3.plugin.Plugin):
 
     _adminPlugin = None
@@ -75,8 +221,11 @@ class CensorPlugin(b3.plugin.Plugin):
     _ignoreLength = 3
     _badWords = None
     _badNames = None
+    _badWordsMatcher = None
+    _badNamesMatcher = None
 
     loadAfterPlugins = ['chatlogger']
+    vetoesEvents = True
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -184,7 +333,7 @@ class CensorPlugin(b3.plugin.Plugin):
         elif word is not None:
             # has a plain word
             self._badWords.append(self._get_censor_data(rulename, '\\s' + word.strip() + '\\s',
-                                                        penalty, self._defaultBadWordPenalty))
+                                                        penalty, self._defaultBadWordPenalty, word=word.strip()))
             self.debug("badword rule '%s' loaded" % rulename)
 
     def _add_bad_name(self, rulename, penalty=None, word=None, regexp=None):
@@ -206,10 +355,10 @@ class CensorPlugin(b3.plugin.Plugin):
         elif word is not None:
             # has a plain word
             self._badNames.append(self._get_censor_data(rulename, '\\s' + word.strip() + '\\s',
-                                                        penalty, self._defaultBadNamePenalty))
+                                                        penalty, self._defaultBadNamePenalty, word=word.strip()))
             self.debug("badname rule '%s' loaded" % rulename)
 
-    def _get_censor_data(self, name, regexp, penalty, default):
+    def _get_censor_data(self, name, regexp, penalty, default, word=None):
         try:
             regexp = re.compile(regexp, re.IGNORECASE)
         except re.error:
@@ -224,7 +373,7 @@ class CensorPlugin(b3.plugin.Plugin):
         else:
             pd = default
 
-        return CensorData(name=name, penalty=pd, regexp=regexp)
+        return CensorData(name=name, penalty=pd, regexp=regexp, word=word)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -281,6 +430,22 @@ class CensorPlugin(b3.plugin.Plugin):
         self._adminPlugin.penalizeClient(penalty.type, client, penalty.reason,
                                          penalty.keyword, penalty.duration, None, data)
 
+    def getBadWordsMatcher(self):
+        """
+        Return the matcher built out of the current badword rules.
+        """
+        if self._badWordsMatcher is None or not self._badWordsMatcher.isFor(self._badWords):
+            self._badWordsMatcher = CensorMatcher(self._badWords)
+        return self._badWordsMatcher
+
+    def getBadNamesMatcher(self):
+        """
+        Return the matcher built out of the current badname rules.
+        """
+        if self._badNamesMatcher is None or not self._badNamesMatcher.isFor(self._badNames):
+            self._badNamesMatcher = CensorMatcher(self._badNames)
+        return self._badNamesMatcher
+
     def checkBadName(self, client):
         """
         Check a client for a badname
@@ -294,22 +459,19 @@ class CensorPlugin(b3.plugin.Plugin):
         self.info("checking '%s'=>'%s' for badname" % (client.exactName, cleaned_name))
 
         was_penalized = False
-        for w in self._badNames:
-            if w.regexp.search(client.exactName):
+        match = self.getBadNamesMatcher().search(client.exactName, cleaned_name)
+        if match:
+            w, matched = match
+            if matched is client.exactName:
                 self.debug("badname rule [%s] matches '%s'" % (w.name, client.exactName))
-                self.penalizeClientBadname(w.penalty, client, '%s (rule %s)' % (client.exactName, w.name))
-                was_penalized = True
-                break
-            if w.regexp.search(cleaned_name):
+            else:
                 self.debug("badname rule [%s] matches cleaned name '%s' for player '%s'" % (w.name, cleaned_name, client.exactName))
-                self.penalizeClientBadname(w.penalty, client, '%s (rule %s)' % (client.exactName, w.name))
-                was_penalized = True
-                break
+            self.penalizeClientBadname(w.penalty, client, '%s (rule %s)' % (client.exactName, w.name))
+            was_penalized = True
 
         if was_penalized:
             # check again in 1 minute
-            t = threading.Timer(60, self.checkBadName, (client,))
-            t.start()
+            self.console.timers.schedule(60, self.checkBadName, (client,), client=client)
             return
 
     def checkBadWord(self, text, client):
@@ -321,15 +483,16 @@ class CensorPlugin(b3.plugin.Plugin):
         cleaned = ' ' + self.clean(text) + ' '
         text = ' ' + text + ' '
         self.debug("cleaned text: [%s]" % cleaned)
-        for w in self._badWords:
-            if w.regexp.search(text):
+        match = self.getBadWordsMatcher().search(text, cleaned)
+        if match:
+            w, matched = match
+            if matched is text:
                 self.debug("badword rule [%s] matches '%s'" % (w.name, text))
                 self.penalizeClient(w.penalty, client, text)
-                raise b3.events.VetoEvent
-            if w.regexp.search(cleaned):
+            else:
                 self.debug("badword rule [%s] matches cleaned text '%s'" % (w.name, cleaned))
                 self.penalizeClient(w.penalty, client, '%s => %s' % (text, cleaned))
-                raise b3.events.VetoEvent
+            raise b3.events.VetoEvent
 
     def clean(self, data):
         return re.sub(self._reClean, ' ', self.console.stripColors(data.lower()))
\ No newline at end of file
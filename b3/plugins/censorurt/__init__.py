@@ -15,9 +15,8 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'xlr8or & courgette'
-__version__ = '0.2'
+__version__ = '0.3'
 
-import threading
 from b3.plugins.censor import CensorPlugin
 
 
@@ -98,8 +97,8 @@ class CensorurtPlugin(CensorPlugin):
                                                          {'playername': client.name, 'duration': self._muteduration1}))
                         self.console.write('mute %s' % client.cid)
                         client.langMuted = True
-                        t = threading.Timer(self._muteduration1 * 60, self.unmutePlayer, (client,))
-                        t.start()
+                        self.console.timers.schedule(self._muteduration1 * 60, self.unmutePlayer, (client,),
+                                                     client=client)
                 elif client.langWarnings == 2:
                     if self._muteduration2 != 0:
                         self.debug('Muting %s for %s minutes.' % (client.name, self._muteduration2))
@@ -107,16 +106,16 @@ class CensorurtPlugin(CensorPlugin):
                                                          {'playername': client.name, 'duration': self._muteduration2}))
                         self.console.write('mute %s' % client.cid)
                         client.langMuted = True
-                        t = threading.Timer(self._muteduration2 * 60, self.unmutePlayer, (client,))
-                        t.start()
+                        self.console.timers.schedule(self._muteduration2 * 60, self.unmutePlayer, (client,),
+                                                     client=client)
                 else:
                     self.debug('Muting %s for %s minutes.' % (client.name, self._muteduration3))
                     self.console.say(self.getMessage('mute_announcement',
                                                      {'playername': client.name, 'duration': self._muteduration3}))
                     self.console.write('mute %s' % client.cid)
                     client.langMuted = True
-                    t = threading.Timer(self._muteduration3 * 60, self.unmutePlayer, (client,))
-                    t.start()
+                    self.console.timers.schedule(self._muteduration3 * 60, self.unmutePlayer, (client,),
+                                                 client=client)
 
                 if client.langWarnings > self._warnafter:
                     self._adminPlugin.penalizeClient(penalty.type, client, penalty.reason, penalty.keyword, penalty.duration, None, data)
@@ -27,12 +27,14 @@ from b3.config import ConfigParser
 from b3.timezones import timezones
 from logging.handlers import TimedRotatingFileHandler
 
-__version__ = '1.5'
+__version__ = '1.6.1'
 __author__ = 'Courgette, xlr8or, BlackMamba, OliverWieland'
 
 
 class ChatloggerPlugin(Plugin):
 
+    threadSafe = True
+
     _cronTab = None
     _max_age_in_days = None
     _max_age_cmd_in_days = None
@@ -347,18 +349,21 @@ class AbstractData(object):
 
     def _save2db(self, data):
         q = self._insertquery()
-        try:
-            cursor = self.plugin.console.storage.query(q, data)
+        # do not hold the event thread while the row is inserted: rows of the same table keep their order
+        future = self.plugin.console.storage.submit(q, data, key=self._table)
+        future.add_done_callback(self._saved2db)
+
+    def _saved2db(self, future):
+        e = future.exception()
+        if e is None:
+            cursor = future.result()
             if cursor.rowcount > 0:
                 self.plugin.debug("rowcount: %s, id:%s" % (cursor.rowcount, cursor.lastrowid))
             else:
                 self.plugin.warning("inserting into %s failed" % self._table)
-        except Exception, e:
-            if e[0] == 1146:
-                self.plugin.error("could not save to database : %s" % e[1])
-                self.plugin.info("refer to this plugin readme file for instruction on how to create the required tables")
-            else:
-                raise e
+        elif e.args and e.args[0] == 1146:
+            self.plugin.error("could not save to database : %s" % e.args[1])
+            self.plugin.info("refer to this plugin readme file for instruction on how to create the required tables")
 
 
 class CmdData(AbstractData):
@@ -15,7 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.7'
+__version__ = '1.7.1'
 __author__ = 'guwashi / xlr8or'
 
 import b3
@@ -26,6 +26,7 @@ import b3.plugin
 class CountryfilterPlugin(b3.plugin.Plugin):
 
     requiresPlugins = ['geolocation']
+    vetoesEvents = True
 
     cf_announce_accept = True
     cf_announce_reject = True
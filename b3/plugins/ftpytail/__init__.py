@@ -15,7 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
  
-__version__ = '1.10'
+__version__ = '1.11'
 __author__ = 'Bakes, Courgette'
 
 import b3
@@ -28,13 +28,14 @@ import time
 from ConfigParser import NoOptionError
 from ftplib import FTP
 from b3 import functions
+from b3.logtailer import PollDelay
+from b3.logtailer import RemoteLogWriter
 
 
 class FtpytailPlugin(b3.plugin.Plugin):
 
     requiresConfigFile = False
-    buffer = None
-    file = None
+    writer = None
     ftpconfig = None
     lgame_log = None
     url_path = None
@@ -57,6 +58,8 @@ class FtpytailPlugin(b3.plugin.Plugin):
     _ftplib_debug_level = 0         # 0: no debug, 1: normal debug, 2: extended debug
     
     _gamelog_read_delay = 0.150
+    _gamelog_max_delay = 2.0
+    _pollDelay = None
     _use_windows_cache_fix = False
     _cache_refresh_delay = 1
 
@@ -72,23 +75,35 @@ class FtpytailPlugin(b3.plugin.Plugin):
         """
         if self.console.config.has_option('server', 'delay'):
             self._gamelog_read_delay = self.console.config.getfloat('server', 'delay')
-        
-        if self.console.config.has_option('server', 'local_game_log'):
-            self.lgame_log = self.console.config.getpath('server', 'local_game_log')
-        else:
-            self.lgame_log = os.path.normpath(os.path.expanduser(self.console.input.name))
 
-        self.lgame_log = b3.getWritableFilePath(self.lgame_log)
-        self.debug('local game log is: %s' % self.lgame_log)
+        try:
+            self._gamelog_max_delay = self.console.config.getfloat('server', 'remote_log_max_delay')
+        except NoOptionError:
+            pass
+        except ValueError, e:
+            self.error('could not load server/remote_log_max_delay config value from B3 config file: %s' % e)
+
+        self._pollDelay = PollDelay(self._gamelog_read_delay, self._gamelog_max_delay)
+
+        if self.console.getLogStream() is None:
+            if self.console.config.has_option('server', 'local_game_log'):
+                self.lgame_log = self.console.config.getpath('server', 'local_game_log')
+            else:
+                self.lgame_log = os.path.normpath(os.path.expanduser(self.console.input.name))
+
+            self.lgame_log = b3.getWritableFilePath(self.lgame_log)
+            self.debug('local game log is: %s' % self.lgame_log)
+        else:
+            self.debug('streaming the remote game log to the parser')
 
-        if self.console.config.get('server', 'game_log')[0:6] == 'ftp://':
-            self.init_thread(self.console.config.get('server', 'game_log'))
-            
         if self.console.config.has_option('server', 'log_append'):
             self._logAppend = self.console.config.getboolean('server', 'log_append')
         else:
             self._logAppend = False
-    
+
+        if self.console.config.get('server', 'game_log')[0:6] == 'ftp://':
+            self.init_thread(self.console.config.get('server', 'game_log'))
+
     def onLoadConfig(self):
         """
         Load plugin configuration.
@@ -190,28 +205,19 @@ class FtpytailPlugin(b3.plugin.Plugin):
 
     def update(self):
         """
-        Update the local log file.
+        Download the remote game log data.
         """
-        def handle_download(block):
-            #self.debug('received %s bytes' % len(block))
-            self._remoteFileOffset += len(block)
-            if self.buffer is None:
-                self.buffer = block
-            else:
-                self.buffer = self.buffer + block
-        
         def force_windows_cache_reload(_):
             # no need to do anything here so
             return
             
         ftp = None
-        self.file = open(self.lgame_log, 'ab')
-        self.file.write('\r\n')
-        self.file.write('B3 has been restarted\r\n')
-        self.file.write('\r\n')
+        self.writer = RemoteLogWriter(self.console.getLogStream(), self.lgame_log, self._logAppend)
 
         while self.console.working:
 
+            received = 0
+
             try:
 
                 if not ftp:
@@ -224,62 +230,22 @@ class FtpytailPlugin(b3.plugin.Plugin):
                         break
                     else:
                         self._nbConsecutiveConnFailure = 0
-                        remotesize = ftp.size(os.path.basename(self.url_path))
-                        self.verbose("connection successful: remote file size is %s" % remotesize)
-                        if self._remoteFileOffset is None:
-                            self._remoteFileOffset = remotesize
                         
-                if self._use_windows_cache_fix:
+                if self._use_windows_cache_fix and self._remoteFileOffset is not None:
                     time.sleep(self._cache_refresh_delay)
                     ftp.retrbinary('RETR ' + os.path.basename(self.url_path),
                                    force_windows_cache_reload, 1,
                                    rest=self._remoteFileOffset)
-                    
-                remotesize = ftp.size(os.path.basename(self.url_path))
-                if remotesize < self._remoteFileOffset:
-                    self.debug("remote file rotation detected")
-                    self._remoteFileOffset = 0
-                if remotesize > self._remoteFileOffset:
-                    if (remotesize - self._remoteFileOffset) > self._maxGap:
-                        gap = remotesize - self._remoteFileOffset
-                        self.debug('gap between local and remote file too large (%s bytes)', gap)
-                        self.debug('downloading only the last %s bytes' % self._maxGap)
-                        self._remoteFileOffset = remotesize - self._maxGap
-                    #self.debug('RETR from remote offset %s. (expecting to read at least %s '
-                    #           'bytes)' % (self._remoteFileOffset, remoteSize - self._remoteFileOffset))
-                    ftp.retrbinary('RETR ' + os.path.basename(self.url_path),
-                                   handle_download,
-                                   rest=self._remoteFileOffset)
 
-                    if self.buffer:
-                        self.file.write(self.buffer)
-                        self.buffer = None
-                        self.file.flush()
-
-                    if self.console._paused:
-                        self.console.unpause()
-                        self.debug('unpausing')
+                received = self.download(ftp)
 
             except ftplib.all_errors, e:
                 self.debug(str(e))
                 self._nbConsecutiveConnFailure += 1
                 if self.console._paused is False:
                     self.console.pause()
-                self.file.close()
                 self.debug('FTP error: resetting local log file?')
-                if self._logAppend:
-                    try:
-                        self.file = open(self.lgame_log, 'ab')
-                        self.file.write('\r\n')
-                        self.file.write('B3 has restarted writing the log file\r\n')
-                        self.file.write('\r\n')
-                    except IOError:
-                        self.file = open(self.lgame_log, 'w')
-                else:
-                    self.file = open(self.lgame_log, 'w')
-
-                self.file.close()
-                self.file = open(self.lgame_log, 'ab')
+                self.writer.reset()
 
                 try:
                     ftp.close()
@@ -294,7 +260,9 @@ class FtpytailPlugin(b3.plugin.Plugin):
                 else:
                     self.debug('too many failures: sleeping %s sec' % self._long_delay)
                     time.sleep(self._long_delay)
-            time.sleep(self._gamelog_read_delay)
+
+            # poll again soon while the game log grows, slow down while it does not
+            time.sleep(self._pollDelay.update(received))
 
         self.verbose("stopping Ftpytail update thread")
 
@@ -303,9 +271,51 @@ class FtpytailPlugin(b3.plugin.Plugin):
         except Exception:
             pass
         try:
-            self.file.close()
+            self.writer.close()
         except Exception:
             pass
+
+    def download(self, ftp):
+        """
+        Download the data appended to the remote game log since the last call.
+        Received blocks are passed on as they come: a large catch-up is never held in memory at once.
+        :param ftp: The FTP connection
+        :return: The amount of bytes received
+        """
+        filename = os.path.basename(self.url_path)
+        remotesize = ftp.size(filename)
+        if self._remoteFileOffset is None:
+            self.verbose("remote file size is %s" % remotesize)
+            self._remoteFileOffset = remotesize
+        if remotesize < self._remoteFileOffset:
+            self.debug("remote file rotation detected")
+            self._remoteFileOffset = 0
+            self.writer.skip()
+        if remotesize == self._remoteFileOffset:
+            return 0
+        if (remotesize - self._remoteFileOffset) > self._maxGap:
+            gap = remotesize - self._remoteFileOffset
+            self.debug('gap between local and remote file too large (%s bytes)', gap)
+            self.debug('downloading only the last %s bytes' % self._maxGap)
+            self._remoteFileOffset = remotesize - self._maxGap
+            self.writer.skip(aligned=False)
+
+        if self.console._paused:
+            # unpause first: the parser skips what was received while paused
+            self.console.unpause()
+            self.debug('unpausing')
+
+        start = self._remoteFileOffset
+        ftp.retrbinary('RETR ' + filename, self.handle_download, rest=self._remoteFileOffset)
+        return self._remoteFileOffset - start
+
+    def handle_download(self, block):
+        """
+        Pass on a block of the remote game log.
+        :param block: The received bytes
+        """
+        self._remoteFileOffset += len(block)
+        self.writer.write(block)
     
     def ftpconnect(self):
         self.verbose('connecting to %s:%s ...' % (self.ftpconfig["host"], self.ftpconfig["port"]))
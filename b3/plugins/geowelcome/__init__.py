@@ -15,11 +15,10 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.3.1'
+__version__ = '1.3.2'
 __author__  = 'SGT'
 
 import time
-import threading
 
 from b3.functions import getCmd
 from b3.plugins.welcome import WelcomePlugin
@@ -101,16 +100,14 @@ class GeowelcomePlugin(WelcomePlugin):
         Handle EVT_CLIENT_GEOLOCATION_SUCCESS
         """
         if self.must_welcome(event.client):
-            t = threading.Timer(self._welcomeDelay, self.geowelcome, (event.client,))
-            t.start()
+            self.console.timers.schedule(self._welcomeDelay, self.geowelcome, (event.client,), client=event.client)
 
     def onGeolocationFailure(self, event):
         """
         Handle EVT_CLIENT_GEOLOCATION_FAILURE
         """
         if self.must_welcome(event.client):
-            t = threading.Timer(self._welcomeDelay, self.welcome, (event.client,))
-            t.start()
+            self.console.timers.schedule(self._welcomeDelay, self.welcome, (event.client,), client=event.client)
 
     ####################################################################################################################
     #                                                                                                                  #
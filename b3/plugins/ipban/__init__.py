@@ -15,13 +15,16 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.3.0'
+__version__ = '1.4.0'
 __author__ = 'xlr8or'
 
 import b3
+import b3.cron
 import b3.events
+import b3.functions
 import b3.lib
 import b3.plugin
+import threading
 
 from time import time
 from ConfigParser import NoOptionError
@@ -31,6 +34,20 @@ class IpbanPlugin(b3.plugin.Plugin):
 
     _adminPlugin = None
     _maxLevel = 1
+    _reconcileInterval = 10
+    _cronTab = None
+
+    def __init__(self, console, config=None):
+        """
+        Object constructor.
+        :param console: The console instance
+        :param config: The plugin configuration
+        """
+        b3.plugin.Plugin.__init__(self, console, config)
+        self._lock = threading.Lock()
+        self._banIps = set()  # ips having an active ban
+        self._tempBanIps = {}  # ips having an active tempban => tempban expiration time
+        self._journal = None  # ban changes notified while the index is being reloaded
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -56,8 +73,21 @@ class IpbanPlugin(b3.plugin.Plugin):
             # don't use EVT_CLIENT_CONNECT since we need the client group for level exclusion
             self.registerEvent('EVT_CLIENT_AUTH', self.onPlayerConnect)
 
-        self.debug('banned ips: %s' % self.getBanIps())
-        self.debug('banned ips: %s' % self.getTempBanIps())
+        self.registerEvent('EVT_CLIENT_BAN', self.onBan)
+        self.registerEvent('EVT_CLIENT_BAN_TEMP', self.onTempBan)
+        self.registerEvent('EVT_CLIENT_UNBAN', self.onUnban)
+
+        self.loadBans()
+        self.debug('banned ips: %s' % sorted(self._banIps))
+        self.debug('tempbanned ips: %s' % sorted(self._tempBanIps))
+
+        if self._cronTab:
+            self.console.cron - self._cronTab
+            self._cronTab = None
+        if self._reconcileInterval > 0:
+            self._cronTab = b3.cron.PluginCronTab(self, self.loadBans, minute='*/%s' % self._reconcileInterval)
+            self.console.cron + self._cronTab
+
         self.debug('plugin started')
 
     def onLoadConfig(self):
@@ -65,6 +95,8 @@ class IpbanPlugin(b3.plugin.Plugin):
         Load plugin configuration
         """
         self._maxLevel = self.getSetting('settings', 'maxlevel', b3.LEVEL, self._maxLevel)
+        self._reconcileInterval = self.getSetting('settings', 'reconcile_interval', b3.INT, self._reconcileInterval,
+                                                  lambda x: max(0, min(59, x)))
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -83,21 +115,112 @@ class IpbanPlugin(b3.plugin.Plugin):
         else:
             self.debug('checking player: <cid:%s,name:%s,ip:%s>' % (client.cid, client.name, client.ip))
             # check for active bans and tempbans
-            if client.ip in self.getBanIps():
+            if self.isBanned(client.ip):
                 self.debug('client refused: <cid:%s,name:%s,ip:%s>' % (client.cid, client.name, client.ip))
                 client.kick('IPBan: client refused: %s (%s) has an active Ban' % (client.ip, client.name))
-            elif client.ip in self.getTempBanIps():
+            elif self.isTempBanned(client.ip):
                 self.debug('client refused: <cid:%s,name:%s,ip:%s>' % (client.cid, client.name, client.ip))
                 client.kick('IPBan: client refused: %s (%s) has an active TempBan' % (client.ip, client.name))
             else:
                 self.debug('client accepted (no active Ban/TempBan found): <cid:%s,name:%s,ip:%s>' % (client.cid, client.name, client.ip))
 
+    def onBan(self, event):
+        """
+        Handle EVT_CLIENT_BAN.
+        """
+        if event.client and event.client.ip:
+            self._apply('ban', event.client.ip)
+
+    def onTempBan(self, event):
+        """
+        Handle EVT_CLIENT_BAN_TEMP.
+        """
+        if event.client and event.client.ip:
+            try:
+                duration = b3.functions.time2minutes(event.data['duration'])
+            except (KeyError, TypeError, ValueError):
+                duration = 0
+            if duration > 0:
+                self._apply('tempban', event.client.ip, time() + duration * 60)
+            else:
+                # unknown duration: wait for the next reconciliation with the database
+                self.debug('no tempban duration found in event data: %r' % event.data)
+
+    def onUnban(self, event):
+        """
+        Handle EVT_CLIENT_UNBAN.
+        """
+        if event.client and event.client.ip:
+            self._apply('unban', event.client.ip)
+
     ####################################################################################################################
     #                                                                                                                  #
     #   OTHER METHODS                                                                                                  #
     #                                                                                                                  #
     ####################################################################################################################
 
+    def isBanned(self, ip):
+        """
+        Tell whether the given IP has an active ban.
+        """
+        return ip in self._banIps
+
+    def isTempBanned(self, ip):
+        """
+        Tell whether the given IP has an active tempban.
+        """
+        return self._tempBanIps.get(ip, 0) > time()
+
+    def loadBans(self):
+        """
+        (Re)load the banned and tempbanned IPs from the database.
+        Ban changes notified while the database is being queried are applied again on top of the loaded data.
+        """
+        with self._lock:
+            self._journal = []
+        try:
+            ban_ips = set(self.getBanIps())
+            tempban_ips = self.getTempBans()
+        except Exception, e:
+            self.error('could not load banned IPs: %s' % e)
+            with self._lock:
+                self._journal = None
+            return
+
+        with self._lock:
+            journal, self._journal = self._journal, None
+            for change in journal:
+                self._applyTo(ban_ips, tempban_ips, *change)
+            if ban_ips != self._banIps or set(tempban_ips) != set(self._tempBanIps):
+                self.verbose('banned IPs reloaded: %s bans, %s tempbans' % (len(ban_ips), len(tempban_ips)))
+            self._banIps = ban_ips
+            self._tempBanIps = tempban_ips
+
+    def _apply(self, change, ip, expire=None):
+        """
+        Apply a ban change to the in-memory index.
+        :param change: 'ban', 'tempban' or 'unban'
+        :param ip: The IP address
+        :param expire: The tempban expiration time
+        """
+        with self._lock:
+            if self._journal is not None:
+                self._journal.append((change, ip, expire))
+            self._applyTo(self._banIps, self._tempBanIps, change, ip, expire)
+
+    @staticmethod
+    def _applyTo(ban_ips, tempban_ips, change, ip, expire=None):
+        """
+        Apply a ban change to the given IP set and tempban dict.
+        """
+        if change == 'ban':
+            ban_ips.add(ip)
+        elif change == 'tempban':
+            tempban_ips[ip] = max(expire, tempban_ips.get(ip, 0))
+        elif change == 'unban':
+            ban_ips.discard(ip)
+            tempban_ips.pop(ip, None)
+
     def getBanIps(self):
         """
         Returns a list of banned IPs
@@ -117,14 +240,20 @@ class IpbanPlugin(b3.plugin.Plugin):
         """
         Returns a list of TempBanned IPs
         """
-        banned = []
-        cursor = self.console.storage.query("SELECT clients.ip AS target_ip FROM penalties INNER JOIN clients ON "
-                                            "penalties.client_id = clients.id WHERE penalties.type = 'TempBan' AND "
-                                            "penalties.inactive = 0 AND penalties.time_expire > %s "
-                                            "GROUP BY clients.ip" % int(time()))
+        return self.getTempBans().keys()
+
+    def getTempBans(self):
+        """
+        Returns a dict of TempBanned IPs => tempban expiration time
+        """
+        banned = {}
+        cursor = self.console.storage.query("SELECT clients.ip AS target_ip, MAX(penalties.time_expire) AS expire "
+                                            "FROM penalties INNER JOIN clients ON penalties.client_id = clients.id "
+                                            "WHERE penalties.type = 'TempBan' AND penalties.inactive = 0 AND "
+                                            "penalties.time_expire > %s GROUP BY clients.ip" % int(time()))
         if cursor:
             while not cursor.EOF:
-                banned.append(cursor.getValue('target_ip'))
+                banned[cursor.getValue('target_ip')] = int(cursor.getValue('expire'))
                 cursor.moveNext()
         cursor.close()
         return banned
\ No newline at end of file
@@ -16,7 +16,7 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'Fenix'
-__version__ = '2.31'
+__version__ = '2.32'
 
 import b3
 import b3.plugin
@@ -31,7 +31,6 @@ from b3.functions import getCmd
 from b3.functions import getStuffSoundingLike
 from b3.functions import right_cut
 from ConfigParser import NoOptionError
-from threading import Timer
 
 ########################################################################################################################
 #                                                                                                                      #
@@ -561,9 +560,7 @@ class JumperPlugin(b3.plugin.Plugin):
             self._maps_data_from_api = maps_data_from_api
 
         # welcome the clients on the new level
-        thread = Timer(30.0, self.welcomeClients, (event.data['new'].lower(),))
-        thread.setDaemon(True)
-        thread.start()
+        self.console.timers.schedule(30, self.welcomeClients, (event.data['new'].lower(),))
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -18,7 +18,7 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 #
 
-__version__ = '1.8'
+__version__ = '1.9'
 __author__ = 'Thomas LÉVEIL'
 
 
@@ -233,7 +233,7 @@ class MakeroomPlugin(Plugin):
                 except ConfigParser.NoOptionError:
                     info_message = "Making room for clan member, please come back again"
                 self.console.say(info_message)
-                threading.Timer(self._delay, self._free_a_slot, (client, )).start()
+                self.console.timers.schedule(self._delay, self._free_a_slot, (client, ))
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -294,8 +294,9 @@ class MakeroomPlugin(Plugin):
                 if self._delay == 0:
                     last_connected_client.kick(reason=kick_reason, keyword="makeroom", silent=True)
                 else:
-                    threading.Timer(self._delay, last_connected_client.kick, (),
-                                    {'reason': kick_reason, 'keyword': "makeroom", 'silent': True}).start()
+                    self.console.timers.schedule(self._delay, last_connected_client.kick, (),
+                                                 {'reason': kick_reason, 'keyword': "makeroom", 'silent': True},
+                                                 client=last_connected_client)
             else:
                 self.info("someone will be kicked")
                 self.cmd_makeroom()
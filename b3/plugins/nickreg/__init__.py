@@ -15,7 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '2.1'
+__version__ = '2.2'
 __author__  = 'Ismael, SGT, Fenix'
 
 import b3
@@ -27,12 +27,15 @@ import os
 import thread
 
 from b3.functions import clamp
+from b3.storage.nameindex import NameIndex
 
 class NickregPlugin(b3.plugin.Plugin):
 
     adminPlugin = None
     crontab = None
     ignore_till = 0
+    nicks = None
+    nicks_index = None
 
     interval = 30
     min_level = 20
@@ -68,6 +71,9 @@ class NickregPlugin(b3.plugin.Plugin):
             sql_path = os.path.join(sql_path_main, self.console.storage.dsnDict['protocol'], 'nickreg.sql')
             self.console.storage.queryFromFile(sql_path)
 
+        # keep the registered nicknames in memory
+        self.load_nicks()
+
         # register our commands
         self.adminPlugin.registerCommand(self, 'registernick', self.min_level, self.cmd_regnick,  'regnick')
         self.adminPlugin.registerCommand(self, 'deletenick', self.min_level, self.cmd_delnick,  'delnick')
@@ -93,6 +99,8 @@ class NickregPlugin(b3.plugin.Plugin):
         """
         # on a new map wait skip the first self.interval seconds of name checks
         self.ignore_till = self.console.time() + self.interval
+        # pick up the nicknames registered or deleted by other applications sharing the database
+        self.load_nicks()
 
     def on_client_name_change(self,  event):
         """
@@ -140,6 +148,36 @@ class NickregPlugin(b3.plugin.Plugin):
         """
         return b3.functions.escape(self.console.stripColors(name).lower(), "'")
 
+    def load_nicks(self):
+        """
+        Load the registered nicknames into memory.
+        """
+        nicks = {}
+        index = NameIndex()
+        cursor = self.console.storage.query("""SELECT id, client_id, name FROM nicks""")
+        while not cursor.EOF:
+            row = cursor.getRow()
+            nicks[int(row['id'])] = (int(row['client_id']), row['name'])
+            index.add(int(row['id']), row['name'])
+            cursor.moveNext()
+        cursor.close()
+        self.nicks, self.nicks_index = nicks, index
+        self.debug('loaded %s registered nicknames', len(nicks))
+
+    def get_nick_owner(self, name):
+        """
+        Return the id of the client who registered the given nickname, or None if it's not registered.
+        :param name: the nickname
+        """
+        name = self.console.stripColors(name).lower()
+        # nicknames containing quotes may have been stored escaped
+        names = (name, self._process_name(name))
+        for nick_id in self.nicks_index.lookup(name):
+            client_id, nick = self.nicks.get(nick_id, (None, ''))
+            if nick.lower() in names:
+                return client_id
+        return None
+
     def warn_client_for_nick_steal(self, client):
         """
         Warn a client for nickname stealing.
@@ -155,18 +193,14 @@ class NickregPlugin(b3.plugin.Plugin):
         if client and client.id and client.pbid not in ('WORLD', 'Server'):
 
             self.debug('checking if client @%s is using a registered nickname (%s)', client.id, client.name)
-            cursor = self.console.storage.query("""SELECT * FROM nicks WHERE name LIKE '%s'""" % self._process_name(client.name))
-            if cursor.EOF:
+            owner_id = self.get_nick_owner(client.name)
+            if owner_id is None:
                 self.debug('nickname "%s" does not seem to be registered: client @%s is legit', client.name, client.id)
+            elif owner_id != int(client.id):
+                self.debug('warning client @%s for nickname stealing (%s): owner is client @%s', client.id, client.name, owner_id)
+                self.warn_client_for_nick_steal(client)
             else:
-                row = cursor.getRow()
-                if int(row['client_id']) != int(client.id):
-                    self.debug('warning client @%s for nickname stealing (%s): owner is client @%s', client.id, client.name, row['client_id'])
-                    self.warn_client_for_nick_steal(client)
-                else:
-                    self.debug('client @%s is the owner of registered nickname (%s): everything ok', client.id, client.name)
-
-                cursor.close()
+                self.debug('client @%s is the owner of registered nickname (%s): everything ok', client.id, client.name)
 
             client.setvar(self, 'nick_check_time', self.console.time())
 
@@ -208,13 +242,10 @@ class NickregPlugin(b3.plugin.Plugin):
         """
         - register current name as yours
         """
-        cursor = self.console.storage.query("""SELECT * FROM nicks WHERE name LIKE '%s'""" % self._process_name(client.name))
-        if not cursor.EOF:
+        if self.get_nick_owner(client.name) is not None:
             client.message('^7Nick ^1%s ^7is already registered' % client.name)
-            cursor.close()
             return
 
-        cursor.close()
         cursor = self.console.storage.query("""SELECT COUNT(*) AS num_registered FROM nicks WHERE client_id = %s""" % client.id)
         num_registered = cursor.getValue('num_registered', 0)
         if num_registered >= self.max_nicks:
@@ -223,7 +254,11 @@ class NickregPlugin(b3.plugin.Plugin):
             return
 
         cursor.close()
-        self.console.storage.query("""INSERT INTO nicks (client_id, name) VALUES ('%s', '%s')""" % (client.id, self._process_name(client.name)))
+        cursor = self.console.storage.query("""INSERT INTO nicks (client_id, name) VALUES ('%s', '%s')""" % (client.id, self._process_name(client.name)))
+        name = self.console.stripColors(client.name).lower()
+        self.nicks[cursor.lastrowid] = (int(client.id), name)
+        self.nicks_index.add(cursor.lastrowid, name)
+        cursor.close()
         client.message('^7Your nick is now registered')
 
     def cmd_delnick(self,  data,  client,  cmd=None):
@@ -255,4 +290,6 @@ class NickregPlugin(b3.plugin.Plugin):
 
         # proceed with the removal
         self.console.storage.query("""DELETE FROM nicks WHERE id = %s""" % data)
+        self.nicks.pop(int(data), None)
+        self.nicks_index.remove(int(data))
         client.message("^7Deleted nick: ^1%s" % row['name'])
\ No newline at end of file
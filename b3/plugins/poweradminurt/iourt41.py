@@ -30,6 +30,7 @@ import string
 
 from b3.functions import getCmd
 from b3.functions import clamp
+from .partition import TeamPartition
 from . import __version__
 from . import __author__
 
@@ -616,12 +617,37 @@ class Poweradminurt41Plugin(b3.plugin.Plugin):
             client.setvar(self, "prev_" + var, old)
 
     def _getScores(self, clients, usexlrstats=True):
+        """
+        Return the skill score (between 0 and 1) of the given clients.
+        Each client gets a row of skill inputs: every input is rescaled over the clients before being weighted.
+        :param clients: The list of clients
+        :param usexlrstats: Whether to include the XLRstats kill ratio and headshots ratio in the score
+        :return: A dict client id => score
+        """
         xlrstats = usexlrstats and self.console.getPlugin('xlrstats')
-        playerstats = {}
-        maxstats = {}
-        minstats = {}
         keys = 'hsratio', 'killratio', 'teamcontrib', 'xhsratio', 'xkillratio', 'flagperf', 'bombperf'
+        weights = {
+            'killratio': 1.0,
+            'teamcontrib': 0.5,
+            'hsratio': 0.3,
+            'xkillratio': 1.0,
+            'xhsratio': 0.5,
+            # weight score for mission objectives higher
+            'flagperf': 3.0,
+            'bombperf': 3.0,
+        }
+        # inputs which get reduced for players who just joined
+        recent = 'killratio', 'teamcontrib', 'hsratio'
+
+        if xlrstats:
+            # the skill inputs of all the clients are retrieved at once: head (0) and helmet (1) hits
+            xstats, xbodies = xlrstats.get_PlayersStats(clients, bodypartids=(0, 1))
+        else:
+            xstats, xbodies = {}, {}
+
         now = self.console.time()
+        ages = []
+        rows = []
         for c in clients:
             if not c.isvar(self, 'teamtime'):
                 c.setvar(self, 'teamtime', now)
@@ -630,101 +656,58 @@ class Poweradminurt41Plugin(b3.plugin.Plugin):
             deaths = max(0, self._teamvar(c, 'deaths'))
             teamkills = max(0, self._teamvar(c, 'teamkills'))
             hs = self._teamvar(c, 'headhits') + self._teamvar(c, 'helmethits')
-            hsratio = min(1.0, hs / (1.0 + kills))  # hs can be greater than kills
-            killratio = kills / (1.0 + deaths + teamkills)
-            teamcontrib = (kills - deaths - teamkills) / (age + 1.0)
             flag_taken = int(bool(c.var(self, 'flag_taken', 0).value))  # one-time bonus
-            flag_captured = self._teamvar(c, 'flag_captured')
-            flag_returned = self._teamvar(c, 'flag_returned')
-            flagperf = 10 * flag_taken + 20 * flag_captured + flag_returned
-            bomb_planted = self._teamvar(c, 'bomb_planted')
-            bomb_defused = self._teamvar(c, 'bomb_defused')
-            bombperf = bomb_planted + bomb_defused
-
-            playerstats[c.id] = {
-                'age': age,
-                'hsratio': hsratio,
-                'killratio': killratio,
-                'teamcontrib': teamcontrib,
-                'flagperf': flagperf,
-                'bombperf': bombperf,
-            }
-
-            stats = xlrstats.get_PlayerStats(c) if xlrstats else None
+            stats = xstats.get(c.id)
             if stats:
-                playerstats[c.id]['xkillratio'] = stats.ratio
-                head = xlrstats.get_PlayerBody(playerid=c.cid, bodypartid=0).kills
-                helmet = xlrstats.get_PlayerBody(playerid=c.cid, bodypartid=1).kills
-                xhsratio = min(1.0, (head + helmet) / (1.0 + kills))
-                playerstats[c.id]['xhsratio'] = xhsratio
+                head = xbodies.get((stats.id, 0))
+                helmet = xbodies.get((stats.id, 1))
+                xhs = (head.kills if head else 0) + (helmet.kills if helmet else 0)
+                xkillratio = stats.ratio
+                xhsratio = min(1.0, xhs / (1.0 + kills))
             else:
-                playerstats[c.id]['xhsratio'] = 0.0
-                playerstats[c.id]['xkillratio'] = 0.8
-            for key in keys:
-                if key not in maxstats or maxstats[key] < playerstats[c.id][key]:
-                    maxstats[key] = playerstats[c.id][key]
-                if key not in minstats or minstats[key] > playerstats[c.id][key]:
-                    minstats[key] = playerstats[c.id][key]
+                xkillratio = 0.8
+                xhsratio = 0.0
+
+            values = {
+                'hsratio': min(1.0, hs / (1.0 + kills)),  # hs can be greater than kills
+                'killratio': kills / (1.0 + deaths + teamkills),
+                'teamcontrib': (kills - deaths - teamkills) / (age + 1.0),
+                'xhsratio': xhsratio,
+                'xkillratio': xkillratio,
+                'flagperf': 10 * flag_taken + 20 * self._teamvar(c, 'flag_captured') +
+                            self._teamvar(c, 'flag_returned'),
+                'bombperf': self._teamvar(c, 'bomb_planted') + self._teamvar(c, 'bomb_defused'),
+            }
+            ages.append(age)
+            rows.append([values[key] for key in keys])
 
         scores = {}
-        weights = {
-            'killratio': 1.0,
-            'teamcontrib': 0.5,
-            'hsratio': 0.3,
-            'xkillratio': 1.0,
-            'xhsratio': 0.5,
-            # weight score for mission objectives higher
-            'flagperf': 3.0,
-            'bombperf': 3.0,
-        }
-
+        if not rows:
+            return scores
+
+        columns = zip(*rows)
+        minstats = [min(column) for column in columns]
+        maxstats = [max(column) for column in columns]
+        self.debug("score: maxstats=%s" % str(dict(zip(keys, maxstats))))
+        self.debug("score: minstats=%s" % str(dict(zip(keys, minstats))))
+        # inputs having the same value for every client do not tell players apart: they are left out
+        used = [k for k in xrange(len(keys)) if maxstats[k] - minstats[k] >= 0.0001]  # accurate at ne nimis
         weightsum = sum(weights[key] for key in keys)
-        self.debug("score: maxstats=%s" % str(maxstats))
-        self.debug("score: minstats=%s" % str(minstats))
-        for c in clients:
+        factors = [weights[keys[k]] / (maxstats[k] - minstats[k]) for k in used]
+        isrecent = [keys[k] in recent for k in used]
+        for c, age, row in zip(clients, ages, rows):
+            tm = min(1.0, age / 5.0)  # reduce score for players who just joined
             score = 0.0
-            tm = min(1.0, playerstats[c.id]['age'] / 5.0)  # reduce score for players who just joined
-            msg = []
-            for key in keys:
-                denom = maxstats[key] - minstats[key]
-                if denom < 0.0001:  # accurate at ne nimis
-                    continue
-                msg.append("%s=%.3f" % (key, playerstats[c.id][key]))
-                keyscore = weights[key] * (playerstats[c.id][key] - minstats[key]) / denom
-                if key in ('killratio', 'teamcontrib', 'hsratio'):
-                    score += tm * keyscore
-                else:
-                    score += keyscore
-
+            for k, factor, reduced in zip(used, factors, isrecent):
+                keyscore = factor * (row[k] - minstats[k])
+                score += tm * keyscore if reduced else keyscore
             score /= weightsum
-            self.debug('score: %s %s score=%.3f age=%.2f %s' % (c.team, c.name, score,
-                                                                playerstats[c.id]['age'], ' '.join(msg)))
+            self.debug('score: %s %s score=%.3f age=%.2f %s' % (c.team, c.name, score, age,
+                                                                ' '.join('%s=%.3f' % (keys[k], row[k]) for k in used)))
             scores[c.id] = score
 
         return scores
 
-    def _getRandomTeams(self, clients, checkforced=False):
-        blue = []
-        red = []
-        nonforced = []
-        for c in clients:
-            # ignore spectators
-            if c.team in (b3.TEAM_BLUE, b3.TEAM_RED):
-                if checkforced and c.isvar(self, 'paforced'):
-                    if c.team == b3.TEAM_BLUE:
-                        blue.append(c)
-                    else:
-                        red.append(c)
-                else:
-                    nonforced.append(c)
-
-        # distribute nonforced players
-        random.shuffle(nonforced)
-        n = (len(nonforced) + len(blue) + len(red)) / 2 - len(blue)
-        blue.extend(nonforced[:n])
-        red.extend(nonforced[n:])
-        return blue, red
-
     def _getTeamScore(self, team, scores):
         return sum(scores.get(c.id, 0.0) for c in team)
 
@@ -819,21 +802,20 @@ class Poweradminurt41Plugin(b3.plugin.Plugin):
             c.setvar(self, 'teamcontribhist', [])
             self._saveTeamvars(c)
 
+    def _isSniper(self, client):
+        """
+        Tell whether a client is a sniper (sniper noobs are ignored).
+        """
+        kills = max(0, client.var(self, 'kills', 0).value)
+        deaths = max(0, client.var(self, 'deaths', 0).value)
+        if kills / (1.0 + deaths) < 1.2:
+            return False
+        # count players with SR8 and PSG1
+        gear = getattr(client, 'gear', '')
+        return 'Z' in gear or 'N' in gear
+
     def _countSnipers(self, team):
-        n = 0
-        for c in team:
-            kills = max(0, c.var(self, 'kills', 0).value)
-            deaths = max(0, c.var(self, 'deaths', 0).value)
-            ratio = kills / (1.0 + deaths)
-            if ratio < 1.2:
-                # Ignore sniper noobs
-                continue
-                # Count players with SR8 and PSG1
-            gear = getattr(c, 'gear', '')
-            if 'Z' in gear or 'N' in gear:
-                n += 1
-
-        return n
+        return len([c for c in team if self._isSniper(c)])
 
     def _move(self, blue, red, scores=None):
         self.debug('move: final blue team: ' + ' '.join(c.name for c in blue))
@@ -946,87 +928,37 @@ class Poweradminurt41Plugin(b3.plugin.Plugin):
 
         return moves
 
-    def _randTeams(self, times, slack, maxmovesperc=None):
+    def _partitionTeams(self, slack, maxmovesperc=None):
         """
-        Randomize teams a few times and pick the most balanced
+        Compute the most balanced teams: see TeamPartition.
+        :param slack: The skill difference under which teams are balanced: snipers are distributed instead
+        :param maxmovesperc: The maximum ratio of players to move (always allow at least 2 moves)
+        :return: A tuple (old skill diff, new skill diff, blue team, red team, scores): the new skill diff and teams
+                 are None if teams cannot be made even by numbers moving so few players
         """
         clients = self.console.clients.getList()
         scores = self._getScores(clients)
-        oldblue = [c for c in clients if c.team == b3.TEAM_BLUE]
-        oldred = [c for c in clients if c.team == b3.TEAM_RED]
-        n = len(oldblue) + len(oldred)
+        players = [c for c in clients if c.team in (b3.TEAM_BLUE, b3.TEAM_RED)]
+        oldblue = [c for c in players if c.team == b3.TEAM_BLUE]
+        oldred = [c for c in players if c.team == b3.TEAM_RED]
         olddiff = self._getTeamScoreDiff(oldblue, oldred, scores)
-        self.debug('rand: n=%s' % n)
-        self.debug('rand: olddiff=%.2f' % olddiff)
-        bestdiff = None  # best balance diff so far when diff > slack
-        sbestdiff = None  # best balance diff so far when diff < slack
-        bestnumdiff = None  # best difference in number of snipers so far
-        bestblue = bestred = None  # best teams so far when diff > slack
-        sbestblue = sbestred = None  # new teams so far when diff < slack
-        epsilon = 0.0001
-
-        if not maxmovesperc and abs(len(oldblue) - len(oldred)) > 1:
-            # Teams are unbalanced by count, force both teams two have equal number
-            # of players
-            self.debug('rand: force new teams')
-            bestblue, bestred = self._getRandomTeams(clients, checkforced=True)
-            bestdiff = self._getTeamScoreDiff(bestblue, bestred, scores)
-
-        for _ in xrange(times):
-            blue, red = self._getRandomTeams(clients, checkforced=True)
-            m = self._countMoves(oldblue, blue) + self._countMoves(oldred, red)
-            if maxmovesperc and m > max(2, int(round(maxmovesperc * n))):
-                continue
-
-            diff = self._getTeamScoreDiff(blue, red, scores)
-
-            if abs(diff) <= slack:
-                # balance below slack threshold, try to distribute the snipers instead
-                numdiff = abs(self._countSnipers(blue) - self._countSnipers(red))
-                if bestnumdiff is None or numdiff < bestnumdiff:
-                    # got better sniper num diff
-                    if bestnumdiff is None:
-                        self.debug('rand: first numdiff %d (sdiff=%.2f)' % (numdiff, diff))
-                    else:
-                        self.debug('rand: found better numdiff %d < %d (sdiff=%.2f)' % (numdiff, bestnumdiff, diff))
-
-                    sbestblue, sbestred = blue, red
-                    sbestdiff, bestnumdiff = diff, numdiff
-
-                elif numdiff == bestnumdiff and abs(diff) < abs(sbestdiff) - epsilon:
-                    # same number of snipers but better balance diff
-                    self.debug('rand: found better sdiff %.2f < %.2f (numdiff=%d bestnumdiff=%d)' % (
-                        abs(diff), abs(sbestdiff), numdiff, bestnumdiff))
-                    sbestblue, sbestred = blue, red
-                    sbestdiff = diff
-
-            elif bestdiff is None or abs(diff) < abs(bestdiff) - epsilon:
-                # balance above slack threshold
-                if bestdiff is None:
-                    self.debug('rand: first diff %.2f' % abs(diff))
-                else:
-                    self.debug('rand: found better diff %.2f < %.2f' % (abs(diff), abs(bestdiff)))
-
-                bestblue, bestred = blue, red
-                bestdiff = diff
-
-        if bestdiff is not None:
-            self.debug('rand: bestdiff=%.2f' % bestdiff)
-
-        if sbestdiff is not None:
-            self.debug('rand: sbestdiff=%.2f bestnumdiff=%d' % (sbestdiff, bestnumdiff))
-            self.debug('rand: snipers: blue=%d red=%d' % (self._countSnipers(sbestblue), self._countSnipers(sbestred)))
-            return olddiff, sbestdiff, sbestblue, sbestred, scores
-
-        return olddiff, bestdiff, bestblue, bestred, scores
-
-    def _countMoves(self, old, new):
-        i = 0
-        newnames = [c.name for c in new]
-        for c in old:
-            if c.name not in newnames:
-                i += 1
-        return i
+        n = len(players)
+        maxmoves = max(2, int(round(maxmovesperc * n))) if maxmovesperc else None
+        self.debug('partition: n=%s olddiff=%.2f maxmoves=%s' % (n, olddiff, maxmoves))
+
+        engine = TeamPartition(scores=[scores.get(c.id, 0.0) for c in players],
+                               teams=[c.team == b3.TEAM_BLUE for c in players],
+                               snipers=[self._isSniper(c) for c in players],
+                               locked=[c.isvar(self, 'paforced') for c in players])
+        split = engine.split(slack, maxmoves)
+        if split is None:
+            self.debug('partition: cannot even teams with %s moves' % maxmoves)
+            return olddiff, None, None, None, scores
+
+        blue = [c for c, inblue in zip(players, split.blue) if inblue]
+        red = [c for c, inblue in zip(players, split.blue) if not inblue]
+        self.debug('partition: diff=%.2f sniperdiff=%d moves=%d' % (split.diff, split.sniperdiff, split.moves))
+        return olddiff, split.diff, blue, red, scores
 
     def skillcheck(self):
         """
@@ -1202,7 +1134,7 @@ class Poweradminurt41Plugin(b3.plugin.Plugin):
             return
 
         self._balancing = True
-        olddiff, bestdiff, blue, red, scores = self._randTeams(100, 0.1)
+        olddiff, bestdiff, blue, red, scores = self._partitionTeams(0.1)
         if client:
             if (client.team == b3.TEAM_BLUE and client.cid not in [c.cid for c in blue]) or \
                (client.team == b3.TEAM_RED and client.cid not in [c.cid for c in red]):
@@ -1244,7 +1176,7 @@ class Poweradminurt41Plugin(b3.plugin.Plugin):
 
         self._balancing = True
         # always allow at least 2 moves, but don't move more than 30% of the players
-        olddiff, bestdiff, bestblue, bestred, scores = self._randTeams(100, 0.1, 0.3)
+        olddiff, bestdiff, bestblue, bestred, scores = self._partitionTeams(0.1, 0.3)
         if bestdiff is not None:
             self.console.write('bigtext "Balancing teams!"')
             self._move(bestblue, bestred, scores)
@@ -0,0 +1,251 @@
+# PowerAdmin Plugin for BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2008 Mark Weirath (xlr8or@xlr8or.com)
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+"""
+Team partition engine used by the skill balancer.
+
+Players are split in two teams of equal size (one player of difference when the amount of players is odd) so that
+the difference between the sums of the players scores is as small as possible. Once the difference falls below a
+slack value, teams are considered balanced and the engine evens out the snipers instead. Among equivalent splits,
+the one moving the fewest players is preferred.
+
+Splits are built deterministically. When few players can change team, every split is looked at. Otherwise the
+current teams and greedy splits (best players first, each one going to the weakest team) are improved by moving or
+swapping players, always applying the best move, till no move improves the split any further.
+"""
+
+import itertools
+
+# two score differences closer than this are considered equal (fewer moves are preferred then)
+EPSILON = 0.0001
+
+# every split is looked at when there are no more players allowed to change team than this
+EXHAUSTIVE_LIMIT = 14
+
+
+class Split(object):
+    """
+    A team partition.
+    """
+    def __init__(self, blue, diff, sniperdiff, moves):
+        """
+        Object constructor.
+        :param blue: A list telling for each player whether it is in the blue team
+        :param diff: The blue team score minus the red team score
+        :param sniperdiff: The difference between the amount of snipers of both teams
+        :param moves: The amount of players changing team
+        """
+        self.blue = blue
+        self.diff = diff
+        self.sniperdiff = sniperdiff
+        self.moves = moves
+
+    def __repr__(self):
+        return 'Split<diff=%.3f sniperdiff=%s moves=%s>' % (self.diff, self.sniperdiff, self.moves)
+
+
+class _State(object):
+    """
+    The split being improved.
+    """
+    def __init__(self, engine, blue):
+        self.blue = list(blue)
+        self.size = sum(1 for x in blue if x)
+        self.score = sum(s for s, x in zip(engine.scores, blue) if x)
+        self.snipers = sum(1 for s, x in zip(engine.snipers, blue) if s and x)
+        self.moves = sum(1 for x, y in zip(engine.teams, blue) if x != y)
+
+    def flip(self, engine, i):
+        sign = -1 if self.blue[i] else 1
+        self.blue[i] = not self.blue[i]
+        self.size += sign
+        self.score += sign * engine.scores[i]
+        self.snipers += sign * engine.snipers[i]
+        self.moves += 1 if self.blue[i] != engine.teams[i] else -1
+
+
+class TeamPartition(object):
+    """
+    Compute balanced team splits.
+    """
+    def __init__(self, scores, teams, snipers=None, locked=None):
+        """
+        Object constructor.
+        :param scores: The list of the players scores
+        :param teams: A list telling for each player whether it currently is in the blue team
+        :param snipers: A list telling for each player whether it is a sniper
+        :param locked: A list telling for each player whether it must stay in its current team
+        """
+        self.scores = [float(x) for x in scores]
+        self.teams = [bool(x) for x in teams]
+        self.snipers = [int(bool(x)) for x in (snipers or [False] * len(scores))]
+        self.locked = [bool(x) for x in (locked or [False] * len(scores))]
+        self.total = sum(self.scores)
+        self.totalsnipers = sum(self.snipers)
+        # players are looked at best first: ties are broken by position so that splits are reproducible
+        self.order = sorted(xrange(len(self.scores)), key=lambda i: (-self.scores[i], i))
+        self.free = [i for i in self.order if not self.locked[i]]
+        n = len(self.scores)
+        lockedblue = sum(1 for x, y in zip(self.teams, self.locked) if x and y)
+        lockedred = sum(1 for x, y in zip(self.teams, self.locked) if not x and y)
+        self.sizes = sorted(set(k for k in (n / 2, (n + 1) / 2) if lockedblue <= k <= n - lockedred))
+        if not self.sizes:
+            # too many locked players in one team: get as close as possible to equal teams
+            self.sizes = [min(max(n / 2, lockedblue), n - lockedred)]
+
+    def split(self, slack=0.0, maxmoves=None):
+        """
+        Return the best split.
+        :param slack: The score difference under which teams are balanced: snipers are evened out instead
+        :param maxmoves: The maximum amount of players changing team (no limit if None)
+        :return: A Split or None if teams cannot be made even by numbers with so few moves
+        """
+        if len(self.free) <= EXHAUSTIVE_LIMIT:
+            return self._exhaustive(slack, maxmoves)
+        best = None
+        bestkey = None
+        for start in self._starts(slack, maxmoves):
+            state = self._improve(start, slack, maxmoves)
+            key = self._key(state.score, state.snipers, state.moves, slack)
+            if bestkey is None or key < bestkey:
+                best, bestkey = state, key
+        if best is None:
+            return None
+        return Split(best.blue, 2 * best.score - self.total, abs(2 * best.snipers - self.totalsnipers), best.moves)
+
+    def _exhaustive(self, slack, maxmoves):
+        """
+        Return the best split looking at all of them.
+        """
+        base = [self.teams[i] and self.locked[i] for i in xrange(len(self.scores))]
+        basescore = sum(s for s, x in zip(self.scores, base) if x)
+        basesnipers = sum(s for s, x in zip(self.snipers, base) if x)
+        basesize = sum(1 for x in base if x)
+        # moves of the split having no free player in the blue team
+        basemoves = sum(1 for i in self.free if self.teams[i])
+        best = None
+        bestkey = None
+        for size in self.sizes:
+            for blue in itertools.combinations(self.free, size - basesize):
+                moves = basemoves + sum(-1 if self.teams[i] else 1 for i in blue)
+                if maxmoves is not None and moves > maxmoves:
+                    continue
+                key = self._key(basescore + sum(self.scores[i] for i in blue),
+                                basesnipers + sum(self.snipers[i] for i in blue), moves, slack)
+                if bestkey is None or key < bestkey:
+                    best, bestkey = blue, key
+        if best is None:
+            return None
+        state = _State(self, [x or i in best for i, x in enumerate(base)])
+        return Split(state.blue, 2 * state.score - self.total, abs(2 * state.snipers - self.totalsnipers),
+                     state.moves)
+
+    def _key(self, score, snipers, moves, slack):
+        """
+        Return the sort key of a split (the lower the better).
+        """
+        diff = abs(2 * score - self.total)
+        if diff <= slack + EPSILON:
+            return 0, abs(2 * snipers - self.totalsnipers), round(diff / EPSILON), moves
+        return 1, 0, round(diff / EPSILON), moves
+
+    def _starts(self, slack, maxmoves):
+        """
+        Generate the splits the search starts from: the current teams made even by numbers and the greedy splits.
+        """
+        state = _State(self, self.teams)
+        while state.size not in self.sizes:
+            # move the player of the biggest team which balances the teams the best
+            bigger = state.size > self.sizes[-1]
+            candidates = []
+            for i in self.free:
+                if state.blue[i] == bigger:
+                    score = state.score + (-self.scores[i] if bigger else self.scores[i])
+                    snipers = state.snipers + (-self.snipers[i] if bigger else self.snipers[i])
+                    candidates.append((self._key(score, snipers, state.moves + 1, slack), i))
+            if not candidates:
+                break
+            state.flip(self, min(candidates)[1])
+        if state.size in self.sizes and (maxmoves is None or state.moves <= maxmoves):
+            yield state
+
+        for size in self.sizes:
+            blue = list(self.teams)
+            bluesize = redsize = 0
+            bluescore = redscore = 0.0
+            for i in xrange(len(blue)):
+                if self.locked[i] and blue[i]:
+                    bluesize += 1
+                    bluescore += self.scores[i]
+                elif self.locked[i]:
+                    redsize += 1
+                    redscore += self.scores[i]
+            redroom = len(blue) - size - redsize
+            blueroom = size - bluesize
+            for i in self.free:
+                if blueroom and (not redroom or bluescore < redscore or
+                                 (bluescore == redscore and self.teams[i])):
+                    blue[i] = True
+                    bluescore += self.scores[i]
+                    blueroom -= 1
+                else:
+                    blue[i] = False
+                    redscore += self.scores[i]
+                    redroom -= 1
+            state = _State(self, blue)
+            if maxmoves is None or state.moves <= maxmoves:
+                yield state
+
+    def _improve(self, state, slack, maxmoves):
+        """
+        Apply the best move or swap of players till the split cannot be improved.
+        """
+        scores = self.scores
+        snipers = self.snipers
+        teams = self.teams
+        while True:
+            bestkey = self._key(state.score, state.snipers, state.moves, slack)
+            best = None
+            blue = [i for i in self.free if state.blue[i]]
+            red = [i for i in self.free if not state.blue[i]]
+            # move a single player (only possible when the amount of players is odd)
+            for i in self.free:
+                sign = -1 if state.blue[i] else 1
+                if state.size + sign not in self.sizes:
+                    continue
+                moves = state.moves + (1 if state.blue[i] == teams[i] else -1)
+                if maxmoves is not None and moves > maxmoves:
+                    continue
+                key = self._key(state.score + sign * scores[i], state.snipers + sign * snipers[i], moves, slack)
+                if key < bestkey:
+                    bestkey, best = key, (i,)
+            # swap a blue player with a red one
+            for i in blue:
+                imoves = state.moves + (1 if teams[i] else -1)
+                iscore = state.score - scores[i]
+                isnipers = state.snipers - snipers[i]
+                for j in red:
+                    moves = imoves + (-1 if teams[j] else 1)
+                    if maxmoves is not None and moves > maxmoves:
+                        continue
+                    key = self._key(iscore + scores[j], isnipers + snipers[j], moves, slack)
+                    if key < bestkey:
+                        bestkey, best = key, (i, j)
+            if best is None:
+                return state
+            for i in best:
+                state.flip(self, i)
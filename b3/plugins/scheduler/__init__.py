@@ -15,7 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
-__version__ = '1.5'
+__version__ = '1.6'
 __author__  = 'Courgette'
 
 
@@ -23,7 +23,6 @@ import b3
 import b3.cron
 import b3.plugin
 import b3.timezones
-import threading
 
 
 class SchedulerPlugin(b3.plugin.Plugin):
@@ -280,7 +279,7 @@ class RestartTask(Task):
     def runcommands(self):
         if 'delay' in self.config.attrib:
             delay_minutes = b3.functions.time2minutes(self.config.attrib['delay'])
-            threading.Timer(delay_minutes * 60, Task.runcommands, [self]).start()
+            self.plugin.console.timers.schedule(delay_minutes * 60, Task.runcommands, (self,))
         else:
             Task.runcommands(self)
 
@@ -24,6 +24,8 @@ import time
 import threading
 
 from b3 import functions
+from b3.logtailer import PollDelay
+from b3.logtailer import RemoteLogWriter
 from ConfigParser import NoOptionError
 
 try:
@@ -36,7 +38,7 @@ except ImportError, ee:
                  "paramiko from http://www.lag.net/paramiko/")
     raise ee
 
-__version__ = '1.3'
+__version__ = '1.4'
 __author__ = 'Courgette'
 
 
@@ -45,6 +47,8 @@ class SftpytailPlugin(b3.plugin.Plugin):
     requiresConfigFile = False
     default_connection_timeout = 30  # time (in sec) to wait before reconnecting after loosing FTP connection
     default_maxGap = 20480           # max gap in bytes between remote file and local file
+    default_max_delay = 2.0          # max delay in sec between two downloads while the remote file does not grow
+    chunk_size = 32768               # amount of bytes requested by each read of the remote file
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -67,8 +71,10 @@ class SftpytailPlugin(b3.plugin.Plugin):
         self._publicIp = None
         self._remoteFileOffset = None
         self._sftpdelay = 0.150
-        self.buffer = None
-        self.file = None
+        self._sftpmaxdelay = SftpytailPlugin.default_max_delay
+        self._pollDelay = None
+        self._rfile = None
+        self.writer = None
         self.lgame_log = None
         self.sftpconfig = None
         self.known_hosts_file = None
@@ -80,23 +86,35 @@ class SftpytailPlugin(b3.plugin.Plugin):
         """
         if self.console.config.has_option('server', 'delay'):
             self._sftpdelay = self.console.config.getfloat('server', 'delay')
-        
-        if self.console.config.has_option('server', 'local_game_log'):
-            self.lgame_log = self.console.config.getpath('server', 'local_game_log')
-        else:
-            self.lgame_log = os.path.normpath(os.path.expanduser(self.console.input.name))
 
-        self.lgame_log = b3.getWritableFilePath(self.lgame_log)
-        self.debug('local game log is: %s' % self.lgame_log)
+        try:
+            self._sftpmaxdelay = self.console.config.getfloat('server', 'remote_log_max_delay')
+        except NoOptionError:
+            pass
+        except ValueError, e:
+            self.error('could not load server/remote_log_max_delay config value from B3 config file: %s' % e)
 
-        if self.console.config.get('server', 'game_log')[0:7] == 'sftp://':
-            self.init_thread(self.console.config.get('server', 'game_log'))
+        self._pollDelay = PollDelay(self._sftpdelay, self._sftpmaxdelay)
+
+        if self.console.getLogStream() is None:
+            if self.console.config.has_option('server', 'local_game_log'):
+                self.lgame_log = self.console.config.getpath('server', 'local_game_log')
+            else:
+                self.lgame_log = os.path.normpath(os.path.expanduser(self.console.input.name))
+
+            self.lgame_log = b3.getWritableFilePath(self.lgame_log)
+            self.debug('local game log is: %s' % self.lgame_log)
+        else:
+            self.debug('streaming the remote game log to the parser')
 
         if self.console.config.has_option('server', 'log_append'):
             self._logAppend = self.console.config.getboolean('server', 'log_append')
         else:
             self._logAppend = False
 
+        if self.console.config.get('server', 'game_log')[0:7] == 'sftp://':
+            self.init_thread(self.console.config.get('server', 'game_log'))
+
         # get rid of "no handler found for paramiko.transport" errors
         paramiko_logger = logging.getLogger('paramiko')
         paramiko_logger.handlers = [logging.NullHandler()]
@@ -173,88 +191,34 @@ class SftpytailPlugin(b3.plugin.Plugin):
 
     def update(self):
         """
-        Update the local log file.
+        Download the remote game log data.
         """
-        def handle_download(block):
-            self.verbose('received %s bytes' % len(block))
-            self._remoteFileOffset += len(block)
-            if self.buffer is None:
-                self.buffer = block
-            else:
-                self.buffer = self.buffer + block
         transport = sftp = None
-        rfile = None
-        self.file = open(self.lgame_log, 'ab')
-        self.file.write('\r\n')
-        self.file.write('B3 has been restarted\r\n')
-        self.file.write('\r\n')
+        self.writer = RemoteLogWriter(self.console.getLogStream(), self.lgame_log, self._logAppend)
         while self.console.working:
+            received = 0
             try:
                 if not sftp:
                     transport, sftp = self.sftpconnect()
-                    rfile = None
+                    self._rfile = None
                     self._nbConsecutiveConnFailure = 0
-                try:
-                    #self.verbose("Getting remote file size for %s" % self.sftpconfig['path'])
-                    remotesize = sftp.stat(self.sftpconfig['path']).st_size
-                    #self.verbose("Remote file size is %s" % remoteSize)
-                except IOError, err:
-                    self.critical(err)
-                    raise err
-                if self._remoteFileOffset is None:
-                    self._remoteFileOffset = remotesize
-                if remotesize < self._remoteFileOffset:
-                    self.debug("remote file rotation detected")
-                    self._remoteFileOffset = 0
-                if remotesize > self._remoteFileOffset:
-                    if (remotesize - self._remoteFileOffset) > self._maxGap:
-                        gap = remotesize - self._remoteFileOffset
-                        self.verbose('gap between local and remote file too large (%s bytes)', gap)
-                        self.verbose('downloading only the last %s bytes' % self._maxGap)
-                        self._remoteFileOffset = remotesize - self._maxGap
-                    #self.debug('RETR from remote offset %s. (expecting to read at least %s bytes)' % (
-                    #           self._remoteFileOffset, remoteSize - self._remoteFileOffset))
-                    if not rfile:
-                        self.debug('opening remote game log file %s for reading' % self.sftpconfig['path'])
-                        rfile = sftp.open(self.sftpconfig['path'], 'r')
-                    rfile.seek(self._remoteFileOffset)
-                    self.debug('reading remote game log file from offset %s' % self._remoteFileOffset)
-                    handle_download(rfile.read())
-                    if self.buffer:
-                        self.file.write(self.buffer)
-                        self.buffer = None
-                        self.file.flush()
-                    if self.console._paused:
-                        self.console.unpause()
-                        self.debug('Unpausing')
+                received = self.download(sftp)
             except paramiko.SSHException, err:
                 self.warning(str(err))
                 self._nbConsecutiveConnFailure += 1
                 self.verbose('lost connection to server: pausing until updated properly')
                 if self.console._paused is False:
                     self.console.pause()
-                self.file.close()
-                if self._logAppend:
-                    try:
-                        self.file = open(self.lgame_log, 'ab')
-                        self.file.write('\r\n')
-                        self.file.write('B3 has restarted writing the log file\r\n')
-                        self.file.write('\r\n')
-                    except IOError:
-                        self.file = open(self.lgame_log, 'w')
-                else:
-                    self.file = open(self.lgame_log, 'w')
-                self.file.close()
-                self.file = open(self.lgame_log, 'ab')
+                self.writer.reset()
                 try:
-                    if rfile is not None:
-                        rfile.close()
+                    if self._rfile is not None:
+                        self._rfile.close()
                     if transport is not None:
                         transport.close()
                     self.debug('sFTP connection closed')
                 except IOError:
                     pass
-                rfile = None
+                self._rfile = None
                 sftp = None
                 
                 if self._nbConsecutiveConnFailure <= 30:
@@ -262,22 +226,75 @@ class SftpytailPlugin(b3.plugin.Plugin):
                 else:
                     self.debug('too many failures: sleeping %s sec' % self._waitBeforeReconnect)
                     time.sleep(self._waitBeforeReconnect)
-            time.sleep(self._sftpdelay)
+            # poll again soon while the game log grows, slow down while it does not
+            time.sleep(self._pollDelay.update(received))
 
         self.verbose("B3 is down: stopping sFtpytail thread")
 
         try:
-            rfile.close()
+            if self._rfile is not None:
+                self._rfile.close()
         except IOError:
             pass
         try:
-            transport.close()
+            if transport is not None:
+                transport.close()
         except IOError:
             pass
         try:
-            self.file.close()
+            self.writer.close()
         except IOError:
             pass
+
+    def download(self, sftp):
+        """
+        Download the data appended to the remote game log since the last call.
+        The remote file is read in chunks which are passed on as they come.
+        :param sftp: The SFTP client
+        :return: The amount of bytes received
+        """
+        try:
+            remotesize = sftp.stat(self.sftpconfig['path']).st_size
+        except IOError, err:
+            self.critical(err)
+            raise err
+        if self._remoteFileOffset is None:
+            self._remoteFileOffset = remotesize
+        if remotesize < self._remoteFileOffset:
+            self.debug("remote file rotation detected")
+            self._remoteFileOffset = 0
+            self.writer.skip()
+            if self._rfile is not None:
+                # the game log may have been replaced by a new file
+                self._rfile.close()
+                self._rfile = None
+        if remotesize == self._remoteFileOffset:
+            return 0
+        if (remotesize - self._remoteFileOffset) > self._maxGap:
+            gap = remotesize - self._remoteFileOffset
+            self.verbose('gap between local and remote file too large (%s bytes)', gap)
+            self.verbose('downloading only the last %s bytes' % self._maxGap)
+            self._remoteFileOffset = remotesize - self._maxGap
+            self.writer.skip(aligned=False)
+
+        if self.console._paused:
+            # unpause first: the parser skips what was received while paused
+            self.console.unpause()
+            self.debug('Unpausing')
+
+        if not self._rfile:
+            self.debug('opening remote game log file %s for reading' % self.sftpconfig['path'])
+            self._rfile = sftp.open(self.sftpconfig['path'], 'r')
+        self._rfile.seek(self._remoteFileOffset)
+        self.debug('reading remote game log file from offset %s' % self._remoteFileOffset)
+        start = self._remoteFileOffset
+        while self._remoteFileOffset < remotesize:
+            block = self._rfile.read(min(self.chunk_size, remotesize - self._remoteFileOffset))
+            if not block:
+                break
+            self._remoteFileOffset += len(block)
+            self.writer.write(block)
+        return self._remoteFileOffset - start
     
     def sftpconnect(self):
         """
@@ -24,11 +24,13 @@ from b3.functions import getCmd
 from b3.functions import clamp
 
 __author__ = 'ThorN, Courgette'
-__version__ = '1.4.4'
+__version__ = '1.4.6'
 
 
 class SpamcontrolPlugin(b3.plugin.Plugin):
 
+    vetoesEvents = True
+
     _adminPlugin = None
 
     _maxSpamins = 10
@@ -90,17 +92,17 @@ class SpamcontrolPlugin(b3.plugin.Plugin):
         Add spam points to the given client.
         """
         now = self.getTime()
-        if client.var(self, 'ignore_till', now).value > now:
+        spam = client.pluginVars(self)
+        if spam.get('ignore_till', now) > now:
             # ignore the user
             raise b3.events.VetoEvent
 
-        last_message_time = client.var(self, 'last_message_time', now).value
-        gap = now - last_message_time
+        gap = now - spam.get('last_message_time', now)
 
         if gap < 2:
             points += 1
 
-        spamins = client.var(self, 'spamins', 0).value + points
+        spamins = spam.get('spamins', 0) + points
 
         # apply natural points decrease due to time
         spamins -= int(gap / self._falloffRate)
@@ -109,16 +111,15 @@ class SpamcontrolPlugin(b3.plugin.Plugin):
             spamins = 0
 
         # set new values
-        client.setvar(self, 'spamins', spamins)
-        client.setvar(self, 'last_message_time', now)
-        client.setvar(self, 'last_message', text)
+        spam.spamins = spamins
+        spam.last_message_time = now
+        spam.last_message = text
 
         # should we warn ?
         if spamins >= self._maxSpamins:
-            client.setvar(self, 'ignore_till', now + 2)
+            spam.ignore_till = now + 2
             self._adminPlugin.warnClient(client, 'spam')
-            spamins = int(spamins / 1.5)
-            client.setvar(self, 'spamins', spamins)
+            spam.spamins = int(spamins / 1.5)
             raise b3.events.VetoEvent
 
     ####################################################################################################################
@@ -137,7 +138,7 @@ class SpamcontrolPlugin(b3.plugin.Plugin):
         points = 0
         client = event.client
         text = event.data
-        last_message = client.var(self, 'last_message').value
+        last_message = client.pluginVars(self).get('last_message')
         color = re.match(r'\^[0-9]', event.data)
         if color and text == last_message:
             points += 5
@@ -16,22 +16,23 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'ThorN'
-__version__ = '1.6.5'
+__version__ = '1.7'
 
 import b3
 import b3.cron
 import b3.plugin
 import b3.events
 import os
-import re
 import StringIO
 import time
 
 from b3 import functions
 from b3.functions import sanitizeMe
+from b3.lib.SimpleXMLWriter import XMLWriter
+from b3.lib.SimpleXMLWriter import escape_attrib
+from b3.querybuilder import QueryBuilder
 from ConfigParser import NoOptionError
 from ftplib import FTP
-from xml.dom.minidom import Document
 
 
 class StatusPlugin(b3.plugin.Plugin):
@@ -45,6 +46,19 @@ class StatusPlugin(b3.plugin.Plugin):
     _enableDBsvarSaving = True
     _enableDBclientSaving = True
 
+    _snapshot = None      # status last written in the XML file
+    _svars = None         # server vars stored in the database: None if unknown
+    _cvars = None         # client rows (by CID) stored in the database: None if unknown
+    _lastRefresh = None   # time the values derived from the clock were last written
+    _refreshInterval = 300
+
+    # values changing with the clock alone: they are written along with other changes or every _refreshInterval
+    _clockVars = ('MapTime', 'RoundTime', 'lastupdate')
+
+    # current clients table columns
+    _clientColumns = ('Updated', 'Name', 'Level', 'DBID', 'CID', 'Joined', 'Connections', 'State', 'Score', 'IP',
+                      'GUID', 'PBID', 'Team', 'ColorName')
+
     _tables = {
         'svars': 'current_svars',
         'cvars': 'current_clients',
@@ -221,11 +235,8 @@ class StatusPlugin(b3.plugin.Plugin):
     def onStop(self, event):
         self.info('B3 stop/exit.. updating status')
         # create an empty status document
-        xml = Document()
-        b3status = xml.createElement("B3Status")
-        b3status.setAttribute("Time", time.asctime())
-        xml.appendChild(b3status)
-        self.writeXML(xml.toprettyxml(indent="        "))
+        self._snapshot = None
+        self.writeStatus('')
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -259,22 +270,54 @@ class StatusPlugin(b3.plugin.Plugin):
             self.bot('creating table to store client information: %s' % self._tables['cvars'])
             self.console.storage.query(self._schema[self.console.storage.dsnDict['protocol']]['cvars'] % self._tables)
 
+        # the tables are empty
+        self._svars = {}
+        self._cvars = {}
+
     def update(self):
         """
         Update XML/DB status.
+        Only what changed since the previous update is written: changed database rows are stored with a few batched
+        queries and the XML status is not written at all if nothing changed. Values derived from the clock alone
+        (map and round times) do not count as changes but are refreshed every _refreshInterval seconds.
         """
+        now = time.time()
+        refresh = self._lastRefresh is None or now - self._lastRefresh >= self._refreshInterval
         clients = self.console.clients.getList()
         score_list = self.console.getPlayerScores()
-                 
-        self.verbose('building XML status')
-        xml = Document()
 
-        # --- Main section
-        b3status = xml.createElement("B3Status")
-        b3status.setAttribute("Time", time.asctime())
-        xml.appendChild(b3status)
+        game, svars = self.getGameStatus(clients)
+        statuses = []
+        for c in clients:
+            try:
+                statuses.append(self.getClientStatus(c, score_list))
+            except Exception, err:
+                self.error('XML Failed: %r' % err, exc_info=err)
+
+        if self._enableDBsvarSaving:
+            self.storeServerVars(svars, refresh)
+
+        if self._enableDBclientSaving:
+            self.storeClients(statuses)
+
+        snapshot = ([(k, v) for k, v in game[0] if k not in self._clockVars], game[1], statuses)
+        if refresh or snapshot != self._snapshot:
+            self.verbose('building XML status')
+            self.writeStatus(self.buildXML(game, statuses))
+            self._snapshot = snapshot
+        else:
+            self.verbose('XML status did not change: not writing it')
+
+        if refresh:
+            self._lastRefresh = now
 
-        # --- Game section
+    def getGameStatus(self, clients):
+        """
+        Return the game status.
+        :param clients: The list of connected clients
+        :return: A tuple ((list of (name, value) game attributes, list of (name, value) game data),
+                 dict of server vars to store in the database)
+        """
         c = self.console.game
         gamename = ''
         gametype = ''
@@ -305,186 +348,240 @@ class StatusPlugin(b3.plugin.Plugin):
         if c.mapTime():
             map_time = c.mapTime()
 
-        # For XML:
-        game = xml.createElement("Game")
-        game.setAttribute("Ip", str(self.console._publicIp))
-        game.setAttribute("Port", str(self.console._port))
-        game.setAttribute("Name", str(gamename))
-        game.setAttribute("Type", str(gametype))
-        game.setAttribute("Map", str(mapname))
-        game.setAttribute("TimeLimit", str(timelimit))
-        game.setAttribute("FragLimit", str(fraglimit))
-        game.setAttribute("CaptureLimit", str(capturelimit))
-        game.setAttribute("Rounds", str(rounds))
-        game.setAttribute("RoundTime", str(round_time))
-        game.setAttribute("MapTime", str(map_time))
-        game.setAttribute("OnlinePlayers", str(len(clients)))
-        b3status.appendChild(game)
-
-        # For DB:
-        if self._enableDBsvarSaving:
-            # EMPTY DB SVARS TABLE
-            self.verbose('cleaning database table: %s...' % self._tables['svars'])
-            self.console.storage.truncateTable(self._tables['svars'])
-            # ADD NEW DATA
-            self.storeServerinfo("Ip", str(self.console._publicIp))
-            self.storeServerinfo("Port", str(self.console._port))
-            self.storeServerinfo("Name", str(gamename))
-            self.storeServerinfo("Type", str(gametype))
-            self.storeServerinfo("Map", str(mapname))
-            self.storeServerinfo("TimeLimit", str(timelimit))
-            self.storeServerinfo("FragLimit", str(fraglimit))
-            self.storeServerinfo("CaptureLimit",str(capturelimit) )
-            self.storeServerinfo("Rounds", str(rounds))
-            self.storeServerinfo("RoundTime", str(round_time))
-            self.storeServerinfo("MapTime", str(map_time))
-            self.storeServerinfo("OnlinePlayers", str(len(clients)))
-            self.storeServerinfo("lastupdate", str(int(time.time())))
-
-        for k, v in self.console.game.__dict__.items():
-            data = xml.createElement("Data")
-            data.setAttribute("Name", str(k))
-            data.setAttribute("Value", str(v))
-            game.appendChild(data)
-            self.storeServerinfo(k, v)
-
-        # --- End Game section        
-
-        # --- Clients section
-        b3clients = xml.createElement("Clients")
-        b3clients.setAttribute("Total", str(len(clients)))
-        b3status.appendChild(b3clients)
-
-        if self._enableDBclientSaving:
-            # EMPTY DB CVARS TABLE
-            self.verbose('cleaning database table: %s...' % self._tables['cvars'])
-            self.console.storage.truncateTable(self._tables['cvars'])
-
-        for c in clients:
+        attributes = [
+            ('Ip', str(self.console._publicIp)),
+            ('Port', str(self.console._port)),
+            ('Name', str(gamename)),
+            ('Type', str(gametype)),
+            ('Map', str(mapname)),
+            ('TimeLimit', str(timelimit)),
+            ('FragLimit', str(fraglimit)),
+            ('CaptureLimit', str(capturelimit)),
+            ('Rounds', str(rounds)),
+            ('RoundTime', str(round_time)),
+            ('MapTime', str(map_time)),
+            ('OnlinePlayers', str(len(clients))),
+        ]
+
+        data = [(str(k), str(v)) for k, v in self.console.game.__dict__.items()]
+
+        # remove forbidden sql characters
+        svars = {}
+        for k, v in attributes + [('lastupdate', str(int(time.time())))] + data:
+            svars[k.replace("'", "")] = v.replace("'", "")[:255]  # length of the database varchar field
+
+        return (attributes, data), svars
+
+    def getClientStatus(self, c, score_list):
+        """
+        Return the status of a client.
+        :param c: The client
+        :param score_list: The player scores by client slot
+        :return: A tuple (dict of client attributes, list of (name, value) client data, tk plugin info)
+        """
+        if not c.name:
+            c.name = "@" + str(c.id)
 
-            if not c.name:
-                c.name = "@" + str(c.id)
+        if c.exactName == "^7":
+            c.exactName = "@" + str(c.id) + "^7"
 
-            if c.exactName == "^7":
-                c.exactName = "@" + str(c.id) + "^7"
+        if not c.maskedLevel:
+            level = c.maxLevel
+        else:
+            level = c.maskedLevel
+
+        attributes = {
+            'Name': sanitizeMe(c.name),
+            'ColorName': sanitizeMe(c.exactName),
+            'DBID': str(c.id),
+            'Connections': str(c.connections),
+            'CID': c.cid,
+            'Level': str(level),
+            'GUID': c.guid or '',
+            'PBID': c.pbid or '',
+            'IP': c.ip,
+            'Team': str(c.team),
+            'Joined': str(time.ctime(c.timeAdd)),
+            'Updated': str(time.ctime(c.timeEdit)),
+            'Score': str(score_list[c.cid]) if score_list and c.cid in score_list else '0',
+            'State': str(c.state),
+        }
 
-            if not c.maskedLevel:
-                level = c.maxLevel
-            else:
-                level = c.maskedLevel
+        data = []
+        for k, v in c.data.iteritems():
             try:
-                client = xml.createElement("Client")
-                client.setAttribute("Name", sanitizeMe(c.name))
-                client.setAttribute("ColorName", sanitizeMe(c.exactName))
-                client.setAttribute("DBID", str(c.id))
-                client.setAttribute("Connections", str(c.connections))
-                client.setAttribute("CID", c.cid)
-                client.setAttribute("Level", str(level))
-
-                if c.guid:
-                    client.setAttribute("GUID", c.guid)
-                else:
-                    client.setAttribute("GUID", '')
-                if c.pbid:
-                    client.setAttribute("PBID", c.pbid)
-                else:
-                    client.setAttribute("PBID", '')
+                clean_data = sanitizeMe(str(v))
+            except Exception, err:
+                self.error("could not sanitize %r" % v, exc_info=err)
+                data.append(("%s" % k, ""))
+            else:
+                data.append(("%s" % k, clean_data))
+
+        tk = None
+        if self._tkPlugin:
+            if hasattr(c, 'tkplugin_points'):
+                attackers = []
+                if hasattr(c, 'tkplugin_attackers'):
+                    for acid, points in c.var(self, 'attackers').value.items():
+                        try:
+                            attackers.append((sanitizeMe(self.console.clients[acid].name), str(acid), str(points)))
+                        except Exception, e:
+                            self.warning('could not append child node in XML tree: %s' % e)
+                tk = (str(c.var(self, 'points')), attackers)
+
+        return attributes, data, tk
+
+    def buildXML(self, game, statuses):
+        """
+        Build the XML status body (everything inside the B3Status element).
+        :param game: The game status as returned by getGameStatus
+        :param statuses: The client statuses as returned by getClientStatus
+        """
+        output = StringIO.StringIO()
+        xml = XMLWriter(output, encoding='utf-8')
+        indent = lambda level: xml.data('\n' + '        ' * level)
+
+        attributes, data = game
+        indent(1)
+        xml.start('Game', dict((k, self._text(v)) for k, v in attributes))
+        for k, v in data:
+            indent(2)
+            xml.element('Data', Name=self._text(k), Value=self._text(v))
+        indent(1)
+        xml.end('Game')
+
+        indent(1)
+        xml.start('Clients', Total=str(len(statuses)))
+        for attributes, data, tk in statuses:
+            indent(2)
+            xml.start('Client', dict((k, self._text(v)) for k, v in attributes.iteritems()))
+            for k, v in data:
+                indent(3)
+                xml.element('Data', Name=self._text(k), Value=self._text(v))
+            if tk:
+                indent(3)
+                xml.start('TkPlugin', Points=tk[0])
+                for name, cid, points in tk[1]:
+                    indent(4)
+                    xml.element('Attacker', Name=self._text(name), CID=cid, Points=points)
+                indent(3)
+                xml.end('TkPlugin')
+            if data or tk:
+                indent(2)
+            xml.end('Client')
+        if statuses:
+            indent(1)
+        xml.end('Clients')
+        return output.getvalue()
+
+    @staticmethod
+    def _text(value):
+        """
+        Return a value as unicode text the XML writer can encode.
+        """
+        if isinstance(value, unicode):
+            return value
+        return str(value).decode('utf-8', 'replace')
 
-                client.setAttribute("IP", c.ip)
-                client.setAttribute("Team", str(c.team))
-                client.setAttribute("Joined", str(time.ctime(c.timeAdd)))
-                client.setAttribute("Updated", str(time.ctime(c.timeEdit)))
+    def storeServerVars(self, svars, refresh=True):
+        """
+        Store in the database the server vars which changed since the previous update.
+        :param svars: The dict of all the server vars
+        :param refresh: Whether to store the vars derived from the clock even if nothing else changed
+        """
+        storage = self.console.storage
+        table = self._tables['svars']
+        if self._svars is None:
+            changed, removed = svars, []
+        else:
+            changed = dict((k, v) for k, v in svars.iteritems() if self._svars.get(k) != v)
+            removed = [k for k in self._svars if k not in svars]
+            if not refresh and not removed and all(k in self._clockVars for k in changed):
+                return
 
-                if score_list and c.cid in score_list:
-                    client.setAttribute("Score", str(score_list[c.cid]))
+        if not changed and not removed:
+            return
+
+        self.verbose('storing %s changed server vars in database table: %s...' % (len(changed) + len(removed), table))
+        q = QueryBuilder(storage.db)
+        try:
+            if self._svars is None:
+                storage.truncateTable(table)
+            if removed:
+                storage.query("""DELETE FROM %s WHERE name IN (%s);""" % (table, ', '.join(q.escape(k) for k in removed)))
+            if changed:
+                values = ', '.join('(%s, %s)' % (q.escape(k), q.escape(v)) for k, v in sorted(changed.items()))
+                protocol = storage.dsnDict['protocol']
+                if protocol == 'postgresql':
+                    storage.query("""UPDATE %(table)s SET value = v.value FROM (VALUES %(values)s) AS v (name, value)
+                                     WHERE %(table)s.name = v.name;""" % {'table': table, 'values': values})
+                    storage.query("""INSERT INTO %(table)s (name, value) SELECT v.name, v.value FROM
+                                     (VALUES %(values)s) AS v (name, value) WHERE NOT EXISTS (
+                                     SELECT 1 FROM %(table)s WHERE %(table)s.name = v.name);""" % {'table': table,
+                                                                                                 'values': values})
+                elif protocol == 'sqlite':
+                    storage.query("""INSERT OR REPLACE INTO %s (name, value) VALUES %s;""" % (table, values))
                 else:
-                    client.setAttribute("Score", 0)
-
-                client.setAttribute("State", str(c.state))
-
-                if self._enableDBclientSaving:
-                    builder_key = ""
-                    builder_value = ""
-                    # get our attributes
-                    for k, v in client.attributes.items():
-                        # build the qrystring
-                        builder_key = "%s%s," % (builder_key, k)
-                        if isinstance(v, basestring):
-                            if "'" in v:
-                                v = "%s" % v.replace("'", "\\'")
-                        builder_value = "%s'%s'," % (builder_value, v)
-
-                    # cut last ,
-                    builder_key = builder_key[:-1]
-                    builder_value = builder_value[:-1]
-
-                    try:
-                        self.console.storage.query("""INSERT INTO %s (%s) VALUES (%s);""" % (self._tables['cvars'], builder_key, builder_value))
-                    except Exception:
-                        # exception is already logged, just don't raise it again
-                        pass
-
-                b3clients.appendChild(client)
-
-                for k, v in c.data.iteritems():
-                    data = xml.createElement("Data")
-                    data.setAttribute("Name", "%s" % k)
-
-                    try:
-                        clean_data = sanitizeMe(str(v))
-                    except Exception, err:
-                        self.error("could not sanitize %r" % v, exc_info=err)
-                        data.setAttribute("Value", "")
-                    else:
-                        data.setAttribute("Value", clean_data)
-
-                    client.appendChild(data)
-                        
-                if self._tkPlugin:
-                    if hasattr(c, 'tkplugin_points'):
-                        tkplugin = xml.createElement("TkPlugin")
-                        tkplugin.setAttribute("Points", str(c.var(self, 'points')))
-                        client.appendChild(tkplugin)            
-                        if hasattr(c, 'tkplugin_attackers'):
-                            for acid, points in c.var(self, 'attackers').value.items():
-                                try:
-                                    attacker = xml.createElement("Attacker")
-                                    attacker.setAttribute("Name", sanitizeMe(self.console.clients[acid].name))
-                                    attacker.setAttribute("CID", str(acid))
-                                    attacker.setAttribute("Points", str(points))
-                                    tkplugin.appendChild(attacker)
-                                except Exception, e:
-                                    self.warning('could not append child node in XML tree: %s' % e)
-                                    pass
-                                
-            except Exception, err:
-                self.error('XML Failed: %r' % err, exc_info=err)
-                pass
+                    storage.query("""INSERT INTO %s (name, value) VALUES %s ON DUPLICATE KEY
+                                     UPDATE value = VALUES(value);""" % (table, values))
+        except Exception:
+            # exception is already logged, just don't raise it again: store everything on next update
+            self._svars = None
+        else:
+            self._svars = svars
 
-        # --- End Clients section
+    def storeClients(self, statuses):
+        """
+        Store in the database the client rows which changed since the previous update.
+        :param statuses: The client statuses as returned by getClientStatus
+        """
+        storage = self.console.storage
+        table = self._tables['cvars']
+        rows = {}
+        for attributes, data, tk in statuses:
+            rows[attributes['CID']] = tuple(attributes[k] for k in self._clientColumns)
+
+        if self._cvars is None:
+            changed, stale = rows, []
+        else:
+            changed = dict((cid, row) for cid, row in rows.iteritems() if self._cvars.get(cid) != row)
+            stale = [cid for cid in self._cvars if cid not in rows or cid in changed]
+
+        if not changed and not stale and self._cvars is not None:
+            return
 
-        self.writeXML(xml.toprettyxml(encoding="UTF-8", indent="        "))
+        self.verbose('storing %s changed clients in database table: %s...' % (len(changed), table))
+        q = QueryBuilder(storage.db)
+        try:
+            if self._cvars is None:
+                storage.truncateTable(table)
+            if stale:
+                storage.query("""DELETE FROM %s WHERE CID IN (%s);""" % (table, ', '.join(q.escape(c) for c in stale)))
+            if changed:
+                values = ', '.join('(%s)' % ', '.join(q.escape(v) for v in row) for cid, row in sorted(changed.items()))
+                storage.query("""INSERT INTO %s (%s) VALUES %s;""" % (table, ', '.join(self._clientColumns), values))
+        except Exception:
+            # exception is already logged, just don't raise it again: store everything on next update
+            self._cvars = None
+        else:
+            self._cvars = rows
 
     def storeServerinfo(self, k, v):
         """
         Store server information in the database.
         """
         if self._enableDBsvarSaving:
-            # remove forbidden sql characters
-            k = re.sub("'", "", str(k))
-            v = re.sub("'", "", str(v))[:255]  # length of the database varchar field
-            try:
-                if self.console.storage.dsnDict['protocol'] == 'postgresql':
-                    self.console.storage.query("""UPDATE %s SET value='%s' WHERE name='%s';""" % (self._tables['svars'], v, k))
-                    self.console.storage.query("""INSERT INTO %s (name, value) SELECT '%s', '%s' WHERE NOT EXISTS (
-                                                  SELECT 1 FROM %s WHERE name='%s');""" % (self._tables['svars'], k, v,
-                                                                                           self._tables['svars'], k))
-                else:
-                    self.console.storage.query("""INSERT INTO %s (name, value) VALUES ('%s','%s') ON DUPLICATE KEY
-                                                  UPDATE value = VALUES(value);""" % (self._tables['svars'], k, v))
-            except Exception:
-                # exception is already logged, just don't raise it again
-                pass
+            svars = dict(self._svars or {})
+            svars[str(k).replace("'", "")] = str(v).replace("'", "")[:255]  # length of the database varchar field
+            self.storeServerVars(svars)
+
+    def writeStatus(self, body):
+        """
+        Write the XML status.
+        :param body: The XML status body as returned by buildXML
+        """
+        self.writeXML("<?xml version='1.0' encoding='UTF-8'?>\n<B3Status Time=\"%s\">%s\n</B3Status>\n" %
+                      (escape_attrib(time.asctime()), body))
 
     def writeXML(self, xml):
         """
@@ -502,4 +599,4 @@ class StatusPlugin(b3.plugin.Plugin):
         else:
             self.debug('writing XML status to %s', self._outputFile)
             with open(self._outputFile, 'w') as f:
-                f.write(xml)
\ No newline at end of file
+                f.write(xml)
@@ -21,12 +21,11 @@ import b3.plugin
 import b3.cron
 import string
 import re
-import threading
 import time
 
 from ConfigParser import NoOptionError
 
-__version__ = '1.5'
+__version__ = '1.7'
 __author__ = 'ThorN, mindriot, Courgette, xlr8or, SGT, 82ndab-Bravo17, ozon, Fenix'
 
 
@@ -408,8 +407,7 @@ class TkPlugin(b3.plugin.Plugin):
                 self.console.say(self.getMessage('forgive_warning', {'name': event.client.exactName,
                                                                      'points': points, 'cid': event.client.cid}) + msg)
                 event.client.setvar(self, 'checkBan', True)
-                t = threading.Timer(30, self.checkTKBan, (event.client,))
-                t.start()
+                self.console.timers.schedule(30, self.checkTKBan, (event.client,))
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -530,11 +528,13 @@ class TkPlugin(b3.plugin.Plugin):
         """
         Return client teamkill info.
         """
-        if not client.isvar(self, 'tkinfo'):
-            client.setvar(self, 'tkinfo', TkInfo(self, client.cid))
-        if not client.isvar(self, 'checkBan'):
-            client.setvar(self, 'checkBan', False)
-        return client.var(self, 'tkinfo').value
+        tk = client.pluginVars(self)
+        tkinfo = tk.get('tkinfo')
+        if tkinfo is None:
+            tkinfo = tk.tkinfo = TkInfo(self, client.cid)
+        if 'checkBan' not in tk:
+            tk.checkBan = False
+        return tkinfo
 
     def forgive(self, acid, victim, silent=False):
         """
@@ -18,14 +18,13 @@
 import b3
 import b3.events
 import b3.plugin
-import threading
 import time
 import re
 
 from b3.functions import getCmd
 from ConfigParser import NoOptionError
 
-__version__ = '1.4'
+__version__ = '1.5'
 __author__ = 'ThorN, xlr8or, Courgette'
 
 F_FIRST = 4
@@ -198,8 +197,7 @@ class WelcomePlugin(b3.plugin.Plugin):
         if self.console.upTime() < 300:
             self.debug('not welcoming player because the bot started less than 5 min ago')
             return
-        t = threading.Timer(self._welcomeDelay, self.welcome, (event.client,))
-        t.start()
+        self.console.timers.schedule(self._welcomeDelay, self.welcome, (event.client,), client=event.client)
 
     ####################################################################################################################
     #                                                                                                                  #
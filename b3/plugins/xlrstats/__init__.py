@@ -18,13 +18,14 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'xlr8or & ttlogic'
-__version__ = '3.0.0-beta.17'
+__version__ = '3.0.0-beta.22'
 
 import b3
 import b3.events
 import b3.plugin
 import b3.cron
 import b3.timezones
+import copy
 import datetime
 import time
 import os
@@ -104,6 +105,8 @@ class XlrstatsPlugin(b3.plugin.Plugin):
     _auto_correct_ignore_days = 60      # How many days before ignoring a players skill in the auto-correct calculation
     auto_purge = False                  # Purge players and associated data automatically (cannot be undone!)
     _purge_player_days = 365            # Number of days after which players will be auto-purged
+    flush_interval = 30                 # seconds between write-behind flushes of the stats cache (0 = write-through)
+    flush_intervals = (1, 2, 3, 4, 5, 6, 10, 12, 15, 20, 30, 60)  # allowed flush_interval values (divisors of 60)
 
     # keep some private map data to detect prematches and restarts
     _last_map = None
@@ -154,6 +157,8 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         self._ctimePlugin = None
         self._xlrstatstables = []           # will contain a list of the xlrstats database tables
         self._cronTabCorrectStats = None
+        self._cronTabFlush = None
+        self._cache = None                  # write-behind cache of the stats records (see StatsCache)
         self.query = None                   # shortcut to the storage.query function
         b3.plugin.Plugin.__init__(self, console, config)
 
@@ -195,6 +200,13 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         ActionStats._table = self.actionstats_table
         PlayerActions._table = self.playeractions_table
 
+        # keep the stats records hot in memory and write them back in batches
+        if self.flush_interval > 0:
+            self._cache = StatsCache(self)
+            second = '*/%s' % self.flush_interval if self.flush_interval < 60 else 0
+            self._cronTabFlush = b3.cron.PluginCronTab(self, self.flushStats, second)
+            self.console.cron + self._cronTabFlush
+
         # register the events we're interested in.
         self.registerEvent('EVT_CLIENT_JOIN', self.onJoin)
         self.registerEvent('EVT_CLIENT_KILL', self.onKill)
@@ -203,6 +215,8 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         self.registerEvent('EVT_GAME_ROUND_START', self.onRoundStart)
         self.registerEvent('EVT_CLIENT_ACTION', self.onAction)       # for game-events/actions
         self.registerEvent('EVT_CLIENT_DAMAGE', self.onDamage)       # for assist recognition
+        self.registerEvent('EVT_CLIENT_DISCONNECT', self.onDisconnect)
+        self.registerEvent('EVT_GAME_ROUND_END', self.onRoundEnd)
 
         # get the Client.id for the bot itself (guid: WORLD or Server(bfbc2/moh/hf))
         sclient = self.console.clients.getByGUID("WORLD")
@@ -315,6 +329,9 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         self.prematch_maxtime = self.getSetting('settings', 'prematch_maxtime', b3.INT, self.prematch_maxtime)
         self.announce = self.getSetting('settings', 'announce', b3.BOOL, self.announce)
         self.keep_time = self.getSetting('settings', 'keep_time', b3.BOOL, self.keep_time)
+        # the flush runs on the seconds of the minute multiple of the interval: only divisors of 60 keep it regular
+        self.flush_interval = self.getSetting('settings', 'flush_interval', b3.INT, self.flush_interval,
+                                              lambda x: max([0] + [d for d in self.flush_intervals if d <= x]))
 
         # load custom table names
         self.load_config_tables()
@@ -456,6 +473,38 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         self.checkMinPlayers(_roundstart=True)
         self.roundstart()
 
+    def onRoundEnd(self, _):
+        """
+        Handle EVT_GAME_ROUND_END
+        """
+        self.flushStats()
+
+    def onDisconnect(self, event):
+        """
+        Handle EVT_CLIENT_DISCONNECT
+        """
+        if self._cache and event.client:
+            # pending changes are written back by the next flush: the player records are evicted then
+            self._cache.evict(event.client.id)
+
+    def onStop(self, _):
+        """
+        Handle EVT_STOP
+        """
+        self.flushStats()
+
+    def onExit(self, _):
+        """
+        Handle EVT_EXIT
+        """
+        self.flushStats()
+
+    def onDisable(self):
+        """
+        Called when the plugin is disabled.
+        """
+        self.flushStats()
+
     def onAction(self, event):
         """
         Handle EVT_CLIENT_ACTION
@@ -529,48 +578,135 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         else:
             client_id = client.id
 
+        s = self.get_CachedStat(PlayerStats, client_id)
+        if s:
+            return s
+
         q = """SELECT * from %s WHERE client_id = %s LIMIT 1""" % (self.playerstats_table, client_id)
         cursor = self.query(q)
         if cursor and not cursor.EOF:
-            r = cursor.getRow()
-            s = PlayerStats()
-            s.id = r['id']
-            s.client_id = r['client_id']
-            s.kills = r['kills']
-            if (s.kills + s.deaths) > self.Kswitch_confrontations:
-                s.Kfactor = self.Kfactor_low
-            else:
-                s.Kfactor = self.Kfactor_high
-            s.deaths = r['deaths']
-            s.teamkills = r['teamkills']
-            s.teamdeaths = r['teamdeaths']
-            s.suicides = r['suicides']
-            s.ratio = r['ratio']
-            s.skill = r['skill']
-            s.assists = r['assists']
-            s.assistskill = r['assistskill']
-            s.curstreak = r['curstreak']
-            s.winstreak = r['winstreak']
-            s.losestreak = r['losestreak']
-            s.rounds = r['rounds']
-            s.hide = r['hide']
-            s.fixed_name = r['fixed_name']
-            s.id_token = r['id_token']
-            return s
-        elif (client is None) or (client.maxLevel >= self.minlevel):
+            return self.cache_Stat(self.make_PlayerStats(cursor.getRow()))
+        return self.new_PlayerStats(client, client_id)
+
+    def new_PlayerStats(self, client, client_id):
+        """
+        Return a new stats record for the given client IFF client's level is high enough (None otherwise).
+        """
+        if (client is None) or (client.maxLevel >= self.minlevel):
             s = PlayerStats()
             s._new = True
             s.skill = self.defaultskill
             s.Kfactor = self.Kfactor_high
             s.client_id = client_id
             return s
+        return None
+
+    def make_PlayerStats(self, r):
+        """
+        Build a PlayerStats object out of a playerstats table row.
+        """
+        s = PlayerStats()
+        s.id = r['id']
+        s.client_id = r['client_id']
+        s.kills = r['kills']
+        if (s.kills + s.deaths) > self.Kswitch_confrontations:
+            s.Kfactor = self.Kfactor_low
         else:
-            return None
+            s.Kfactor = self.Kfactor_high
+        s.deaths = r['deaths']
+        s.teamkills = r['teamkills']
+        s.teamdeaths = r['teamdeaths']
+        s.suicides = r['suicides']
+        s.ratio = r['ratio']
+        s.skill = r['skill']
+        s.assists = r['assists']
+        s.assistskill = r['assistskill']
+        s.curstreak = r['curstreak']
+        s.winstreak = r['winstreak']
+        s.losestreak = r['losestreak']
+        s.rounds = r['rounds']
+        s.hide = r['hide']
+        s.fixed_name = r['fixed_name']
+        s.id_token = r['id_token']
+        return s
 
     def get_PlayerAnon(self):
         return self.get_PlayerStats(None)
 
+    def get_PlayersStats(self, clients, bodypartids=()):
+        """
+        Retrieve the stats records of several clients, along with their body parts stats, in a single query.
+        Records already in the cache are not read again from the database.
+        :param clients: The list of clients
+        :param bodypartids: The body parts to retrieve the player stats of
+        :return: A tuple (dict client id => PlayerStats, dict (player id, body part id) => PlayerBody): clients
+                 whose level is too low and body parts having no stats yet are missing from the dicts
+        """
+        stats = {}
+        bodies = {}
+        missing = []
+        for client in clients:
+            s = self.get_CachedStat(PlayerStats, client.id)
+            if s:
+                stats[client.id] = s
+                for bodypartid in bodypartids:
+                    b = self.get_CachedStat(PlayerBody, (s.id, bodypartid))
+                    if not b:
+                        break
+                    bodies[(s.id, bodypartid)] = b
+                else:
+                    continue
+            missing.append(client)
+
+        if missing:
+            if bodypartids:
+                q = """SELECT s.*, b.id AS body_id, b.bodypart_id AS body_bodypart_id, b.kills AS body_kills,
+                       b.deaths AS body_deaths, b.suicides AS body_suicides, b.teamkills AS body_teamkills,
+                       b.teamdeaths AS body_teamdeaths FROM %s s LEFT JOIN %s b ON b.player_id = s.id
+                       AND b.bodypart_id IN (%s) WHERE s.client_id IN (%s)""" % (
+                    self.playerstats_table, self.playerbody_table, ', '.join(str(x) for x in bodypartids),
+                    ', '.join(str(c.id) for c in missing))
+            else:
+                q = """SELECT * FROM %s WHERE client_id IN (%s)""" % (
+                    self.playerstats_table, ', '.join(str(c.id) for c in missing))
+            cursor = self.query(q)
+            while cursor and not cursor.EOF:
+                r = cursor.getRow()
+                s = stats.get(r['client_id'])
+                if s is None:
+                    s = stats[r['client_id']] = self.cache_Stat(self.make_PlayerStats(r))
+                if r.get('body_id') is not None and (s.id, r['body_bodypart_id']) not in bodies:
+                    # cached records may hold changes not written back yet: they take precedence
+                    b = self.get_CachedStat(PlayerBody, (s.id, r['body_bodypart_id']))
+                    if not b:
+                        b = PlayerBody()
+                        b.id = r['body_id']
+                        b.player_id = s.id
+                        b.bodypart_id = r['body_bodypart_id']
+                        b.kills = r['body_kills']
+                        b.deaths = r['body_deaths']
+                        b.suicides = r['body_suicides']
+                        b.teamkills = r['body_teamkills']
+                        b.teamdeaths = r['body_teamdeaths']
+                        self.cache_Stat(b)
+                    bodies[(s.id, b.bodypart_id)] = b
+                cursor.moveNext()
+            if cursor:
+                cursor.close()
+
+            for client in missing:
+                if client.id not in stats:
+                    s = self.new_PlayerStats(client, client.id)
+                    if s:
+                        stats[client.id] = s
+
+        return stats, bodies
+
     def get_WeaponStats(self, name):
+        s = self.get_CachedStat(WeaponStats, name)
+        if s:
+            return s
+
         s = WeaponStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.weaponstats_table, name)
         cursor = self.query(q)
@@ -581,13 +717,17 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.kills = r['kills']
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.name = name
             return s
 
     def get_Bodypart(self, name):
+        s = self.get_CachedStat(Bodyparts, name)
+        if s:
+            return s
+
         s = Bodyparts()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.bodyparts_table, name)
         cursor = self.query(q)
@@ -598,7 +738,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.kills = r['kills']
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.name = name
@@ -606,6 +746,10 @@ class XlrstatsPlugin(b3.plugin.Plugin):
 
     def get_MapStats(self, name):
         assert name is not None
+        s = self.get_CachedStat(MapStats, name)
+        if s:
+            return s
+
         s = MapStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.mapstats_table, name)
         cursor = self.query(q)
@@ -617,13 +761,17 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.rounds = r['rounds']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.name = name
             return s
 
     def get_WeaponUsage(self, weaponid, playerid):
+        s = self.get_CachedStat(WeaponUsage, (weaponid, playerid))
+        if s:
+            return s
+
         s = WeaponUsage()
         q = """SELECT * from %s WHERE weapon_id = %s AND player_id = %s LIMIT 1""" % (self.weaponusage_table, weaponid, playerid)
         cursor = self.query(q)
@@ -637,7 +785,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.player_id = playerid
@@ -645,6 +793,10 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             return s
 
     def get_Opponent(self, killerid, targetid):
+        s = self.get_CachedStat(Opponents, (killerid, targetid))
+        if s:
+            return s
+
         s = Opponents()
         q = """SELECT * from %s WHERE killer_id = %s AND target_id = %s LIMIT 1""" % (self.opponents_table, killerid, targetid)
         cursor = self.query(q)
@@ -655,7 +807,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.target_id = r['target_id']
             s.kills = r['kills']
             s.retals = r['retals']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.killer_id = killerid
@@ -663,6 +815,10 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             return s
 
     def get_PlayerBody(self, playerid, bodypartid):
+        s = self.get_CachedStat(PlayerBody, (playerid, bodypartid))
+        if s:
+            return s
+
         s = PlayerBody()
         q = """SELECT * from %s WHERE bodypart_id = %s AND player_id = %s LIMIT 1""" % (self.playerbody_table, bodypartid, playerid)
         cursor = self.query(q)
@@ -676,7 +832,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.suicides = r['suicides']
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.player_id = playerid
@@ -696,6 +852,10 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             else:
                 return None
 
+        s = self.get_CachedStat(PlayerMaps, (playerid, mapid))
+        if s:
+            return s
+
         s = PlayerMaps()
         q = """SELECT * from %s WHERE map_id = %s AND player_id = %s LIMIT 1""" % (self.playermaps_table, mapid, playerid)
         cursor = self.query(q)
@@ -710,7 +870,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.teamkills = r['teamkills']
             s.teamdeaths = r['teamdeaths']
             s.rounds = r['rounds']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.player_id = playerid
@@ -718,6 +878,10 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             return s
 
     def get_ActionStats(self, name):
+        s = self.get_CachedStat(ActionStats, name)
+        if s:
+            return s
+
         s = ActionStats()
         q = """SELECT * from %s WHERE name = '%s' LIMIT 1""" % (self.actionstats_table, name)
         cursor = self.query(q)
@@ -726,13 +890,17 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.id = r['id']
             s.name = r['name']
             s.count = r['count']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.name = name
             return s
 
     def get_PlayerActions(self, playerid, actionid):
+        s = self.get_CachedStat(PlayerActions, (playerid, actionid))
+        if s:
+            return s
+
         s = PlayerActions()
         q = """SELECT * from %s WHERE action_id = %s AND player_id = %s LIMIT 1""" % (self.playeractions_table, actionid, playerid)
         cursor = self.query(q)
@@ -742,7 +910,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             s.player_id = r['player_id']
             s.action_id = r['action_id']
             s.count = r['count']
-            return s
+            return self.cache_Stat(s)
         else:
             s._new = True
             s.player_id = playerid
@@ -759,7 +927,12 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             if cursor.rowcount > 0:
                 stat.id = cursor.lastrowid
                 delattr(stat, '_new')
+                self.cache_Stat(stat)
+        elif self._cache:
+            # the update will be written back by the next flush
+            self._cache.put(stat, dirty=True)
         else:
+            # no cache: the next kill reads the record back from the database, so write it right away
             q = stat._updatequery()
             #self.debug('Updating using: %r', q)
             self.query(q)
@@ -770,6 +943,29 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         # If it fails, that's just bad luck.
         return
 
+    def get_CachedStat(self, stat_class, key):
+        """
+        Return a copy of the cached stats record matching the given key (None if not cached).
+        """
+        if self._cache:
+            return self._cache.get(stat_class, key)
+        return None
+
+    def cache_Stat(self, stat):
+        """
+        Store a stats record, as read from (or just inserted in) the database, in the write-behind cache.
+        """
+        if self._cache:
+            self._cache.put(stat)
+        return stat
+
+    def flushStats(self):
+        """
+        Write the pending stats changes back to the database.
+        """
+        if self._cache:
+            self._cache.flush()
+
     def check_Assists(self, client, target, data, etype=None):
         # determine eventual assists // an assist only counts if damage was done within # secs. before death
         # it will also punish teammates that have a 'negative' assist!
@@ -1534,6 +1730,7 @@ class XlrstatsPlugin(b3.plugin.Plugin):
 
     def correctStats(self):
         self.debug('gathering XLRstats statistics')
+        self.flushStats()
         _seconds = self._auto_correct_ignore_days * 86400
         q = """SELECT MAX(%s.skill) AS max_skill, MIN(%s.skill) AS min_skill, SUM(%s.skill) AS sum_skill,
                AVG(%s.skill) AS avg_skill , COUNT(%s.id) AS cnt
@@ -1594,12 +1791,16 @@ class XlrstatsPlugin(b3.plugin.Plugin):
             self.debug('correcting overall skill with factor %s...' % round(_correction_factor, _factor_decimals))
             self.query("""UPDATE %s SET skill=(SELECT skill * %s ) WHERE %s.client_id <> %s""" % (
                        self.playerstats_table, _correction_factor, self.playerstats_table, self._world_clientid))
+            if self._cache:
+                # cached skills are stale now: reload them from the database
+                self._cache.invalidate(PlayerStats)
 
     def purgePlayers(self):
         if not self.auto_purge:
             return None
 
         self.debug('purgin players who haven\'t been online for %s days...', self._purge_player_days)
+        self.flushStats()
 
         # find players who haven't been online for a long time
         _seconds = self._purge_player_days * 86400
@@ -1622,6 +1823,9 @@ class XlrstatsPlugin(b3.plugin.Plugin):
                 self.purgeAssociated(self.weaponusage_table, r['player_id'])
                 cursor.moveNext()
 
+            if self._cache:
+                self._cache.invalidate()
+
     def purgePlayerStats(self, _id):
         self.query("""DELETE FROM %s WHERE id = %s""" % (self.playerstats_table, _id))
 
@@ -1683,6 +1887,9 @@ class XlrstatsPlugin(b3.plugin.Plugin):
                 if limit > 10:
                     limit = 10
 
+        # make sure the toplist reflects the stats collected so far
+        self.flushStats()
+
         q = 'SELECT %s.name, %s.time_edit, %s.id, kills, deaths, ratio, skill, winstreak, losestreak, rounds, fixed_name, ip \
              FROM %s, %s \
                  WHERE (%s.id = %s.client_id) \
@@ -1818,6 +2025,10 @@ class XlrstatsPlugin(b3.plugin.Plugin):
         xlr_tables = [getattr(self, x) for x in dir(self) if x.endswith('_table')]
         current_tables = self.console.storage.getTables()
 
+        # drop the cached records (including pending changes) which are about to be wiped out
+        if self._cache:
+            self._cache.clear()
+
         # truncate database tables
         for table in xlr_tables:
             if table in current_tables:
@@ -2277,6 +2488,7 @@ class BattlestatsPlugin(b3.plugin.Plugin):
 class StatObject(object):
 
     _table = None
+    _fields = ()
 
     def _insertquery(self):
         return None
@@ -2284,11 +2496,52 @@ class StatObject(object):
     def _updatequery(self):
         return None
 
+    def _key(self):
+        """
+        Return the key identifying this record in the write-behind cache.
+        """
+        return None
+
+    def _values(self):
+        """
+        Return the SQL tuple of values (id first, followed by the table fields) of this record.
+        """
+        values = [str(self.id)]
+        for field in self._fields:
+            value = getattr(self, field)
+            if isinstance(value, basestring):
+                values.append("'%s'" % escape(value, "'"))
+            elif isinstance(value, bool):
+                values.append(str(int(value)))
+            else:
+                values.append(str(value))
+        return '(%s)' % ', '.join(values)
+
+    @classmethod
+    def _upsertqueries(cls, stats, protocol):
+        """
+        Return the list of queries needed to write back the given records of this class.
+        :param stats: A list of records already stored in the database
+        :param protocol: The storage protocol
+        """
+        if protocol == 'mysql':
+            return ["""INSERT INTO %s (id, %s) VALUES %s ON DUPLICATE KEY UPDATE %s""" % (
+                    cls._table, ', '.join(cls._fields), ', '.join([x._values() for x in stats]),
+                    ', '.join(['%s=VALUES(%s)' % (f, f) for f in cls._fields]))]
+        elif protocol == 'postgresql':
+            return ["""UPDATE %s SET %s FROM (VALUES %s) AS v (id, %s) WHERE %s.id = v.id""" % (
+                    cls._table, ', '.join(['%s=v.%s' % (f, f) for f in cls._fields]),
+                    ', '.join([x._values() for x in stats]), ', '.join(cls._fields), cls._table)]
+        # no multi-row update available: updates are cheap on a local database file anyway
+        return [x._updatequery() for x in stats]
+
 
 class PlayerStats(StatObject):
 
     # default name of the table for this data object
     _table = 'playerstats'
+    _fields = ('client_id', 'kills', 'deaths', 'teamkills', 'teamdeaths', 'suicides', 'ratio', 'skill', 'assists',
+               'assistskill', 'curstreak', 'winstreak', 'losestreak', 'rounds', 'hide', 'fixed_name', 'id_token')
 
     # fields of the table
     id = None
@@ -2316,6 +2569,9 @@ class PlayerStats(StatObject):
     fixed_name = ""
     id_token = ""    # player identification token for webfront v3
 
+    def _key(self):
+        return self.client_id
+
     def _insertquery(self):
         q = """INSERT INTO %s (client_id, kills, deaths, teamkills, teamdeaths, suicides, ratio, skill, assists,
                assistskill, curstreak, winstreak, losestreak, rounds, hide, fixed_name, id_token) VALUES (%s, %s, %s,
@@ -2339,6 +2595,7 @@ class WeaponStats(StatObject):
 
     # default name of the table for this data object
     _table = 'weaponstats'
+    _fields = ('name', 'kills', 'suicides', 'teamkills')
 
     # fields of the table
     id = None
@@ -2347,6 +2604,9 @@ class WeaponStats(StatObject):
     suicides = 0
     teamkills = 0
 
+    def _key(self):
+        return self.name
+
     def _insertquery(self):
         q = """INSERT INTO %s (name, kills, suicides, teamkills) VALUES ('%s', %s, %s, %s)""" % (
             self._table, escape(self.name, "'"), self.kills, self.suicides, self.teamkills)
@@ -2362,6 +2622,7 @@ class WeaponUsage(StatObject):
 
     # default name of the table for this data object
     _table = 'weaponusage'
+    _fields = ('player_id', 'weapon_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths')
 
     # fields of the table
     id = None
@@ -2373,6 +2634,9 @@ class WeaponUsage(StatObject):
     teamkills = 0
     teamdeaths = 0
 
+    def _key(self):
+        return self.weapon_id, self.player_id
+
     def _insertquery(self):
         q = """INSERT INTO %s (player_id, weapon_id, kills, deaths, suicides, teamkills, teamdeaths)
             VALUES (%s, %s, %s, %s, %s, %s, %s)""" % (self._table, self.player_id, self.weapon_id, self.kills,
@@ -2390,6 +2654,7 @@ class Bodyparts(StatObject):
 
     # default name of the table for this data object
     _table = 'bodyparts'
+    _fields = ('name', 'kills', 'suicides', 'teamkills')
 
     # fields of the table
     id = None
@@ -2398,6 +2663,9 @@ class Bodyparts(StatObject):
     suicides = 0
     teamkills = 0
 
+    def _key(self):
+        return self.name
+
     def _insertquery(self):
         q = """INSERT INTO %s (name, kills, suicides, teamkills) VALUES ('%s', %s, %s, %s)""" % (
             self._table, escape(self.name, "'"), self.kills, self.suicides, self.teamkills)
@@ -2413,6 +2681,7 @@ class MapStats(StatObject):
 
     # default name of the table for this data object
     _table = 'mapstats'
+    _fields = ('name', 'kills', 'suicides', 'teamkills', 'rounds')
 
     # fields of the table
     id = None
@@ -2422,6 +2691,9 @@ class MapStats(StatObject):
     teamkills = 0
     rounds = 0
 
+    def _key(self):
+        return self.name
+
     def _insertquery(self):
         q = """INSERT INTO %s (name, kills, suicides, teamkills, rounds) VALUES ('%s', %s, %s, %s, %s)""" % (
             self._table, escape(self.name, "'"), self.kills, self.suicides, self.teamkills, self.rounds)
@@ -2437,6 +2709,7 @@ class PlayerBody(StatObject):
 
     # default name of the table for this data object
     _table = 'playerbody'
+    _fields = ('player_id', 'bodypart_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths')
 
     # fields of the table
     id = None
@@ -2448,6 +2721,9 @@ class PlayerBody(StatObject):
     teamkills = 0
     teamdeaths = 0
 
+    def _key(self):
+        return self.player_id, self.bodypart_id
+
     def _insertquery(self):
         q = """INSERT INTO %s (player_id, bodypart_id, kills, deaths, suicides, teamkills, teamdeaths)
                VALUES (%s, %s, %s, %s, %s, %s, %s)""" % (self._table, self.player_id, self.bodypart_id, self.kills,
@@ -2465,6 +2741,7 @@ class PlayerMaps(StatObject):
 
     # default name of the table for this data object
     _table = 'playermaps'
+    _fields = ('player_id', 'map_id', 'kills', 'deaths', 'suicides', 'teamkills', 'teamdeaths', 'rounds')
 
     # fields of the table
     id = 0
@@ -2477,6 +2754,9 @@ class PlayerMaps(StatObject):
     teamdeaths = 0
     rounds = 0
 
+    def _key(self):
+        return self.player_id, self.map_id
+
     def _insertquery(self):
         q = """INSERT INTO %s (player_id, map_id, kills, deaths, suicides, teamkills, teamdeaths, rounds)
             VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""" % (self._table, self.player_id, self.map_id, self.kills,
@@ -2494,6 +2774,7 @@ class Opponents(StatObject):
 
     # default name of the table for this data object
     _table = 'opponents'
+    _fields = ('killer_id', 'target_id', 'kills', 'retals')
 
     # fields of the table
     id = None
@@ -2502,6 +2783,9 @@ class Opponents(StatObject):
     kills = 0
     retals = 0
 
+    def _key(self):
+        return self.killer_id, self.target_id
+
     def _insertquery(self):
         q = """INSERT INTO %s (killer_id, target_id, kills, retals) VALUES (%s, %s, %s, %s)""" % (
             self._table, self.killer_id, self.target_id, self.kills, self.retals)
@@ -2517,12 +2801,16 @@ class ActionStats(StatObject):
 
     # default name of the table for this data object
     _table = 'actionstats'
+    _fields = ('name', 'count')
 
     # fields of the table
     id = None
     name = ''
     count = 0
 
+    def _key(self):
+        return self.name
+
     def _insertquery(self):
         q = """INSERT INTO %s (name, count) VALUES ('%s', %s)""" % (self._table, escape(self.name, "'"), self.count)
         return q
@@ -2536,6 +2824,7 @@ class PlayerActions(StatObject):
 
     # default name of the table for this data object
     _table = 'playeractions'
+    _fields = ('player_id', 'action_id', 'count')
 
     # fields of the table
     id = None
@@ -2543,6 +2832,9 @@ class PlayerActions(StatObject):
     action_id = 0
     count = 0
 
+    def _key(self):
+        return self.player_id, self.action_id
+
     def _insertquery(self):
         q = """INSERT INTO %s (player_id, action_id, count) VALUES (%s, %s, %s)""" % (
             self._table, self.player_id, self.action_id, self.count)
@@ -2596,6 +2888,149 @@ class PlayerBattles(StatObject):
     weapon_kills = {}
     favorite_weapon_id = 0
 
+########################################################################################################################
+#                                                                                                                      #
+#   WRITE-BEHIND CACHE - KEEPS THE STATS RECORDS IN MEMORY AND WRITES THEM BACK IN BATCHES                             #
+#                                                                                                                      #
+########################################################################################################################
+
+class StatsCache(object):
+    """
+    Keep the stats records used by the XLRstats plugin in memory: updates are applied to the cached
+    records and written back to the database in batches when flush() is called.
+    Records are handed out as copies so that changes which are not saved with save_Stat() are lost,
+    exactly like they would be without the cache.
+    """
+    batch_size = 100
+
+    def __init__(self, plugin):
+        """
+        Object constructor.
+        :param plugin: The XLRstats plugin instance
+        """
+        self.plugin = plugin
+        self.hits = 0
+        self.misses = 0
+        self.flushed = 0
+        self._rows = {}
+        self._dirty = {}
+        self._evicted = {}  # client id => player id of the clients whose records are evicted by the next flush
+        self._lock = threading.RLock()
+
+    def get(self, stat_class, key):
+        """
+        Return a copy of the cached record matching the given class and key.
+        :param stat_class: The StatObject subclass
+        :param key: The record key (see StatObject._key)
+        :return: A StatObject or None if not cached
+        """
+        with self._lock:
+            stat = self._rows.get((stat_class, key))
+            if stat is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return copy.copy(stat)
+
+    def put(self, stat, dirty=False):
+        """
+        Store a copy of the given record in the cache.
+        :param stat: The StatObject to store (it must have been stored in the database already)
+        :param dirty: Whether the record needs to be written back on the next flush
+        """
+        entry = (stat.__class__, stat._key())
+        with self._lock:
+            self._rows[entry] = copy.copy(stat)
+            if dirty:
+                self._dirty[entry] = self._rows[entry]
+
+    def evict(self, client_id, player_id=None):
+        """
+        Remove from the cache all the records belonging to the given client.
+        Records having pending changes are kept till the next flush, which evicts them.
+        :param client_id: The client database id
+        :param player_id: The id of the client PlayerStats record (looked up in the cache if None)
+        """
+        with self._lock:
+            if player_id is None:
+                playerstats = self._rows.get((PlayerStats, client_id))
+                player_id = playerstats.id if playerstats else None
+            kept = False
+            for entry, stat in self._rows.items():
+                if entry == (PlayerStats, client_id) or (player_id is not None and player_id in (
+                        getattr(stat, 'player_id', None), getattr(stat, 'killer_id', None),
+                        getattr(stat, 'target_id', None))):
+                    if entry in self._dirty:
+                        kept = True
+                    else:
+                        del self._rows[entry]
+            if kept:
+                self._evicted[client_id] = player_id
+            else:
+                self._evicted.pop(client_id, None)
+
+    def invalidate(self, stat_class=None):
+        """
+        Remove from the cache the records which do not have pending changes.
+        :param stat_class: Restrict the invalidation to the given StatObject subclass
+        """
+        with self._lock:
+            for entry in self._rows.keys():
+                if entry not in self._dirty and (stat_class is None or entry[0] is stat_class):
+                    del self._rows[entry]
+
+    def clear(self):
+        """
+        Remove all the records from the cache, discarding pending changes.
+        """
+        with self._lock:
+            self._rows.clear()
+            self._dirty.clear()
+
+    def flush(self):
+        """
+        Write back all the records having pending changes using batched queries.
+        :return: The number of records written back
+        """
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+            if not dirty:
+                return 0
+            evicted, self._evicted = self._evicted, {}
+
+        tables = {}
+        for (stat_class, _), stat in dirty.iteritems():
+            tables.setdefault(stat_class, []).append(stat)
+
+        count = 0
+        protocol = self.plugin.console.storage.protocol
+        for stat_class, stats in tables.iteritems():
+            for i in range(0, len(stats), self.batch_size):
+                batch = stats[i:i + self.batch_size]
+                try:
+                    for q in stat_class._upsertqueries(batch, protocol):
+                        self.plugin.query(q)
+                    count += len(batch)
+                except Exception, e:
+                    self.plugin.error('could not write back %s %s records: %s', len(batch), stat_class.__name__, e)
+                    self._requeue(batch)
+
+        self.flushed += count
+        self.plugin.verbose('flushed %s stats records to the database', count)
+        for client_id, player_id in evicted.iteritems():
+            self.evict(client_id, player_id)
+        return count
+
+    def _requeue(self, stats):
+        """
+        Mark the given records as dirty again unless they have been updated in the meantime.
+        """
+        with self._lock:
+            for stat in stats:
+                entry = (stat.__class__, stat._key())
+                if entry not in self._dirty and self._rows.get(entry) is stat:
+                    self._dirty[entry] = stat
+
 
 if __name__ == '__main__':
     print '\nThis is version ' + __version__ + ' by ' + __author__ + ' for BigBrotherBot.\n'
@@ -37,10 +37,11 @@
 # 2015/07/29 - 1.8   - Thomas LEVEIL - by default, run in console mode and remove the --console option
 
 __author__  = 'ThorN'
-__version__ = '1.8'
+__version__ = '1.9'
 
 import b3
 import b3.config
+import b3.host
 import os
 import sys
 import argparse
@@ -247,12 +248,50 @@ def run_console(options):
         raw_input("press any key to continue...")
 
 
+def run_hosting(options):
+    """
+    Run several game servers in a single B3 process.
+    :param options: command line options
+    """
+    analysis = None     # hosting config analysis result
+
+    try:
+
+        config = b3.getAbsolutePath(options.hosting, True)
+        if not os.path.isfile(config):
+            console_exit('ERROR: hosting configuration file not found (%s).' % config)
+
+        # LOADING HOSTING CONFIGURATION
+        hosting_config = b3.config.load(config)
+        analysis = b3.host.analyze(hosting_config)
+        if analysis:
+            raise b3.config.ConfigFileNotValid('invalid hosting configuration file specified')
+
+        # START B3
+        b3.host.start(hosting_config, options)
+
+    except b3.config.ConfigFileNotValid:
+        print 'CRITICAL: invalid hosting configuration file specified:\n'
+        for problem in analysis or []:
+            print"  >>> %s\n" % problem
+        raise SystemExit(1)
+    except SystemExit:
+        raise
+    except:
+        if sys.stdout != sys.__stdout__:
+            sys.stdout = sys.__stdout__
+            sys.stderr = sys.__stderr__
+        traceback.print_exc()
+        raise SystemExit(1)
+
+
 def main():
     """
     Main execution.
     """
     p = argparse.ArgumentParser()
     p.add_argument('-c', '--config', dest='config', default=None, metavar='b3.ini', help='B3 config file. Example: -c b3.ini')
+    p.add_argument('-H', '--hosting', dest='hosting', default=None, metavar='hosting.ini', help='Run the game servers listed in a hosting config file in a single process. Example: -H hosting.ini')
     p.add_argument('-r', '--restart', action='store_true', dest='restart', default=False, help='Auto-restart B3 on crash')
     p.add_argument('-s', '--setup',  action='store_true', dest='setup', default=False, help='Setup main b3.ini config file')
     p.add_argument('-u', '--update', action='store_true', dest='update', default=False, help='Update B3 database to latest version')
@@ -276,10 +315,14 @@ def main():
 
     if options.restart:
         ## AUTORESTART => CONSOLE
-        if options.config:
+        if options.hosting:
+            run_autorestart(['--hosting', options.hosting] + args)
+        elif options.config:
             run_autorestart(['--config', options.config] + args)
         else:
             run_autorestart([])
+    elif options.hosting:
+        run_hosting(options)
     else:
         run_console(options)
 
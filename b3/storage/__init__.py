@@ -17,7 +17,7 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 __author__ = 'Courgette'
-__version__ = '1.2'
+__version__ = '1.5'
 
 PROTOCOLS = ('mysql', 'sqlite', 'postgresql')
 
@@ -43,6 +43,9 @@ class Storage(object):
     
     def getClientsMatching(self, match):
         raise NotImplementedError
+
+    def getClientsMatchingName(self, name, limit=5, fuzzy=False):
+        raise NotImplementedError
     
     def setClient(self, client):
         raise NotImplementedError
@@ -88,6 +91,12 @@ class Storage(object):
     
     def numPenalties(self, client, type='Ban'):
         raise NotImplementedError
+
+    def getClientsActivePenalties(self, clients, type=('Ban', 'TempBan', 'Warning')):
+        raise NotImplementedError
+
+    def getClientAndPenalties(self, client, type=('Ban', 'TempBan', 'Warning')):
+        raise NotImplementedError
     
     def getGroups(self):
         raise NotImplementedError
@@ -107,6 +116,7 @@ class Storage(object):
 from mysql import MysqlStorage
 from sqlite import SqliteStorage
 from postgresql import PostgresqlStorage
+from shared import getSharedStorage
 
 def getStorage(dsn, dsnDict, console):
     """
@@ -127,4 +137,4 @@ def getStorage(dsn, dsnDict, console):
                              'protocols are: %s' % (dsnDict['protocol'], ','.join(PROTOCOLS)))
 
     construct = globals()['%sStorage' % dsnDict['protocol'].title()]
-    return construct(dsn, dsnDict, console)
\ No newline at end of file
+    return construct(dsn, dsnDict, console)
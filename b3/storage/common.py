@@ -24,7 +24,7 @@ import b3
 import os
 import re
 import sys
-import thread
+import threading
 
 from b3.clients import Client
 from b3.clients import ClientBan
@@ -35,13 +35,41 @@ from b3.clients import ClientWarning
 from b3.clients import Penalty
 from b3.querybuilder import QueryBuilder
 from b3.storage import Storage
+from b3.storage.cursor import BufferedCursor
 from b3.storage.cursor import Cursor as DBCursor
+from b3.storage.executor import StorageExecutor
+from b3.storage.nameindex import NameIndex
+from b3.storage.pool import ConnectionPool
+from b3.storage.pool import StorageStatus
 from contextlib import contextmanager
 from time import time
 
+
+def getCachedClient(console, client):
+    """
+    Fill a client object with the data found in the admins_cache section of the main configuration file.
+    :param console: The console instance.
+    :param client: The client object to fill with cached data.
+    """
+    if console.config.has_option('admins_cache', client.guid):
+        data = console.config.get('admins_cache', client.guid, True)
+        console.debug('pulling user form admins_cache %s' % data)
+        cid, name, level = data.split(',')
+        client.id = cid.strip()
+        client.name = name.strip()
+        client._tempLevel = int(level.strip())
+        return client
+    else:
+        raise KeyError('no client matching guid %s in admins_cache' % client.guid)
+
+
 class DatabaseStorage(Storage):
 
-    _lock = None
+    _executor = None
+    _nameIndex = None
+    _nameIndexChunk = 10000
+    _pool = None
+    _poolSize = 4
     _lastConnectAttempt = 0
     _consoleNotice = True
     _reName = re.compile(r'([A-Z])')
@@ -62,7 +90,8 @@ class DatabaseStorage(Storage):
         self.dsnDict = dsnDict
         self.console = console
         self.db = None
-        self._lock = thread.allocate_lock()
+        self._pool = ConnectionPool(self, size=self._poolSize)
+        self._executor = StorageExecutor(self)
 
     ####################################################################################################################
     #                                                                                                                  #
@@ -96,6 +125,113 @@ class DatabaseStorage(Storage):
         """
         self.shutdown()
 
+    def setupPool(self, size=None, timeout=None):
+        """
+        Configure the connection pool shared by the threads querying the storage layer.
+        :param size: The maximum number of connections opened with the storage layer.
+        :param timeout: The amount of seconds a query waits for a free connection before failing.
+        """
+        if size is not None:
+            self._pool.size = max(1, int(size))
+        if timeout is not None:
+            self._pool.timeout = max(0, float(timeout))
+        self.console.debug('Storage: connection pool size: %s, timeout: %ss', self._pool.size, self._pool.timeout)
+
+    def setupExecutor(self, workers=None, queue_size=None):
+        """
+        Configure and start the worker threads executing the tasks given to submit() and submitCall().
+        Until this is called (or with no worker) the tasks are executed synchronously.
+        :param workers: The number of worker threads.
+        :param queue_size: The maximum number of tasks waiting in each worker queue.
+        """
+        if workers is not None:
+            self._executor.workers = max(0, int(workers))
+        if queue_size is not None:
+            self._executor.queue_size = max(1, int(queue_size))
+        self.console.debug('Storage: %s worker threads, task queue size: %s', self._executor.workers,
+                           self._executor.queue_size)
+        self._executor.start()
+
+    def setupNameIndex(self):
+        """
+        Create the in-memory index of the client names and aliases used by getClientsMatchingName() and start
+        loading it in a separate thread: until it is loaded the names are searched in the storage layer.
+        """
+        self._nameIndex = NameIndex()
+        thread = threading.Thread(target=self._loadNameIndex, name='storage-nameindex')
+        thread.daemon = True
+        thread.start()
+
+    def _loadNameIndex(self):
+        """
+        Load the client names and aliases into the name index.
+        """
+        index = self._nameIndex
+        start = time()
+        try:
+            for table, key, field in (('clients', 'id', 'name'), ('aliases', 'client_id', 'alias')):
+                last_id = 0
+                while True:
+                    cursor = self.query("""SELECT id, %s, %s FROM %s WHERE id > %s ORDER BY id LIMIT %s""" % (
+                                        key, field, table, last_id, self._nameIndexChunk))
+                    rows = 0
+                    while not cursor.EOF:
+                        row = cursor.getRow()
+                        index.add(int(row[key]), row[field])
+                        last_id = int(row['id'])
+                        rows += 1
+                        cursor.moveNext()
+                    cursor.close()
+                    if rows < self._nameIndexChunk:
+                        break
+        except Exception, e:
+            self.console.error('Storage: could not load the name index: %s', e)
+        else:
+            index.ready = True
+            self.console.debug('Storage: name index loaded: %s names in %.1fs', len(index), time() - start)
+
+    def stopExecutor(self, wait=True):
+        """
+        Stop the storage worker threads: tasks still queued are executed first.
+        :param wait: Whether to wait for the queued tasks to be executed.
+        """
+        self._executor.stop(wait)
+
+    def _newConnection(self):
+        """
+        Open a new connection with the storage layer (used to fill the connection pool).
+        :raise Exception: If the connection cannot be established.
+        :return The connection instance.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _pingConnection(connection):
+        """
+        Check whether the given connection is still usable.
+        :param connection: The connection to check.
+        :return True if the connection is healthy, False otherwise.
+        """
+        try:
+            cursor = connection.cursor()
+            cursor.execute('SELECT 1')
+            cursor.fetchall()
+            cursor.close()
+        except Exception:
+            return False
+        return True
+
+    @staticmethod
+    def _closeConnection(connection):
+        """
+        Close a connection, ignoring any error.
+        :param connection: The connection to close.
+        """
+        try:
+            connection.close()
+        except Exception:
+            pass
+
     ####################################################################################################################
     #                                                                                                                  #
     #   STORAGE INTERFACE                                                                                              #
@@ -127,6 +263,8 @@ class DatabaseStorage(Storage):
         """
         self.console.debug('Storage: getClient %s' % client)
         where = {'id': client.id} if client.id > 0 else {'guid': client.guid}
+        if client.id > 0:
+            self.waitPending('clients', client.id)
 
         try:
 
@@ -134,8 +272,15 @@ class DatabaseStorage(Storage):
             if not cursor.rowcount:
                 raise KeyError('no client matching guid %s' % client.guid)
 
+            row = cursor.getRow()
+            if client.id <= 0 and row and self.waitPending('clients', row['id']):
+                # an update of the record was still pending: read it again
+                cursor.close()
+                cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'clients', {'id': row['id']}, None, 1))
+                row = cursor.getRow() or row
+
             found = False
-            for k, v in cursor.getRow().iteritems():
+            for k, v in row.iteritems():
                 #if hasattr(client, k) and getattr(client, k):
                 #    # don't set already set items
                 #    continue
@@ -150,16 +295,7 @@ class DatabaseStorage(Storage):
 
         except Exception:
             # query failed, try local cache
-            if self.console.config.has_option('admins_cache', client.guid):
-                data = self.console.config.get('admins_cache', client.guid, True)
-                self.console.debug('pulling user form admins_cache %s' % data)
-                cid, name, level = data.split(',')
-                client.id = cid.strip()
-                client.name = name.strip()
-                client._tempLevel = int(level.strip())
-                return client
-            else:
-                raise KeyError('no client matching guid %s in admins_cache' % client.guid)
+            return getCachedClient(self.console, client)
 
     def getClientsMatching(self, match):
         """
@@ -167,19 +303,49 @@ class DatabaseStorage(Storage):
         :param match: The data to match clients against.
         """
         self.console.debug('Storage: getClientsMatching %s' % match)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'clients', match, 'time_edit DESC', 5))
+        query = QueryBuilder(self.db).SelectQuery('*', 'clients', match, 'time_edit DESC', 5)
+        rows = self._getRows(query)
+        if self.waitPending('clients', [row['id'] for row in rows]):
+            # an update of some of the records was still pending: read them again
+            rows = self._getRows(query)
 
         clients = []
-        while not cursor.EOF:
-            g = cursor.getRow()
+        for g in rows:
             client = Client()
             for k, v in g.iteritems():
                 setattr(client, self.getVar(k), v)
             clients.append(client)
+
+        return clients
+
+    def getClientsMatchingName(self, name, limit=5, fuzzy=False):
+        """
+        Return a list of clients whose name or one of whose aliases contains the given name, best matches first.
+        Without a loaded name index, clients whose current name contains the given one are returned.
+        :param name: The name to search.
+        :param limit: The maximum number of clients to return.
+        :param fuzzy: Whether to also return clients whose name is similar to the given one (needs the name index).
+        """
+        index = self._nameIndex
+        if index is None or not index.ready:
+            return self.getClientsMatching({'%name%': name})
+
+        self.console.debug('Storage: getClientsMatchingName %s' % name)
+        ids = [key for key, text, score in index.search(name, limit, fuzzy)]
+        if not ids:
+            return []
+
+        found = {}
+        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'clients', {'id': ids}))
+        while not cursor.EOF:
+            client = Client()
+            for k, v in cursor.getRow().iteritems():
+                setattr(client, self.getVar(k), v)
+            found[int(client.id)] = client
             cursor.moveNext()
 
         cursor.close()
-        return clients
+        return [found[x] for x in ids if x in found]
 
     def setClient(self, client):
         """
@@ -206,6 +372,9 @@ class DatabaseStorage(Storage):
             client.id = cursor.lastrowid
             cursor.close()
 
+        if self._nameIndex is not None and data.get('name'):
+            self._nameIndex.add(int(client.id), data['name'])
+
         return client.id
 
     def setClientAlias(self, alias):
@@ -230,6 +399,9 @@ class DatabaseStorage(Storage):
             alias.id = cursor.lastrowid
             cursor.close()
 
+        if self._nameIndex is not None and data.get('alias') and data.get('client_id'):
+            self._nameIndex.add(int(data['client_id']), data['alias'])
+
         return alias.id
 
     def getClientAlias(self, alias):
@@ -371,17 +543,16 @@ class DatabaseStorage(Storage):
         :param types: The penalties type.
         :param num: The amount of penalties to retrieve.
         """
-        penalties = []
         where = QueryBuilder(self.db).WhereClause({'type': types, 'inactive': 0})
         where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
-        cursor = self.query(QueryBuilder(self.db).SelectQuery(fields='*', table='penalties', where=where,
-                                                              orderby='time_add DESC, id DESC', limit=num))
-        while not cursor.EOF and len(penalties) < num:
-            penalties.append(self._createPenaltyFromRow(cursor.getRow()))
-            cursor.moveNext()
+        query = QueryBuilder(self.db).SelectQuery(fields='*', table='penalties', where=where,
+                                                  orderby='time_add DESC, id DESC', limit=num)
+        rows = self._getRows(query)
+        if self.waitPending('penalties', [row['client_id'] for row in rows]):
+            # an update of some of the records was still pending: read them again
+            rows = self._getRows(query)
 
-        cursor.close()
-        return penalties
+        return [self._createPenaltyFromRow(row) for row in rows[:num]]
 
     def setClientPenalty(self, penalty):
         """
@@ -431,11 +602,13 @@ class DatabaseStorage(Storage):
         :return: The penalty given as input with all the fields set.
         """
         self.console.debug('Storage: getClientPenalty %s' % penalty)
-        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', {'id': penalty.id}, None, 1))
-        if cursor.EOF:
-            cursor.close()
+        query = QueryBuilder(self.db).SelectQuery('*', 'penalties', {'id': penalty.id}, None, 1)
+        row = self.query(query).getOneRow()
+        if row and self.waitPending('penalties', row['client_id']):
+            # an update of the record was still pending: read it again
+            row = self.query(query).getOneRow()
+        if not row:
             raise KeyError('no penalty matching id %s' % penalty.id)
-        row = cursor.getOneRow()
         return self._createPenaltyFromRow(row)
 
     def getClientPenalties(self, client, type='Ban'):
@@ -445,6 +618,7 @@ class DatabaseStorage(Storage):
         :param type: The type of the penalties we want to retrieve.
         :return: List of penalties
         """
+        self.waitPending('penalties', client.id)
         self.console.debug('Storage: getClientPenalties %s' % client)
         where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
         where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
@@ -465,6 +639,7 @@ class DatabaseStorage(Storage):
         :param type: The type of the penalty we want to retrieve.
         :return: The last penalty added for the given client
         """
+        self.waitPending('penalties', client.id)
         where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
         where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
         cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where, 'time_add DESC', 1))
@@ -482,6 +657,7 @@ class DatabaseStorage(Storage):
         :param type: The type of the penalty we want to retrieve.
         :return: The first penalty added for the given client.
         """
+        self.waitPending('penalties', client.id)
         where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
         where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
         cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where,
@@ -498,6 +674,7 @@ class DatabaseStorage(Storage):
         :param client: The client whose penalties we want to disable.
         :param type: The type of the penalties we want to disable.
         """
+        self.waitPending('penalties', client.id)
         self.query(QueryBuilder(self.db).UpdateQuery({'inactive': 1}, 'penalties',
                                                      {'type': type, 'client_id': client.id, 'inactive': 0}))
 
@@ -508,6 +685,7 @@ class DatabaseStorage(Storage):
         :param type: The penalties type.
         :return The number of penalties.
         """
+        self.waitPending('penalties', client.id)
         where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': client.id, 'inactive': 0})
         where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
         cursor = self.query("""SELECT COUNT(id) total FROM penalties WHERE %s""" % where)
@@ -515,6 +693,86 @@ class DatabaseStorage(Storage):
         cursor.close()
         return value
 
+    def getClientsActivePenalties(self, clients, type=('Ban', 'TempBan', 'Warning')):
+        """
+        Return the active penalties of several clients, fetching them with a single query.
+        :param clients: The clients whose penalties we want to retrieve.
+        :param type: The type of the penalties we want to retrieve.
+        :return: A dict mapping every client id to the list of its penalties (most recent first)
+        """
+        ids = sorted(set(int(c.id) for c in clients if c.id))
+        penalties = dict((x, []) for x in ids)
+        if not ids:
+            return penalties
+
+        self.waitPending('penalties', ids)
+
+        self.console.debug('Storage: getClientsActivePenalties %s' % ids)
+        where = QueryBuilder(self.db).WhereClause({'type': type, 'client_id': ids, 'inactive': 0})
+        where += ' AND (time_expire = -1 OR time_expire > %s)' % int(time())
+        cursor = self.query(QueryBuilder(self.db).SelectQuery('*', 'penalties', where, 'time_add DESC'))
+
+        while not cursor.EOF:
+            penalty = self._createPenaltyFromRow(cursor.getRow())
+            penalties.setdefault(penalty.clientId, []).append(penalty)
+            cursor.moveNext()
+
+        cursor.close()
+        return penalties
+
+    _penaltyFields = ('id', 'type', 'client_id', 'admin_id', 'duration', 'inactive', 'keyword', 'reason', 'data',
+                      'time_add', 'time_edit', 'time_expire')
+
+    def getClientAndPenalties(self, client, type=('Ban', 'TempBan', 'Warning')):
+        """
+        Fill a client object with the data fetched from the storage and return its active penalties: both are
+        fetched with a single query (the penalties are joined to the client record).
+        :param client: The client object to fill with fetch data.
+        :param type: The type of the penalties we want to retrieve.
+        :return: A tuple (client, penalties): penalties is None if they could not be fetched
+        """
+        self.console.debug('Storage: getClientAndPenalties %s' % client)
+        qb = QueryBuilder(self.db)
+        types = (type,) if isinstance(type, basestring) else type
+        if client.id > 0:
+            self.waitPending('clients', client.id)
+            self.waitPending('penalties', client.id)
+            where = 'c.id = %s' % qb.escape(int(client.id))
+        else:
+            where = 'c.guid = %s' % qb.escape(client.guid)
+
+        query = 'SELECT c.*, %s FROM clients c LEFT JOIN penalties p ON p.client_id = c.id AND p.inactive = 0 ' \
+                'AND p.type IN (%s) AND (p.time_expire = -1 OR p.time_expire > %s) WHERE %s ORDER BY p.time_add DESC'
+        query %= (', '.join('p.%s AS penalty_%s' % (x, x) for x in self._penaltyFields),
+                  ', '.join(qb.escape(x) for x in types), int(time()), where)
+
+        try:
+            cursor = self.query(query)
+        except Exception, e:
+            # query failed: let getClient deal with it (it falls back on the local cache)
+            self.console.warning('Storage: could not fetch client %s along with its penalties: %s' % (client, e))
+            return self.getClient(client), None
+
+        found = None
+        penalties = []
+        while not cursor.EOF:
+            row = cursor.getRow()
+            if found is None:
+                found = row['id']
+                for k, v in row.iteritems():
+                    if not k.startswith('penalty_'):
+                        setattr(client, self.getVar(k), v)
+            if row['id'] == found and row['penalty_id'] is not None:
+                penalties.append(self._createPenaltyFromRow(dict((k[8:], v) for k, v in row.iteritems()
+                                                                 if k.startswith('penalty_'))))
+            cursor.moveNext()
+
+        cursor.close()
+        if found is None:
+            return getCachedClient(self.console, client), []
+
+        return client, penalties
+
     _groups = None
 
     def getGroups(self):
@@ -600,17 +858,14 @@ class DatabaseStorage(Storage):
         :param bindata: Data to bind to the given query.
         :raise Exception: If the query cannot be evaluated.
         """
-        self._lock.acquire()
-        try:
-            cursor = self.db.cursor()
+        with self._pool.connection() as db:
+            cursor = db.cursor()
             if bindata is None:
                 cursor.execute(query)
             else:
                 cursor.execute(query, bindata)
-            dbcursor = DBCursor(cursor, self.db)
-        finally:
-            self._lock.release()
-        return dbcursor
+            # the connection goes back to the pool on return: buffer the result set
+            return DBCursor(BufferedCursor(cursor), db)
 
     def query(self, query, bindata=None):
         """
@@ -632,6 +887,56 @@ class DatabaseStorage(Storage):
             self.console.error('Query failed [%s] %r: %s', query, bindata, e)
             raise e
 
+    def submit(self, query, bindata=None, key=None):
+        """
+        Execute a query on the storage layer without waiting for it to complete.
+        Meant for writes whose outcome does not need to be known right away: errors are logged.
+        :param query: The query to execute.
+        :param bindata: Data to bind to the given query.
+        :param key: Queries submitted with the same key (ie: a table/row identifier) are executed in order.
+        :return: A StorageFuture whose result is the query cursor.
+        """
+        return self._executor.submit(self.query, (query, bindata), key=key)
+
+    def waitPending(self, table, id, timeout=10):
+        """
+        Wait for the writes submitted for some table rows to be executed: only the keys having a pending write
+        are waited for, so reads not following an asynchronous write of their rows never block.
+        Reads following asynchronous writes must call this to see the data they write.
+        :param table: The table name (the first item of the key the writes were submitted with).
+        :param id: The row id (the second item of the key), or a list of row ids.
+        :param timeout: The maximum amount of seconds to wait for each write.
+        :return: True if there was a pending write to wait for.
+        """
+        if not isinstance(id, (list, tuple, set)):
+            return self._executor.wait((table, id), timeout)
+        return len([x for x in set(id) if self._executor.wait((table, x), timeout)]) > 0
+
+    def _getRows(self, query):
+        """
+        Execute a query and return the rows of its result set.
+        :param query: The query to execute.
+        :return: A list of dict
+        """
+        cursor = self.query(query)
+        rows = []
+        while not cursor.EOF:
+            rows.append(cursor.getRow())
+            cursor.moveNext()
+        cursor.close()
+        return rows
+
+    def submitCall(self, func, args=(), kwargs=None, key=None):
+        """
+        Run a storage method (ie: setClient) without waiting for it to complete.
+        :param func: The function to execute.
+        :param args: The function positional arguments.
+        :param kwargs: The function keyword arguments.
+        :param key: Calls submitted with the same key (ie: a table/row identifier) are executed in order.
+        :return: A StorageFuture whose result is the function return value.
+        """
+        return self._executor.submit(func, args, kwargs, key=key)
+
     @contextmanager
     def query2(self, query, bindata=None):
         """
@@ -699,10 +1004,20 @@ class DatabaseStorage(Storage):
     def status(self):
         """
         Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
+        :return A StorageStatus evaluating to True if the connection is active, False otherwise.
         """
         raise NotImplementedError
 
+    def _status(self, connected):
+        """
+        Build the status() result out of the connection state and the connection pool statistics.
+        :param connected: Whether the connection with the storage layer is active.
+        """
+        status = StorageStatus(self._pool.stats())
+        status.update(self._executor.stats())
+        status['connected'] = bool(connected)
+        return status
+
     def getField(self, name):
         """
         Return a database field name given the correspondent variable name.
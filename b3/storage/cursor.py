@@ -21,6 +21,36 @@
 # 26/12/2014 - Fenix - moved into separate module
 
 
+class BufferedCursor(object):
+    """
+    DB-API cursor wrapper holding the whole result set in memory, so it stays readable once the
+    connection it was executed on is given back to the connection pool.
+    """
+    def __init__(self, cursor):
+        """
+        Object constructor: fetch the result set and close the given cursor.
+        :param cursor: The cursor the query has been executed on.
+        """
+        self.description = cursor.description
+        self.rowcount = cursor.rowcount
+        self.lastrowid = cursor.lastrowid
+        # description is None for statements not returning rows (some drivers raise on fetch)
+        self._rows = iter(cursor.fetchall() if cursor.description is not None else ())
+        cursor.close()
+
+    def fetchone(self):
+        """
+        Return the next row of the result set, or None when no more rows are available.
+        """
+        return next(self._rows, None)
+
+    def close(self):
+        """
+        Discard the rows not fetched yet.
+        """
+        self._rows = iter(())
+
+
 class Cursor(object):
 
     _cursor = None
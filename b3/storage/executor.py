@@ -0,0 +1,274 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+import Queue
+import sys
+import threading
+
+from traceback import extract_tb
+
+
+class StorageFuture(object):
+    """
+    Result of a task submitted to the StorageExecutor.
+    """
+    def __init__(self):
+        """
+        Object constructor.
+        """
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._callbacks = []
+        self._result = None
+        self._exception = None
+
+    def done(self):
+        """
+        Return True if the task has been executed.
+        """
+        return self._done.isSet()
+
+    def result(self, timeout=None):
+        """
+        Wait for the task to be executed and return its result.
+        :param timeout: The maximum amount of seconds to wait for
+        :raise Exception: The exception raised by the task, if any
+        :raise RuntimeError: If the task did not complete within timeout
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError('storage task did not complete within %s seconds' % timeout)
+        if self._exception is not None:
+            raise self._exception
+        return self._result
+
+    def exception(self, timeout=None):
+        """
+        Wait for the task to be executed and return the exception it raised (None if it succeeded).
+        :param timeout: The maximum amount of seconds to wait for
+        :raise RuntimeError: If the task did not complete within timeout
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError('storage task did not complete within %s seconds' % timeout)
+        return self._exception
+
+    def add_done_callback(self, callback):
+        """
+        Register a function to be called with this future once the task is executed.
+        The callback runs right away if the task is already done.
+        :param callback: The function to call
+        """
+        with self._lock:
+            if not self._done.isSet():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def _complete(self, result=None, exception=None):
+        """
+        Store the task outcome and run the registered callbacks.
+        """
+        with self._lock:
+            self._result = result
+            self._exception = exception
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            callback(self)
+
+
+class StorageExecutor(object):
+    """
+    Run storage tasks in a pool of worker threads.
+    Tasks submitted with the same key are executed by the same worker, in submission order. When the worker
+    queue is full the submitting thread blocks (backpressure) till there is room, logging a warning every
+    put_timeout seconds. With no worker the tasks run synchronously in the submitting thread.
+    """
+    def __init__(self, storage, workers=0, queue_size=1000, put_timeout=5):
+        """
+        Object constructor.
+        :param storage: The storage instance
+        :param workers: The number of worker threads
+        :param queue_size: The maximum number of tasks waiting in each worker queue
+        :param put_timeout: The amount of seconds between two warnings while a submission blocks on a full queue
+        """
+        self.storage = storage
+        self.workers = workers
+        self.queue_size = queue_size
+        self.put_timeout = put_timeout
+        self._queues = []
+        self._threads = []
+        self._lock = threading.Lock()
+        self._next = 0
+        self._pending = {}  # key => future of the last task submitted with it
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.overflows = 0
+
+    def start(self):
+        """
+        Start the worker threads.
+        """
+        with self._lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                queue = Queue.Queue(self.queue_size)
+                thread = threading.Thread(target=self._work, args=(queue,), name='storage-worker-%s' % i)
+                thread.daemon = True
+                self._queues.append(queue)
+                self._threads.append(thread)
+                thread.start()
+
+    def stop(self, wait=True):
+        """
+        Stop the worker threads once they have executed the tasks already queued.
+        :param wait: Whether to wait for the pending tasks to be executed
+        """
+        with self._lock:
+            queues, threads = self._queues, self._threads
+            self._queues, self._threads = [], []
+
+        for queue in queues:
+            queue.put(None)
+
+        if wait:
+            for thread in threads:
+                if thread is not threading.current_thread():
+                    thread.join()
+
+    def submit(self, func, args=(), kwargs=None, key=None):
+        """
+        Schedule the execution of func(*args, **kwargs).
+        :param func: The function to execute
+        :param args: The function positional arguments
+        :param kwargs: The function keyword arguments
+        :param key: Tasks sharing the same key are executed in submission order
+        :return: A StorageFuture
+        """
+        future = StorageFuture()
+        task = (future, func, args, kwargs or {})
+        if key is not None:
+            with self._lock:
+                self._pending[key] = future
+            future.add_done_callback(lambda f: self._forget(key, f))
+
+        with self._lock:
+            self.submitted += 1
+            queues = self._queues
+            if queues:
+                if key is None:
+                    self._next += 1
+                    index = self._next % len(queues)
+                else:
+                    index = hash(key) % len(queues)
+                queue, worker = queues[index], self._threads[index]
+
+        if not queues or threading.current_thread() in self._threads:
+            # synchronous mode, or a task submitted by a task: run it now to keep the ordering
+            self._run(*task)
+            return future
+
+        while True:
+            try:
+                queue.put(task, True, self.put_timeout)
+                return future
+            except Queue.Full:
+                with self._lock:
+                    self.overflows += 1
+                    stopped = queue not in self._queues
+                if stopped:
+                    # the worker drains its queue before exiting: the task runs after the ones queued before it
+                    worker.join()
+                    self._run(*task)
+                    return future
+                # never run the task ahead of the ones already queued: keep waiting for the worker
+                self.storage.console.warning('Storage: task queue full (%s tasks): waiting for the storage worker',
+                                             queue.qsize())
+
+    def wait(self, match, timeout=None):
+        """
+        Wait for the last tasks submitted with the given key to be executed, so that a read following them sees
+        the data they write.
+        :param match: A task key, or a function telling whether a task key matches
+        :param timeout: The maximum amount of seconds to wait for each task
+        :return: True if there was a pending task to wait for
+        """
+        if threading.current_thread() in self._threads:
+            # tasks submitted by a task run right away: nothing can be pending in front of it
+            return False
+        with self._lock:
+            if callable(match):
+                futures = [f for k, f in self._pending.items() if match(k)]
+            else:
+                futures = [self._pending[match]] if match in self._pending else []
+        for future in futures:
+            try:
+                future.exception(timeout)
+            except RuntimeError, e:
+                self.storage.console.warning('Storage: %s', e)
+        return len(futures) > 0
+
+    def _forget(self, key, future):
+        """
+        Stop tracking the last task submitted with a key once it is executed.
+        """
+        with self._lock:
+            if self._pending.get(key) is future:
+                del self._pending[key]
+
+    def stats(self):
+        """
+        Return the executor usage statistics.
+        """
+        with self._lock:
+            return {
+                'executor_workers': len(self._threads),
+                'executor_pending': sum(q.qsize() for q in self._queues),
+                'executor_submitted': self.submitted,
+                'executor_completed': self.completed,
+                'executor_failed': self.failed,
+                'executor_overflows': self.overflows,
+            }
+
+    def _work(self, queue):
+        """
+        Worker thread main loop.
+        """
+        while True:
+            task = queue.get()
+            if task is None:
+                break
+            self._run(*task)
+
+    def _run(self, future, func, args, kwargs):
+        """
+        Execute a task and complete its future.
+        """
+        try:
+            result = func(*args, **kwargs)
+        except Exception, e:
+            with self._lock:
+                self.failed += 1
+            self.storage.console.error('Storage: task %s failed: %s %s', getattr(func, '__name__', func), e,
+                                       extract_tb(sys.exc_info()[2]))
+            future._complete(exception=e)
+        else:
+            with self._lock:
+                self.completed += 1
+            future._complete(result=result)
@@ -62,6 +62,7 @@ class PymysqlStorage(DatabaseStorage):
         """
         Close the current active database connection.
         """
+        self._pool.reset()
         if self.db and self.db.open:
             # checking 'open' will prevent exception raising
             self.console.bot('Closing connection with MySQL database...')
@@ -77,11 +78,9 @@ class PymysqlStorage(DatabaseStorage):
     def status(self):
         """
         Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
+        :return A StorageStatus evaluating to True if the connection is active, False otherwise.
         """
-        if self.db and self.db.open:
-           return True
-        return False
+        return self._status(self.db and self.db.open)
 
 
 class MysqlConnectorStorage(DatabaseStorage):
@@ -117,6 +116,7 @@ class MysqlConnectorStorage(DatabaseStorage):
         """
         Close the current active database connection.
         """
+        self._pool.reset()
         if self.db and self.db._socket is not None:
             # the shutdown method is already exception safe
             self.console.bot('Closing connection with MySQL database...')
@@ -132,11 +132,9 @@ class MysqlConnectorStorage(DatabaseStorage):
     def status(self):
         """
         Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
+        :return A StorageStatus evaluating to True if the connection is active, False otherwise.
         """
-        if self.db and self.db._socket is not None:
-            return True
-        return False
+        return self._status(self.db and self.db._socket is not None)
 
 
 class MySQLdbStorage(DatabaseStorage):
@@ -172,6 +170,7 @@ class MySQLdbStorage(DatabaseStorage):
         """
         Close the current active database connection.
         """
+        self._pool.reset()
         if self.db and self.db.open:
             # checking 'open' will prevent exception raising
             self.console.bot('Closing connection with MySQL database...')
@@ -187,11 +186,9 @@ class MySQLdbStorage(DatabaseStorage):
     def status(self):
         """
         Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
+        :return A StorageStatus evaluating to True if the connection is active, False otherwise.
         """
-        if self.db and self.db.open:
-           return True
-        return False
+        return self._status(self.db and self.db.open)
 
 
 class MysqlStorage(DatabaseStorage):
@@ -279,12 +276,8 @@ class MysqlStorage(DatabaseStorage):
 
             try:
                 # create the connection instance using the specified connector
-                self.db = self.__driver.connect(host=self.dsnDict['host'],
-                                                port=self.dsnDict['port'],
-                                                user=self.dsnDict['user'],
-                                                passwd=self.dsnDict['password'],
-                                                db=self.dsnDict['path'][1:],
-                                                charset="utf8")
+                self.db = self._newConnection()
+                self._pool.reset(self.db)
 
                 self.console.bot('Successfully established a connection with MySQL database')
                 self._lastConnectAttempt = 0
@@ -317,6 +310,19 @@ class MysqlStorage(DatabaseStorage):
 
         return self.db
 
+    def _newConnection(self):
+        """
+        Open a new connection with the MySQL database (used to fill the connection pool).
+        :raise Exception: If the connection cannot be established.
+        :return The connection instance.
+        """
+        return self.__driver.connect(host=self.dsnDict['host'],
+                                     port=self.dsnDict['port'],
+                                     user=self.dsnDict['user'],
+                                     passwd=self.dsnDict['password'],
+                                     db=self.dsnDict['path'][1:],
+                                     charset="utf8")
+
     ####################################################################################################################
     #                                                                                                                  #
     #   STORAGE INTERFACE                                                                                              #
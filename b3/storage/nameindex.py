@@ -0,0 +1,224 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__version__ = '1.2'
+
+import math
+import re
+import threading
+
+
+class NameIndex(object):
+    """
+    In-memory trigram index of names.
+    Every name is stored along with a key (e.g. a client database id): several names can share the same key and the
+    same name can be stored under several keys. Names are normalized (color codes and whitespaces removed, lowercase)
+    and split into overlapping 3 characters sequences (trigrams) which map to the names containing them, so that
+    substring and fuzzy searches only look at names sharing trigrams with the searched text.
+    """
+    _reColor = re.compile(r'\^[0-9a-z]', re.I)
+    _reSpaces = re.compile(r'\s+', re.UNICODE)
+
+    def __init__(self):
+        """
+        Object constructor.
+        """
+        self._lock = threading.Lock()
+        self._names = {}  # entry id => (key, normalized name)
+        self._entries = {}  # (key, normalized name) => entry id
+        self._grams = {}  # trigram => set of entry ids
+        self._nextId = 0
+        self.ready = False
+
+    def __len__(self):
+        return len(self._names)
+
+    def __nonzero__(self):
+        # an index holding no name yet is still an index
+        return True
+
+    @classmethod
+    def normalize(cls, name):
+        """
+        Return the normalized form of a name.
+        :param name: The name to normalize
+        """
+        if not isinstance(name, basestring):
+            return ''
+        return cls._reSpaces.sub('', cls._reColor.sub('', name)).lower()
+
+    @staticmethod
+    def getTrigrams(text):
+        """
+        Return the set of trigrams of a normalized text (texts shorter than 3 characters have none).
+        :param text: The normalized text
+        """
+        return set(text[i:i + 3] for i in xrange(len(text) - 2))
+
+    def add(self, key, name):
+        """
+        Index a name.
+        :param key: The key the name belongs to
+        :param name: The name to index
+        """
+        text = self.normalize(name)
+        if not text:
+            return
+        with self._lock:
+            if (key, text) in self._entries:
+                return
+            self._nextId += 1
+            entry_id = self._nextId
+            self._names[entry_id] = (key, text)
+            self._entries[(key, text)] = entry_id
+            for gram in self.getTrigrams(text):
+                try:
+                    self._grams[gram].add(entry_id)
+                except KeyError:
+                    self._grams[gram] = set([entry_id])
+
+    def remove(self, key, name=None):
+        """
+        Remove a name from the index.
+        :param key: The key the name belongs to
+        :param name: The name to remove (all the names of the key if None)
+        """
+        with self._lock:
+            if name is None:
+                entries = [(k, t) for (k, t) in self._entries if k == key]
+            else:
+                entries = [(key, self.normalize(name))]
+            for entry in entries:
+                entry_id = self._entries.pop(entry, None)
+                if entry_id is None:
+                    continue
+                del self._names[entry_id]
+                for gram in self.getTrigrams(entry[1]):
+                    ids = self._grams.get(gram)
+                    if ids is not None:
+                        ids.discard(entry_id)
+                        if not ids:
+                            del self._grams[gram]
+
+    def lookup(self, name):
+        """
+        Return the keys of the names equal to the given one (once normalized).
+        :param name: The name to look for
+        """
+        text = self.normalize(name)
+        if not text:
+            return []
+        with self._lock:
+            if len(text) < 3:
+                return [k for (k, t) in self._entries if t == text]
+            candidates = None
+            for gram in self.getTrigrams(text):
+                ids = self._grams.get(gram)
+                if not ids:
+                    return []
+                if candidates is None or len(ids) < len(candidates):
+                    candidates = ids
+            return [key for key, t in (self._names[x] for x in candidates) if t == text]
+
+    def containing(self, name):
+        """
+        Return the keys of the names containing the given one (once normalized).
+        :param name: The name to look for
+        """
+        text = self.normalize(name)
+        if not text:
+            return []
+        with self._lock:
+            if len(text) < 3:
+                keys = set(k for (k, t) in self._entries if text in t)
+            else:
+                keys = set(self._names[x][0] for x in self._containing(text))
+        return list(keys)
+
+    def search(self, name, limit=5, fuzzy=False, threshold=0.4):
+        """
+        Search names containing the given one, the exact matches first.
+        With fuzzy matching on, names sharing enough trigrams with the searched text follow the names containing it.
+        Names in each group are ranked by similarity with the searched text.
+        :param name: The name to search
+        :param limit: The maximum number of keys to return
+        :param fuzzy: Whether to also return names similar to the searched text but not containing it
+        :param threshold: The minimum ratio of trigrams of the searched text a name must contain to be a fuzzy match
+        :return: A list of tuples (key, normalized name, score) best first, with one tuple per key
+        """
+        text = self.normalize(name)
+        if not text:
+            return []
+        with self._lock:
+            if len(text) < 3:
+                # no trigram to look up: scan the names
+                scored = [(self._score(text, None, t, 0), k, t) for (k, t) in self._entries if text in t]
+            else:
+                found = self._containing(text)
+                scored = [(self._score(text, None, self._names[x][1], 0),) + self._names[x] for x in found]
+                if fuzzy and len(set(key for _, key, _ in scored)) < limit:
+                    # names containing the text always rank first: only look for similar names if there are not enough
+                    scored.extend(self._fuzzy(text, threshold, found))
+        scored.sort(reverse=True)
+        result = []
+        seen = set()
+        for score, key, t in scored:
+            if key not in seen:
+                seen.add(key)
+                result.append((key, t, score))
+                if len(result) == limit:
+                    break
+        return result
+
+    def _containing(self, text):
+        """
+        Return the ids of the entries containing the given text (must be called with the lock held).
+        """
+        sets = sorted((self._grams.get(g, set()) for g in self.getTrigrams(text)), key=len)
+        candidates = sets[0].intersection(*sets[1:])
+        return set(x for x in candidates if text in self._names[x][1])
+
+    def _fuzzy(self, text, threshold, skip):
+        """
+        Return the scored names sharing enough trigrams with the given text (must be called with the lock held).
+        """
+        grams = sorted(self.getTrigrams(text), key=lambda g: len(self._grams.get(g, ())))
+        needed = max(1, int(math.ceil(len(grams) * threshold)))
+        # a name sharing at least `needed` trigrams shares at least one of the len(grams) - needed + 1 rarest ones
+        candidates = set()
+        for gram in grams[:len(grams) - needed + 1]:
+            candidates.update(self._grams.get(gram, ()))
+        scored = []
+        for entry_id in candidates - skip:
+            key, t = self._names[entry_id]
+            shared = sum(1 for g in grams if entry_id in self._grams.get(g, ()))
+            if shared >= needed:
+                scored.append((self._score(text, grams, t, shared), key, t))
+        return scored
+
+    def _score(self, text, grams, candidate, shared):
+        """
+        Return a ranking score: exact matches score 3, names containing the text 2 plus the ratio of the name they
+        cover, other names 1 plus the ratio of trigrams they share with the text.
+        """
+        if candidate == text:
+            return 3.0
+        if text in candidate:
+            return 2.0 + float(len(text)) / len(candidate)
+        union = len(grams) + len(self.getTrigrams(candidate)) - shared
+        return 1.0 + min(0.99, float(shared) / union if union else 0.0)
@@ -0,0 +1,221 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+import threading
+
+from contextlib import contextmanager
+from time import time
+
+
+class PoolTimeout(Exception):
+    """
+    Raised when no database connection could be checked out of the pool in time.
+    """
+    pass
+
+
+class StorageStatus(dict):
+    """
+    Storage status as returned by DatabaseStorage.status().
+    Evaluates to True if the connection with the storage layer is active (as status() used to return), while
+    the dict items carry the connection pool statistics.
+    """
+    def __nonzero__(self):
+        return bool(self.get('connected'))
+
+
+class ConnectionPool(object):
+    """
+    Bounded pool of database connections shared among the threads using a DatabaseStorage.
+    A thread checking out a connection while already holding one gets the same connection back, so nested
+    queries never deadlock on the pool.
+    """
+    def __init__(self, storage, size=1, timeout=10, check_interval=60):
+        """
+        Object constructor.
+        :param storage: The DatabaseStorage instance creating the connections
+        :param size: The maximum number of open connections
+        :param timeout: The amount of seconds a thread waits for a free connection before giving up
+        :param check_interval: The amount of idle seconds after which a connection is checked before reuse
+        """
+        self.storage = storage
+        self.size = size
+        self.timeout = timeout
+        self.check_interval = check_interval
+        self._cond = threading.Condition(threading.Lock())
+        self._local = threading.local()
+        self._idle = []  # list of (connection, last used time)
+        self._open = 0
+        self._generation = 0
+        self.checkouts = 0
+        self.waits = 0
+        self.timeouts = 0
+        self.reconnects = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+        self._checkout_total = 0.0
+        self._checkout_max = 0.0
+
+    def reset(self, connection=None):
+        """
+        Drop every idle connection of the pool (connections currently checked out are closed on checkin).
+        :param connection: An already established connection to seed the pool with
+        """
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._generation += 1
+            self._open = 0
+            if connection is not None:
+                self._idle.append((connection, time()))
+                self._open = 1
+            self._cond.notify_all()
+
+        for conn, last_used in idle:
+            if conn is not connection and conn is not self.storage.db:
+                self.storage._closeConnection(conn)
+
+    def checkout(self):
+        """
+        Return a database connection for the current thread, waiting for one to be available if necessary.
+        :raise PoolTimeout: If no connection is made available within the pool timeout
+        :raise Exception: If a new connection cannot be established
+        """
+        local = self._local
+        if getattr(local, 'connection', None) is not None:
+            local.depth += 1
+            return local.connection
+
+        start = time()
+        waited = False
+        with self._cond:
+            while True:
+                if self._idle:
+                    connection, last_used = self._idle.pop()
+                    break
+                if self._open < self.size:
+                    connection, last_used = None, None
+                    self._open += 1
+                    break
+                remaining = self.timeout - (time() - start)
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout('timed out waiting for a database connection (pool size: %s)' % self.size)
+                waited = True
+                self._cond.wait(remaining)
+            generation = self._generation
+            wait = time() - start
+            if waited:
+                self.waits += 1
+                self._wait_total += wait
+                self._wait_max = max(self._wait_max, wait)
+
+        if connection is not None and time() - last_used > self.check_interval:
+            # connection sat in the pool for a while: make sure the server did not drop it
+            if not self.storage._pingConnection(connection):
+                self.storage.console.debug('Storage: dropping dead database connection from the pool')
+                self.storage._closeConnection(connection)
+                connection = None
+                self.reconnects += 1
+
+        if connection is None:
+            try:
+                connection = self.storage._newConnection()
+            except Exception:
+                with self._cond:
+                    if generation == self._generation:
+                        self._open -= 1
+                    self._cond.notify()
+                raise
+
+        elapsed = time() - start
+        with self._cond:
+            self.checkouts += 1
+            self._checkout_total += elapsed
+            self._checkout_max = max(self._checkout_max, elapsed)
+
+        local.connection = connection
+        local.generation = generation
+        local.depth = 1
+        local.broken = False
+        return connection
+
+    def checkin(self, connection, broken=False):
+        """
+        Give a connection back to the pool.
+        :param connection: The connection previously returned by checkout()
+        :param broken: Whether the connection failed and must be discarded
+        """
+        local = self._local
+        local.broken = local.broken or broken
+        local.depth -= 1
+        if local.depth > 0:
+            return
+
+        broken, generation = local.broken, local.generation
+        local.connection = None
+
+        with self._cond:
+            stale = generation != self._generation
+            if not stale:
+                if broken:
+                    self._open -= 1
+                else:
+                    self._idle.append((connection, time()))
+            self._cond.notify()
+
+        if (broken or stale) and connection is not self.storage.db:
+            self.storage._closeConnection(connection)
+        if broken:
+            self.reconnects += 1
+
+    @contextmanager
+    def connection(self):
+        """
+        Check a connection out for the duration of a 'with' statement block.
+        A connection raising an exception is health checked and discarded if it is not usable anymore.
+        """
+        connection = self.checkout()
+        broken = False
+        try:
+            yield connection
+        except Exception:
+            broken = not self.storage._pingConnection(connection)
+            raise
+        finally:
+            self.checkin(connection, broken)
+
+    def stats(self):
+        """
+        Return the pool usage statistics (times in milliseconds).
+        """
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                'pool_size': self.size,
+                'pool_open': self._open,
+                'pool_idle': idle,
+                'pool_in_use': self._open - idle,
+                'checkouts': self.checkouts,
+                'waits': self.waits,
+                'timeouts': self.timeouts,
+                'reconnects': self.reconnects,
+                'wait_time_avg': self._wait_total * 1000 / self.waits if self.waits else 0.0,
+                'wait_time_max': self._wait_max * 1000,
+                'checkout_time_avg': self._checkout_total * 1000 / self.checkouts if self.checkouts else 0.0,
+                'checkout_time_max': self._checkout_max * 1000,
+            }
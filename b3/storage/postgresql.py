@@ -27,6 +27,7 @@ import b3
 import re
 import sys
 
+from b3.storage.cursor import BufferedCursor
 from b3.storage.cursor import Cursor as DBCursor
 from b3.storage.common import DatabaseStorage
 from time import time
@@ -98,15 +99,8 @@ class PostgresqlStorage(DatabaseStorage):
 
             try:
 
-                import psycopg2
-                self.db = psycopg2.connect(host=self.dsnDict['host'],
-                                           port=self.dsnDict['port'],
-                                           user=self.dsnDict['user'],
-                                           password=self.dsnDict['password'],
-                                           database=self.dsnDict['path'][1:])
-
-                self.db.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
-                self.db.set_client_encoding("UTF8")
+                self.db = self._newConnection()
+                self._pool.reset(self.db)
 
                 self.console.bot('Successfully established a connection with PostgreSQL database')
                 self._lastConnectAttempt = 0
@@ -140,6 +134,23 @@ class PostgresqlStorage(DatabaseStorage):
 
         return self.db
 
+    def _newConnection(self):
+        """
+        Open a new connection with the PostgreSQL database (used to fill the connection pool).
+        :raise Exception: If the connection cannot be established.
+        :return The connection instance.
+        """
+        import psycopg2
+        connection = psycopg2.connect(host=self.dsnDict['host'],
+                                      port=self.dsnDict['port'],
+                                      user=self.dsnDict['user'],
+                                      password=self.dsnDict['password'],
+                                      database=self.dsnDict['path'][1:])
+
+        connection.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        connection.set_client_encoding("UTF8")
+        return connection
+
     def getConnection(self):
         """
         Return the database connection. If the connection has not been established yet, will establish a new one.
@@ -153,6 +164,7 @@ class PostgresqlStorage(DatabaseStorage):
         """
         Close the current active database connection.
         """
+        self._pool.reset()
         if self.db and not self.db.closed:
             self.console.bot('Closing connection with PostgreSQL database...')
             self.db.close()
@@ -209,29 +221,28 @@ class PostgresqlStorage(DatabaseStorage):
         :param bindata: Data to bind to the given query.
         :raise Exception: If the query cannot be evaluated.
         """
-        self._lock.acquire()
-
-        try:
+        with self._pool.connection() as db:
             # postgresql doesn't support backticks: the query will be logged with backticks since
             # logging is handled in 'query()' but we will strip them out before executing the query.
             newquery = query.replace('`','').strip()
 
-            cursor = self.db.cursor()
+            cursor = db.cursor()
             if bindata is None:
                 cursor.execute(newquery)
             else:
                 cursor.execute(newquery, bindata)
 
-            # create our cursor instance
-            dbcursor = DBCursor(cursor, self.db)
+            # create our cursor instance (buffered: the connection goes back to the pool on return)
+            dbcursor = DBCursor(BufferedCursor(cursor), db)
 
             if self._reInsert.match(newquery):
                 # if this is an insert query try to get the last insert id:
                 # this needs a separate query in postgresql: it can be done in a single query
                 # adding 'RETURNING id' to the INSERT statement but then we would have added
-                # a constraint on the name of the PRIMARY KEY for each table
+                # a constraint on the name of the PRIMARY KEY for each table.
+                # LASTVAL() is per session hence it must be run on the connection used by the INSERT
                 try:
-                    cursor = self.db.cursor()
+                    cursor = db.cursor()
                     cursor.execute("SELECT LASTVAL();")
                     dbcursor.lastrowid = cursor.fetchone()[0]
                     dbcursor._cursor.lastrowid = dbcursor.lastrowid
@@ -240,9 +251,6 @@ class PostgresqlStorage(DatabaseStorage):
                     # can't recover in any case
                     pass
 
-        finally:
-            self._lock.release()
-
         return dbcursor
 
     ####################################################################################################################
@@ -254,11 +262,9 @@ class PostgresqlStorage(DatabaseStorage):
     def status(self):
         """
         Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
+        :return A StorageStatus evaluating to True if the connection is active, False otherwise.
         """
-        if self.db and not self.db.closed:
-            return True
-        return False
+        return self._status(self.db and not self.db.closed)
 
 ########################################################################################################################
 ##                                                                                                                    ##
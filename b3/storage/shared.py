@@ -0,0 +1,150 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+import threading
+
+from time import time
+
+# shared storage classes (K=>storage class, V=>shared storage class)
+_classes = {}
+
+
+class SharedStorage(object):
+    """
+    Storage of a parser running along with other parsers in the same process (see b3.host).
+    The connection, the connection pool, the worker threads and the name index are the ones of the storage owned by
+    the hosting process: only the console (used for logging) and the usage statistics belong to the parser.
+    This class is mixed with the class of the shared storage so that the storage interface runs unchanged.
+    """
+    def __new__(cls, *args, **kwargs):
+        # the storage class is already set up (MysqlStorage picks its base class according to the driver)
+        return object.__new__(cls)
+
+    def __init__(self, storage, console):
+        """
+        Object constructor.
+        :param storage: The storage owned by the hosting process
+        :param console: The console instance
+        """
+        self.shared = storage
+        self.dsn = storage.dsn
+        self.dsnDict = storage.dsnDict
+        self.console = console
+        self._lock = threading.Lock()
+        self.queries = 0
+        self.failures = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self._query_total = 0.0
+        self._query_max = 0.0
+
+    db = property(lambda self: self.shared.db)
+    _pool = property(lambda self: self.shared._pool)
+    _executor = property(lambda self: self.shared._executor)
+    _nameIndex = property(lambda self: self.shared._nameIndex)
+
+    def connect(self):
+        """
+        Return the connection of the shared storage (established by the hosting process).
+        """
+        return self.shared.getConnection()
+
+    def getConnection(self):
+        """
+        Return the connection of the shared storage (established by the hosting process).
+        """
+        return self.shared.getConnection()
+
+    def shutdown(self):
+        """
+        Nothing to do: the shared storage is shut down by the hosting process.
+        """
+        pass
+
+    def setupPool(self, size=None, timeout=None):
+        """
+        Nothing to do: the connection pool is configured by the hosting process.
+        """
+        pass
+
+    def setupExecutor(self, workers=None, queue_size=None):
+        """
+        Nothing to do: the worker threads are started by the hosting process.
+        """
+        pass
+
+    def setupNameIndex(self):
+        """
+        Nothing to do: the name index is loaded by the hosting process.
+        """
+        pass
+
+    def stopExecutor(self, wait=True):
+        """
+        Nothing to do: the worker threads are stopped by the hosting process.
+        """
+        pass
+
+    def _query(self, query, bindata=None):
+        """
+        Execute a query on the storage layer, accounting for it in the usage statistics.
+        """
+        with self._lock:
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+        start = time()
+        failed = True
+        try:
+            cursor = super(SharedStorage, self)._query(query, bindata)
+            failed = False
+            return cursor
+        finally:
+            elapsed = time() - start
+            with self._lock:
+                self.in_use -= 1
+                self.queries += 1
+                self.failures += failed
+                self._query_total += elapsed
+                self._query_max = max(self._query_max, elapsed)
+
+    def getStats(self):
+        """
+        Return the storage usage statistics of the parser (times in milliseconds).
+        """
+        with self._lock:
+            return {
+                'queries': self.queries,
+                'failures': self.failures,
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'query_time_avg': self._query_total * 1000 / self.queries if self.queries else 0.0,
+                'query_time_max': self._query_max * 1000,
+            }
+
+
+def getSharedStorage(storage, console):
+    """
+    Return a storage sharing the connection pool, the worker threads and the name index of another one.
+    :param storage: The storage owned by the hosting process
+    :param console: The console instance
+    """
+    construct = _classes.get(storage.__class__)
+    if construct is None:
+        construct = type('Shared%s' % storage.__class__.__name__, (SharedStorage, storage.__class__), {})
+        _classes[storage.__class__] = construct
+    return construct(storage, console)
@@ -31,6 +31,7 @@ from b3.storage.common import DatabaseStorage
 
 class SqliteStorage(DatabaseStorage):
 
+    _poolSize = 1
     protocol = 'sqlite'
 
     def __init__(self, dsn, dsnDict, console):
@@ -55,12 +56,11 @@ class SqliteStorage(DatabaseStorage):
         :return The connection instance if established successfully, otherwise None.
         """
         try:
-            import sqlite3
             path = b3.getWritableFilePath(self.dsn[9:])
             self.console.bot("Using database file: %s" % path)
             is_new_database = not os.path.isfile(path)
-            self.db = sqlite3.connect(path, check_same_thread=False)
-            self.db.isolation_level = None  # set autocommit mode
+            self.db = self._newConnection()
+            self._pool.reset(self.db)
         except Exception, e:
             self.db = None
             self.console.error('Database connection failed: %s', e)
@@ -79,6 +79,28 @@ class SqliteStorage(DatabaseStorage):
         finally:
             return self.db
 
+    def _newConnection(self):
+        """
+        Open a new connection with the SQLite database (used to fill the connection pool).
+        :raise Exception: If the connection cannot be established.
+        :return The connection instance.
+        """
+        import sqlite3
+        connection = sqlite3.connect(b3.getWritableFilePath(self.dsn[9:]), check_same_thread=False)
+        connection.isolation_level = None  # set autocommit mode
+        return connection
+
+    def setupPool(self, size=None, timeout=None):
+        """
+        Configure the connection pool shared by the threads querying the storage layer.
+        An in-memory database exists only within its connection: the pool is limited to one connection.
+        :param size: The maximum number of connections opened with the storage layer.
+        :param timeout: The amount of seconds a query waits for a free connection before failing.
+        """
+        if self.dsn[9:] == ':memory:':
+            size = 1
+        super(SqliteStorage, self).setupPool(size, timeout)
+
     def getConnection(self):
         """
         Return the database connection. If the connection has not been established yet, will establish a new one.
@@ -92,6 +114,7 @@ class SqliteStorage(DatabaseStorage):
         """
         Close the current active database connection.
         """
+        self._pool.reset()
         if self.db:
             # checking 'open' will prevent exception raising
             self.console.bot('Closing connection with SQLite database...')
@@ -147,6 +170,6 @@ class SqliteStorage(DatabaseStorage):
     def status(self):
         """
         Check whether the connection with the storage layer is active or not.
-        :return True if the connection is active, False otherwise.
+        :return A StorageStatus evaluating to True if the connection is active, False otherwise.
         """
-        return self.db is None
\ No newline at end of file
+        return self._status(self.db is not None)
\ No newline at end of file
@@ -0,0 +1,355 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+__version__ = '1.2'
+
+import Queue
+import math
+import sys
+import threading
+import time
+
+from traceback import extract_tb
+
+
+class TimerHandle(object):
+    """
+    A function scheduled on the TimerWheel.
+    """
+    def __init__(self, wheel, due, function, args, kwargs, client=None, name=None):
+        """
+        Object constructor.
+        :param wheel: The TimerWheel the function is scheduled on
+        :param due: The time the function is due at
+        :param function: The function to run
+        :param args: The function positional arguments
+        :param kwargs: The function keyword arguments
+        :param client: The client the timer is bound to
+        :param name: The timer name (used in log messages)
+        """
+        self.wheel = wheel
+        self.due = due
+        self.function = function
+        self.args = args
+        self.kwargs = kwargs
+        self.client = client
+        self.name = name or getattr(function, '__name__', repr(function))
+        self.tick = None
+        self.cancelled = False
+        self.fired = False
+
+    def cancel(self):
+        """
+        Cancel the timer.
+        :return: True if the timer got cancelled before its function was run
+        """
+        return self.wheel.cancel(self)
+
+    def isActive(self):
+        """
+        Tell whether the timer function is still to be run.
+        """
+        return not self.cancelled and not self.fired
+
+    def __repr__(self):
+        return 'TimerHandle<%s due in %0.1fs>' % (self.name, self.due - time.time())
+
+
+class TimerWheel(object):
+    """
+    Run functions after a delay without starting a thread for each of them.
+    Timers are hashed into the slots of a wheel according to their due tick: a single thread advances the wheel one
+    slot per tick and hands the due timers over to a small pool of worker threads, so that a slow function does
+    not delay the others. The threads are started with the first timer: the amount of threads does not depend on
+    the amount of timers.
+    """
+    def __init__(self, console, tick=0.1, slots=512, workers=2):
+        """
+        Object constructor.
+        :param console: The console instance
+        :param tick: The wheel resolution (in seconds)
+        :param slots: The number of slots of the wheel
+        :param workers: The number of threads running the timer functions
+        """
+        self.console = console
+        self.tick = tick
+        self.workers = workers
+        self._slots = [[] for _ in xrange(slots)]
+        self._cond = threading.Condition(threading.Lock())
+        self._queue = Queue.Queue()
+        self._threads = []
+        self._clients = {}  # client => set of the TimerHandle bound to it
+        self._running = False
+        self._origin = None  # time of tick 0
+        self._ticks = 0  # last processed tick
+        self.pending = 0
+        self.scheduled = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.failed = 0
+        self.max_lag = 0.0
+
+    def schedule(self, delay, function, args=(), kwargs=None, client=None, name=None):
+        """
+        Run function(*args, **kwargs) in delay seconds.
+        :param delay: The amount of seconds to wait for
+        :param function: The function to run
+        :param args: The function positional arguments
+        :param kwargs: The function keyword arguments
+        :param client: A client the timer is bound to: the timer is cancelled when the client disconnects
+        :param name: The timer name (used in log messages)
+        :return: A TimerHandle
+        """
+        handle = TimerHandle(self, time.time() + max(0, delay), function, tuple(args), kwargs or {}, client, name)
+        with self._cond:
+            if not self._running:
+                self._start()
+            if not self.pending:
+                # the wheel thread did not follow the clock while idle
+                self._ticks = max(self._ticks, self._currentTick())
+                self._cond.notify()
+            handle.tick = max(self._ticks + 1, int(math.ceil((handle.due - self._origin) / self.tick)))
+            self._slots[handle.tick % len(self._slots)].append(handle)
+            if client is not None:
+                self._clients.setdefault(client, set()).add(handle)
+            self.pending += 1
+            self.scheduled += 1
+        return handle
+
+    def cancel(self, handle):
+        """
+        Cancel a timer.
+        :param handle: The TimerHandle of the timer
+        :return: True if the timer got cancelled before its function was run
+        """
+        with self._cond:
+            return self._cancel(handle)
+
+    def cancelClient(self, client):
+        """
+        Cancel all the timers bound to a client.
+        :param client: The client
+        :return: The number of cancelled timers
+        """
+        with self._cond:
+            handles = self._clients.pop(client, ())
+            return len([h for h in handles if self._cancel(h)])
+
+    def stop(self, timeout=5):
+        """
+        Stop the wheel: pending timers are discarded.
+        :param timeout: The maximum amount of seconds to wait for each thread to terminate
+        """
+        with self._cond:
+            if not self._running:
+                return
+            self._running = False
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+            for slot in self._slots:
+                del slot[:]
+            self._clients.clear()
+            self.pending = 0
+        for _ in xrange(self.workers):
+            self._queue.put(None)
+        for thread in threads:
+            if thread is not threading.current_thread():
+                thread.join(timeout)
+
+    def stats(self):
+        """
+        Return the wheel usage statistics.
+        """
+        with self._cond:
+            return {
+                'threads': len(self._threads),
+                'pending': self.pending,
+                'scheduled': self.scheduled,
+                'fired': self.fired,
+                'cancelled': self.cancelled,
+                'failed': self.failed,
+                'max_lag': self.max_lag,
+            }
+
+    def _start(self):
+        """
+        Start the wheel and worker threads (must be called with the lock held).
+        """
+        self._running = True
+        self._origin = time.time()
+        self._ticks = 0
+        thread = threading.Thread(target=self._turn, name='timer-wheel')
+        thread.daemon = True
+        self._threads.append(thread)
+        for i in xrange(self.workers):
+            worker = threading.Thread(target=self._work, name='timer-worker-%s' % i)
+            worker.daemon = True
+            self._threads.append(worker)
+        for t in self._threads:
+            t.start()
+
+    def _currentTick(self):
+        return int((time.time() - self._origin) / self.tick)
+
+    def _cancel(self, handle):
+        """
+        Cancel a timer (must be called with the lock held).
+        """
+        if handle.cancelled or handle.fired:
+            return False
+        handle.cancelled = True
+        self.pending -= 1
+        self.cancelled += 1
+        self._unbind(handle)
+        return True
+
+    def _unbind(self, handle):
+        """
+        Forget the client a timer is bound to (must be called with the lock held).
+        """
+        if handle.client is not None:
+            handles = self._clients.get(handle.client)
+            if handles:
+                handles.discard(handle)
+                if not handles:
+                    del self._clients[handle.client]
+
+    def _turn(self):
+        """
+        Wheel thread main loop: collect the due timers once per tick.
+        """
+        while True:
+            with self._cond:
+                while self._running and not self.pending:
+                    self._cond.wait()
+                if not self._running:
+                    break
+                now = self._currentTick()
+                if now <= self._ticks:
+                    self._cond.wait(self._origin + (self._ticks + 1) * self.tick - time.time())
+                    continue
+                due = []
+                for i in xrange(1, min(now - self._ticks, len(self._slots)) + 1):
+                    slot = self._slots[(self._ticks + i) % len(self._slots)]
+                    if slot:
+                        later = []
+                        for handle in slot:
+                            if handle.cancelled:
+                                continue
+                            if handle.tick <= now:
+                                handle.fired = True
+                                self.pending -= 1
+                                self._unbind(handle)
+                                due.append(handle)
+                            else:
+                                later.append(handle)
+                        slot[:] = later
+                self._ticks = now
+            for handle in sorted(due, key=lambda h: h.due):
+                self._queue.put(handle)
+
+    def _work(self):
+        """
+        Worker thread main loop: run the due timer functions.
+        """
+        while True:
+            handle = self._queue.get()
+            if handle is None:
+                break
+            lag = time.time() - handle.due
+            try:
+                handle.function(*handle.args, **handle.kwargs)
+            except Exception, e:
+                with self._cond:
+                    self.failed += 1
+                self.console.error('Timer %s failed: %s %s', handle.name, e, extract_tb(sys.exc_info()[2]))
+            with self._cond:
+                self.fired += 1
+                self.max_lag = max(self.max_lag, lag)
+
+
+class TimerView(object):
+    """
+    The timers of a parser sharing the TimerWheel of the hosting process with other parsers (see b3.host).
+    Timers are run by the shared wheel: the view keeps track of the ones scheduled through it so that they can be
+    accounted for and cancelled when the parser stops, without touching those of the other parsers.
+    """
+    def __init__(self, wheel, console):
+        """
+        Object constructor.
+        :param wheel: The shared TimerWheel instance
+        :param console: The console instance
+        """
+        self.wheel = wheel
+        self.console = console
+        self._lock = threading.Lock()
+        self._handles = set()
+        self._prune_at = 64  # amount of tracked handles triggering the removal of the inactive ones
+        self.scheduled = 0
+
+    def schedule(self, delay, function, args=(), kwargs=None, client=None, name=None):
+        """
+        Run function(*args, **kwargs) in delay seconds (see TimerWheel.schedule).
+        :return: A TimerHandle
+        """
+        handle = self.wheel.schedule(delay, function, args, kwargs, client, name)
+        with self._lock:
+            self._handles.add(handle)
+            self.scheduled += 1
+            if len(self._handles) >= self._prune_at:
+                self._handles = set(h for h in self._handles if h.isActive())
+                self._prune_at = max(64, 2 * len(self._handles))
+        return handle
+
+    def cancel(self, handle):
+        """
+        Cancel a timer.
+        :param handle: The TimerHandle of the timer
+        :return: True if the timer got cancelled before its function was run
+        """
+        with self._lock:
+            self._handles.discard(handle)
+        return self.wheel.cancel(handle)
+
+    def cancelClient(self, client):
+        """
+        Cancel all the timers bound to a client.
+        :param client: The client
+        :return: The number of cancelled timers
+        """
+        return self.wheel.cancelClient(client)
+
+    def stop(self, timeout=5):
+        """
+        Cancel the timers scheduled through this view.
+        :param timeout: Unused: the shared wheel is stopped by the hosting process
+        """
+        with self._lock:
+            handles, self._handles = self._handles, set()
+        for handle in handles:
+            self.wheel.cancel(handle)
+
+    def stats(self):
+        """
+        Return the usage statistics of the timers scheduled through this view.
+        """
+        with self._lock:
+            return {
+                'pending': len([h for h in self._handles if h.isActive()]),
+                'scheduled': self.scheduled,
+            }
@@ -0,0 +1,177 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""
+Measure how fast the censor plugin checks chat messages and player names against its rules.
+
+The rules are loaded from a censor plugin configuration file (the default one if none is given) and a chat corpus
+(one message per line) is checked twice:
+    - legacy: every rule is tried in order against the raw text and then against the cleaned text
+    - matcher: the rules are checked at once by the CensorMatcher
+
+Both passes must report the same rule for every message, mismatches are reported.
+
+Usage:
+    python -m b3.tools.benchmark.censor [--config plugin_censor.xml] [--corpus chat.txt] [--repeat 3]
+"""
+
+__version__ = '1.1'
+
+import argparse
+import os
+import random
+import re
+import sys
+import time
+
+from b3.config import XmlConfigParser
+from b3.functions import meanstdv
+from b3.plugins.censor import CensorPlugin
+
+DEFAULT_CONFIG = os.path.join(os.path.dirname(__file__), '..', '..', 'conf', 'plugin_censor.xml')
+
+# words used to build a synthetic chat corpus when none is given: a few of them are swear words
+VOCABULARY = ('gg', 'nice', 'shot', 'lol', 'noob', 'camper', 'rush', 'b', 'a', 'site', 'flag', 'need', 'backup',
+              'medic', 'go', 'go', 'go', 'where', 'is', 'the', 'enemy', 'behind', 'you', 'thanks', 'sorry', 'lag',
+              'map', 'next', 'vote', 'kick', 'him', 'hacker', 'aimbot', 'wallhack', 'ok', 'yes', 'no', 'wtf',
+              'omg', 'haha', 'team', 'red', 'blue', 'defend', 'attack', '!xlrstats', '!help', 'GG', 'WP', 'np',
+              'thx', 'brb', 'afk', 'back', 'cover', 'me', 'sniper', 'on', 'roof', 'ninja', 'defuse', 'bomb')
+SWEARWORDS = ('fuck', 'sh1t', 'a$$hole', 'b!tch', 'f*ck', 'cunt', 'n1gger', 'kanker', 'fdp', 'merde')
+NAMES = ('Player', 'Sniper', 'xXxKillerxXx', '^1Red^7Baron', 'Ninja', 'Bob', 'Joe', 'L33T', 'Camper', 'Medic')
+
+
+class QuietConsole(object):
+    """
+    Just enough of a console to load the censor plugin configuration.
+    """
+    _reColor = re.compile(r'\^[0-9a-z]')
+
+    def stripColors(self, text):
+        return re.sub(self._reColor, '', text).strip()
+
+    def __getattr__(self, name):
+        # logging methods
+        return lambda *args, **kwargs: None
+
+
+def load_plugin(path):
+    """
+    Return a censor plugin instance having loaded the given configuration file.
+    """
+    config = XmlConfigParser()
+    config.load(path)
+    plugin = CensorPlugin(QuietConsole(), config)
+    plugin.onLoadConfig()
+    return plugin
+
+
+def synthetic_corpus(lines, swear_ratio=0.02, seed=0):
+    """
+    Generate chat messages.
+    :param lines: The amount of messages to generate
+    :param swear_ratio: The ratio of messages containing a swear word
+    :param seed: The random number generator seed
+    """
+    rnd = random.Random(seed)
+    result = []
+    for i in xrange(lines):
+        words = [rnd.choice(VOCABULARY) for _ in range(rnd.randint(1, 12))]
+        if rnd.random() < swear_ratio:
+            words.insert(rnd.randrange(len(words) + 1), rnd.choice(SWEARWORDS))
+        result.append(' '.join(words))
+    return result
+
+
+def legacy_check(plugin, rules, text, cleaned):
+    """
+    Check a text the way CensorPlugin.checkBadWord() used to.
+    """
+    for w in rules:
+        if w.regexp.search(text):
+            return w, text
+        if w.regexp.search(cleaned):
+            return w, cleaned
+    return None
+
+
+def matcher_check(plugin, rules, text, cleaned):
+    """
+    Check a text using the CensorMatcher.
+    """
+    return plugin.getBadWordsMatcher().search(text, cleaned) if rules is plugin._badWords else \
+        plugin.getBadNamesMatcher().search(text, cleaned)
+
+
+def run(plugin, rules, messages, check, repeat=3):
+    """
+    Check all the messages with the given function.
+    :return: A tuple (messages per second for each repetition, list of results of the last repetition)
+    """
+    rates = []
+    results = None
+    for i in range(repeat):
+        results = []
+        start = time.time()
+        for message in messages:
+            cleaned = ' ' + plugin.clean(message) + ' '
+            results.append(check(plugin, rules, ' ' + message + ' ', cleaned))
+        elapsed = time.time() - start
+        rates.append(len(messages) / elapsed if elapsed else 0)
+    return rates, results
+
+
+def compare(legacy, matcher):
+    """
+    Return the amount of messages for which the two passes reported a different rule or text.
+    """
+    return sum(1 for r1, r2 in zip(legacy, matcher) if (r1 and (r1[0].name, r1[1])) != (r2 and (r2[0].name, r2[1])))
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Measure the censor plugin checking speed')
+    p.add_argument('--config', default=DEFAULT_CONFIG, help='censor plugin configuration file')
+    p.add_argument('--corpus', help='chat messages, one per line (a synthetic corpus is generated if omitted)')
+    p.add_argument('--lines', type=int, default=50000, help='number of messages of the synthetic corpus')
+    p.add_argument('--repeat', type=int, default=3, help='number of times the corpus is checked')
+    options = p.parse_args(argv)
+
+    plugin = load_plugin(options.config)
+    if options.corpus:
+        with open(options.corpus, 'r') as f:
+            messages = f.read().splitlines()
+    else:
+        messages = synthetic_corpus(options.lines)
+    names = [random.Random(i).choice(NAMES) + str(i % 100) for i in xrange(len(messages) / 10)] + \
+        [n for n in SWEARWORDS]
+
+    print "%-10s %6s %8s %8s %16s %16s %8s %10s" % ('rules', 'count', 'texts', 'matches', 'legacy texts/s',
+                                                    'matcher texts/s', 'speedup', 'mismatches')
+    for label, rules, texts in (('badwords', plugin._badWords, messages), ('badnames', plugin._badNames, names)):
+        legacy_rates, legacy = run(plugin, rules, texts, legacy_check, options.repeat)
+        matcher_rates, matcher = run(plugin, rules, texts, matcher_check, options.repeat)
+        legacy_rate = meanstdv(legacy_rates)[0]
+        matcher_rate = meanstdv(matcher_rates)[0]
+        print "%-10s %6s %8s %8s %16.0f %16.0f %7.2fx %10s" % (label, len(rules), len(texts),
+                                                              sum(1 for r in matcher if r), legacy_rate,
+                                                              matcher_rate,
+                                                              matcher_rate / legacy_rate if legacy_rate else 0,
+                                                              compare(legacy, matcher))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
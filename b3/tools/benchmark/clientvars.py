@@ -0,0 +1,310 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""
+Measure how fast plugins access the variables they store in client objects and the client core fields.
+
+A stream of game events (chat, damage, kill, team change) is generated and every event is handled the way the
+spamcontrol, tk and xlrstats plugins do, three times:
+    - legacy: the client variables are stored the way Client.var/Client.setvar used to (nested dicts of ClientVar
+      objects, lookups guarded by try/except) and the client core fields in the instance dict
+    - compat: Client.var/Client.setvar on the slots based Client
+    - namespace: direct attribute access on the plugin namespace returned by Client.pluginVars
+
+The memory footprint of a client object is reported for the legacy and the slots based layouts.
+
+Usage:
+    python -m b3.tools.benchmark.clientvars [--clients 32] [--events 200000] [--repeat 3]
+"""
+
+__version__ = '1.1'
+
+import argparse
+import gc
+import random
+import sys
+import time
+
+from b3.clients import Client
+from b3.functions import meanstdv
+
+EVENT_MIX = (('chat', 30), ('damage', 45), ('kill', 20), ('team', 5))
+
+
+class LegacyClientVar(object):
+    """
+    The ClientVar the way it used to be.
+    """
+    value = None
+
+    def __init__(self, value):
+        self.value = value
+
+
+class LegacyClient(object):
+    """
+    Just enough of the legacy Client implementation: core fields in the instance dict, class level defaults,
+    try/except guarded variable lookups.
+    """
+    _maxLevel = None
+    _name = ''
+    _team = 0
+    cid = None
+    connected = True
+    hide = False
+
+    def __init__(self, **kwargs):
+        self._pluginData = {}
+        self._data = {}
+        for k, v in kwargs.iteritems():
+            setattr(self, k, v)
+
+    def _get_name(self):
+        return self._name
+
+    def _set_name(self, name):
+        self._name = name
+
+    name = property(_get_name, _set_name)
+
+    def _get_team(self):
+        return self._team
+
+    def _set_team(self, team):
+        self._team = team
+
+    team = property(_get_team, _set_team)
+
+    def _get_maxLevel(self):
+        return self._maxLevel or 0
+
+    maxLevel = property(_get_maxLevel)
+
+    def isvar(self, plugin, key):
+        try:
+            d = self._pluginData[id(plugin)][key]
+            return True
+        except Exception:
+            return False
+
+    def setvar(self, plugin, key, value=None):
+        try:
+            self._pluginData[id(plugin)]
+        except Exception:
+            self._pluginData[id(plugin)] = {key: LegacyClientVar(value)}
+        else:
+            try:
+                self._pluginData[id(plugin)][key].value = value
+            except Exception:
+                self._pluginData[id(plugin)][key] = LegacyClientVar(value)
+        try:
+            return self._pluginData[id(plugin)][key]
+        except Exception:
+            return None
+
+    def var(self, plugin, key, default=None):
+        try:
+            return self._pluginData[id(plugin)][key]
+        except Exception:
+            return self.setvar(plugin, key, default)
+
+
+class Plugin(object):
+    """
+    A plugin instance (variables are indexed by plugin instance).
+    """
+    def __init__(self, name):
+        self.name = name
+
+
+SPAMCONTROL = Plugin('spamcontrol')
+TK = Plugin('tk')
+XLRSTATS = Plugin('xlrstats')
+
+
+def var_handlers():
+    """
+    Return the event handlers using Client.var/Client.setvar (legacy and compat passes).
+    """
+    def chat(now, client, target, text):
+        if client.maxLevel >= 20:
+            return
+        if client.var(SPAMCONTROL, 'ignore_till', now).value > now:
+            return
+        gap = now - client.var(SPAMCONTROL, 'last_message_time', now).value
+        points = 2 if text == client.var(SPAMCONTROL, 'last_message').value else 1
+        client.setvar(SPAMCONTROL, 'spamins', max(0, client.var(SPAMCONTROL, 'spamins', 0).value + points - int(gap)))
+        client.setvar(SPAMCONTROL, 'last_message_time', now)
+        client.setvar(SPAMCONTROL, 'last_message', text)
+
+    def damage(now, client, target, text):
+        if client.team != target.team or not client.connected:
+            return
+        if not client.isvar(TK, 'tkinfo'):
+            client.setvar(TK, 'tkinfo', {})
+        attacked = client.var(TK, 'tkinfo').value
+        attacked[target.cid] = attacked.get(target.cid, 0) + 1
+
+    def kill(now, client, target, text):
+        kills = client.var(XLRSTATS, 'kills', 0)
+        kills.value += 1
+        deaths = target.var(XLRSTATS, 'deaths', 0)
+        deaths.value += 1
+        if client.name and target.name:
+            client.setvar(XLRSTATS, 'last_victim', target.cid)
+
+    def team(now, client, target, text):
+        client.team = target.team if client.team != target.team else 1 + (client.team % 2)
+
+    return {'chat': chat, 'damage': damage, 'kill': kill, 'team': team}
+
+
+def namespace_handlers():
+    """
+    Return the event handlers using the plugin namespaces.
+    """
+    def chat(now, client, target, text):
+        if client.maxLevel >= 20:
+            return
+        spam = client.pluginVars(SPAMCONTROL)
+        if spam.get('ignore_till', now) > now:
+            return
+        gap = now - spam.get('last_message_time', now)
+        points = 2 if text == spam.get('last_message') else 1
+        spam.spamins = max(0, spam.get('spamins', 0) + points - int(gap))
+        spam.last_message_time = now
+        spam.last_message = text
+
+    def damage(now, client, target, text):
+        if client.team != target.team or not client.connected:
+            return
+        tk = client.pluginVars(TK)
+        attacked = tk.get('tkinfo')
+        if attacked is None:
+            attacked = tk.tkinfo = {}
+        attacked[target.cid] = attacked.get(target.cid, 0) + 1
+
+    def kill(now, client, target, text):
+        stats = client.pluginVars(XLRSTATS)
+        stats.kills = stats.get('kills', 0) + 1
+        victim_stats = target.pluginVars(XLRSTATS)
+        victim_stats.deaths = victim_stats.get('deaths', 0) + 1
+        if client.name and target.name:
+            stats.last_victim = target.cid
+
+    def team(now, client, target, text):
+        client.team = target.team if client.team != target.team else 1 + (client.team % 2)
+
+    return {'chat': chat, 'damage': damage, 'kill': kill, 'team': team}
+
+
+class SlotsClient(Client):
+    """
+    A Client which does not fire events on team change (there is no console to queue them to).
+    """
+    def _get_team(self):
+        return self._team
+
+    def _set_team(self, team):
+        self._team = team
+
+    team = property(_get_team, _set_team)
+
+    def _get_maxLevel(self):
+        return self._maxLevel or 0
+
+    maxLevel = property(_get_maxLevel)
+
+
+def make_clients(cls, count):
+    """
+    Create client objects.
+    :param cls: The client class
+    :param count: The amount of clients to create
+    """
+    return [cls(cid=str(i), name='player%s' % i, team=1 + (i % 2)) for i in xrange(count)]
+
+
+def make_events(count, clients, seed=0):
+    """
+    Generate a stream of events as tuples (event name, time, client index, target index, text).
+    :param count: The amount of events to generate
+    :param clients: The amount of clients
+    :param seed: The random number generator seed
+    """
+    rnd = random.Random(seed)
+    names = [name for name, weight in EVENT_MIX for _ in xrange(weight)]
+    texts = ('gg', 'nice shot', 'lol', 'gg', 'need backup', 'go go go')
+    events = []
+    for i in xrange(count):
+        events.append((rnd.choice(names), i * 0.05, rnd.randrange(clients), rnd.randrange(clients), rnd.choice(texts)))
+    return events
+
+
+def run(clients, handlers, events, repeat=3):
+    """
+    Dispatch the events to the handlers.
+    :return: A list of the amount of events handled per second for each repetition
+    """
+    rates = []
+    for i in range(repeat):
+        start = time.time()
+        for name, now, client, target, text in events:
+            handlers[name](now, clients[client], clients[target], text)
+        elapsed = time.time() - start
+        rates.append(len(events) / elapsed if elapsed else 0)
+    return rates
+
+
+def footprint(client):
+    """
+    Return the size in bytes of a client object along with the dicts it holds (instance dict included).
+    """
+    size = sys.getsizeof(client)
+    for d in gc.get_referents(client):
+        if type(d) is dict:
+            size += sys.getsizeof(d) + sum(sys.getsizeof(x) for x in gc.get_referents(d) if type(x) is dict)
+    return size
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Measure the client variables and core fields access speed')
+    p.add_argument('--clients', type=int, default=32, help='number of connected clients')
+    p.add_argument('--events', type=int, default=200000, help='number of events to handle')
+    p.add_argument('--repeat', type=int, default=3, help='number of times the events are handled')
+    options = p.parse_args(argv)
+
+    events = make_events(options.events, options.clients)
+    passes = (('legacy', LegacyClient, var_handlers()),
+              ('compat', SlotsClient, var_handlers()),
+              ('namespace', SlotsClient, namespace_handlers()))
+
+    print "%-10s %8s %8s %14s %8s %12s" % ('pass', 'clients', 'events', 'events/s', 'speedup', 'client size')
+    reference = None
+    for label, cls, handlers in passes:
+        clients = make_clients(cls, options.clients)
+        size = footprint(clients[0])
+        rate = meanstdv(run(clients, handlers, events, options.repeat))[0]
+        if reference is None:
+            reference = rate
+        print "%-10s %8s %8s %14.0f %7.2fx %12s" % (label, options.clients, len(events), rate,
+                                                    rate / reference if reference else 0, size)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,280 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""
+Replay a game log through the B3 event queue and report dispatching throughput.
+
+Every log line is turned into an event according to its q3a action token (Kill, Hit, say, ClientConnect, ...),
+queued with Parser.queueEvent() and consumed by Parser.handleEvents() running in its own thread, exactly as it
+happens when B3 is running. The handlers are no-op plugins (optionally simulating some work) so the figures
+only measure the dispatching overhead.
+
+The same log is replayed in several modes:
+    - legacy: the dispatching loop as it was before the per-event sleeps got removed
+    - single: one event dispatched per queue read (event_batch_size: 1)
+    - batched: events dispatched in batches of --batch-size (event_batch_size: N)
+
+Usage:
+    python -m b3.tools.benchmark.eventdispatch [--log games_mp.log] [--handler-cost 0.1]
+"""
+
+__version__ = '1.1'
+
+import argparse
+import logging
+import Queue
+import random
+import re
+import sys
+import thread
+import threading
+import time
+
+import b3.events
+
+from b3.events import EventsStats
+from b3.functions import meanstdv
+from b3.parser import Parser
+
+# q3a action token => B3 event key
+ACTIONS = {
+    'kill': 'EVT_CLIENT_KILL',
+    'hit': 'EVT_CLIENT_DAMAGE',
+    'say': 'EVT_CLIENT_SAY',
+    'sayteam': 'EVT_CLIENT_TEAM_SAY',
+    'clientconnect': 'EVT_CLIENT_CONNECT',
+    'clientbegin': 'EVT_CLIENT_JOIN',
+    'clientdisconnect': 'EVT_CLIENT_DISCONNECT',
+    'item': 'EVT_CLIENT_ITEM_PICKUP',
+    'flag': 'EVT_CLIENT_ACTION',
+    'initgame': 'EVT_GAME_ROUND_START',
+    'shutdowngame': 'EVT_GAME_EXIT',
+}
+
+_lineFormat = re.compile(r'^\s*\d+:\d+\s+(?P<action>[a-z]+):\s*(?P<data>.*)$', re.IGNORECASE)
+
+
+class BenchmarkParser(Parser):
+    """
+    Parser stripped down to the event queue: no configuration, no storage, no game server.
+    """
+    gameName = 'benchmark'
+    handler_sleep = 0  # amount of seconds handlers sleep after each event
+
+    def __init__(self, batch_size=1, queue_size=50):
+        """
+        Object constructor.
+        :param batch_size: The value of the event_batch_size setting
+        :param queue_size: The value of the event_queue_size setting
+        """
+        # skip parent class constructor
+        self.log = logging.getLogger('output')
+        self.Events = b3.events.eventManager
+        self.exiting = thread.allocate_lock()
+        self.queue = Queue.Queue(queue_size)
+        self.working = True
+        self._handlers = {}
+        self._eventBatchSize = batch_size
+        self._eventsStats = EventsStats(self, max_samples=None)
+        self._actions = dict((k, self.getEventID(v)) for k, v in ACTIONS.iteritems())
+        self.dropped = 0
+
+    def parseLine(self, line):
+        """
+        Turn a log line into an event and queue it.
+        """
+        match = _lineFormat.match(line)
+        if not match:
+            return
+        event_type = self._actions.get(match.group('action').lower(), self.getEventID('EVT_UNKNOWN'))
+        if not self.queueEvent(b3.events.Event(event_type, match.group('data'))):
+            self.dropped += 1
+
+    def queueEvent(self, event, expire=10):
+        """
+        Queue an event, not counting events nobody listens to as dropped.
+        """
+        if event.type not in self._handlers:
+            return True
+        return Parser.queueEvent(self, event, expire)
+
+
+class LegacyBenchmarkParser(BenchmarkParser):
+    """
+    Reproduce the event dispatching as it was done before: 1ms sleep before queueing each
+    event and after each handler call, one event handled per queue read.
+    """
+    handler_sleep = 0.001
+
+    def queueEvent(self, event, expire=10):
+        time.sleep(0.001)
+        return BenchmarkParser.queueEvent(self, event, expire)
+
+
+class BenchmarkPlugin(object):
+    """
+    Minimal stand-in for b3.plugin.Plugin as seen by Parser.handleEvents().
+    """
+    def __init__(self, console, cost=0):
+        """
+        Object constructor.
+        :param console: The console class instance
+        :param cost: The amount of milliseconds each event handling should take
+        """
+        self.console = console
+        self.cost = cost / 1000.0
+        self.handled = 0
+
+    def isEnabled(self):
+        return True
+
+    def parseEvent(self, event):
+        self.handled += 1
+        if self.cost:
+            time.sleep(self.cost)
+        if self.console.handler_sleep:
+            time.sleep(self.console.handler_sleep)
+
+
+def synthetic_log(lines, seed=0):
+    """
+    Generate a game log looking like an Urban Terror one.
+    :param lines: The amount of lines to generate
+    :param seed: The random number generator seed
+    """
+    rnd = random.Random(seed)
+    weighted = ['Kill'] * 10 + ['Hit'] * 30 + ['say'] * 4 + ['sayteam'] * 2 + ['Item'] * 8 + ['Flag'] + \
+               ['ClientUserinfoChanged'] * 2 + ['ClientConnect', 'ClientBegin', 'ClientDisconnect']
+    result = [' 0:00 InitGame: \\sv_hostname\\B3 benchmark\\mapname\\ut4_turnpike']
+    for i in xrange(1, lines):
+        action = weighted[rnd.randrange(len(weighted))]
+        cid, target = rnd.randrange(16), rnd.randrange(16)
+        if action == 'Kill':
+            data = '%s %s 19: Player%s killed Player%s by UT_MOD_LR300' % (cid, target, cid, target)
+        elif action == 'Hit':
+            data = '%s %s 1 19: Player%s hit Player%s in the Torso' % (target, cid, cid, target)
+        elif action in ('say', 'sayteam'):
+            data = '%s Player%s: !xlrstats' % (cid, cid)
+        elif action == 'Item':
+            data = '%s ut_weapon_ump45' % cid
+        elif action == 'Flag':
+            data = '%s 2: team_CTF_redflag' % cid
+        elif action == 'ClientUserinfoChanged':
+            data = '%s n\\Player%s\\t\\1\\r\\0' % (cid, cid)
+        else:
+            data = '%s' % cid
+        result.append('%2d:%02d %s: %s' % (i / 600, (i / 10) % 60, action, data))
+    return result
+
+
+def replay(parser, lines, plugins=3, cost=0, throttle=0):
+    """
+    Replay log lines through the given parser.
+    :param parser: The BenchmarkParser instance to use
+    :param lines: The log lines
+    :param plugins: The amount of plugins listening for every event
+    :param cost: The amount of milliseconds each handler takes to handle an event
+    :param throttle: The amount of seconds to sleep after each line (mimic the lines_per_second setting)
+    :return: A dict with the measures
+    """
+    # one class per plugin since handler statistics are collected by class name
+    handlers = [type('Plugin%s' % i, (BenchmarkPlugin,), {})(parser, cost) for i in range(plugins)]
+    for key in set(ACTIONS.values()) | set(['EVT_STOP']):
+        for h in handlers:
+            parser.registerHandler(parser.getEventID(key), h)
+
+    worker = threading.Thread(target=parser.handleEvents, name='handleEvents')
+    worker.start()
+    start = time.time()
+    for line in lines:
+        parser.parseLine(line)
+        if throttle:
+            time.sleep(throttle)
+    parser.queueEvent(b3.events.Event(parser.getEventID('EVT_STOP'), None), expire=3600)
+    worker.join()
+    elapsed = time.time() - start
+
+    handled = handlers[0].handled - 1 if handlers else 0  # each plugin gets every event, EVT_STOP excluded
+    latency = {}
+    for plugin_name, timers in parser._eventsStats._handling_timers.iteritems():
+        samples = [x for event_timers in timers.itervalues() for x in event_timers]
+        latency[plugin_name] = (meanstdv(samples)[0], max(samples) if samples else 0)
+
+    return {
+        'lines': len(lines),
+        'events': handled,
+        'dropped': parser.dropped,
+        'elapsed': elapsed,
+        'events_per_second': handled / elapsed if elapsed else 0,
+        'latency': latency,
+    }
+
+
+def print_report(title, result):
+    """
+    Print replay results on stdout.
+    """
+    print "%s" % title
+    print "  %(lines)s lines, %(events)s events dispatched, %(dropped)s dropped in %(elapsed)0.3fs" % result
+    print "  %(events_per_second)0.1f events/sec" % result
+    for plugin_name in sorted(result['latency']):
+        mean, highest = result['latency'][plugin_name]
+        print "  %-10s handler latency (ms) mean(%0.3f) max(%0.3f)" % (plugin_name, mean, highest)
+    print
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Replay a game log through the B3 event queue')
+    p.add_argument('--log', help='game log to replay (a synthetic Urban Terror log is generated if omitted)')
+    p.add_argument('--lines', type=int, default=5000, help='number of lines of the synthetic log')
+    p.add_argument('--plugins', type=int, default=3, help='number of plugins listening for every event')
+    p.add_argument('--handler-cost', type=float, default=0, help='milliseconds each handler spends per event')
+    p.add_argument('--batch-size', type=int, default=32, help='event_batch_size used in batched mode')
+    p.add_argument('--queue-size', type=int, default=50, help='event_queue_size')
+    p.add_argument('--throttle', action='store_true', help='sleep after each line as the lines_per_second '
+                                                           'setting does (50 lines/sec) in the legacy mode')
+    p.add_argument('--modes', default='legacy,single,batched', help='comma separated list of modes to run')
+    options = p.parse_args(argv)
+
+    if options.log:
+        with open(options.log, 'r') as f:
+            lines = f.read().splitlines()
+    else:
+        lines = synthetic_log(options.lines)
+
+    logging.getLogger('output').setLevel(logging.CRITICAL)
+
+    for mode in options.modes.split(','):
+        if mode == 'legacy':
+            parser = LegacyBenchmarkParser(queue_size=options.queue_size)
+            throttle = 1.0 / 50 if options.throttle else 0
+        elif mode == 'single':
+            parser = BenchmarkParser(batch_size=1, queue_size=options.queue_size)
+            throttle = 0
+        elif mode == 'batched':
+            parser = BenchmarkParser(batch_size=options.batch_size, queue_size=options.queue_size)
+            throttle = 0
+        else:
+            p.error('unknown mode: %s' % mode)
+            return
+        result = replay(parser, lines, options.plugins, options.handler_cost, throttle)
+        print_report('%s (event_batch_size: %s)' % (mode, parser._eventBatchSize), result)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
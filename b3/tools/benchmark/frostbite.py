@@ -0,0 +1,183 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""
+Measure the Frostbite packet codec on the receive path of the game server connection.
+
+A capture (the raw byte stream sent by a BF3/BF4 server to B3) is fed to the codec in chunks the size of a socket
+read and cut into packets, three times:
+    - legacy: the string concatenation receive buffer and the slicing decoder the parsers used to rely on
+    - header: the PacketBuffer, decoding the packet headers only (what is needed to route command responses)
+    - full: the PacketBuffer, decoding the packet words too
+
+When no capture is given, one is synthesized out of the replay tool frostbite game template: game events, each
+acknowledged by B3, with an admin.listPlayers response of a full server every now and then. A synthetic capture can
+be saved with --save and replayed later with --capture, as can captures recorded on live servers.
+
+Usage:
+    python -m b3.tools.benchmark.frostbite [--capture FILE] [--packets 50000] [--chunk 8192] [--repeat 3]
+"""
+
+__version__ = '1.1'
+
+import argparse
+import ast
+import sys
+import time
+
+from b3.parsers.frostbite2.protocol import DecodeInt32
+from b3.parsers.frostbite2.protocol import DecodeHeader
+from b3.parsers.frostbite2.protocol import EncodePacket
+from b3.parsers.frostbite2.protocol import PacketBuffer
+from b3.tools.benchmark.replay import FROSTBITE_GAME
+from b3.tools.benchmark.replay import synthetic_corpus
+
+PLAYERS = 64
+
+# admin.listPlayers columns of a BF3/BF4 server
+PLAYER_COLUMNS = ['name', 'guid', 'teamId', 'squadId', 'kills', 'deaths', 'score', 'rank', 'ping', 'type']
+
+
+def player_list(players):
+    """
+    Build the words of the admin.listPlayers response of a server.
+    :param players: The amount of players
+    """
+    words = ['OK', str(len(PLAYER_COLUMNS))] + PLAYER_COLUMNS + [str(players)]
+    for cid in range(players):
+        words += ['Player%s' % cid, 'EA_%032d' % cid, str(1 + cid % 2), str(1 + cid % 8), str(cid % 30),
+                  str(cid % 20), str(cid * 100), str(cid % 100), str(30 + cid), '0']
+    return words
+
+
+def synthetic_capture(packets, players=PLAYERS, list_every=50):
+    """
+    Generate the byte stream sent by a game server.
+    :param packets: The amount of game events
+    :param players: The amount of players
+    :param list_every: The amount of game events between two admin.listPlayers responses
+    """
+    listing = player_list(players)
+    data = []
+    for i, line in enumerate(synthetic_corpus('frostbite', FROSTBITE_GAME, packets, players=players)):
+        data.append(EncodePacket(True, False, i, ast.literal_eval(line)))
+        data.append(EncodePacket(False, True, 2 * i, ['OK']))
+        if i % list_every == 0:
+            data.append(EncodePacket(False, True, 2 * i + 1, listing))
+    return ''.join(data)
+
+
+def legacy_decode(data):
+    """
+    The legacy decoder (frostbite2.protocol.DecodePacket), slicing the packet.
+    """
+    [isFromServer, isResponse, sequence] = DecodeHeader(data)
+    wordsSize = DecodeInt32(data[4:8]) - 12
+    data = data[12:]
+    words = []
+    offset = 0
+    while offset < wordsSize:
+        wordLen = DecodeInt32(data[offset:offset + 4])
+        words.append(data[offset + 4:offset + 4 + wordLen])
+        offset += wordLen + 5
+    return [isFromServer, isResponse, sequence, words]
+
+
+def measure_legacy(chunks):
+    """
+    Cut packets out of the stream the way FrostbiteDispatcher.handle_read used to.
+    :return: The amount of packets decoded
+    """
+    count = 0
+    buffer_in = ''
+    for chunk in chunks:
+        buffer_in += chunk
+        while len(buffer_in) >= 8 and len(buffer_in) >= DecodeInt32(buffer_in[4:8]):
+            packetSize = DecodeInt32(buffer_in[4:8])
+            packet = buffer_in[0:packetSize]
+            buffer_in = buffer_in[packetSize:len(buffer_in)]
+            legacy_decode(packet)
+            count += 1
+    return count
+
+
+def measure_buffer(chunks, words):
+    """
+    Cut packets out of the stream with a PacketBuffer.
+    :param words: Whether to decode the packet words
+    :return: The amount of packets decoded
+    """
+    count = 0
+    buf = PacketBuffer()
+    for chunk in chunks:
+        buf.feed(chunk)
+        packet = buf.next_packet()
+        while packet is not None:
+            if words:
+                packet.words
+            count += 1
+            packet = buf.next_packet()
+    return count
+
+
+PASSES = (
+    ('legacy', measure_legacy),
+    ('header', lambda chunks: measure_buffer(chunks, False)),
+    ('full', lambda chunks: measure_buffer(chunks, True)),
+)
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Measure the Frostbite packet codec on recorded or synthetic captures')
+    p.add_argument('--capture', action='append', help='raw server to B3 byte stream (may be given more than once)')
+    p.add_argument('--packets', type=int, default=50000, help='number of game events of the synthetic capture')
+    p.add_argument('--players', type=int, default=PLAYERS, help='number of players of the synthetic capture')
+    p.add_argument('--chunk', type=int, default=8192, help='size of the socket reads')
+    p.add_argument('--repeat', type=int, default=3, help='number of runs of each pass (the best one is reported)')
+    p.add_argument('--save', help='save the synthetic capture to this file')
+    options = p.parse_args(argv)
+
+    captures = []
+    for path in options.capture or []:
+        with open(path, 'rb') as f:
+            captures.append((path, f.read()))
+    if not captures:
+        data = synthetic_capture(options.packets, options.players)
+        if options.save:
+            with open(options.save, 'wb') as f:
+                f.write(data)
+        captures.append(('synthetic', data))
+
+    print "%-20s %-8s %10s %10s %12s %10s" % ('capture', 'pass', 'packets', 'time (s)', 'packets/s', 'MB/s')
+    for name, data in captures:
+        chunks = [data[i:i + options.chunk] for i in xrange(0, len(data), options.chunk)]
+        for label, measure in PASSES:
+            best = None
+            for _ in range(max(1, options.repeat)):
+                start = time.time()
+                count = measure(chunks)
+                elapsed = time.time() - start
+                if best is None or elapsed < best:
+                    best = elapsed
+            best = max(best, 1e-9)
+            print "%-20s %-8s %10s %10.3f %12.0f %10.1f" % (name[-20:], label, count, best, count / best,
+                                                              len(data) / best / 1024 / 1024)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -0,0 +1,208 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""
+Measure how fast the q3a based parsers match game log lines against their line formats.
+
+For every parser class the log is matched twice:
+    - legacy: every line format is tried in order and the handler name is built and looked up on every line
+    - dispatcher: lines are routed on their action word by the LineDispatcher and handler names are cached
+
+Only the line matching is measured: no event is created nor dispatched. Both passes must produce the same
+matches, mismatches are reported.
+
+Usage:
+    python -m b3.tools.benchmark.lineparsing [--log games_mp.log] [--parsers iourt42,cod4] [--repeat 3]
+"""
+
+__version__ = '1.1'
+
+import argparse
+import random
+import string
+import sys
+import time
+
+from b3.functions import meanstdv
+
+PARSERS = {
+    'iourt41': 'b3.parsers.iourt41.Iourt41Parser',
+    'iourt42': 'b3.parsers.iourt42.Iourt42Parser',
+    'iourt43': 'b3.parsers.iourt43.Iourt43Parser',
+    'cod': 'b3.parsers.cod.CodParser',
+    'cod2': 'b3.parsers.cod2.Cod2Parser',
+    'cod4': 'b3.parsers.cod4.Cod4Parser',
+    'cod5': 'b3.parsers.cod5.Cod5Parser',
+    'cod6': 'b3.parsers.cod6.Cod6Parser',
+    'cod7': 'b3.parsers.cod7.Cod7Parser',
+    'sof2': 'b3.parsers.sof2.Sof2Parser',
+    'smg': 'b3.parsers.smg.SmgParser',
+    'wop': 'b3.parsers.wop.WopParser',
+    'oa081': 'b3.parsers.oa081.Oa081Parser',
+}
+
+# sample lines used to build a synthetic log when none is given: the weight gives the line frequency
+URT_LINES = (
+    (1, r'InitGame: \sv_hostname\B3 benchmark\g_gametype\7\sv_maxclients\16\mapname\ut4_turnpike'),
+    (1, r'ClientConnect: %(cid)s'),
+    (1, r'ClientUserinfo: %(cid)s \ip\11.22.33.%(cid)s:27960\name\Player%(cid)s\racered\2\raceblue\2\rate\25000'
+        r'\ut_timenudge\0\cg_rgb\128 128 128\cl_guid\0123456789ABCDEF0123456789ABC%(cid)03d\authc\0'),
+    (2, r'ClientUserinfoChanged: %(cid)s n\Player%(cid)s\t\1\r\0\tl\0\f0\\f1\\f2\\a0\0\a1\0\a2\0'),
+    (1, r'ClientBegin: %(cid)s'),
+    (10, r'Kill: %(cid)s %(target)s 19: Player%(cid)s killed Player%(target)s by UT_MOD_LR300'),
+    (30, r'Hit: %(target)s %(cid)s 1 19: Player%(cid)s hit Player%(target)s in the Torso'),
+    (4, r'say: %(cid)s Player%(cid)s: !xlrstats'),
+    (2, r'sayteam: %(cid)s Player%(cid)s: need backup'),
+    (8, r'Item: %(cid)s ut_weapon_ump45'),
+    (1, r'Flag: %(cid)s 2: team_CTF_redflag'),
+    (1, r'score: 10  ping: 50  client: %(cid)s Player%(cid)s'),
+    (1, r'red:8  blue:5'),
+    (1, r'Exit: Timelimit hit.'),
+    (1, r'ClientDisconnect: %(cid)s'),
+    (1, r'ShutdownGame:'),
+    (1, r'------------------------------------------------------------'),
+)
+
+COD_LINES = (
+    (1, r'InitGame: \g_gametype\war\gamename\Call of Duty 4\mapname\mp_crash\sv_hostname\B3 benchmark'),
+    (1, r'J;01234567890123456789012345678%(cid)03d;%(cid)s;Player%(cid)s'),
+    (10, r'K;01234567890123456789012345678%(target)03d;%(target)s;axis;Player%(target)s;'
+         r'01234567890123456789012345678%(cid)03d;%(cid)s;allies;Player%(cid)s;ak47_mp;135;MOD_HEAD_SHOT;head'),
+    (30, r'D;01234567890123456789012345678%(target)03d;%(target)s;axis;Player%(target)s;'
+         r'01234567890123456789012345678%(cid)03d;%(cid)s;allies;Player%(cid)s;ak47_mp;35;MOD_RIFLE_BULLET;'
+         r'torso_upper'),
+    (4, r'say;01234567890123456789012345678%(cid)03d;%(cid)s;Player%(cid)s;!xlrstats'),
+    (2, r'sayteam;01234567890123456789012345678%(cid)03d;%(cid)s;Player%(cid)s;need backup'),
+    (8, r'Weapon;01234567890123456789012345678%(cid)03d;%(cid)s;Player%(cid)s;ak47_mp'),
+    (1, r'Q;01234567890123456789012345678%(cid)03d;%(cid)s;Player%(cid)s'),
+    (1, r'ExitLevel: executed'),
+    (1, r'ShutdownGame:'),
+    (1, r'------------------------------------------------------------'),
+)
+
+
+def synthetic_log(samples, lines, seed=0):
+    """
+    Generate a game log out of sample lines.
+    :param samples: A sequence of (weight, line) tuples
+    :param lines: The amount of lines to generate
+    :param seed: The random number generator seed
+    """
+    rnd = random.Random(seed)
+    weighted = [line for weight, line in samples for _ in range(weight)]
+    result = []
+    for i in xrange(lines):
+        data = {'cid': rnd.randrange(16), 'target': rnd.randrange(16)}
+        result.append('%3d:%02d %s' % (i / 600, (i / 10) % 60, weighted[rnd.randrange(len(weighted))] % data))
+    return result
+
+
+def load_parser(name):
+    """
+    Return an instance of the given parser class without running its constructor.
+    :param name: The parser name (ie: iourt42)
+    """
+    module_name, class_name = PARSERS[name].rsplit('.', 1)
+    module = __import__(module_name, fromlist=[class_name])
+    cls = getattr(module, class_name)
+    return cls.__new__(cls)
+
+
+def legacy_match(parser, line):
+    """
+    Match a log line the way AbstractParser.getLineParts() and AbstractParser.parseLine() used to.
+    """
+    line = parser._lineClear.sub('', line, 1)
+    for f in parser._lineFormats:
+        m = f.match(line)
+        if m:
+            func = 'On%s' % string.capwords(m.group('action').lower()).replace(' ', '')
+            return m, func if hasattr(parser, func) else None
+    return None, None
+
+
+def dispatcher_match(parser, line):
+    """
+    Match a log line using the LineDispatcher and the handler cache.
+    """
+    line = parser._lineClear.sub('', line, 1)
+    m = parser.getLineDispatcher().match(line)
+    if m:
+        return m, parser.getLineHandler(m.group('action').lower())
+    return None, None
+
+
+def run(parser, lines, match, repeat=3):
+    """
+    Match all the lines with the given function.
+    :return: A tuple (lines per second for each repetition, list of results of the last repetition)
+    """
+    rates = []
+    results = None
+    for i in range(repeat):
+        results = []
+        start = time.time()
+        for line in lines:
+            results.append(match(parser, line))
+        elapsed = time.time() - start
+        rates.append(len(lines) / elapsed if elapsed else 0)
+    return rates, results
+
+
+def compare(lines, legacy, dispatcher):
+    """
+    Return the lines for which the two passes produced a different outcome.
+    """
+    mismatches = []
+    for line, (m1, f1), (m2, f2) in zip(lines, legacy, dispatcher):
+        if (m1 and (m1.re, m1.groupdict())) != (m2 and (m2.re, m2.groupdict())) or f1 != f2:
+            mismatches.append(line)
+    return mismatches
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Measure the q3a parsers log line matching speed')
+    p.add_argument('--log', help='game log to parse (a synthetic log matching the game is generated if omitted)')
+    p.add_argument('--lines', type=int, default=20000, help='number of lines of the synthetic log')
+    p.add_argument('--parsers', default=','.join(sorted(PARSERS)), help='comma separated list of parsers')
+    p.add_argument('--repeat', type=int, default=3, help='number of times the log is parsed')
+    options = p.parse_args(argv)
+
+    log = None
+    if options.log:
+        with open(options.log, 'r') as f:
+            log = f.read().splitlines()
+
+    print "%-10s %8s %16s %16s %8s %10s" % ('parser', 'lines', 'legacy lines/s', 'dispatcher l/s', 'speedup',
+                                            'mismatches')
+    for name in options.parsers.split(','):
+        if name not in PARSERS:
+            p.error('unknown parser: %s' % name)
+        parser = load_parser(name)
+        lines = log or synthetic_log(COD_LINES if name.startswith('cod') else URT_LINES, options.lines)
+        legacy_rates, legacy = run(parser, lines, legacy_match, options.repeat)
+        dispatcher_rates, dispatcher = run(parser, lines, dispatcher_match, options.repeat)
+        legacy_rate = meanstdv(legacy_rates)[0]
+        dispatcher_rate = meanstdv(dispatcher_rates)[0]
+        print "%-10s %8s %16.0f %16.0f %7.2fx %10s" % (name, len(lines), legacy_rate, dispatcher_rate,
+                                                       dispatcher_rate / legacy_rate if legacy_rate else 0,
+                                                       len(compare(lines, legacy, dispatcher)))
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
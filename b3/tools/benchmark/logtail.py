@@ -0,0 +1,106 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""
+Measure the latency between a line being written to the game log and B3 reading it.
+
+A writer thread appends timestamped lines to a temporary log file at random intervals while the main thread
+follows the file the same way Parser.run() does (read, then wait 'delay' seconds or until the file changes).
+Each watcher method is measured in turn, along with the CPU time used by the reading thread.
+
+Usage:
+    python -m b3.tools.benchmark.logtail [--lines 200] [--delay 0.33] [--methods polling,auto]
+"""
+
+__version__ = '1.1'
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+from b3.logtailer import LogTailer
+from b3.logtailer import getWatcher
+
+
+def writer(path, lines, interval, seed=0):
+    """
+    Append timestamped lines to the given file.
+    :param path: The log file path
+    :param lines: The amount of lines to write
+    :param interval: The average amount of seconds between two lines
+    :param seed: The random number generator seed
+    """
+    rnd = random.Random(seed)
+    with open(path, 'a') as f:
+        for i in xrange(lines):
+            time.sleep(rnd.uniform(0, 2 * interval))
+            f.write('%0.6f say: 1 Player: line %s\n' % (time.time(), i))
+            f.flush()
+
+
+def measure(method, lines, interval, delay):
+    """
+    Follow a log file being written and return the read latencies (in milliseconds) and the CPU time used.
+    """
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'games_mp.log')
+    open(path, 'w').close()
+    tailer = LogTailer(path, watcher=getWatcher(path, method))
+    thread = threading.Thread(target=writer, args=(path, lines, interval))
+    latencies = []
+    cpu_start = time.clock()
+    try:
+        thread.start()
+        while len(latencies) < lines:
+            for line in tailer.read():
+                latencies.append((time.time() - float(line.split(' ', 1)[0])) * 1000)
+            tailer.wait(delay)
+        cpu = time.clock() - cpu_start
+        return tailer.watcher.name, sorted(latencies), cpu
+    finally:
+        thread.join()
+        tailer.close()
+        shutil.rmtree(directory)
+
+
+def percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Measure the game log reading latency')
+    p.add_argument('--lines', type=int, default=200, help='number of lines to write')
+    p.add_argument('--interval', type=float, default=0.02, help='average seconds between two written lines')
+    p.add_argument('--delay', type=float, default=0.33, help='value of the delay setting')
+    p.add_argument('--methods', default='polling,auto', help='comma separated list of game_log_watch values')
+    options = p.parse_args(argv)
+
+    print "%-10s %8s %12s %12s %12s %10s" % ('method', 'lines', 'median (ms)', 'p95 (ms)', 'max (ms)', 'cpu (s)')
+    for method in options.methods.split(','):
+        name, latencies, cpu = measure(method, options.lines, options.interval, options.delay)
+        print "%-10s %8s %12.1f %12.1f %12.1f %10.3f" % (name, len(latencies), percentile(latencies, 0.5),
+                                                        percentile(latencies, 0.95), latencies[-1], cpu)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
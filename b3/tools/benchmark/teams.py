@@ -0,0 +1,164 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+"""
+Compare the poweradminurt skill balancer team partition engine with the random search it replaces.
+
+Random servers are generated (player skill scores, current teams, snipers, players locked in their team) and teams
+are computed the way !paskuffle (no move limit) and !pabalance (30% of the players at most) do, twice:
+    - random: the legacy search, keeping the best of 100 random splits
+    - partition: the TeamPartition engine
+
+For each server size and pass the mean and worst absolute skill difference, the mean sniper difference, the mean
+amount of moved players and the mean time spent per split are reported.
+
+Usage:
+    python -m b3.tools.benchmark.teams [--players 8,16,32] [--servers 200] [--slack 0.1]
+"""
+
+__version__ = '1.1'
+
+import argparse
+import random
+import sys
+import time
+
+from b3.functions import meanstdv
+from b3.plugins.poweradminurt.partition import TeamPartition
+
+
+def make_server(players, rnd):
+    """
+    Generate a server as a tuple (scores, teams, snipers, locked).
+    :param players: The amount of players
+    :param rnd: The random number generator
+    """
+    scores = [rnd.random() ** 2 for _ in xrange(players)]  # a few good players, many average ones
+    teams = [rnd.random() < 0.5 for _ in xrange(players)]
+    snipers = [rnd.random() < 0.15 for _ in xrange(players)]
+    locked = [rnd.random() < 0.05 for _ in xrange(players)]
+    return scores, teams, snipers, locked
+
+
+def random_search(scores, teams, snipers, locked, slack, maxmovesperc=None, times=100, rnd=random):
+    """
+    The legacy random search (PoweradminurtPlugin._randTeams), working on player indexes.
+    :return: A tuple (blue team, diff) or (None, None) if no split was found
+    """
+    def diff_of(team):
+        return sum(scores[i] for i in team) * 2 - total
+
+    def snipers_of(team):
+        return len([i for i in team if snipers[i]])
+
+    def random_teams():
+        blue = [i for i in xrange(n) if locked[i] and teams[i]]
+        red = [i for i in xrange(n) if locked[i] and not teams[i]]
+        nonforced = [i for i in xrange(n) if not locked[i]]
+        rnd.shuffle(nonforced)
+        k = n / 2 - len(blue)
+        return blue + nonforced[:k], red + nonforced[k:]
+
+    def count_moves(old, new):
+        # the legacy implementation compared name lists
+        newnames = ['player%s' % i for i in new]
+        return len([i for i in old if 'player%s' % i not in newnames])
+
+    n = len(scores)
+    total = sum(scores)
+    oldblue = [i for i in xrange(n) if teams[i]]
+    oldred = [i for i in xrange(n) if not teams[i]]
+    epsilon = 0.0001
+    bestdiff = sbestdiff = bestnumdiff = None
+    bestblue = sbestblue = None
+    if not maxmovesperc and abs(len(oldblue) - len(oldred)) > 1:
+        bestblue, bestred = random_teams()
+        bestdiff = diff_of(bestblue)
+    for _ in xrange(times):
+        blue, red = random_teams()
+        m = count_moves(oldblue, blue) + count_moves(oldred, red)
+        if maxmovesperc and m > max(2, int(round(maxmovesperc * n))):
+            continue
+        diff = diff_of(blue)
+        if abs(diff) <= slack:
+            numdiff = abs(snipers_of(blue) - snipers_of(red))
+            if bestnumdiff is None or numdiff < bestnumdiff:
+                sbestblue, sbestdiff, bestnumdiff = blue, diff, numdiff
+            elif numdiff == bestnumdiff and abs(diff) < abs(sbestdiff) - epsilon:
+                sbestblue, sbestdiff = blue, diff
+        elif bestdiff is None or abs(diff) < abs(bestdiff) - epsilon:
+            bestblue, bestdiff = blue, diff
+    if sbestdiff is not None:
+        return sbestblue, sbestdiff
+    return bestblue, bestdiff
+
+
+def measure(servers, slack, maxmovesperc, engine):
+    """
+    Compute the splits of the given servers.
+    :return: A tuple (list of abs diffs, list of sniper diffs, list of moves, mean time per split in ms, failures)
+    """
+    diffs, sniperdiffs, moves = [], [], []
+    failures = 0
+    start = time.time()
+    for scores, teams, snipers, locked in servers:
+        if engine == 'partition':
+            maxmoves = max(2, int(round(maxmovesperc * len(scores)))) if maxmovesperc else None
+            split = TeamPartition(scores, teams, snipers, locked).split(slack, maxmoves)
+            if split is None:
+                failures += 1
+                continue
+            blue = [i for i, x in enumerate(split.blue) if x]
+            diff = split.diff
+        else:
+            blue, diff = random_search(scores, teams, snipers, locked, slack, maxmovesperc)
+            if blue is None:
+                failures += 1
+                continue
+        blue = set(blue)
+        n = len(scores)
+        diffs.append(abs(diff))
+        sniperdiffs.append(abs(2 * len([i for i in blue if snipers[i]]) - sum(1 for x in snipers if x)))
+        moves.append(len([i for i in xrange(n) if (i in blue) != teams[i]]))
+    elapsed = time.time() - start
+    return diffs, sniperdiffs, moves, elapsed * 1000.0 / max(1, len(servers)), failures
+
+
+def main(argv=None):
+    p = argparse.ArgumentParser(description='Compare the skill balancer team partition engine with random search')
+    p.add_argument('--players', default='8,16,32', help='comma separated list of server sizes')
+    p.add_argument('--servers', type=int, default=200, help='number of servers generated for each size')
+    p.add_argument('--slack', type=float, default=0.1, help='skill difference under which snipers are distributed')
+    p.add_argument('--seed', type=int, default=0, help='random number generator seed')
+    options = p.parse_args(argv)
+
+    rnd = random.Random(options.seed)
+    print "%-8s %-10s %8s %10s %10s %10s %8s %10s %6s" % ('players', 'command', 'pass', 'mean diff', 'max diff',
+                                                            'snipers', 'moves', 'ms/split', 'fail')
+    for players in [int(x) for x in options.players.split(',')]:
+        servers = [make_server(players, rnd) for _ in xrange(options.servers)]
+        for command, maxmovesperc in (('skuffle', None), ('balance', 0.3)):
+            for engine in ('random', 'partition'):
+                diffs, sniperdiffs, moves, ms, failures = measure(servers, options.slack, maxmovesperc, engine)
+                print "%-8s %-10s %8s %10.4f %10.4f %10.2f %8.1f %10.3f %6s" % (
+                    players, command, engine, meanstdv(diffs)[0], max(diffs or [0]), meanstdv(sniperdiffs)[0],
+                    meanstdv(moves)[0], ms, failures)
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -160,3 +160,15 @@ class InstantTimer(object):
 
     def run(self):
         self.function(*self.args, **self.kwargs)
+
+
+## Makes a way to patch b3.timer.TimerWheel.schedule so it behave synchronously and instantly
+##
+## Usage:
+## @patch('b3.timer.TimerWheel.schedule', new=instant_schedule)
+## def test_my_code_using_timers(self):
+##     self.console.timers.schedule(30, print, args=['hi'])  # prints 'hi' instantly and in the same thread
+##
+def instant_schedule(self, delay, function, args=(), kwargs=None, client=None, name=None):
+    function(*args, **(kwargs or {}))
+    return Mock()
@@ -17,10 +17,12 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
 import operator
+import time
 from b3.clients import Client, Group
 from mock import Mock, patch, ANY
 from b3 import TEAM_UNKNOWN, TEAM_RED, TEAM_BLUE
-from b3.clients import Alias, IpAlias
+from b3.clients import Alias, IpAlias, ClientVar, PluginVars
+from b3.clients import ClientBan, ClientTempBan, ClientWarning, PenaltySummary
 import unittest2 as unittest
 from tests import B3TestCase
 
@@ -137,6 +139,104 @@ class Test_Client(B3TestCase):
 
 
 
+class Test_Client_vars(unittest.TestCase):
+
+    def setUp(self):
+        self.client = Client()
+        self.plugin = object()
+
+    def test_extra_attributes(self):
+        # parsers and plugins can still attach their own attributes
+        self.client.messagequeue = []
+        self.assertEqual([], self.client.messagequeue)
+        self.client.setvar(self.plugin, 'points', 2)
+        self.assertEqual(2, self.client.var(self.plugin, 'points').value)
+        self.assertEqual([], self.client.messagequeue)
+
+    def test_var_default(self):
+        self.assertFalse(self.client.isvar(self.plugin, 'points'))
+        var = self.client.var(self.plugin, 'points', 5)
+        self.assertIsInstance(var, ClientVar)
+        self.assertEqual(5, var.value)
+        self.assertTrue(self.client.isvar(self.plugin, 'points'))
+        self.assertEqual(5, self.client.var(self.plugin, 'points', 10).value)
+
+    def test_setvar(self):
+        var = self.client.setvar(self.plugin, 'name', 'joe')
+        self.assertEqual('joe', var.toString())
+        self.assertIs(var, self.client.var(self.plugin, 'name'))
+        self.client.setvar(self.plugin, 'name', 'jack')
+        self.assertEqual('jack', var.value)
+
+    def test_var_value_assignment(self):
+        var = self.client.var(self.plugin, 'points', 0)
+        var.value += 3
+        self.assertEqual(3, self.client.var(self.plugin, 'points').toInt())
+        self.assertEqual(3, self.client.pluginVars(self.plugin).points)
+
+    def test_pluginVars(self):
+        plugin_vars = self.client.pluginVars(self.plugin)
+        self.assertIsInstance(plugin_vars, PluginVars)
+        self.assertIs(plugin_vars, self.client.pluginVars(self.plugin))
+        plugin_vars.points = 7
+        self.assertEqual(7, plugin_vars.get('points'))
+        self.assertIsNone(plugin_vars.get('foo'))
+        self.assertIn('points', plugin_vars)
+        self.assertListEqual([('points', 7)], plugin_vars.items())
+        self.assertEqual(7, self.client.var(self.plugin, 'points').value)
+        self.assertEqual(7, plugin_vars.points)
+        self.assertListEqual([('points', 7)], plugin_vars.items())
+
+    def test_attribute_read_through_var(self):
+        plugin_vars = self.client.pluginVars(self.plugin)
+        plugin_vars.points = 5
+        var = self.client.var(self.plugin, 'points', 1)
+        self.assertEqual(5, var.value)
+        var.value = 6
+        self.assertEqual(6, plugin_vars.points)
+        self.assertEqual(6, plugin_vars.get('points'))
+        self.assertIs(var, self.client.setvar(self.plugin, 'points', 7))
+        self.assertEqual(7, plugin_vars.points)
+        del plugin_vars.points
+        self.assertFalse(self.client.isvar(self.plugin, 'points'))
+
+    def test_getPluginVars(self):
+        self.client.setvar(self.plugin, 'points', 1)
+        other = object()
+        self.client.pluginVars(other).name = 'joe'
+        plugin_vars = self.client.getPluginVars()
+        self.assertListEqual([('points', 1)], plugin_vars[id(self.plugin)].items())
+        self.assertListEqual([('name', 'joe')], plugin_vars[id(other)].items())
+
+    def test_plugins_do_not_share_vars(self):
+        other = object()
+        self.client.setvar(self.plugin, 'points', 1)
+        self.assertFalse(self.client.isvar(other, 'points'))
+        self.assertIsNone(self.client.var(other, 'points').value)
+        self.assertEqual(1, self.client.var(self.plugin, 'points').value)
+
+    def test_delvar(self):
+        var = self.client.setvar(self.plugin, 'points', 1)
+        self.client.delvar(self.plugin, 'points')
+        self.client.delvar(self.plugin, 'points')
+        self.client.delvar(object(), 'points')
+        self.assertFalse(self.client.isvar(self.plugin, 'points'))
+        self.assertIsNone(self.client.var(self.plugin, 'points').value)
+        self.assertIsNot(var, self.client.var(self.plugin, 'points'))
+
+    def test_varlist_vardict(self):
+        self.assertListEqual([], self.client.varlist(self.plugin, 'list').value)
+        self.assertDictEqual({}, self.client.vardict(self.plugin, 'dict').value)
+        self.assertEqual(0, self.client.vardict(self.plugin, 'dict').length())
+
+    def test_standalone_ClientVar(self):
+        var = ClientVar(5)
+        self.assertEqual(5, var.toInt())
+        var.value = 'x'
+        self.assertEqual('x', var.toString())
+        self.assertEqual(0, ClientVar(None).length())
+
+
 class Test_Client_groups(B3TestCase):
 
     def setUp(self):
@@ -210,6 +310,111 @@ class Test_Client_groups(B3TestCase):
         self.assertTrue(self.client.inGroup(self.group_superadmin))
 
 
+class Test_Client_penalties(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        client = Client(console=self.console, guid="abcdef0123456789", name="joe")
+        self.client_id = client.save()
+        self.client = Client(console=self.console, guid="abcdef0123456789", name="joe", cid="1")
+        self.console.clients[self.client.cid] = self.client
+
+    def tearDown(self):
+        self.console.clients.clear()
+        B3TestCase.tearDown(self)
+
+    def add_penalty(self, cls, timeExpire=-1, inactive=0):
+        penalty = cls(clientId=self.client_id, adminId=0, timeExpire=timeExpire, inactive=inactive)
+        penalty.save(self.console)
+        return penalty
+
+    def test_auth_fetches_penalties(self):
+        warning = self.add_penalty(ClientWarning, timeExpire=int(time.time()) + 60)
+        self.add_penalty(ClientBan, inactive=1)
+        self.assertTrue(self.client.auth())
+        with patch.object(self.console.storage, 'query', wraps=self.console.storage.query) as query:
+            self.assertEqual(1, self.client.numWarnings)
+            self.assertEqual(warning.id, self.client.lastWarning.id)
+            self.assertEqual(warning.id, self.client.firstWarning.id)
+            self.assertEqual(0, self.client.numBans)
+            self.assertIsNone(self.client.lastBan)
+            self.assertEqual(0, query.call_count)
+
+    def test_auth_banned_client(self):
+        self.add_penalty(ClientBan)
+        with patch.object(self.client, 'reBan') as reBan:
+            self.assertFalse(self.client.auth())
+            self.assertEqual(1, reBan.call_count)
+
+    def test_lazy_loading(self):
+        self.add_penalty(ClientTempBan, timeExpire=int(time.time()) + 60)
+        client = Client(console=self.console, id=self.client_id)
+        self.assertEqual(1, client.numBans)
+        self.add_penalty(ClientBan)
+        # penalties of clients which are not connected are loaded once
+        self.assertEqual(1, client.numBans)
+        client.refreshPenalties()
+        self.assertEqual(2, client.numBans)
+
+    def test_summary_follows_new_penalties(self):
+        self.client.auth()
+        self.assertEqual(0, self.client.numWarnings)
+        self.client.warn(duration='1h', warning='stop that')
+        self.assertEqual(1, self.client.numWarnings)
+        warning = self.client.lastWarning
+        warning.inactive = 1
+        warning.save(self.console)
+        self.assertEqual(0, self.client.numWarnings)
+        # penalties added without going through the client object
+        self.add_penalty(ClientBan)
+        self.assertEqual(1, self.client.numBans)
+        self.client.unban()
+        self.assertEqual(0, self.client.numBans)
+
+
+class Test_PenaltySummary(unittest.TestCase):
+
+    def penalty(self, cls, id, timeAdd, timeExpire=-1, inactive=0):
+        return cls(id=id, clientId=1, timeAdd=timeAdd, timeExpire=timeExpire, inactive=inactive)
+
+    def test_count(self):
+        now = int(time.time())
+        summary = PenaltySummary([self.penalty(ClientBan, 1, now - 100),
+                                  self.penalty(ClientTempBan, 2, now - 50, timeExpire=now + 60),
+                                  self.penalty(ClientTempBan, 3, now - 500, timeExpire=now - 60),
+                                  self.penalty(ClientWarning, 4, now - 10, timeExpire=now + 60),
+                                  self.penalty(ClientBan, 5, now - 10, inactive=1)])
+        self.assertEqual(4, len(summary))
+        self.assertEqual(2, summary.count(('Ban', 'TempBan')))
+        self.assertEqual(1, summary.count('Warning'))
+        self.assertEqual(0, summary.count('Kick'))
+
+    def test_last_and_first(self):
+        now = int(time.time())
+        w1 = self.penalty(ClientWarning, 1, now - 100, timeExpire=now + 300)
+        w2 = self.penalty(ClientWarning, 2, now - 50, timeExpire=now + 100)
+        w3 = self.penalty(ClientWarning, 3, now - 80, timeExpire=now + 300)
+        summary = PenaltySummary([w1, w2, w3])
+        self.assertIs(w2, summary.last('Warning'))
+        self.assertIs(w1, summary.first('Warning'))
+        self.assertIsNone(summary.last('Ban'))
+        self.assertIsNone(summary.first('Ban'))
+
+    def test_update(self):
+        now = int(time.time())
+        ban = self.penalty(ClientBan, 1, now)
+        summary = PenaltySummary()
+        summary.update(ban)
+        summary.update(ban)
+        self.assertEqual(1, summary.count('Ban'))
+        ban.inactive = 1
+        summary.update(ban)
+        self.assertEqual(0, len(summary))
+        # unsaved penalties are ignored
+        summary.update(self.penalty(ClientBan, 0, now))
+        self.assertEqual(0, len(summary))
+
+
 class Test_Client_events(B3TestCase):
     
     def setUp(self):
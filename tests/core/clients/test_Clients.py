@@ -103,3 +103,98 @@ class TestClients(B3TestCase):
 
         # verify that an proper event was fired
         Event_mock.assert_called_once_with(b3.events.EVT_CLIENT_DISCONNECT, 1, joe, None)
+
+
+class TestClients_indexes(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        Clients.authorizeClients = Mock()
+        self.clients = self.console.clients
+        self.joe = self.clients.newClient(1, name='joe', guid="joe_guid")
+        self.haxor = self.clients.newClient(2, name=' H a    x\t0r', guid="haxor_guid")
+
+    def test_getByName(self):
+        self.assertIs(self.joe, self.clients.getByName('JOE'))
+        self.assertIs(self.joe, self.clients.getByExactName('joe'))
+        self.assertIsNone(self.clients.getByName('jo'))
+
+    def test_name_change(self):
+        self.joe.name = '^1Joey'
+        self.assertIsNone(self.clients.getByName('joe'))
+        self.assertIs(self.joe, self.clients.getByName('joey'))
+        self.assertIs(self.joe, self.clients.getByExactName('^1joey'))
+        self.assertListEqual([self.joe], self.clients.getClientsByName('oey'))
+        self.assertIs(self.joe, self.clients.getClientLikeName('oey'))
+
+    def test_getClientsByName_short_needle(self):
+        self.assertListEqual([self.joe], self.clients.getClientsByName('j'))
+        self.assertListEqual([self.joe, self.haxor], self.clients.getClientsByName(' '))
+
+    def test_getClientLikeName_keeps_whitespaces(self):
+        self.assertIs(self.haxor, self.clients.getClientLikeName('a    x'))
+        self.assertIsNone(self.clients.getClientLikeName('hax'))
+
+    def test_getByGUID(self):
+        self.assertIs(self.joe, self.clients.getByGUID('JOE_GUID'))
+        self.clients.disconnect(self.joe)
+        self.assertIsNone(self.clients.getByGUID('joe_guid'))
+
+    def test_getByGUID_fuzzy(self):
+        guid = '0123456789ABCDEF0123456789ABCDEF'
+        client = self.clients.newClient(3, name='bill', guid=guid)
+        self.assertIs(client, self.clients.getByGUID(guid[:-1]))
+
+    def test_getByDB_connected_client_does_not_hit_storage(self):
+        self.console.storage.getClientsMatching = Mock()
+        self.assertListEqual([self.haxor], self.clients.getByDB('@%s' % self.haxor.id))
+        self.assertFalse(self.console.storage.getClientsMatching.called)
+
+    def test_getClientsByTeam(self):
+        self.joe.team = b3.TEAM_RED
+        self.haxor.team = b3.TEAM_BLUE
+        self.assertListEqual([self.joe], self.clients.getClientsByTeam(b3.TEAM_RED))
+        self.haxor.team = b3.TEAM_RED
+        self.assertListEqual([self.joe, self.haxor], self.clients.getClientsByTeam(b3.TEAM_RED))
+        self.assertListEqual([], self.clients.getClientsByTeam(b3.TEAM_BLUE))
+
+    def test_getClientsByState(self):
+        self.joe.state = b3.STATE_ALIVE
+        self.assertListEqual([self.joe], self.clients.getClientsByState(b3.STATE_ALIVE))
+        self.joe.state = b3.STATE_DEAD
+        self.assertListEqual([], self.clients.getClientsByState(b3.STATE_ALIVE))
+        self.assertListEqual([self.joe], self.clients.getClientsByState(b3.STATE_DEAD))
+
+    def test_getClientsByLevel(self):
+        superadmin = self.console.storage.getGroup(b3.clients.Group(keyword='superadmin'))
+        reg = self.console.storage.getGroup(b3.clients.Group(keyword='reg'))
+        self.assertListEqual([], self.clients.getClientsByLevel(min=100))
+        self.joe.setGroup(superadmin)
+        self.assertListEqual([self.joe], self.clients.getClientsByLevel(min=100))
+        # masked clients are found under their mask level unless masked levels are requested
+        self.joe.maskGroup = reg
+        self.assertListEqual([], self.clients.getClientsByLevel(min=100))
+        self.assertListEqual([self.joe], self.clients.getClientsByLevel(min=100, masked=True))
+        self.assertListEqual([self.joe], self.clients.getClientsByLevel(min=reg.level, max=reg.level))
+
+    def test_hidden_clients(self):
+        self.joe.hide = True
+        self.assertListEqual([], self.clients.getClientsByName('joe'))
+        self.assertListEqual([self.haxor], self.clients.getClientsByTeam(self.joe.team))
+
+    def test_direct_assignment(self):
+        bill = Client(console=self.console, cid=3, name='bill', guid='bill_guid')
+        self.clients[3] = bill
+        self.assertIs(bill, self.clients.getByName('bill'))
+        bill.name = 'william'
+        self.assertIs(bill, self.clients.getByName('william'))
+        del self.clients[3]
+        self.assertIsNone(self.clients.getByName('william'))
+        # a client removed from the registry no longer updates it
+        bill.name = 'billy'
+        self.assertIsNone(self.clients.getByName('billy'))
+
+    def test_resetIndex(self):
+        self.clients.resetIndex()
+        self.assertIs(self.joe, self.clients.getByName('joe'))
+        self.assertIs(self.haxor, self.clients.getByGUID('haxor_guid'))
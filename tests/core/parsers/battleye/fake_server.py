@@ -0,0 +1,160 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import binascii
+import random
+import select
+import socket
+import struct
+import threading
+import time
+
+
+class FakeBattleyeServer(object):
+    """
+    UDP server speaking the BattlEye RCon protocol.
+    Commands are answered in the order they are received. Responses longer than packet_size are split into several
+    packets, which can be sent in random order. Server messages are sent again till they are acknowledged. Incoming
+    and outgoing packets can be dropped to simulate packet loss.
+    """
+    def __init__(self, password='password', packet_size=1024, loss=0, shuffle=False, seed=0):
+        """
+        Object constructor.
+        :param password: The RCon password
+        :param packet_size: The maximum size of the response packets data
+        :param loss: The ratio of incoming and outgoing packets to drop
+        :param shuffle: Whether to send the packets of multi packet responses in random order
+        :param seed: The random number generator seed used to drop and shuffle packets
+        """
+        self.password = password
+        self.packet_size = packet_size
+        self.loss = loss
+        self.shuffle = shuffle
+        self.random = random.Random(seed)
+        self.responses = {}  # command name => response or function(command arguments) returning the response
+        self.drop = None  # function(command) returning True if the command packet must be dropped
+        self.executed = []  # commands executed, in order
+        self.acknowledged = set()  # sequence numbers of the acknowledged server messages
+        self.message_retry = 0.2  # amount of seconds after which a server message not acknowledged is sent again
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.address = self.socket.getsockname()
+        self.client = None
+        self._lock = threading.Lock()
+        self._messages = {}  # sequence number => [packet, amount of times sent, next time to send]
+        self._message_seq = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name='FakeBattleyeServer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        self.socket.close()
+
+    def message(self, text):
+        """
+        Send a server message to the logged in client.
+        """
+        with self._lock:
+            seq = self._message_seq
+            self._message_seq = (self._message_seq + 1) % 256
+            self._messages[seq] = [self.encode(2, seq, text), 0, 0]
+
+    @staticmethod
+    def encode(packet_type, seq, data=''):
+        payload = chr(255) + chr(packet_type) + ('' if seq is None else chr(seq)) + data
+        return 'BE' + struct.pack('<I', binascii.crc32(payload) & 0xffffffff) + payload
+
+    def _serve(self):
+        while self._running:
+            self._send_messages()
+            if not select.select([self.socket], [], [], 0.01)[0]:
+                continue
+            packet, address = self.socket.recvfrom(65536)
+            if self.loss and self.random.random() < self.loss:
+                continue
+            if packet[:2] != 'BE' or packet[2:6] != struct.pack('<I', binascii.crc32(packet[6:]) & 0xffffffff):
+                self.socket.sendto(self.encode(255, None), address)
+                continue
+            tp = ord(packet[7])
+            if tp == 0:
+                self.client = address if packet[8:] == self.password else None
+                self.socket.sendto(self.encode(0, None, '\x01' if self.client else '\x00'), address)
+            elif address != self.client:
+                continue
+            elif tp == 1:
+                seq, cmd = ord(packet[8]), packet[9:]
+                if self.drop and self.drop(cmd):
+                    continue
+                self._reply(seq, self.execute(cmd))
+            elif tp == 2:
+                with self._lock:
+                    self.acknowledged.add(ord(packet[8]))
+                    self._messages.pop(ord(packet[8]), None)
+
+    def execute(self, cmd):
+        """
+        Return the response to a command.
+        """
+        self.executed.append(cmd)
+        name, _, args = cmd.partition(' ')
+        if not name:
+            return ''
+        if name not in self.responses:
+            return 'Unknown command'
+        response = self.responses[name]
+        return response(args) if callable(response) else response
+
+    def _reply(self, seq, data):
+        if len(data) <= self.packet_size:
+            packets = [self.encode(1, seq, data)]
+        else:
+            chunks = [data[i:i + self.packet_size] for i in range(0, len(data), self.packet_size)]
+            packets = [self.encode(1, seq, '\x00' + chr(len(chunks)) + chr(i) + chunk) for i, chunk in
+                       enumerate(chunks)]
+            if self.shuffle:
+                self.random.shuffle(packets)
+        for packet in packets:
+            self._sendto_client(packet)
+
+    def _send_messages(self):
+        now = time.time()
+        with self._lock:
+            for seq, message in self._messages.items():
+                if message[2] > now:
+                    continue
+                if message[1] == 5:
+                    # the BattlEye server gives up after 5 tries
+                    del self._messages[seq]
+                    continue
+                message[1] += 1
+                message[2] = now + self.message_retry
+                self._sendto_client(message[0])
+
+    def _sendto_client(self, packet):
+        if self.client is None or (self.loss and self.random.random() < self.loss):
+            return
+        self.socket.sendto(packet, self.client)
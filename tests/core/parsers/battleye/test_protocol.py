@@ -0,0 +1,187 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import threading
+import time
+import unittest2 as unittest
+
+from b3.parsers.battleye.protocol import BattleyeServer
+from b3.parsers.battleye.protocol import CommandFailedError
+from b3.parsers.battleye.protocol import CommandTimeoutError
+from tests.core.parsers.battleye.fake_server import FakeBattleyeServer
+
+BANS = ''.join('%3s 0123456789abcdef0123456789abcdef perm Ban reason %s\n' % (i, i) for i in range(100))
+
+
+class BattleyeServerTestCase(unittest.TestCase):
+
+    loss = 0
+
+    def setUp(self):
+        self.server = FakeBattleyeServer(packet_size=256, loss=self.loss, shuffle=True)
+        self.server.responses['bans'] = BANS
+        self.server.responses['say'] = ''
+        self.server.responses['kick'] = lambda args: '%s was kicked' % args
+        self.server.start()
+        self.conn = BattleyeServer(*self.server.address, password='password')
+        self.conn.command_retry = 0.1
+        self.messages = []
+        self.conn.subscribe(self.on_message)
+
+    def on_message(self, message):
+        self.messages.append(message)
+
+    def tearDown(self):
+        self.conn.stop()
+        self.conn.join(5)
+        self.server.stop()
+
+
+class Test_connection(BattleyeServerTestCase):
+
+    def test_login(self):
+        self.assertTrue(self.conn.connected)
+        self.assertTrue(self.conn.is_alive())
+
+    def test_bad_password(self):
+        conn = BattleyeServer(*self.server.address, password='f00')
+        self.assertFalse(conn.connected)
+        conn.join(5)
+        self.assertFalse(conn.is_alive())
+
+    def test_stop(self):
+        self.conn.stop()
+        self.conn.join(5)
+        self.assertFalse(self.conn.is_alive())
+        self.assertFalse(self.conn.connected)
+
+    def test_stop_wakes_up_waiting_commands(self):
+        self.server.drop = lambda cmd: True
+        threading.Timer(0.2, self.conn.stop).start()
+        start = time.time()
+        self.assertRaises(CommandTimeoutError, self.conn.command, 'kick 1', 5)
+        self.assertLess(time.time() - start, 2)
+
+    def test_keepalive(self):
+        self.conn.keepalive = 0.1
+        time.sleep(self.conn.select_timeout + 0.5)
+        self.assertIn('', self.server.executed)
+
+    def test_idle_connection_does_not_poll(self):
+        self.assertEqual(self.conn.select_timeout, self.conn._next_timeout())
+
+
+class Test_commands(BattleyeServerTestCase):
+
+    def test_response(self):
+        self.assertEqual('1 was kicked', self.conn.command('kick 1'))
+
+    def test_empty_response(self):
+        self.assertEqual('', self.conn.command('say -1 hello', timeout=1))
+
+    def test_command_with_no_response(self):
+        self.assertIsNone(self.conn.command('say -1 hello'))
+
+    def test_unknown_command(self):
+        self.assertRaises(CommandFailedError, self.conn.command, 'f00')
+
+    def test_multi_packet_response(self):
+        self.assertEqual(BANS, self.conn.command('bans'))
+
+    def test_lost_command(self):
+        dropped = []
+        def drop(cmd):
+            if cmd == 'kick 1' and not dropped:
+                dropped.append(cmd)
+                return True
+        self.server.drop = drop
+        self.assertEqual('1 was kicked', self.conn.command('kick 1'))
+        self.assertEqual(['kick 1'], self.server.executed)
+
+    def test_timeout(self):
+        self.server.drop = lambda cmd: cmd == 'kick 1'
+        start = time.time()
+        self.assertRaises(CommandTimeoutError, self.conn.command, 'kick 1', 0.3)
+        self.assertLess(time.time() - start, 1)
+        self.assertEqual('2 was kicked', self.conn.command('kick 2'))
+        self.assertFalse(self.conn._pending)
+
+    def test_concurrent_commands(self):
+        results = {}
+        def call(i):
+            results[i] = self.conn.command('kick %s' % i)
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(50)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertDictEqual(dict((i, '%s was kicked' % i) for i in range(50)), results)
+
+    def test_throughput(self):
+        def call(n):
+            for i in range(n):
+                self.assertEqual(BANS, self.conn.command('bans'))
+        threads = [threading.Thread(target=call, args=(25,)) for _ in range(8)]
+        start = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertGreaterEqual(len(self.server.executed), 200)
+        self.assertLess(time.time() - start, 10)
+
+
+class Test_server_messages(BattleyeServerTestCase):
+
+    def test_message(self):
+        self.server.message('Player #1 f00 disconnected')
+        deadline = time.time() + 2
+        while not self.server.acknowledged and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertListEqual([u'Player #1 f00 disconnected'], self.messages)
+        self.assertSetEqual(set([0]), self.server.acknowledged)
+
+    def test_resent_message_is_notified_once(self):
+        packet = FakeBattleyeServer.encode(2, 7, 'hello')
+        self.conn._handle_packet(packet)
+        self.conn._handle_packet(packet)
+        self.assertListEqual([u'hello'], self.messages)
+
+
+class Test_packet_loss(BattleyeServerTestCase):
+
+    loss = 0.2
+
+    def test_commands(self):
+        for i in range(30):
+            self.assertEqual('%s was kicked' % i, self.conn.command('kick %s' % i))
+
+    def test_multi_packet_response(self):
+        for i in range(5):
+            self.assertEqual(BANS, self.conn.command('bans'))
+
+    def test_messages(self):
+        self.conn.command('kick 1')
+        for i in range(10):
+            self.server.message('message %s' % i)
+        deadline = time.time() + 3
+        while self.server._messages and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(len(set(self.messages)), len(self.messages))
+        self.assertTrue(self.messages)
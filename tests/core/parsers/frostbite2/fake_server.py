@@ -0,0 +1,141 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import select
+import socket
+import threading
+
+from b3.parsers.frostbite2.protocol import DecodeInt32
+from b3.parsers.frostbite2.protocol import DecodePacket
+from b3.parsers.frostbite2.protocol import EncodePacket
+from b3.parsers.frostbite2.protocol import containsCompletePacket
+
+
+class FakeFrostbiteServer(object):
+    """
+    TCP server speaking the Frostbite2 RCON protocol with a single client at a time.
+    Each command is answered by its own thread after the delay configured for its first word, so that responses to
+    pipelined commands can come back out of order.
+    """
+    def __init__(self):
+        self.responses = {}  # command word => response words or function(command words) returning them
+        self.delays = {}  # command word => amount of seconds the command takes to execute
+        self.received = []  # words of the commands received, in order
+        self.acknowledged = []  # sequence numbers of the acknowledged events
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind(('127.0.0.1', 0))
+        self.socket.listen(5)
+        self.address = self.socket.getsockname()
+        self.client = None
+        self._lock = threading.Lock()
+        self._event_seq = 0
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name='FakeFrostbiteServer')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        self.disconnect()
+        self.socket.close()
+
+    def disconnect(self):
+        """
+        Close the connection with the client.
+        """
+        with self._lock:
+            if self.client:
+                self.client.close()
+                self.client = None
+
+    def event(self, *words):
+        """
+        Send a game event to the client.
+        """
+        with self._lock:
+            seq = self._event_seq
+            self._event_seq += 1
+        self._send(EncodePacket(True, False, seq, words))
+
+    def _send(self, packet):
+        with self._lock:
+            if self.client:
+                self.client.sendall(packet)
+
+    def _serve(self):
+        buf = ''
+        while self._running:
+            sockets = [self.socket] + ([self.client] if self.client else [])
+            readable = select.select(sockets, [], [], 0.05)[0]
+            if self.socket in readable:
+                # the connectivity test connection is accepted and replaced by the actual one
+                client = self.socket.accept()[0]
+                with self._lock:
+                    if self.client:
+                        self.client.close()
+                    self.client = client
+                buf = ''
+                continue
+            if not readable:
+                continue
+            try:
+                data = self.client.recv(65536)
+            except (socket.error, AttributeError):
+                data = ''
+            if not data:
+                self.disconnect()
+                continue
+            buf += data
+            while containsCompletePacket(buf):
+                size = DecodeInt32(buf[4:8])
+                packet, buf = buf[:size], buf[size:]
+                self._handle(DecodePacket(packet))
+
+    def _handle(self, packet):
+        from_server, is_response, sequence, words = packet
+        if is_response:
+            self.acknowledged.append(sequence)
+            return
+        self.received.append(words)
+        delay = self.delays.get(words[0], 0)
+        if delay:
+            threading.Timer(delay, self._respond, args=(sequence, words)).start()
+        else:
+            self._respond(sequence, words)
+
+    def _respond(self, sequence, words):
+        if words[0] == 'login.hashed':
+            response = ['OK', '0123456789ABCDEF'] if len(words) == 1 else ['OK']
+        elif words[0] in self.responses:
+            response = self.responses[words[0]]
+            if callable(response):
+                response = response(words)
+        else:
+            response = ['UnknownCommand']
+        try:
+            self._send(EncodePacket(False, True, sequence, response))
+        except socket.error:
+            pass
@@ -0,0 +1,211 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import socket
+import threading
+import time
+import unittest2 as unittest
+
+from b3.parsers.frostbite2.protocol import CommandFailedError
+from b3.parsers.frostbite2.protocol import CommandTimeoutError
+from b3.parsers.frostbite2.protocol import CommandUnknownCommandError
+from b3.parsers.frostbite2.protocol import DecodePacket
+from b3.parsers.frostbite2.protocol import EncodePacket
+from b3.parsers.frostbite2.protocol import FrostbiteServer
+from b3.parsers.frostbite2.protocol import NetworkError
+from b3.parsers.frostbite2.protocol import PacketBuffer
+from tests.core.parsers.frostbite2.fake_server import FakeFrostbiteServer
+
+EVENT = ['player.onKill', 'joe', 'jack', 'M16A4', 'true']
+
+
+class Test_codec(unittest.TestCase):
+
+    def test_decode_string(self):
+        packet = EncodePacket(True, False, 42, EVENT)
+        self.assertListEqual([0x80000000, 0, 42, EVENT], DecodePacket(packet))
+
+    def test_decode_response(self):
+        packet = EncodePacket(False, True, 0x3fffffff, ['OK', ''])
+        self.assertListEqual([0, 0x40000000, 0x3fffffff, ['OK', '']], DecodePacket(packet))
+
+    def test_decode_non_ascii_words(self):
+        packet = EncodePacket(True, False, 1, ['player.onChat', 'j\xe9r\xf4me', 'h\x00i'])
+        self.assertListEqual(['player.onChat', 'j\xe9r\xf4me', 'h\x00i'], DecodePacket(packet)[3])
+
+
+class Test_PacketBuffer(unittest.TestCase):
+
+    def test_incomplete_packet(self):
+        packet = EncodePacket(True, False, 1, EVENT)
+        buf = PacketBuffer()
+        buf.feed(packet[:5])
+        self.assertIsNone(buf.next_packet())
+        buf.feed(packet[5:-1])
+        self.assertIsNone(buf.next_packet())
+        buf.feed(packet[-1:])
+        self.assertListEqual(EVENT, buf.next_packet().words)
+        self.assertIsNone(buf.next_packet())
+        self.assertEqual(0, len(buf))
+
+    def test_split_stream(self):
+        data = ''.join(EncodePacket(True, False, i, EVENT + [str(i)]) for i in range(200))
+        buf = PacketBuffer(64)
+        packets = []
+        for i in range(0, len(data), 7):
+            buf.feed(data[i:i + 7])
+            packet = buf.next_packet()
+            while packet is not None:
+                packets.append([packet.sequence, packet.words])
+                packet = buf.next_packet()
+        self.assertListEqual([[i, EVENT + [str(i)]] for i in range(200)], packets)
+
+    def test_buffer_grows_to_fit_big_packets(self):
+        words = ['OK'] + ['player%s' % i for i in range(1000)]
+        buf = PacketBuffer(16)
+        buf.feed(EncodePacket(False, True, 3, words) + EncodePacket(True, False, 4, EVENT))
+        self.assertListEqual(words, buf.next_packet().words)
+        self.assertListEqual(EVENT, buf.next_packet().words)
+
+    def test_invalid_packet_size(self):
+        buf = PacketBuffer()
+        buf.feed('\x00' * 12)
+        self.assertRaises(socket.error, buf.next_packet)
+
+
+class FrostbiteServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.server = FakeFrostbiteServer()
+        self.server.responses['admin.say'] = ['OK']
+        self.server.responses['admin.kickPlayer'] = lambda words: ['OK', words[1]]
+        self.server.responses['admin.listPlayers'] = ['OK', '0', '0']
+        self.server.responses['admin.yell'] = ['InvalidArguments']
+        self.server.start()
+        self.conn = FrostbiteServer(*self.server.address, password='password', command_timeout=2)
+        self.events = []
+        self.conn.subscribe(self.on_event)
+
+    def on_event(self, words):
+        self.events.append(words)
+
+    def tearDown(self):
+        self.conn.stop()
+        self.conn.join(5)
+        self.server.stop()
+
+
+class Test_commands(FrostbiteServerTestCase):
+
+    def test_connected(self):
+        self.assertTrue(self.conn.connected)
+
+    def test_auth(self):
+        self.conn.auth()
+        self.assertEqual(['login.hashed'], self.server.received[0])
+        self.assertEqual('login.hashed', self.server.received[1][0])
+
+    def test_response(self):
+        self.assertEqual(['joe'], self.conn.command('admin.kickPlayer', 'joe'))
+        self.assertEqual(['joe'], self.conn.command(('admin.kickPlayer', 'joe')))
+
+    def test_failed_command(self):
+        self.assertRaises(CommandFailedError, self.conn.command, 'admin.yell', 'f00')
+        self.assertRaises(CommandUnknownCommandError, self.conn.command, 'f00')
+
+    def test_timeout(self):
+        self.server.delays['admin.listPlayers'] = 1
+        self.conn.command_timeout = 0.2
+        self.assertRaises(CommandTimeoutError, self.conn.command, 'admin.listPlayers', 'all')
+        self.assertEqual(['joe'], self.conn.command('admin.kickPlayer', 'joe'))
+        time.sleep(1)
+        self.assertDictEqual({}, self.conn.pending_commands)
+
+    def test_responses_out_of_order(self):
+        self.server.delays['admin.listPlayers'] = 0.3
+        slow = self.conn.send('admin.listPlayers', 'all')
+        start = time.time()
+        self.assertEqual(['joe'], self.conn.command('admin.kickPlayer', 'joe'))
+        self.assertLess(time.time() - start, 0.25)
+        self.assertFalse(slow.done())
+        self.assertTrue(slow.wait(2))
+        self.assertEqual(['OK', '0', '0'], slow.response)
+
+    def test_concurrent_commands(self):
+        self.server.delays['admin.kickPlayer'] = 0.1
+        results = {}
+        def call(i):
+            results[i] = self.conn.command('admin.kickPlayer', 'player%s' % i)
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(50)]
+        start = time.time()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertDictEqual(dict((i, ['player%s' % i]) for i in range(50)), results)
+        self.assertLess(time.time() - start, 2)
+
+    def test_command_batch(self):
+        self.server.delays['admin.say'] = 0.05
+        commands = [('admin.say', 'line %s' % i, 'all') for i in range(100)] + [('admin.yell', 'f00'), 'f00']
+        start = time.time()
+        results = self.conn.command_batch(commands)
+        self.assertLess(time.time() - start, 1)
+        self.assertListEqual([[]] * 100, results[:100])
+        self.assertIsInstance(results[100], CommandFailedError)
+        self.assertIsInstance(results[101], CommandUnknownCommandError)
+        self.assertListEqual([list(x) if type(x) == tuple else [x] for x in commands], self.server.received)
+
+    def test_command_batch_timeout(self):
+        self.server.delays['admin.listPlayers'] = 1
+        results = self.conn.command_batch([('admin.kickPlayer', 'joe'), ('admin.listPlayers', 'all')], timeout=0.2)
+        self.assertEqual(['joe'], results[0])
+        self.assertIsInstance(results[1], CommandTimeoutError)
+
+    def test_stats(self):
+        self.conn.command('admin.kickPlayer', 'joe')
+        self.conn.command_batch([('admin.say', 'hi', 'all')] * 3 + [('admin.yell', 'f00')])
+        stats = self.conn.getStats()
+        self.assertEqual(1, stats['admin.kickPlayer']['count'])
+        self.assertEqual(3, stats['admin.say']['count'])
+        self.assertEqual(0, stats['admin.say']['errors'])
+        self.assertEqual(1, stats['admin.yell']['errors'])
+        self.assertGreaterEqual(stats['admin.say']['max'], stats['admin.say']['avg'])
+        self.assertGreater(stats['admin.say']['rate'], 0)
+
+    def test_lost_connection(self):
+        self.server.delays['admin.listPlayers'] = 1
+        threading.Timer(0.2, self.server.disconnect).start()
+        start = time.time()
+        self.assertRaises(NetworkError, self.conn.command, 'admin.listPlayers', 'all')
+        self.assertLess(time.time() - start, 1)
+        self.conn.join(2)
+        self.assertFalse(self.conn.connected)
+
+
+class Test_events(FrostbiteServerTestCase):
+
+    def test_event(self):
+        self.conn.command('admin.listPlayers', 'all')
+        self.server.event('player.onJoin', 'joe', 'EA_0123')
+        deadline = time.time() + 2
+        while not (self.events and self.server.acknowledged) and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertListEqual([['player.onJoin', 'joe', 'EA_0123']], self.events)
+        self.assertListEqual([0], self.server.acknowledged)
@@ -0,0 +1,106 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import random
+import re
+import select
+import socket
+import threading
+import time
+
+
+class FakeQ3Server(object):
+    """
+    UDP server answering RCON and connectionless commands the way a q3a game server does.
+    Commands are processed one at a time, in the order they are received. Responses longer than packet_size are
+    split into several packets. Incoming packets can be dropped to simulate packet loss.
+    """
+    header = '\377\377\377\377'
+    _reRcon = re.compile(r'^\377\377\377\377rcon "(?P<password>[^"]*)" (?P<cmd>.*?)\n?$', re.DOTALL)
+
+    def __init__(self, password='password', packet_size=1024, loss=0, seed=0):
+        """
+        Object constructor.
+        :param password: The RCON password
+        :param packet_size: The maximum size of the response packets
+        :param loss: The ratio of incoming packets to drop
+        :param seed: The random number generator seed used to drop packets
+        """
+        self.password = password
+        self.packet_size = packet_size
+        self.loss = loss
+        self.random = random.Random(seed)
+        self.responses = {}  # command name => response or function(command arguments) returning the response
+        self.delays = {}  # command name => amount of seconds the command takes to execute
+        self.drop = None  # function(command) returning True if the packet must be dropped
+        self.received = []
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.bind(('127.0.0.1', 0))
+        self.address = self.socket.getsockname()
+        self._running = False
+        self._thread = None
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._serve, name='FakeQ3Server')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._running = False
+        if self._thread:
+            self._thread.join()
+        self.socket.close()
+
+    def _serve(self):
+        while self._running:
+            if not select.select([self.socket], [], [], 0.05)[0]:
+                continue
+            packet, address = self.socket.recvfrom(65536)
+            self.received.append(packet)
+            match = self._reRcon.match(packet)
+            cmd = match.group('cmd') if match else packet[len(self.header):].strip()
+            if (self.drop and self.drop(cmd)) or (self.loss and self.random.random() < self.loss):
+                continue
+            if match:
+                if match.group('password') != self.password:
+                    self._reply(address, 'print\n', 'Bad rconpassword.\n')
+                else:
+                    self._reply(address, 'print\n', self.execute(cmd))
+            elif cmd.startswith('getstatus'):
+                self._reply(address, 'statusResponse\n', '\\sv_hostname\\fake server\\mapname\\ut4_turnpike\n')
+            elif cmd.startswith('getinfo'):
+                self._reply(address, 'infoResponse\n', '\\hostname\\fake server\\clients\\0')
+
+    def execute(self, cmd):
+        """
+        Return the response to a RCON command.
+        """
+        name, _, args = cmd.partition(' ')
+        time.sleep(self.delays.get(name, 0))
+        if name == 'echo':
+            return args + '\n'
+        response = self.responses.get(name, '')
+        return response(args) if callable(response) else response
+
+    def _reply(self, address, kind, data):
+        if not data:
+            return
+        for i in range(0, len(data), self.packet_size):
+            self.socket.sendto(self.header + kind + data[i:i + self.packet_size], address)
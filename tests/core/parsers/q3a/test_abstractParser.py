@@ -16,7 +16,9 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
+import re
 from b3.parsers.q3a.abstractParser import AbstractParser
+from b3.parsers.q3a.abstractParser import LineDispatcher
 from mock import Mock
 import unittest2 as unittest
 
@@ -48,6 +50,89 @@ class Test(unittest.TestCase):
         assertGetCvar('mapname', '"mapname" is:"ut4_abbey^7"', ("mapname", 'ut4_abbey', None))
 
 
+class Test_LineDispatcher(unittest.TestCase):
+
+    def setUp(self):
+        self.formats = (
+            re.compile(r'^(?P<action>[a-z]+):\s+(?P<data>(?P<cid>[0-9]+)\s+(?P<text>.*))$', re.IGNORECASE),
+            re.compile(r'^(?P<action>Kill):\s*(?P<data>.*)$', re.IGNORECASE),
+            re.compile(r'^(?P<action>[A-Z]);(?P<data>.*)$', re.IGNORECASE),
+            re.compile(r'^(?P<action>(?:red|blue)):(?P<data>.*)$', re.IGNORECASE),
+            re.compile(r'^(?P<data>(?P<action>[^:]+):\s*(?P<text>.*))$', re.IGNORECASE),
+        )
+        self.dispatcher = LineDispatcher(self.formats)
+
+    def assertMatchedBy(self, line, index):
+        m = self.dispatcher.match(line)
+        if index is None:
+            self.assertIsNone(m)
+        else:
+            self.assertIs(self.formats[index], m.re)
+        # same outcome as trying every format in order
+        for f in self.formats:
+            expected = f.match(line)
+            if expected:
+                self.assertEqual(expected.groupdict(), m.groupdict())
+                break
+
+    def test_routing(self):
+        self.assertMatchedBy('say: 1 hello', 0)
+        self.assertMatchedBy('Kill: joe killed bob', 1)
+        self.assertMatchedBy('K;guid;1;axis;joe', 2)
+        self.assertMatchedBy('red:8  blue:5', 3)
+
+    def test_unroutable_format_is_always_tried(self):
+        self.assertMatchedBy('score: ten', 4)
+        self.assertMatchedBy('------', None)
+        self.assertIn(self.formats[4], self.dispatcher.getFormats(''))
+        self.assertIn(self.formats[4], self.dispatcher.getFormats('K'))
+
+    def test_precedence(self):
+        f = self.formats
+        self.assertEqual((f[0], f[1], f[2], f[4]), self.dispatcher.getFormats('Kill'))
+        self.assertEqual((f[0], f[2], f[4]), self.dispatcher.getFormats('say'))
+        self.assertEqual((f[0], f[2], f[3], f[4]), self.dispatcher.getFormats('red'))
+
+    def test_formats_are_cached_per_token(self):
+        self.assertIs(self.dispatcher.getFormats('say'), self.dispatcher.getFormats('say'))
+
+    def test_cache_is_bounded(self):
+        self.dispatcher._maxTokens = 2
+        for token in ('a', 'b', 'c', 'd'):
+            self.dispatcher.getFormats(token)
+        self.assertEqual(2, len(self.dispatcher._byToken))
+
+
+class Test_getLineHandler(unittest.TestCase):
+
+    def setUp(self):
+        class MyParser(AbstractParser):
+            def __init__(self):
+                pass
+            def OnFlagreturn(self, action, data, match=None):
+                pass
+            def OnKill(self, action, data, match=None):
+                pass
+        self.parser = MyParser()
+
+    def test_handler(self):
+        self.assertEqual('OnKill', self.parser.getLineHandler('kill'))
+        self.assertEqual('OnFlagreturn', self.parser.getLineHandler('flagreturn'))
+        self.assertIsNone(self.parser.getLineHandler('unknown'))
+
+    def test_handler_is_cached(self):
+        self.parser.getLineHandler('kill')
+        self.parser.getLineHandler('unknown')
+        self.assertDictEqual({'kill': 'OnKill', 'unknown': None}, self.parser._lineHandlers)
+
+    def test_dispatcher_follows_line_formats(self):
+        dispatcher = self.parser.getLineDispatcher()
+        self.assertIs(dispatcher, self.parser.getLineDispatcher())
+        self.parser._lineFormats = (re.compile(r'^(?P<action>Kill):(?P<data>.*)$'),)
+        self.assertIsNot(dispatcher, self.parser.getLineDispatcher())
+        self.assertEqual('Kill', self.parser.getLineDispatcher().match('Kill: 1 2').group('action'))
+
+
 if __name__ == "__main__":
     #import sys;sys.argv = ['', 'Test.testName']
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,207 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import threading
+import time
+import unittest2 as unittest
+
+from b3.config import CfgConfigParser
+from b3.parsers.q3a.rcon import Rcon
+from mock import Mock
+from tests.core.parsers.q3a.fake_server import FakeQ3Server
+
+STATUS = 'map: ut4_turnpike\n' + \
+         'num score ping name            lastmsg address               qport rate\n' + \
+         '--- ----- ---- --------------- ------- --------------------- ----- -----\n' + \
+         ''.join('%3s    10   50 Player%-9s       0 11.22.33.%s:27960 %5s 25000\n' % (i, i, i, 1000 + i)
+                 for i in range(32))
+
+
+class RconTestCase(unittest.TestCase):
+
+    pipelining = True
+
+    def setUp(self):
+        self.server = FakeQ3Server(packet_size=256)
+        self.server.responses['status'] = STATUS
+        self.server.responses['say'] = lambda args: 'broadcast: print "%s"\n' % args
+        self.server.responses['kick'] = lambda args: '%s was kicked.\n' % args
+        self.server.start()
+        self.console = Mock()
+        self.console.encoding = None
+        self.console.config = CfgConfigParser()
+        self.console.config.loadFromString('[server]\nrcon_pipelining: %s\n' % ('yes' if self.pipelining else 'no'))
+        self.rcon = Rcon(self.console, self.server.address, 'password')
+
+    def tearDown(self):
+        self.rcon.close()
+        self.server.stop()
+
+
+class Test_pipelined_rcon(RconTestCase):
+
+    def test_response(self):
+        start = time.time()
+        self.assertEqual('broadcast: print "hello"\n', self.rcon.write('say hello'))
+        self.assertLess(time.time() - start, self.rcon.socket_timeout / 2)
+
+    def test_multi_packet_response(self):
+        self.assertEqual(STATUS, self.rcon.write('status'))
+
+    def test_no_output(self):
+        start = time.time()
+        self.assertEqual('', self.rcon.write('g_gear 0'))
+        self.assertLess(time.time() - start, self.rcon.socket_timeout / 2)
+
+    def test_concurrent_callers(self):
+        results = {}
+        def call(i):
+            results[i] = self.rcon.write('kick %s' % i)
+        self.server.delays['kick'] = 0.05
+        threads = [threading.Thread(target=call, args=(i,)) for i in range(10)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertDictEqual(dict((i, '%s was kicked.\n' % i) for i in range(10)), results)
+
+    def test_lost_command(self):
+        self.server.drop = lambda cmd: cmd == 'kick 1'
+        start = time.time()
+        self.assertEqual('', self.rcon.write('kick 1'))
+        self.assertLess(time.time() - start, self.rcon.socket_timeout / 2)
+        self.assertEqual('2 was kicked.\n', self.rcon.write('kick 2'))
+
+    def test_lost_marker(self):
+        self.server.drop = lambda cmd: cmd == 'echo B3RCON2'
+        self.assertEqual('1 was kicked.\n', self.rcon.write('kick 1'))
+        self.assertEqual('2 was kicked.\n', self.rcon.write('kick 2', socketTimeout=0.2))
+        self.assertEqual('3 was kicked.\n', self.rcon.write('kick 3'))
+        self.assertEqual(1, self.rcon.getStats()['kick']['timeouts'])
+        self.assertTrue(self.rcon.pipelining)
+
+    def test_lost_marker_with_pipelined_requests(self):
+        self.server.drop = lambda cmd: cmd == 'echo B3RCON1'
+        self.server.delays['kick'] = 0.05
+        first = self.rcon._submit('kick 1')
+        second = self.rcon._submit('kick 2')
+        self.assertEqual('', first.wait(5))
+        # the responses of both commands arrived before the marker of the second one: none of them can be trusted
+        self.assertEqual('', second.wait(5))
+        self.assertEqual(2, self.rcon.getStats()['kick']['lost'])
+        self.assertEqual('3 was kicked.\n', self.rcon.write('kick 3'))
+
+    def test_markers_out_of_order(self):
+        self.server.drop = lambda cmd: True
+        first = self.rcon._submit('kick 1')
+        second = self.rcon._submit('kick 2')
+        # the marker of the second command arrives first, with the response of the first command
+        self.rcon._handlePacket(self.rcon.rconreplystring + '1 was kicked.\n')
+        self.rcon._handlePacket(self.rcon.rconreplystring + 'B3RCON%s\n' % second.id)
+        self.rcon._handlePacket(self.rcon.rconreplystring + 'B3RCON%s\n' % first.id)
+        self.assertEqual('', first.wait(5))
+        self.assertEqual('', second.wait(5))
+
+    def test_no_marker_falls_back_to_serial_commands(self):
+        # game server without echo command
+        self.server.drop = lambda cmd: cmd.startswith('echo B3RCON')
+        self.assertEqual('1 was kicked.\n', self.rcon.write('kick 1', socketTimeout=0.2))
+        self.assertFalse(self.rcon.pipelining)
+        start = time.time()
+        self.assertEqual('2 was kicked.\n', self.rcon.write('kick 2', socketTimeout=0.2))
+        self.assertLess(time.time() - start, 1)
+
+    def test_repeated_marker_timeouts_fall_back_to_serial_commands(self):
+        self.assertEqual('0 was kicked.\n', self.rcon.write('kick 0'))
+        self.server.drop = lambda cmd: cmd.startswith('echo B3RCON')
+        for i in range(1, self.rcon.max_marker_timeouts + 1):
+            self.assertTrue(self.rcon.pipelining)
+            self.assertEqual('%s was kicked.\n' % i, self.rcon.write('kick %s' % i, socketTimeout=0.1))
+        self.assertFalse(self.rcon.pipelining)
+
+    def test_max_inflight(self):
+        self.server.drop = lambda cmd: True
+        requests = [self.rcon._submit('kick %s' % i, socketTimeout=0.5) for i in range(self.rcon.max_inflight)]
+        blocked = threading.Thread(target=self.rcon.write, args=('kick 10',), kwargs={'socketTimeout': 0.1})
+        blocked.start()
+        time.sleep(0.1)
+        self.assertTrue(blocked.isAlive())
+        self.assertEqual(self.rcon.max_inflight, len(self.rcon._pending))
+        for request in requests:
+            request.wait(5)
+        blocked.join(5)
+        self.assertFalse(blocked.isAlive())
+
+    def test_server_down(self):
+        self.server.stop()
+        start = time.time()
+        self.assertEqual('', self.rcon.write('kick 1', socketTimeout=0.2))
+        self.assertLess(time.time() - start, 1)
+
+    def test_late_response_is_discarded(self):
+        self.server.delays['map'] = 0.3
+        self.assertEqual('', self.rcon.write('map ut4_casa', socketTimeout=0.1))
+        self.assertEqual('1 was kicked.\n', self.rcon.write('kick 1'))
+
+    def test_writelines(self):
+        self.rcon.writelines(['say a', 'say b', 'say c'])
+        deadline = time.time() + 5
+        while self.rcon.getStats().get('say', {}).get('count', 0) < 3 and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertEqual(3, self.rcon.getStats()['say']['count'])
+
+    def test_getRules(self):
+        self.assertIn('statusResponse', self.rcon.getRules())
+        self.assertIn('infoResponse', self.rcon.getInfo())
+
+    def test_stats(self):
+        self.rcon.write('status')
+        self.rcon.write('say hello')
+        self.rcon.write('say hello')
+        stats = self.rcon.getStats()
+        self.assertEqual(1, stats['status']['count'])
+        self.assertEqual(2, stats['say']['count'])
+        self.assertEqual(0, stats['say']['timeouts'])
+        self.assertGreaterEqual(stats['say']['max'], stats['say']['avg'])
+
+    def test_packet_loss(self):
+        self.rcon.max_marker_timeouts = 100
+        self.rcon.write('kick 0')
+        self.server.loss = 0.2
+        for i in range(20):
+            response = self.rcon.write('kick %s' % i, socketTimeout=0.1)
+            self.assertIn(response, ('', '%s was kicked.\n' % i))
+        self.assertEqual(21, self.rcon.getStats()['kick']['count'])
+
+
+class Test_legacy_rcon(RconTestCase):
+
+    pipelining = False
+
+    def test_disabled_by_default(self):
+        self.console.config.loadFromString('[server]\n')
+        rcon = Rcon(self.console, self.server.address, 'password')
+        self.assertFalse(rcon.pipelining)
+
+    def test_response(self):
+        self.assertFalse(self.rcon.pipelining)
+        self.assertEqual('broadcast: print "hello"\n', self.rcon.write('say hello', socketTimeout=0.1))
+
+    def test_multi_packet_response(self):
+        self.assertEqual(STATUS, self.rcon.write('status', socketTimeout=0.1))
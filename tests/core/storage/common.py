@@ -17,6 +17,8 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
 
+import time
+
 from b3.clients import Client
 from b3.clients import Alias
 from b3.clients import IpAlias
@@ -107,6 +109,50 @@ class StorageAPITest(object):
         self.assertEqual(1, len(result))
         self.assertEqual('jack', result[0].name)
 
+    def test_getClientsMatchingName(self):
+        self.storage.setClient(Client(guid="aaaaaaaaaa", name="bill"))
+        self.storage.setClient(Client(guid="bbbbbbbbbb", name="billy"))
+        self.storage.setClient(Client(guid="cccccccccc", name="john"))
+        self.storage.setClientAlias(Alias(alias='billythekid', clientId=3))
+
+        # without name index: current names containing the given name
+        result = self.storage.getClientsMatchingName('bill')
+        self.assertSetEqual(set(['bill', 'billy']), set(c.name for c in result))
+
+        self.storage.setupNameIndex()
+        deadline = time.time() + 5
+        while not self.storage._nameIndex.ready and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(self.storage._nameIndex.ready)
+
+        # names and aliases, best match first
+        self.assertListEqual(['bill', 'billy', 'john'], [c.name for c in self.storage.getClientsMatchingName('bill')])
+        self.assertListEqual(['john'], [c.name for c in self.storage.getClientsMatchingName('thekid')])
+        self.assertListEqual(['bill'], [c.name for c in self.storage.getClientsMatchingName('bill', limit=1)])
+        self.assertListEqual([], self.storage.getClientsMatchingName('zzz'))
+
+        # names similar to the given one only on demand
+        self.assertListEqual([], self.storage.getClientsMatchingName('jhon'))
+        self.assertListEqual([], self.storage.getClientsMatchingName('billythekyd'))
+        self.assertListEqual(['john'], [c.name for c in self.storage.getClientsMatchingName('billythekyd', fuzzy=True)])
+
+        # names stored after the index was loaded
+        self.storage.setClient(Client(guid="dddddddddd", name="zzz"))
+        self.assertListEqual(['zzz'], [c.name for c in self.storage.getClientsMatchingName('zzz')])
+
+    def test_getClientsMatchingName_empty_index(self):
+        # the index of an empty database must be kept up to date too
+        self.storage.setupNameIndex()
+        deadline = time.time() + 5
+        while not self.storage._nameIndex.ready and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertTrue(self.storage._nameIndex.ready)
+        self.assertEqual(0, len(self.storage._nameIndex))
+        self.storage.setClient(Client(guid="aaaaaaaaaa", name="bill"))
+        self.storage.setClientAlias(Alias(alias='billythekid', clientId=1))
+        self.assertEqual(2, len(self.storage._nameIndex))
+        self.assertListEqual(['bill'], [c.name for c in self.storage.getClientsMatchingName('thekid')])
+
     # def test_getClientsMatching_no_db(self):
     #     when(self.storage).query(ANY()).thenRaise(KeyError())
     #     self.assertRaises(KeyError, self.storage.getClientsMatching, {'guid': "xxxxxxxxxx"})
@@ -442,6 +488,55 @@ class StorageAPITest(object):
         # when(self.storage).query(ANY()).thenRaise(KeyError())
         # self.assertRaises(KeyError, self.storage.numPenalties, c1)
 
+    def test_getClientsActivePenalties(self):
+        c1 = Mock()
+        c1.id = 15
+        c2 = Mock()
+        c2.id = 18
+        c3 = Mock()
+        c3.id = 21
+        Penalty(clientId=c1.id, adminId=0, timeExpire=-1, type='Ban', inactive=1, data='pA').save(self.console)
+        Penalty(clientId=c1.id, adminId=0, timeExpire=-1, type='Ban', inactive=0, data='pB').save(self.console)
+        Penalty(clientId=c1.id, adminId=0, timeExpire=-1, type='Kick', inactive=0, data='pC').save(self.console)
+        Penalty(clientId=c1.id, adminId=0, timeExpire=int(time.time()) - 10, type='Warning', inactive=0, data='pD').save(self.console)
+        Penalty(clientId=c2.id, adminId=0, timeExpire=int(time.time()) + 60, type='Warning', inactive=0, data='pE').save(self.console)
+        Penalty(clientId=c2.id, adminId=0, timeExpire=-1, type='TempBan', inactive=0, data='pF').save(self.console)
+        result = self.storage.getClientsActivePenalties([c1, c2, c3])
+        self.assertSetEqual(set([15, 18, 21]), set(result.keys()))
+        self.assertListEqual(['pB'], [p.data for p in result[15]])
+        self.assertSetEqual(set(['pE', 'pF']), set(p.data for p in result[18]))
+        self.assertListEqual([], result[21])
+        result = self.storage.getClientsActivePenalties([c1, c2], type='Warning')
+        self.assertListEqual(['pE'], [p.data for p in result[18]])
+        self.assertDictEqual({}, self.storage.getClientsActivePenalties([]))
+
+    def test_getClientAndPenalties(self):
+        c1 = Client(ip="1.2.3.4", connections=3, guid="mlkjmlkjqsdf", pbid="123546abcdef", name="some dude")
+        c1_id = self.storage.setClient(c1)
+        c2_id = self.storage.setClient(Client(ip="1.2.3.5", guid="azerazerazer", name="other dude"))
+        Penalty(clientId=c1_id, adminId=0, timeExpire=-1, type='Ban', inactive=1, data='pA').save(self.console)
+        Penalty(clientId=c1_id, adminId=0, timeExpire=-1, type='TempBan', inactive=0, data='pB').save(self.console)
+        Penalty(clientId=c1_id, adminId=0, timeExpire=-1, type='Notice', inactive=0, data='pC').save(self.console)
+        Penalty(clientId=c1_id, adminId=0, timeExpire=int(time.time()) + 60, type='Warning', inactive=0, data='pD').save(self.console)
+        Penalty(clientId=c2_id, adminId=0, timeExpire=-1, type='Ban', inactive=0, data='pE').save(self.console)
+        # by guid
+        client, penalties = self.storage.getClientAndPenalties(Client(guid="mlkjmlkjqsdf"))
+        self.assertEqual(c1_id, client.id)
+        self.assertEqual("some dude", client.name)
+        self.assertEqual(3, client.connections)
+        self.assertSetEqual(set(['pB', 'pD']), set(p.data for p in penalties))
+        # by id
+        client, penalties = self.storage.getClientAndPenalties(Client(id=c1_id), type='Warning')
+        self.assertEqual("mlkjmlkjqsdf", client.guid)
+        self.assertListEqual(['pD'], [p.data for p in penalties])
+        # client without penalty
+        self.storage.setClient(Client(ip="1.2.3.6", guid="wxcvwxcvwxcv", name="clean dude"))
+        client, penalties = self.storage.getClientAndPenalties(Client(guid="wxcvwxcvwxcv"))
+        self.assertEqual("clean dude", client.name)
+        self.assertListEqual([], penalties)
+        # unknown client
+        self.assertRaises(KeyError, self.storage.getClientAndPenalties, Client(guid='god'))
+
     def test_getGroups(self):
         groups = self.storage.getGroups()
         self.assertEqual(8, len(groups))
@@ -0,0 +1,194 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import threading
+import time
+import unittest2 as unittest
+
+from b3.clients import Client
+from b3.clients import Penalty
+from b3.functions import splitDSN
+from b3.storage.executor import StorageExecutor
+from b3.storage.sqlite import SqliteStorage
+from mock import Mock
+from tests import B3TestCase
+
+
+class Test_StorageExecutor(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = Mock()
+        self.executor = StorageExecutor(self.storage)
+
+    def tearDown(self):
+        self.executor.stop()
+
+    def test_synchronous_mode(self):
+        future = self.executor.submit(lambda x: x * 2, (21,))
+        self.assertTrue(future.done())
+        self.assertEqual(42, future.result())
+
+    def test_exception(self):
+        def fail():
+            raise ValueError('boom')
+        future = self.executor.submit(fail)
+        self.assertIsInstance(future.exception(), ValueError)
+        self.assertRaises(ValueError, future.result)
+        self.assertEqual(1, self.executor.stats()['executor_failed'])
+        self.assertTrue(self.storage.console.error.called)
+
+    def test_done_callback(self):
+        results = []
+        self.executor.workers = 1
+        self.executor.start()
+        release = threading.Event()
+        future = self.executor.submit(lambda: release.wait(5) and 'done')
+        future.add_done_callback(lambda f: results.append(f.result()))
+        self.assertEqual([], results)
+        release.set()
+        self.assertEqual('done', future.result(5))
+        self.executor.stop()
+        self.assertEqual(['done'], results)
+
+    def test_same_key_keeps_order(self):
+        self.executor.workers = 4
+        self.executor.start()
+        executed = []
+        futures = [self.executor.submit(executed.append, (i,), key=('clients', 1)) for i in range(200)]
+        for f in futures:
+            f.result(5)
+        self.assertListEqual(range(200), executed)
+
+    def test_tasks_run_in_workers(self):
+        self.executor.workers = 2
+        self.executor.start()
+        future = self.executor.submit(lambda: threading.current_thread().name)
+        self.assertTrue(future.result(5).startswith('storage-worker-'))
+
+    def test_full_queue_blocks_till_there_is_room(self):
+        self.executor.workers = 1
+        self.executor.queue_size = 1
+        self.executor.put_timeout = 0.01
+        self.executor.start()
+        release = threading.Event()
+        executed = []
+        self.executor.submit(release.wait, (5,), key='k')                  # blocks the worker
+        self.executor.submit(executed.append, ('older',), key='k')         # fills the queue
+        threading.Timer(0.2, release.set).start()
+        future = self.executor.submit(executed.append, ('newer',), key='k')
+        future.result(5)
+        self.assertListEqual(['older', 'newer'], executed)
+        self.assertGreaterEqual(self.executor.stats()['executor_overflows'], 1)
+        self.assertTrue(self.storage.console.warning.called)
+
+    def test_wait(self):
+        self.executor.workers = 1
+        self.executor.start()
+        release = threading.Event()
+        executed = []
+        self.executor.submit(lambda: release.wait(5) and executed.append(1), key=('clients', 1))
+        threading.Timer(0.1, release.set).start()
+        self.assertFalse(self.executor.wait(('clients', 2)))
+        self.assertTrue(self.executor.wait(lambda key: key[0] == 'clients', 5))
+        self.assertListEqual([1], executed)
+        self.assertFalse(self.executor.wait(('clients', 1)))
+
+    def test_stop_executes_queued_tasks(self):
+        self.executor.workers = 2
+        self.executor.start()
+        executed = []
+        for i in range(50):
+            self.executor.submit(executed.append, (i,), key=i % 3)
+        self.executor.stop()
+        self.assertEqual(50, len(executed))
+        self.assertEqual(0, self.executor.stats()['executor_workers'])
+
+
+class Test_sqlite_submit(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.storage = self.console.storage = SqliteStorage('sqlite://:memory:', splitDSN('sqlite://:memory:'),
+                                                            self.console)
+        self.storage.connect()
+        self.storage.setupExecutor(workers=2)
+
+    def tearDown(self):
+        B3TestCase.tearDown(self)
+        self.storage.stopExecutor()
+        self.storage.shutdown()
+
+    def test_submit(self):
+        future = self.storage.submit("INSERT INTO groups (name, keyword, level) VALUES ('test', 'test', 150)",
+                                     key='groups')
+        self.assertEqual(1, future.result(5).rowcount)
+        cursor = self.storage.query("SELECT COUNT(*) AS total FROM groups WHERE keyword = 'test'")
+        self.assertEqual(1, cursor.getValue('total'))
+
+    def test_client_save_updates_in_background(self):
+        client = Client(console=self.console, guid='GUID1', name='joe')
+        client_id = client.save()
+        client.name = 'jack'
+        self.assertEqual(client_id, client.save())
+        self.storage.stopExecutor()
+        cursor = self.storage.query("SELECT name FROM clients WHERE id = %s" % client_id)
+        self.assertEqual('jack', cursor.getValue('name'))
+
+    def test_read_after_background_update(self):
+        client = Client(console=self.console, guid='GUID1', name='joe')
+        client.save()
+        release = threading.Event()
+        self.storage.submitCall(release.wait, (5,), key=('clients', client.id))  # delays the update
+        client.name = 'jack'
+        client.save()
+        threading.Timer(0.1, release.set).start()
+        self.assertEqual('jack', self.storage.getClient(Client(guid='GUID1')).name)
+
+    def test_read_does_not_wait_for_other_rows(self):
+        joe = Client(console=self.console, guid='GUID1', name='joe')
+        joe.save()
+        jack = Client(console=self.console, guid='GUID2', name='jack')
+        jack.save()
+        release = threading.Event()
+        self.storage.submitCall(release.wait, (5,), key=('clients', joe.id))  # delays joe's updates
+        try:
+            start = time.time()
+            self.assertEqual(1, len(self.storage.getClientsMatching({'guid': 'GUID2'})))
+            self.assertEqual([], self.storage.getClientPenalties(jack))
+            self.assertLess(time.time() - start, 1)
+        finally:
+            release.set()
+
+    def test_penalty_read_after_background_update(self):
+        client = Client(console=self.console, guid='GUID1', name='joe')
+        client.save()
+        penalty = Penalty(clientId=client.id, adminId=0, type='Ban', reason='foo', timeExpire=-1)
+        penalty.save(self.console)
+        release = threading.Event()
+        self.storage.submitCall(release.wait, (5,), key=('penalties', client.id))  # delays the update
+        penalty.inactive = 1
+        penalty.save(self.console)
+        threading.Timer(0.1, release.set).start()
+        self.assertEqual([], self.storage.getClientPenalties(client))
+        self.assertEqual(1, self.storage.getClientPenalty(Penalty(id=penalty.id)).inactive)
+
+    def test_status(self):
+        status = self.storage.status()
+        self.assertEqual(2, status['executor_workers'])
+        self.assertIn('executor_pending', status)
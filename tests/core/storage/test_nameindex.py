@@ -0,0 +1,106 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+import time
+import unittest2 as unittest
+
+from b3.storage.nameindex import NameIndex
+
+
+class Test_NameIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.index = NameIndex()
+        self.index.add(1, '^1Courgette')
+        self.index.add(2, 'Bill')
+        self.index.add(2, 'BillyTheKid')
+        self.index.add(3, 'Billy The Kid')
+        self.index.add(4, 'Joe')
+
+    def keys(self, name, **kwargs):
+        return [key for key, text, score in self.index.search(name, **kwargs)]
+
+    def test_normalize(self):
+        self.assertEqual('courgette', NameIndex.normalize('^1Cour gette '))
+        self.assertEqual('', NameIndex.normalize(None))
+
+    def test_len(self):
+        # 'Billy The Kid' and 'BillyTheKid' are different names
+        self.assertEqual(5, len(self.index))
+        self.index.add(3, 'billythekid')
+        self.assertEqual(5, len(self.index))
+
+    def test_exact_match_first(self):
+        self.index.add(5, 'Billy')
+        self.assertEqual([5, 3, 2], self.keys('billy'))
+
+    def test_substring(self):
+        self.assertEqual([1], self.keys('ourg'))
+        self.assertEqual([], self.keys('xyz'))
+
+    def test_one_result_per_key(self):
+        results = self.index.search('bill')
+        self.assertEqual([2, 3], [key for key, text, score in results])
+        self.assertEqual('bill', results[0][1])
+
+    def test_containing(self):
+        self.assertItemsEqual([2, 3], self.index.containing('thekid'))
+        self.assertItemsEqual([1, 4], self.index.containing('o'))
+        self.assertEqual([], self.index.containing('courgete'))
+        self.assertEqual([], self.index.containing(''))
+
+    def test_empty_index_is_true(self):
+        self.assertEqual(0, len(NameIndex()))
+        self.assertTrue(NameIndex())
+
+    def test_fuzzy(self):
+        # typo: not a substring but most trigrams are shared
+        self.assertEqual([], self.keys('courgete'))
+        self.assertEqual([1], self.keys('courgete', fuzzy=True))
+        self.assertEqual([], self.keys('courgete', fuzzy=True, threshold=1))
+
+    def test_short_query(self):
+        self.assertEqual([4], self.keys('jo'))
+        self.assertEqual([4, 1], self.keys('o'))
+
+    def test_limit(self):
+        self.assertEqual([2], self.keys('bill', limit=1))
+
+    def test_remove(self):
+        self.index.remove(2, 'Bill')
+        self.assertEqual([3, 2], self.keys('bill'))
+        self.index.remove(2)
+        self.assertEqual([3], self.keys('bill'))
+        self.assertEqual(1, len(self.index._grams['bil']))
+        self.index.remove(3)
+        self.assertNotIn('bil', self.index._grams)
+
+    def test_lookup(self):
+        self.assertEqual([1], self.index.lookup('courgette'))
+        self.assertEqual([], self.index.lookup('courg'))
+        self.assertEqual([4], self.index.lookup('JOE'))
+        self.assertItemsEqual([2, 3], self.index.lookup('billythekid'))
+
+    def test_search_is_fast(self):
+        index = NameIndex()
+        for i in xrange(50000):
+            index.add(i, 'Player%s' % i)
+        start = time.time()
+        results = index.search('player4242')
+        self.assertLess(time.time() - start, 0.5)
+        self.assertEqual(4242, results[0][0])
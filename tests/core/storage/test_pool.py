@@ -0,0 +1,239 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import threading
+import unittest2 as unittest
+
+from b3.functions import splitDSN
+from b3.storage.cursor import BufferedCursor
+from b3.storage.cursor import Cursor as DBCursor
+from b3.storage.pool import ConnectionPool
+from b3.storage.pool import PoolTimeout
+from b3.storage.sqlite import SqliteStorage
+from mock import Mock
+from tests import B3TestCase
+
+
+class FakeStorage(object):
+
+    db = None
+
+    def __init__(self):
+        self.console = Mock()
+        self.created = []
+        self.closed = []
+        self.alive = True
+
+    def _newConnection(self):
+        connection = Mock()
+        self.created.append(connection)
+        return connection
+
+    def _pingConnection(self, connection):
+        return self.alive
+
+    def _closeConnection(self, connection):
+        self.closed.append(connection)
+
+
+class Test_ConnectionPool(unittest.TestCase):
+
+    def setUp(self):
+        self.storage = FakeStorage()
+        self.pool = ConnectionPool(self.storage, size=2, timeout=0.1)
+
+    def test_connections_are_reused(self):
+        with self.pool.connection() as c1:
+            pass
+        with self.pool.connection() as c2:
+            pass
+        self.assertIs(c1, c2)
+        self.assertEqual(1, len(self.storage.created))
+
+    def test_checkout_is_reentrant_within_a_thread(self):
+        with self.pool.connection() as c1:
+            with self.pool.connection() as c2:
+                self.assertIs(c1, c2)
+        self.assertEqual(1, self.pool.stats()['pool_idle'])
+
+    def test_threads_get_their_own_connection(self):
+        connections = []
+        def worker():
+            with self.pool.connection() as c:
+                connections.append(c)
+        with self.pool.connection() as c1:
+            t = threading.Thread(target=worker)
+            t.start()
+            t.join()
+        self.assertEqual(1, len(connections))
+        self.assertIsNot(c1, connections[0])
+        self.assertEqual(2, self.pool.stats()['pool_open'])
+
+    def test_pool_is_bounded(self):
+        self.pool.size = 1
+        errors = []
+        def worker():
+            try:
+                self.pool.checkout()
+            except PoolTimeout, e:
+                errors.append(e)
+        with self.pool.connection():
+            t = threading.Thread(target=worker)
+            t.start()
+            t.join()
+        self.assertEqual(1, len(errors))
+        self.assertEqual(1, self.pool.stats()['timeouts'])
+        self.assertEqual(1, len(self.storage.created))
+
+    def test_waiting_thread_gets_released_connection(self):
+        self.pool.size = 1
+        self.pool.timeout = 5
+        connections = []
+        def worker():
+            with self.pool.connection() as c:
+                connections.append(c)
+        c1 = self.pool.checkout()
+        t = threading.Thread(target=worker)
+        t.start()
+        t.join(0.05)
+        self.assertEqual([], connections)
+        self.pool.checkin(c1)
+        t.join()
+        self.assertEqual([c1], connections)
+        self.assertEqual(1, self.pool.stats()['waits'])
+
+    def test_broken_connection_is_discarded(self):
+        self.storage.alive = False
+        try:
+            with self.pool.connection() as c1:
+                raise RuntimeError('lost connection')
+        except RuntimeError:
+            pass
+        self.assertEqual([c1], self.storage.closed)
+        self.storage.alive = True
+        with self.pool.connection() as c2:
+            self.assertIsNot(c1, c2)
+        self.assertEqual(1, self.pool.stats()['reconnects'])
+
+    def test_query_error_keeps_connection(self):
+        try:
+            with self.pool.connection() as c1:
+                raise RuntimeError('syntax error')
+        except RuntimeError:
+            pass
+        with self.pool.connection() as c2:
+            self.assertIs(c1, c2)
+
+    def test_idle_connection_is_health_checked(self):
+        self.pool.check_interval = -1
+        with self.pool.connection() as c1:
+            pass
+        self.storage.alive = False
+        with self.pool.connection() as c2:
+            self.assertIsNot(c1, c2)
+        self.assertEqual([c1], self.storage.closed)
+
+    def test_failed_connection_frees_its_slot(self):
+        self.pool.size = 1
+        self.storage._newConnection = Mock(side_effect=RuntimeError('connection refused'))
+        self.assertRaises(RuntimeError, self.pool.checkout)
+        self.assertEqual(0, self.pool.stats()['pool_open'])
+
+    def test_reset(self):
+        with self.pool.connection() as c1:
+            self.pool.reset()
+        self.assertEqual([c1], self.storage.closed)
+        self.assertEqual(0, self.pool.stats()['pool_open'])
+
+    def test_stats(self):
+        with self.pool.connection():
+            stats = self.pool.stats()
+        self.assertEqual(2, stats['pool_size'])
+        self.assertEqual(1, stats['pool_in_use'])
+        self.assertEqual(1, stats['checkouts'])
+        self.assertGreaterEqual(stats['checkout_time_max'], stats['checkout_time_avg'])
+
+
+class Test_sqlite_pool(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.storage = SqliteStorage('sqlite://:memory:', splitDSN('sqlite://:memory:'), self.console)
+
+    def tearDown(self):
+        B3TestCase.tearDown(self)
+        self.storage.shutdown()
+
+    def test_memory_database_uses_one_connection(self):
+        self.storage.setupPool(size=5, timeout=3)
+        self.assertEqual(1, self.storage._pool.size)
+        self.assertEqual(3, self.storage._pool.timeout)
+
+    def test_status(self):
+        self.assertFalse(self.storage.status())
+        self.storage.connect()
+        self.storage.query("SELECT 1")
+        status = self.storage.status()
+        self.assertTrue(status)
+        self.assertEqual(1, status['pool_size'])
+        self.assertEqual(0, status['pool_in_use'])
+        self.assertGreater(status['checkouts'], 0)
+
+    def test_cursor_outlives_connection_checkout(self):
+        self.storage.connect()
+        self.storage.query("CREATE TABLE pooltest (id INTEGER)")
+        for i in xrange(3):
+            self.storage.query("INSERT INTO pooltest (id) VALUES (%s)" % i)
+        # WHEN
+        cursor = self.storage.query("SELECT id FROM pooltest ORDER BY id")
+        # THEN
+        self.assertEqual(0, self.storage.status()['pool_in_use'])
+        self.assertIsInstance(cursor._cursor, BufferedCursor)
+        ids = []
+        while not cursor.EOF:
+            ids.append(cursor.getValue('id'))
+            cursor.moveNext()
+        self.assertListEqual([0, 1, 2], ids)
+
+
+class Test_BufferedCursor(unittest.TestCase):
+
+    def test_rows_are_fetched_and_cursor_closed(self):
+        raw = Mock(description=(('id',),), rowcount=2, lastrowid=0)
+        raw.fetchall.return_value = [(1,), (2,)]
+        # WHEN
+        cursor = DBCursor(BufferedCursor(raw), None)
+        # THEN
+        raw.close.assert_called_once_with()
+        self.assertEqual(1, cursor.getValue('id'))
+        cursor.moveNext()
+        self.assertEqual(2, cursor.getValue('id'))
+        cursor.moveNext()
+        self.assertTrue(cursor.EOF)
+        self.assertFalse(raw.fetchone.called)
+
+    def test_statement_without_result_set(self):
+        raw = Mock(description=None, rowcount=1, lastrowid=7)
+        # WHEN
+        cursor = DBCursor(BufferedCursor(raw), None)
+        # THEN
+        self.assertFalse(raw.fetchall.called)
+        self.assertTrue(cursor.EOF)
+        self.assertEqual(7, cursor.lastrowid)
+        self.assertEqual(1, cursor.rowcount)
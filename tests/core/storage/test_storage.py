@@ -108,6 +108,12 @@ class Test_Storage(B3TestCase):
     def test_numPenalties(self):
         self.assertRaises(NotImplementedError, self.storage.numPenalties, Mock())
 
+    def test_getClientsActivePenalties(self):
+        self.assertRaises(NotImplementedError, self.storage.getClientsActivePenalties, [Mock()])
+
+    def test_getClientAndPenalties(self):
+        self.assertRaises(NotImplementedError, self.storage.getClientAndPenalties, Mock())
+
     def test_getGroups(self):
         self.assertRaises(NotImplementedError, self.storage.getGroups)
 
@@ -16,10 +16,12 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
+import calendar
+import threading
 import time
 import unittest2 as unittest
-from mock import sentinel, Mock
-from b3.cron import CronTab, OneTimeCronTab, PluginCronTab, Cron
+from mock import sentinel, Mock, patch
+from b3.cron import CronTab, OneTimeCronTab, PluginCronTab, Cron, CronView
 from tests import B3TestCase
 
 class Test_Crontab(unittest.TestCase):
@@ -113,8 +115,8 @@ class Test_OneTimeCrontab(unittest.TestCase):
 
 class Test_PluginCronTab(unittest.TestCase):
 
+    @patch.object(CronTab, 'match', Mock(return_value=True))
     def test(self):
-        CronTab.match = Mock(return_value=True)
         mock_command = Mock()
         p = Mock()
         tab = PluginCronTab(plugin=p, command=mock_command)
@@ -247,5 +249,174 @@ class Test_Cron(B3TestCase):
         self.assertEqual(CronTab, type(self.cron._tabs[crontab_id]))
 
 
+class Test_Crontab_getNextTime(unittest.TestCase):
+
+    # Monday 2014-07-21 10:20:30 UTC
+    now = calendar.timegm((2014, 7, 21, 10, 20, 30))
+
+    def assertNextTime(self, expected, tab, after=None):
+        nexttime = tab.getNextTime(self.now if after is None else after)
+        self.assertEqual(expected, time.gmtime(nexttime)[:6] if nexttime is not None else None)
+
+    def test_every_second(self):
+        self.assertNextTime((2014, 7, 21, 10, 20, 31), CronTab(None, second='*'))
+
+    def test_every_minute(self):
+        self.assertNextTime((2014, 7, 21, 10, 21, 0), CronTab(None))
+
+    def test_every_five_minutes(self):
+        self.assertNextTime((2014, 7, 21, 10, 25, 0), CronTab(None, minute='*/5'))
+
+    def test_hour(self):
+        self.assertNextTime((2014, 7, 22, 3, 0, 0), CronTab(None, minute=0, hour=3))
+
+    def test_dow(self):
+        # in crontab 0 is Mon
+        self.assertNextTime((2014, 7, 26, 0, 0, 0), CronTab(None, minute=0, hour=0, dow=5))
+
+    def test_month(self):
+        self.assertNextTime((2015, 2, 1, 0, 0, 0), CronTab(None, minute=0, hour=0, day=1, month=2))
+
+    def test_never(self):
+        self.assertNextTime(None, CronTab(None, day=0))
+
+    def test_matches_what_match_accepts(self):
+        for kwargs in ({'second': '*/7'}, {'second': '5-12/2, 30', 'minute': '*/3'}, {'minute': '1,2', 'hour': 11},
+                       {'minute': 59, 'hour': '*/6', 'dow': '0,3'}):
+            tab = CronTab(None, **kwargs)
+            t = self.now
+            for i in range(5):
+                nexttime = tab.getNextTime(t)
+                self.assertTrue(tab.match(time.gmtime(nexttime)))
+                expected = t + 1
+                while not tab.match(time.gmtime(expected)):
+                    expected += 1
+                self.assertEqual(expected, nexttime, kwargs)
+                t = nexttime
+
+
+class Test_Cron_scheduler(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.cron = Cron(self.console, workers=2)
+
+    def tearDown(self):
+        self.cron.stop()
+        B3TestCase.tearDown(self)
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            time.sleep(0.05)
+
+    def test_heap(self):
+        tab1 = CronTab(None, minute='*/5')
+        tab2 = CronTab(None, second='*')
+        self.cron + tab1
+        self.cron + tab2
+        self.assertIs(tab2, self.cron._heap[0][2])
+        self.assertEqual(tab1.getNextTime(time.time()), self.cron._entries[id(tab1)][0])
+        self.cron - tab2
+        self.assertIsNone(self.cron._heap[0][2])
+        self.assertNotIn(id(tab2), self.cron._entries)
+
+    def test_reschedule_when_changed(self):
+        tab = CronTab(None, minute='*/5')
+        self.cron + tab
+        tab.second = '*'
+        tab.minute = '*'
+        self.assertEqual(tab.getNextTime(time.time()), self.cron._entries[id(tab)][0])
+        self.assertEqual(1, len([x for x in self.cron._heap if x[2] is tab]))
+
+    def test_run(self):
+        command = Mock(name="command", __name__='command')
+        self.cron + CronTab(command, second='*')
+        self.cron.start()
+        self.wait_for(lambda: command.call_count >= 2)
+        self.assertGreaterEqual(command.call_count, 2)
+        self.assertGreaterEqual(self.cron.getStats().values()[0]['runs'], 1)
+
+    def test_max_runs(self):
+        command = Mock(name="command", __name__='command')
+        tab_id = self.cron.add(OneTimeCronTab(command, second='*'))
+        self.cron.start()
+        self.wait_for(lambda: tab_id not in self.cron._tabs)
+        time.sleep(1.2)
+        self.assertEqual(1, command.call_count)
+        self.assertDictEqual({}, self.cron.getStats())
+
+    def test_disabled_plugin(self):
+        command = Mock(name="command", __name__='command')
+        plugin = Mock()
+        plugin.isEnabled = Mock(return_value=False)
+        tab = PluginCronTab(plugin, command, second='*')
+        self.cron + tab
+        self.cron.start()
+        time.sleep(1.5)
+        self.assertFalse(command.called)
+        self.assertEqual(0, tab.numRuns)
+
+    def test_slow_crontab_does_not_delay_others(self):
+        release = threading.Event()
+        slow = Mock(name="slow", __name__='slow', side_effect=lambda: release.wait(5))
+        fast = Mock(name="fast", __name__='fast')
+        slow_id = self.cron.add(CronTab(slow, second='*'))
+        self.cron + CronTab(fast, second='*')
+        self.cron.start()
+        self.wait_for(lambda: fast.call_count >= 3)
+        release.set()
+        self.assertGreaterEqual(fast.call_count, 3)
+        # the slow crontab was still running when it was due again
+        self.assertEqual(1, slow.call_count)
+        stats = self.cron.getStats()['slow (%s)' % slow_id]
+        self.assertGreaterEqual(stats['overruns'], 1)
+
+    def test_failure(self):
+        command = Mock(name="command", __name__='command', side_effect=ValueError('boom'))
+        tab_id = self.cron.add(CronTab(command, second='*'))
+        self.cron.start()
+        self.wait_for(lambda: self.cron.getStats()['command (%s)' % tab_id]['failures'] >= 1)
+        self.assertGreaterEqual(self.cron.getStats()['command (%s)' % tab_id]['failures'], 1)
+
+
+class Test_CronView(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.cron = Cron(self.console)
+        self.view1 = CronView(self.cron, Mock())
+        self.view2 = CronView(self.cron, Mock())
+
+    def test_add(self):
+        tab1 = CronTab(None)
+        tab2 = CronTab(None)
+        self.view1 + tab1
+        self.view2 + tab2
+        self.assertEqual(2, len(self.cron._tabs))
+        self.assertDictEqual({id(tab1): tab1}, self.view1._tabs)
+        self.assertDictEqual({id(tab2): tab2}, self.view2._tabs)
+
+    def test_removed_by_the_cron(self):
+        tab = CronTab(None)
+        self.view1 + tab
+        self.cron - tab
+        self.assertDictEqual({}, self.view1._tabs)
+
+    def test_stats(self):
+        tab_id = self.view1.create(None)
+        self.view2.create(None)
+        self.assertListEqual(['None (%s)' % tab_id], self.view1.getStats().keys())
+        self.assertEqual(2, len(self.cron.getStats()))
+
+    def test_stop(self):
+        self.view1 + CronTab(None)
+        tab = CronTab(None)
+        self.view2 + tab
+        self.view1.stop()
+        self.assertDictEqual({id(tab): tab}, self.cron._tabs)
+        self.assertFalse(self.cron._stopEvent.isSet())
+
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,56 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+import unittest2 as unittest
+
+from mock import Mock
+from b3.events import EventsStats
+
+
+class Test_EventsStats(unittest.TestCase):
+
+    def setUp(self):
+        self.stats = EventsStats(Mock(), max_samples=None)
+
+    def test_queue_wait_percentiles_without_samples(self):
+        self.assertDictEqual({50: 0, 90: 0, 99: 0}, self.stats.get_queue_wait_percentiles())
+
+    def test_queue_wait_percentiles(self):
+        for ms in range(1, 101):
+            self.stats.add_event_wait(ms)
+        percentiles = self.stats.get_queue_wait_percentiles((50, 90, 100))
+        self.assertAlmostEqual(50.5, percentiles[50])
+        self.assertAlmostEqual(90.1, percentiles[90])
+        self.assertEqual(100, percentiles[100])
+
+    def test_handling_stats(self):
+        self.stats.add_event_handled('AdminPlugin', 'EVT_CLIENT_SAY', 1.0)
+        self.stats.add_event_handled('AdminPlugin', 'EVT_CLIENT_SAY', 3.0)
+        self.stats.add_event_handled('TkPlugin', 'EVT_CLIENT_DAMAGE', 0.5)
+        self.assertDictEqual({
+            'AdminPlugin': {'EVT_CLIENT_SAY': (2, 2.0, 3.0)},
+            'TkPlugin': {'EVT_CLIENT_DAMAGE': (1, 0.5, 0.5)},
+        }, self.stats.get_handling_stats())
+
+    def test_max_samples(self):
+        stats = EventsStats(Mock(), max_samples=2)
+        for ms in (10, 1, 2):
+            stats.add_event_handled('AdminPlugin', 'EVT_CLIENT_SAY', ms)
+            stats.add_event_wait(ms)
+        self.assertEqual((2, 1.5, 2), stats.get_handling_stats()['AdminPlugin']['EVT_CLIENT_SAY'])
+        self.assertEqual(2, stats.get_queue_wait_percentiles((100,))[100])
@@ -194,6 +194,15 @@ class Test_misc(unittest.TestCase):
             if expected != result:
                 self.fail("%r, expecting '%s' but got '%s'" % (test_data, expected, result))
 
+    def test_percentile(self):
+        self.assertEqual(0, functions.percentile([], 50))
+        self.assertEqual(7, functions.percentile([7], 99))
+        self.assertEqual(3, functions.percentile([5, 1, 3, 2, 4], 50))
+        self.assertEqual(1, functions.percentile([5, 1, 3, 2, 4], 0))
+        self.assertEqual(5, functions.percentile([5, 1, 3, 2, 4], 100))
+        self.assertAlmostEqual(4.6, functions.percentile([5, 1, 3, 2, 4], 90))
+        self.assertAlmostEqual(2.5, functions.percentile([1, 2, 3, 4], 50))
+
     def test_getBytes(self):
         self.assertEqual(10, functions.getBytes(10))
         self.assertEqual(10, functions.getBytes('10'))
@@ -0,0 +1,200 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+import argparse
+import imp
+import logging
+import os
+import sys
+
+from mock import Mock
+from mock import patch
+from b3.config import CfgConfigParser
+from b3.cron import CronTab
+from b3.cron import CronView
+from b3.host import Host
+from b3.host import analyze
+from b3.parser import Parser
+from b3.parsers.cod import CodParser
+from b3.parsers.oa081 import Oa081Parser
+from b3.storage.shared import SharedStorage
+from b3.timer import TimerView
+from tests import B3TestCase
+from textwrap import dedent
+
+
+class HostTestCase(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.conf = CfgConfigParser()
+        self.conf.loadFromString(dedent("""
+            [b3]
+            database: sqlite://:memory:
+            storage_workers: 0
+            name_index: no
+            stats_interval: 0
+
+            [servers]
+        """))
+        options = argparse.Namespace(config=None, autorestart=False)
+        stdout, stderr = sys.stdout, sys.stderr
+        try:
+            with patch('b3.output.getInstance', return_value=logging.getLogger('output')), \
+                    patch('b3.getWritableFilePath', side_effect=lambda path, decode=False: path), \
+                    patch('b3.getShortPath', side_effect=lambda path, decode=False: path):
+                self.host = Host(self.conf, options)
+        except:
+            B3TestCase.tearDown(self)
+            raise
+        finally:
+            sys.stdout, sys.stderr = stdout, stderr
+        self.host.screen = Mock()
+
+    def tearDown(self):
+        self.host.shutdown()
+        B3TestCase.tearDown(self)
+
+
+class Test_Host(HostTestCase):
+
+    def test_shared_storage(self):
+        console1 = Mock()
+        console2 = Mock()
+        storage1 = self.host.getStorage(console1)
+        storage2 = self.host.getStorage(console2)
+        self.assertIsInstance(storage1, SharedStorage)
+        self.assertIsInstance(storage1, self.host.storage.__class__)
+        self.assertIs(console1, storage1.console)
+        self.assertIs(self.host.storage.getConnection(), storage1.getConnection())
+        self.assertIs(storage1.db, storage2.db)
+
+    def test_storage_accounting(self):
+        storage1 = self.host.getStorage(Mock())
+        storage2 = self.host.getStorage(Mock())
+        storage1.getCounts()
+        storage1.getCounts()
+        self.assertGreater(storage1.getStats()['queries'], storage2.getStats()['queries'])
+        self.assertEqual(0, storage2.getStats()['queries'])
+        self.assertEqual(0, storage1.getStats()['in_use'])
+
+    def test_shared_storage_is_not_shut_down_by_a_server(self):
+        storage = self.host.getStorage(Mock())
+        storage.shutdown()
+        self.assertTrue(self.host.storage.status())
+
+    def test_cron_and_timers(self):
+        cron = self.host.getCron(Mock())
+        timers = self.host.getTimers(Mock())
+        self.assertIsInstance(cron, CronView)
+        self.assertIsInstance(timers, TimerView)
+        cron.add(CronTab(None))
+        self.assertEqual(1, len(self.host.cron.getStats()))
+
+    def test_modules_loaded_once(self):
+        path = os.path.join(os.path.dirname(__file__), '..', 'plugins', 'fakeplugins')
+        modules = []
+        for i in range(2):
+            fp, pathname, description = imp.find_module('testplugin1', [path])
+            try:
+                modules.append(self.host.loadModule('testplugin1', fp, pathname, description))
+            finally:
+                if fp:
+                    fp.close()
+        self.assertIs(modules[0], modules[1])
+        self.assertEqual(1, self.host.getStats()['shared']['plugin_modules'])
+
+    def test_server_failing_to_start(self):
+        with patch.object(self.host, 'error') as error_mock:
+            self.assertIsNone(self.host.addServer('server1', '/f00/b3.ini'))
+        self.assertTrue(error_mock.called)
+        stats = self.host.getStats()
+        self.assertDictEqual({'running': False, 'restarts': 0}, dict(stats['servers']['server1']))
+        self.assertEqual(0, stats['shared']['servers'])
+
+    def test_server_stats(self):
+        server = self.host.servers['server1'] = Mock(restarts=0, started=None)
+        server.isRunning.return_value = True
+        server.console = self.console
+        self.console.storage = self.host.getStorage(self.console)
+        self.console._plugins = {'admin': Mock()}
+        self.console.queue = Mock(**{'qsize.return_value': 3})
+        self.console.storage.getCounts()
+        stats = self.host.getStats()['servers']['server1']
+        self.assertEqual(1, stats['plugins'])
+        self.assertEqual(0, stats['clients'])
+        self.assertEqual(3, stats['events_queued'])
+        self.assertGreater(stats['db_queries'], 0)
+
+
+class Test_hosted_parsers(B3TestCase):
+
+    def newParser(self, cls, host):
+        # only run the part of the constructor preceding the configuration loading
+        parser = cls.__new__(cls)
+        options = argparse.Namespace(autorestart=False, host=host, server='server')
+        with patch.object(Parser, 'loadConfig', return_value=False), patch('sys.stdout'):
+            self.assertRaises(SystemExit, Parser.__init__, parser, None, options)
+        return parser
+
+    def test_class_containers_are_not_shared(self):
+        host = Mock()
+        cod1, cod2 = self.newParser(CodParser, host), self.newParser(CodParser, host)
+        cod1._counter['4'] = 1
+        self.assertDictEqual({}, cod2._counter)
+        self.assertDictEqual({}, CodParser._counter)
+        oa1, oa2 = self.newParser(Oa081Parser, host), self.newParser(Oa081Parser, host)
+        oa1._connectingSlots.append('4')
+        self.assertListEqual([], oa2._connectingSlots)
+        self.assertListEqual([], Oa081Parser._connectingSlots)
+
+    def test_parser_running_alone_uses_class_containers(self):
+        cod = self.newParser(CodParser, None)
+        self.assertIs(CodParser._counter, cod._counter)
+
+
+class Test_analyze(B3TestCase):
+
+    def test_nominal(self):
+        conf = CfgConfigParser()
+        conf.loadFromString(dedent("""
+            [b3]
+            database: sqlite://:memory:
+
+            [servers]
+            server1: %s
+        """ % os.path.abspath(__file__)))
+        self.assertListEqual([], analyze(conf))
+
+    def test_problems(self):
+        conf = CfgConfigParser()
+        conf.loadFromString(dedent("""
+            [b3]
+
+            [servers]
+            server1: /f00/b3.ini
+        """))
+        self.assertEqual(2, len(analyze(conf)))
+
+    def test_no_server(self):
+        conf = CfgConfigParser()
+        conf.loadFromString(dedent("""
+            [b3]
+            database: sqlite://:memory:
+        """))
+        self.assertListEqual(['no server listed in section [servers]'], analyze(conf))
@@ -0,0 +1,283 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest2 as unittest
+
+from b3.logtailer import InotifyWatcher
+from b3.logtailer import LogTailer
+from b3.logtailer import PollDelay
+from b3.logtailer import PollingWatcher
+from b3.logtailer import RemoteLogWriter
+from b3.logtailer import StreamTailer
+from b3.logtailer import getWatcher
+
+
+def inotify_available():
+    try:
+        InotifyWatcher._loadLibc()
+        return True
+    except OSError:
+        return False
+
+
+class LogTailerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'games_mp.log')
+        self.write('0:00 InitGame: first\n', 'w')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, data, mode='a'):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+
+class Test_LogTailer(LogTailerTestCase):
+
+    def setUp(self):
+        LogTailerTestCase.setUp(self)
+        self.tailer = LogTailer(self.path)
+
+    def tearDown(self):
+        self.tailer.close()
+        LogTailerTestCase.tearDown(self)
+
+    def test_read_from_current_position(self):
+        self.tailer.seekEnd()
+        self.assertListEqual([], self.tailer.read())
+        self.write('0:01 Kill: 1 2 3: a killed b by MOD\n0:02 say: 1 a: hello\n')
+        self.assertListEqual(['0:01 Kill: 1 2 3: a killed b by MOD', '0:02 say: 1 a: hello'], self.tailer.read())
+        self.assertListEqual([], self.tailer.read())
+
+    def test_partial_line_is_kept(self):
+        self.tailer.seekEnd()
+        self.write('0:01 say: 1 a: hel')
+        self.assertListEqual([], self.tailer.read())
+        self.write('lo\n0:02 say')
+        self.assertListEqual(['0:01 say: 1 a: hello'], self.tailer.read())
+
+    def test_read_in_chunks(self):
+        self.tailer.chunk_size = 7
+        lines = ['%s:00 say: 1 a: line %s' % (i, i) for i in range(100)]
+        self.write('\n'.join(lines) + '\n')
+        self.assertListEqual(['0:00 InitGame: first'] + lines, self.tailer.read())
+        self.assertEqual(os.path.getsize(self.path), self.tailer.file.tell())
+
+    def test_truncation(self):
+        self.tailer.read()
+        self.write('0:00 InitGame: new\n', 'w')
+        self.assertListEqual([], self.tailer.read())
+        self.assertEqual(1, self.tailer.truncations)
+        self.write('0:01 say: 1 a: hello\n')
+        self.assertListEqual(['0:01 say: 1 a: hello'], self.tailer.read())
+
+    def test_rotation(self):
+        self.tailer.read()
+        self.write('0:01 say: 1 a: old\n')
+        os.rename(self.path, self.path + '.1')
+        self.assertListEqual(['0:01 say: 1 a: old'], self.tailer.read())
+        self.write('0:00 InitGame: new\n', 'w')
+        self.assertListEqual(['0:00 InitGame: new'], self.tailer.read())
+        self.assertEqual(1, self.tailer.rotations)
+
+    def test_rotation_flushes_partial_line(self):
+        self.tailer.read()
+        self.write('0:01 say: 1 a: unterminated')
+        self.assertListEqual([], self.tailer.read())
+        os.rename(self.path, self.path + '.1')
+        self.write('0:00 InitGame: new\n', 'w')
+        self.assertListEqual(['0:01 say: 1 a: unterminated', '0:00 InitGame: new'], self.tailer.read())
+
+
+class Test_watchers(LogTailerTestCase):
+
+    def test_polling(self):
+        watcher = getWatcher(self.path, 'polling')
+        self.assertIsInstance(watcher, PollingWatcher)
+        start = time.time()
+        self.assertFalse(watcher.wait(0.05))
+        self.assertGreaterEqual(time.time() - start, 0.05)
+
+    @unittest.skipUnless(inotify_available(), 'inotify is not available')
+    def test_inotify_wakes_up_on_write(self):
+        watcher = getWatcher(self.path)
+        self.assertIsInstance(watcher, InotifyWatcher)
+        try:
+            self.assertFalse(watcher.wait(0.01))
+            timer = threading.Timer(0.05, self.write, ('0:01 say: 1 a: hello\n',))
+            timer.start()
+            start = time.time()
+            self.assertTrue(watcher.wait(5))
+            self.assertLess(time.time() - start, 2)
+            timer.join()
+        finally:
+            watcher.close()
+
+    @unittest.skipUnless(inotify_available(), 'inotify is not available')
+    def test_inotify_ignores_other_files(self):
+        watcher = getWatcher(self.path)
+        try:
+            with open(os.path.join(self.directory, 'b3.log'), 'w') as f:
+                f.write('something\n')
+            self.assertFalse(watcher.wait(0.05))
+        finally:
+            watcher.close()
+
+    @unittest.skipUnless(inotify_available(), 'inotify is not available')
+    def test_inotify_notices_rotation(self):
+        watcher = getWatcher(self.path)
+        try:
+            os.rename(self.path, self.path + '.1')
+            self.assertTrue(watcher.wait(1))
+        finally:
+            watcher.close()
+
+
+class Test_StreamTailer(unittest.TestCase):
+
+    def setUp(self):
+        self.tailer = StreamTailer(max_size=1024)
+
+    def test_complete_lines(self):
+        self.assertListEqual([], self.tailer.read())
+        self.tailer.feed('0:01 say: 1 a: hello\n0:02 say: 1 a: world\n')
+        self.assertListEqual(['0:01 say: 1 a: hello', '0:02 say: 1 a: world'], self.tailer.read())
+        self.assertListEqual([], self.tailer.read())
+
+    def test_partial_line_is_kept(self):
+        self.tailer.feed('0:01 say: 1 a: hel')
+        self.assertListEqual([], self.tailer.read())
+        self.tailer.feed('lo\n0:02 ')
+        self.tailer.feed('say')
+        self.assertListEqual(['0:01 say: 1 a: hello'], self.tailer.read())
+        self.tailer.feed(': 1 a: b\n')
+        self.assertListEqual(['0:02 say: 1 a: b'], self.tailer.read())
+
+    def test_reset_drops_partial_line(self):
+        self.tailer.feed('0:01 say: 1 a: old\n0:02 say: 1 a: unterminated')
+        self.tailer.reset()
+        self.tailer.feed('0:00 InitGame: new\n')
+        self.assertListEqual(['0:01 say: 1 a: old', '0:00 InitGame: new'], self.tailer.read())
+        self.assertEqual(1, self.tailer.resets)
+
+    def test_unaligned_reset_skips_up_to_next_line(self):
+        self.tailer.feed('0:01 say: 1 a: hello\n')
+        self.tailer.reset(aligned=False)
+        self.tailer.feed('a: cut\n0:09 say: 1 a: next\n')
+        self.assertListEqual(['0:01 say: 1 a: hello', '0:09 say: 1 a: next'], self.tailer.read())
+
+    def test_overflow_drops_oldest_lines(self):
+        self.tailer.max_size = 64
+        lines = ['0:%02d say: 1 a: line %s' % (i, i) for i in range(10)]
+        for line in lines:
+            self.tailer.feed(line + '\n')
+        result = self.tailer.read()
+        self.assertGreater(len(result), 0)
+        self.assertListEqual(lines[-len(result):], result)
+        self.assertLessEqual(sum(len(x) + 1 for x in result), 64)
+        stats = self.tailer.stats()
+        self.assertEqual(sum(len(x) + 1 for x in lines), stats['received'])
+        self.assertGreater(stats['dropped'], 0)
+
+    def test_overflow_drops_partial_line(self):
+        self.tailer.max_size = 64
+        self.tailer.feed('0:01 say: 1 a: a partial')
+        self.assertListEqual([], self.tailer.read())
+        self.tailer.feed('x' * 100 + '\n0:02 say: 1 a: next\n')
+        self.assertListEqual(['0:02 say: 1 a: next'], self.tailer.read())
+
+    def test_seekEnd(self):
+        self.tailer.feed('0:01 say: 1 a: hello\n0:02 say')
+        self.tailer.seekEnd()
+        self.tailer.feed('0:03 say: 1 a: world\n')
+        self.assertListEqual(['0:03 say: 1 a: world'], self.tailer.read())
+
+    def test_wait_wakes_up_on_feed(self):
+        self.assertFalse(self.tailer.wait(0.01))
+        timer = threading.Timer(0.05, self.tailer.feed, ('0:01 say: 1 a: hello\n',))
+        timer.start()
+        start = time.time()
+        self.assertTrue(self.tailer.wait(5))
+        self.assertLess(time.time() - start, 2)
+        timer.join()
+
+    def test_close(self):
+        self.tailer.close()
+        start = time.time()
+        self.assertFalse(self.tailer.wait(5))
+        self.assertLess(time.time() - start, 2)
+        self.tailer.feed('0:01 say: 1 a: hello\n')
+        self.assertListEqual([], self.tailer.read())
+
+
+class Test_PollDelay(unittest.TestCase):
+
+    def test_back_off_while_idle(self):
+        delay = PollDelay(0.1, 1)
+        self.assertEqual(0.2, delay.update(0))
+        self.assertEqual(0.4, delay.update(0))
+        self.assertEqual(0.8, delay.update(0))
+        self.assertEqual(1, delay.update(0))
+        self.assertEqual(1, delay.update(0))
+        self.assertEqual(0.1, delay.update(25))
+
+    def test_maximum_lower_than_minimum(self):
+        delay = PollDelay(0.5, 0.1)
+        self.assertEqual(0.5, delay.update(0))
+
+
+class Test_RemoteLogWriter(LogTailerTestCase):
+
+    def read(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def test_stream(self):
+        stream = StreamTailer()
+        writer = RemoteLogWriter(stream, self.path)
+        writer.write('0:01 say: 1 a: hel')
+        writer.skip()
+        writer.write('0:02 say: 1 a: world\n')
+        writer.reset()
+        writer.close()
+        self.assertListEqual(['0:02 say: 1 a: world'], stream.read())
+        self.assertEqual('0:00 InitGame: first\n', self.read())
+
+    def test_file(self):
+        writer = RemoteLogWriter(None, self.path)
+        writer.write('0:01 say: 1 a: hello\n')
+        self.assertEqual('0:00 InitGame: first\n\r\nB3 has been restarted\r\n\r\n0:01 say: 1 a: hello\n', self.read())
+        writer.reset()
+        writer.write('0:02 say: 1 a: world\n')
+        writer.close()
+        self.assertEqual('0:02 say: 1 a: world\n', self.read())
+
+    def test_file_append(self):
+        writer = RemoteLogWriter(None, self.path, append=True)
+        writer.reset()
+        writer.close()
+        self.assertTrue(self.read().endswith('B3 has restarted writing the log file\r\n\r\n'))
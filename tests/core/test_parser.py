@@ -18,8 +18,17 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 #
 import logging
+import os
+import Queue
+import shutil
+import tempfile
+import thread
+import threading
 import unittest2 as unittest
+import b3.events
 from b3.clients import Client
+from b3.events import EventsStats
+from b3.logtailer import LogTailer
 from b3.parser import Parser
 
 
@@ -166,6 +175,279 @@ class Test_getWrap(unittest.TestCase):
         self.assertIsInstance(wrapped_text, list)
         self.assertListEqual(wrapped_text, ["Lorem ipsum dolor sit amet"])
 
+    def test_multiline_disabled(self):
+        self.parser._use_color_codes = False
+        self.parser._multiline = False
+        self.parser._line_length = 40
+        self.parser._line_color_prefix = ''
+        wrapped_text = self.parser.getWrap(r"Lorem ipsum\ndolor sit amet")
+        self.assertListEqual(wrapped_text, [r"Lorem ipsum\ndolor sit amet"])
+
+    def test_multiline_enabled(self):
+        self.parser._use_color_codes = False
+        self.parser._multiline = True
+        self.parser._line_length = 40
+        self.parser._line_color_prefix = ''
+        wrapped_text = self.parser.getWrap(r"Lorem ipsum\ndolor sit amet")
+        self.assertListEqual(wrapped_text, ["Lorem ipsum", ">dolor sit amet"])
+
+
+class DummyHandler(object):
+
+    def __init__(self, name, received, veto=False, gate=None, threadSafe=False):
+        self.name = name
+        self.received = received
+        self.veto = veto
+        self.vetoesEvents = veto
+        self.gate = gate
+        self.threadSafe = threadSafe
+        self.waiting = threading.Event()
+
+    def isEnabled(self):
+        return True
+
+    def parseEvent(self, event):
+        if self.gate:
+            self.waiting.set()
+            self.gate.wait(5)
+        self.received.append((self.name, event.data))
+        if self.veto:
+            raise b3.events.VetoEvent
+
+
+class Test_handleEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = DummyParser()
+        self.parser.Events = b3.events.eventManager
+        self.parser.queue = Queue.Queue(50)
+        self.parser.exiting = thread.allocate_lock()
+        self.parser._eventsStats = EventsStats(self.parser)
+        self.parser._handlers = {}
+        self.parser.working = True
+        self.received = []
+        self.evt_say = self.parser.getEventID('EVT_CLIENT_SAY')
+        self.evt_stop = self.parser.getEventID('EVT_STOP')
+
+    def queue(self, event_type, data):
+        self.parser.queue.put((self.parser.time(), self.parser.time() + 10, b3.events.Event(event_type, data)))
+
+    def test_single_event_dispatch(self):
+        # GIVEN
+        self.parser._eventBatchSize = 1
+        self.parser._handlers[self.evt_say] = [DummyHandler('A', self.received)]
+        self.parser._handlers[self.evt_stop] = []
+        for i in range(3):
+            self.queue(self.evt_say, i)
+        self.queue(self.evt_stop, None)
+        # WHEN
+        self.parser.handleEvents()
+        # THEN
+        self.assertListEqual([('A', 0), ('A', 1), ('A', 2)], self.received)
+        self.assertTrue(self.parser.queue.empty())
+
+    def test_batched_dispatch_preserves_order(self):
+        # GIVEN
+        self.parser._eventBatchSize = 4
+        self.parser._handlers[self.evt_say] = [DummyHandler('A', self.received), DummyHandler('B', self.received)]
+        self.parser._handlers[self.evt_stop] = []
+        for i in range(6):
+            self.queue(self.evt_say, i)
+        self.queue(self.evt_stop, None)
+        # WHEN
+        self.parser.handleEvents()
+        # THEN
+        self.assertListEqual([(name, i) for i in range(6) for name in ('A', 'B')], self.received)
+
+    def test_batched_dispatch_veto(self):
+        # GIVEN
+        self.parser._eventBatchSize = 10
+        self.parser._handlers[self.evt_say] = [DummyHandler('A', self.received, veto=True),
+                                               DummyHandler('B', self.received)]
+        self.parser._handlers[self.evt_stop] = []
+        self.queue(self.evt_say, 0)
+        self.queue(self.evt_say, 1)
+        self.queue(self.evt_stop, None)
+        # WHEN
+        self.parser.handleEvents()
+        # THEN
+        self.assertListEqual([('A', 0), ('A', 1)], self.received)
+
+    def test_batched_dispatch_stops_on_EVT_STOP(self):
+        # GIVEN
+        self.parser._eventBatchSize = 10
+        self.parser._handlers[self.evt_say] = [DummyHandler('A', self.received)]
+        self.parser._handlers[self.evt_stop] = []
+        self.queue(self.evt_say, 0)
+        self.queue(self.evt_stop, None)
+        self.queue(self.evt_say, 1)
+        # WHEN
+        self.parser.handleEvents()
+        # THEN
+        self.assertListEqual([('A', 0)], self.received)
+        self.assertFalse(self.parser.working)
+
+    def test_expired_event_is_dropped(self):
+        # GIVEN
+        self.parser._eventBatchSize = 10
+        self.parser._handlers[self.evt_say] = [DummyHandler('A', self.received)]
+        self.parser._handlers[self.evt_stop] = []
+        now = self.parser.time()
+        self.parser.queue.put((now - 20, now - 10, b3.events.Event(self.evt_say, 0)))
+        self.queue(self.evt_say, 1)
+        self.queue(self.evt_stop, None)
+        # WHEN
+        self.parser.handleEvents()
+        # THEN
+        self.assertListEqual([('A', 1)], self.received)
+
+
+class Test_threaded_dispatch(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = DummyParser()
+        self.parser.Events = b3.events.eventManager
+        self.parser._eventsStats = EventsStats(self.parser)
+        self.parser._eventWorkers = {}
+        self.parser._eventDispatch = 'threaded'
+        self.parser._eventInboxSize = 100
+        self.parser._handlers = {}
+        self.parser.working = True
+        self.received = []
+        self.gate = threading.Event()
+        self.evt_say = self.parser.getEventID('EVT_CLIENT_SAY')
+
+    def tearDown(self):
+        self.gate.set()
+        self.parser.stopEventWorkers()
+
+    def dispatch(self, data):
+        now = self.parser.time()
+        self.parser._dispatchEvent(now, now + 10, b3.events.Event(self.evt_say, data))
+
+    def test_slow_plugin_does_not_delay_others(self):
+        # GIVEN
+        slow = DummyHandler('slow', self.received, gate=self.gate)
+        fast = DummyHandler('fast', self.received)
+        self.parser._handlers[self.evt_say] = [slow, fast]
+        # WHEN
+        for i in range(3):
+            self.dispatch(i)
+        self.parser._eventWorkers[fast].stop(5)
+        # THEN
+        self.assertListEqual([('fast', 0), ('fast', 1), ('fast', 2)], self.received)
+        self.gate.set()
+        self.parser._eventWorkers[slow].stop(5)
+        self.assertListEqual([('slow', 0), ('slow', 1), ('slow', 2)], self.received[3:])
+
+    def test_veto(self):
+        # GIVEN
+        before = DummyHandler('before', self.received)
+        veto = DummyHandler('veto', self.received, veto=True)
+        after = DummyHandler('after', self.received)
+        self.parser._handlers[self.evt_say] = [before, veto, after]
+        # WHEN
+        self.dispatch(0)
+        self.parser.stopEventWorkers()
+        # THEN
+        self.assertListEqual([('before', 0), ('veto', 0)], sorted(self.received))
+
+    def test_inbox_full(self):
+        # GIVEN
+        self.parser._eventInboxSize = 2
+        slow = DummyHandler('slow', self.received, gate=self.gate)
+        self.parser._handlers[self.evt_say] = [slow]
+        # WHEN
+        for i in range(5):
+            self.dispatch(i)
+        # THEN
+        stats = self.parser.getEventWorkersStats()['DummyHandler']
+        self.assertEqual(2, stats['max_depth'])
+        self.assertLessEqual(2, stats['dropped'])
+        self.assertEqual(5, stats['received'] + stats['dropped'])
+        self.gate.set()
+        self.parser.stopEventWorkers()
+        self.assertEqual(5 - stats['dropped'], len(self.received))
+
+    def test_expired_in_inbox(self):
+        # GIVEN
+        slow = DummyHandler('slow', self.received, gate=self.gate)
+        self.parser._handlers[self.evt_say] = [slow]
+        clock = [100]
+        self.parser.time = lambda: clock[0]
+        # WHEN
+        self.parser._dispatchEvent(100, 110, b3.events.Event(self.evt_say, 0))
+        self.parser._dispatchEvent(100, 110, b3.events.Event(self.evt_say, 1))
+        slow.waiting.wait(5)
+        clock[0] = 120
+        self.gate.set()
+        self.parser._eventWorkers[slow].stop(5)
+        # THEN
+        self.assertListEqual([('slow', 0)], self.received)
+        self.assertEqual(1, self.parser._eventWorkers[slow].expired)
+
+    def test_threadsafe_mode(self):
+        # GIVEN
+        self.parser._eventDispatch = 'threadsafe'
+        safe = DummyHandler('safe', self.received, threadSafe=True)
+        unsafe = DummyHandler('unsafe', self.received)
+        self.parser._handlers[self.evt_say] = [safe, unsafe]
+        # WHEN
+        self.dispatch(0)
+        # THEN
+        self.assertIsNotNone(self.parser.getEventWorker(safe))
+        self.assertIsNone(self.parser.getEventWorker(unsafe))
+
+    def test_serial_mode(self):
+        # GIVEN
+        self.parser._eventDispatch = 'serial'
+        handler = DummyHandler('A', self.received, threadSafe=True)
+        self.parser._handlers[self.evt_say] = [handler]
+        # WHEN
+        self.dispatch(0)
+        # THEN
+        self.assertListEqual([('A', 0)], self.received)
+        self.assertDictEqual({}, self.parser.getEventWorkersStats())
+
+
+class Test_read(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'games_mp.log')
+        with open(self.path, 'w') as f:
+            f.write('0:00 InitGame: first\n')
+        self.parser = DummyParser()
+        self.parser.input = open(self.path, 'r')
+        self.parser._logTailer = LogTailer(self.path, self.parser.input)
+
+    def tearDown(self):
+        self.parser._logTailer.close()
+        shutil.rmtree(self.directory)
+
+    def write(self, data, mode='a'):
+        with open(self.path, mode) as f:
+            f.write(data)
+
+    def test_read_with_log_tailer(self):
+        self.assertListEqual(['0:00 InitGame: first'], self.parser.read())
+        self.write('0:01 say: 1 a: hello\n')
+        self.assertListEqual(['0:01 say: 1 a: hello'], self.parser.read())
+
+    def test_input_follows_rotation(self):
+        self.parser.read()
+        os.rename(self.path, self.path + '.1')
+        self.write('0:00 InitGame: new\n', 'w')
+        self.assertListEqual(['0:00 InitGame: new'], self.parser.read())
+        self.assertIs(self.parser._logTailer.file, self.parser.input)
+
+    def test_unpause_skips_pending_lines(self):
+        self.parser.bot = lambda *args: None
+        self.parser.pause()
+        self.write('0:01 say: 1 a: hello\n')
+        self.parser.unpause()
+        self.assertListEqual([], self.parser.read())
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
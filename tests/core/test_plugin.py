@@ -23,6 +23,7 @@ import logging
 import os
 from ConfigParser import NoOptionError
 
+from mock import Mock
 from mock import patch
 from mock import call
 from mock import ANY
@@ -567,3 +568,37 @@ class Test_Plugin_requiresStorage(B3TestCase):
             self.console.loadPlugins()
         # THEN
         self.assertListEqual([call('Could not load plugin testplugin3', exc_info=ANY)], error_mock.mock_calls)
+
+
+class Test_Plugin_class_containers(B3TestCase):
+
+    class ContainerPlugin(MyPlugin):
+        _counts = {}
+        _names = []
+        _limit = 5
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        # plugin classes are shared among the parsers hosted in the same process
+        self.console.host = Mock()
+
+    def test_instances_do_not_share_class_containers(self):
+        p1 = self.ContainerPlugin(self.console)
+        p2 = self.ContainerPlugin(self.console)
+        p1._counts['joe'] = 1
+        p1._names.append('joe')
+        self.assertDictEqual({}, p2._counts)
+        self.assertListEqual([], p2._names)
+        self.assertDictEqual({}, self.ContainerPlugin._counts)
+        self.assertEqual(5, p2._limit)
+
+    def test_events_registered_per_instance(self):
+        p1 = self.ContainerPlugin(self.console)
+        p2 = self.ContainerPlugin(self.console)
+        p1.registerEvent('EVT_CLIENT_SAY')
+        self.assertNotEqual(p1.events, p2.events)
+
+    def test_parser_running_alone(self):
+        self.console.host = None
+        p1 = self.ContainerPlugin(self.console)
+        self.assertIs(self.ContainerPlugin._counts, p1._counts)
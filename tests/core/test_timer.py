@@ -0,0 +1,172 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+#
+import threading
+import time
+import unittest2 as unittest
+
+from mock import Mock
+from b3.timer import TimerView
+from b3.timer import TimerWheel
+
+
+class Test_TimerWheel(unittest.TestCase):
+
+    def setUp(self):
+        self.console = Mock()
+        self.wheel = TimerWheel(self.console, tick=0.01, slots=16)
+        self.fired = []
+        self.lock = threading.Lock()
+
+    def tearDown(self):
+        self.wheel.stop()
+
+    def record(self, value):
+        with self.lock:
+            self.fired.append(value)
+
+    def wait_for(self, count, timeout=5):
+        deadline = time.time() + timeout
+        while len(self.fired) < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_no_thread_before_first_timer(self):
+        self.assertEqual(0, self.wheel.stats()['threads'])
+
+    def test_fire(self):
+        handle = self.wheel.schedule(0.02, self.record, ('a',))
+        self.assertTrue(handle.isActive())
+        self.wait_for(1)
+        self.assertListEqual(['a'], self.fired)
+        self.assertFalse(handle.isActive())
+        self.assertFalse(handle.cancel())
+
+    def test_kwargs(self):
+        self.wheel.schedule(0, lambda **kw: self.record(kw), kwargs={'x': 1})
+        self.wait_for(1)
+        self.assertListEqual([{'x': 1}], self.fired)
+
+    def test_fire_order(self):
+        self.wheel = TimerWheel(self.console, tick=0.01, slots=16, workers=1)
+        for delay in (0.25, 0.05, 0.15, 0.1, 0.2):
+            self.wheel.schedule(delay, self.record, (delay,))
+        self.wait_for(5)
+        self.assertListEqual([0.05, 0.1, 0.15, 0.2, 0.25], self.fired)
+
+    def test_delay_longer_than_a_wheel_revolution(self):
+        # 16 slots of 10ms: the timer goes round the wheel several times before firing
+        start = time.time()
+        self.wheel.schedule(0.5, self.record, ('late',))
+        self.wheel.schedule(0.05, self.record, ('early',))
+        self.wait_for(2)
+        self.assertListEqual(['early', 'late'], self.fired)
+        self.assertGreaterEqual(time.time() - start, 0.5)
+
+    def test_cancel(self):
+        handle = self.wheel.schedule(0.05, self.record, ('a',))
+        self.wheel.schedule(0.1, self.record, ('b',))
+        self.assertTrue(handle.cancel())
+        self.assertFalse(handle.cancel())
+        self.wait_for(1)
+        time.sleep(0.1)
+        self.assertListEqual(['b'], self.fired)
+        self.assertEqual(1, self.wheel.stats()['cancelled'])
+
+    def test_cancelClient(self):
+        joe, mike = object(), object()
+        self.wheel.schedule(0.05, self.record, ('joe1',), client=joe)
+        self.wheel.schedule(0.05, self.record, ('joe2',), client=joe)
+        self.wheel.schedule(0.05, self.record, ('mike',), client=mike)
+        self.assertEqual(2, self.wheel.cancelClient(joe))
+        self.assertEqual(0, self.wheel.cancelClient(joe))
+        self.wait_for(1)
+        time.sleep(0.1)
+        self.assertListEqual(['mike'], self.fired)
+        self.assertDictEqual({}, self.wheel._clients)
+
+    def test_failing_function(self):
+        def boom():
+            raise ValueError('boom')
+        self.wheel.schedule(0, boom)
+        self.wheel.schedule(0.02, self.record, ('a',))
+        self.wait_for(1)
+        stats = self.wheel.stats()
+        self.assertEqual(1, stats['failed'])
+        self.assertTrue(self.console.error.called)
+
+    def test_stats(self):
+        for i in range(10):
+            self.wheel.schedule(0.01, self.record, (i,))
+        self.wheel.schedule(60, self.record, ('never',)).cancel()
+        self.wheel.schedule(60, self.record, ('pending',))
+        self.wait_for(10)
+        time.sleep(0.05)
+        stats = self.wheel.stats()
+        self.assertEqual(12, stats['scheduled'])
+        self.assertEqual(10, stats['fired'])
+        self.assertEqual(1, stats['cancelled'])
+        self.assertEqual(1, stats['pending'])
+        self.assertEqual(0, stats['failed'])
+        self.assertEqual(3, stats['threads'])
+
+    def test_thread_count_does_not_depend_on_timer_count(self):
+        before = threading.active_count()
+        for i in range(1000):
+            self.wheel.schedule(0.05 + (i % 50) * 0.001, self.record, (i,))
+        self.assertEqual(before + 1 + self.wheel.workers, threading.active_count())
+        self.wait_for(1000)
+        self.assertEqual(1000, len(self.fired))
+
+    def test_stop(self):
+        self.wheel.schedule(60, self.record, ('never',))
+        self.wheel.stop()
+        self.assertEqual(0, self.wheel.stats()['threads'])
+        self.assertEqual(0, self.wheel.stats()['pending'])
+        # the wheel restarts with the next timer
+        self.wheel.schedule(0, self.record, ('a',))
+        self.wait_for(1)
+        self.assertListEqual(['a'], self.fired)
+
+
+class Test_TimerView(unittest.TestCase):
+
+    def setUp(self):
+        self.wheel = TimerWheel(Mock(), tick=0.01, slots=16)
+        self.view1 = TimerView(self.wheel, Mock())
+        self.view2 = TimerView(self.wheel, Mock())
+        self.fired = []
+
+    def tearDown(self):
+        self.wheel.stop()
+
+    def test_fire(self):
+        self.view1.schedule(0, self.fired.append, ('a',))
+        deadline = time.time() + 5
+        while not self.fired and time.time() < deadline:
+            time.sleep(0.01)
+        self.assertListEqual(['a'], self.fired)
+        self.assertDictEqual({'pending': 0, 'scheduled': 1}, self.view1.stats())
+
+    def test_stop(self):
+        self.view1.schedule(0.5, self.fired.append, ('a',))
+        self.view2.schedule(0.5, self.fired.append, ('b',))
+        self.assertEqual(2, self.wheel.stats()['pending'])
+        self.view1.stop()
+        self.assertEqual(0, self.view1.stats()['pending'])
+        self.assertEqual(1, self.view2.stats()['pending'])
+        self.assertEqual(1, self.wheel.stats()['pending'])
@@ -26,7 +26,7 @@ from b3.fake import FakeClient
 from b3.config import CfgConfigParser
 from b3.plugins.admin import Command
 from b3.clients import Client, Group, ClientVar, ClientBan, ClientTempBan
-from tests import InstantTimer
+from tests import instant_schedule
 from tests.plugins.admin import Admin_TestCase
 from tests.plugins.admin import Admin_functional_test
 
@@ -1106,7 +1106,10 @@ class Test_cmd_mask(Admin_functional_test):
         ## WHEN joe reconnects
         self.joe.disconnects()
         client = self.console.storage.getClient(Client(id=self.joe.id))
-        joe2 = FakeClient(self.console, **client.__dict__)
+        # core client fields live in slots, not in the instance dict
+        data = dict((k, getattr(client, k)) for k in Client.__slots__ if k not in ('console', '__dict__', '__weakref__'))
+        data.update(client.__dict__)
+        joe2 = FakeClient(self.console, **data)
         joe2.connects(1)
         ## THEN joe is still masked
         self.assertEqual(128, joe2.maxGroup.id)
@@ -1627,8 +1630,8 @@ message: ^1WARNING^7 [^3$warnings^7]: $reason
         self.assertListEqual([], self.joe.message_history)
         self.assertListEqual([], self.mike.message_history)
 
-    @patch('threading.Timer', new_callable=lambda: InstantTimer)
-    def test_warn_then_auto_kick(self, instant_timer, sleep_mock):
+    @patch('b3.timer.TimerWheel.schedule', new=instant_schedule)
+    def test_warn_then_auto_kick(self, sleep_mock):
         # GIVEN
         self.p.warn_delay = 0
         self.assertEqual(0, self.mike.numWarnings)
@@ -1648,15 +1651,15 @@ message: ^1WARNING^7 [^3$warnings^7]: $reason
         ], self.say_mock.mock_calls)
         # THEN Mike was kicked for having too many warnings
         self.assertListEqual([
-            call(u'^7too many warnings: ^7behave yourself', u'None', 6, self.joe, False, '')
+            call(u'^7too many warnings: ^7behave yourself', None, 6, self.joe, False, '')
         ], mike_tempban_mock.mock_calls)
         # THEN No private message was sent
         self.assertListEqual([], self.joe.message_history)
         self.assertListEqual([], self.mike.message_history)
 
 
-    @patch('threading.Timer', new_callable=lambda: InstantTimer)
-    def test_warn_then_auto_kick_duration_divider_60(self, instant_timer, sleep_mock):
+    @patch('b3.timer.TimerWheel.schedule', new=instant_schedule)
+    def test_warn_then_auto_kick_duration_divider_60(self, sleep_mock):
         # GIVEN
         self.p.config._sections['warn']['duration_divider'] = '60'
         self.p.warn_delay = 0
@@ -1677,7 +1680,7 @@ message: ^1WARNING^7 [^3$warnings^7]: $reason
         ], self.say_mock.mock_calls)
         # THEN Mike was kicked for having too many warnings
         self.assertListEqual([
-            call(u'^7too many warnings: ^7behave yourself', u'None', 3, self.joe, False, '')
+            call(u'^7too many warnings: ^7behave yourself', None, 3, self.joe, False, '')
         ], mike_tempban_mock.mock_calls)
         # THEN No private message was sent
         self.assertListEqual([], self.joe.message_history)
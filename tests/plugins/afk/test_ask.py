@@ -52,7 +52,7 @@ def test_no_response(plugin, joe):
     assert [call('Are you AFK?')] == joe.message.mock_calls
     assert [call("Joe is AFK, kicking in 0.005s")] == plugin.console.say.mock_calls
     # WHEN
-    sleep(.01)
+    sleep(.3)
     # THEN
     assert [call(joe)] == plugin.kick_client.mock_calls
 
@@ -70,7 +70,7 @@ def test_response(plugin, joe):
     # WHEN
     joe.says("hi")
     assert joe not in plugin.kick_timers
-    sleep(.01)
+    sleep(.3)
     # THEN
     assert [] == plugin.kick_client.mock_calls
     assert joe not in plugin.kick_timers
@@ -89,7 +89,7 @@ def test_make_kill(plugin, joe):
     # WHEN
     joe.kills(joe)
     assert joe not in plugin.kick_timers
-    sleep(.01)
+    sleep(.3)
     assert [] == plugin.kick_client.mock_calls
 
 
@@ -125,3 +125,14 @@ STeam:0:1:333333
         self.assertBanned("STEAM:0:1:333333")
         self.assertBanned("64A8FC41E14548C2B8A0C50637FAF16E")
         self.assertBanned("690CD3D4975A4D4B83C1960A9CA0C060")
+
+
+    def test_match_with_separator(self):
+        self.file_content = '''\
+64A8FC41E14548C2B8A0C50637FAF16E,cheater
+STEAM:0:1:111111;another cheater
+'''
+        self.assertBanned("64A8FC41E14548C2B8A0C50637FAF16E", "64A8FC41E14548C2B8A0C50637FAF16E,cheater")
+        self.assertBanned("STEAM:0:1:111111", "STEAM:0:1:111111;another cheater")
+        self.assertNotBanned("64A8FC41E14548C2B8A0C50637FAF16E,cheater,x")
+        self.assertNotBanned("cheater")
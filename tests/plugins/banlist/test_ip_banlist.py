@@ -158,3 +158,42 @@ class Test_IpBanlist(BanlistTestCase):
         assertBanned("33.44.55.77", "33.44.55.66")
         assertBanned("33.44.55.6", "33.44.55.66")
 
+
+    def test_first_matching_entry_wins(self):
+        self.file_content = '''\
+11.22.33.44 first
+11.22.33.44 second
+11.22.33.0 range
+'''
+        self.assertTrue(self.isBanned("11.22.33.44"))
+        self.ip_banlist.plugin.info.assert_called_with("ip '11.22.33.44' matches banlist entry '11.22.33.44 first' (Banlist_name 2000-01-01 00:00:00)")
+        self.assertTrue(self.isBanned("11.22.33.45"))
+        self.ip_banlist.plugin.info.assert_called_with("ip '11.22.33.45' matches (by range) banlist entry '11.22.33.0 range' (Banlist_name 2000-01-01 00:00:00)")
+
+
+    def test_windows_line_endings(self):
+        self.file_content = '11.22.33.44\r\n22.33.44.0\r\n'
+        self.assertTrue(self.isBanned("11.22.33.44"))
+        self.assertTrue(self.isBanned("22.33.44.55"))
+        self.assertFalse(self.isBanned("11.22.33.45"))
+
+
+    def test_reload_when_file_changes(self):
+        self.file_content = '11.22.33.44\n'
+        self.assertTrue(self.isBanned("11.22.33.44"))
+        self.assertFalse(self.isBanned("55.66.77.88"))
+        self.file_content = '55.66.77.88\n'
+        # file did not change
+        self.assertFalse(self.isBanned("55.66.77.88"))
+        # file changed
+        self.ip_banlist.getModifiedTime = Mock(return_value=946684801)
+        self.assertTrue(self.isBanned("55.66.77.88"))
+        self.assertFalse(self.isBanned("11.22.33.44"))
+
+
+    def test_large_banlist(self):
+        self.file_content = '\n'.join('%s.%s.%s.%s' % (a, b, c, d) for a in (10, 20) for b in range(10)
+                                      for c in range(50) for d in range(100)) + '\n'
+        self.assertTrue(self.isBanned("20.9.49.99"))
+        self.assertEqual(100000, len(self.ip_banlist._ips))
+        self.assertFalse(self.isBanned("30.9.49.99"))
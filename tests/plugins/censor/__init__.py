@@ -33,7 +33,7 @@ class CensorTestCase(B3TestCase):
     def setUp(self):
         # Timer needs to be patched or the Censor plugin would schedule a 2nd check one minute after
         # penalizing a player.
-        self.timer_patcher = patch('threading.Timer')
+        self.timer_patcher = patch('b3.timer.TimerWheel.schedule')
         self.timer_patcher.start()
 
         self.log = logging.getLogger('output')
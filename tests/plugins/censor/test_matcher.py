@@ -0,0 +1,144 @@
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+import re
+import unittest2 as unittest
+
+from b3.plugins.censor import CensorData
+from b3.plugins.censor import CensorMatcher
+
+
+def word_rule(name, word):
+    return CensorData(name=name, regexp=re.compile('\\s' + word + '\\s', re.I), word=word)
+
+
+def regexp_rule(name, regexp):
+    return CensorData(name=name, regexp=re.compile(regexp, re.I))
+
+
+def legacy_search(rules, text, cleaned):
+    for rule in rules:
+        if rule.regexp.search(text):
+            return rule, text
+        if rule.regexp.search(cleaned):
+            return rule, cleaned
+    return None
+
+
+class Test_CensorMatcher(unittest.TestCase):
+
+    def assert_match(self, rules, text, cleaned, expected_name, expected_text):
+        result = CensorMatcher(rules).search(text, cleaned)
+        self.assertIsNotNone(result)
+        self.assertEqual(expected_name, result[0].name)
+        self.assertIs(expected_text, result[1])
+        self.assertEqual(legacy_search(rules, text, cleaned), result)
+
+    def test_no_rules(self):
+        self.assertIsNone(CensorMatcher([]).search(' hello ', ' hello '))
+
+    def test_no_match(self):
+        rules = [word_rule('ass', 'ass'), regexp_rule('fuck', r'f[u\*]+ck')]
+        self.assertIsNone(CensorMatcher(rules).search(' nice one! ', ' nice one  '))
+
+    def test_word(self):
+        rules = [word_rule('ass', 'ass')]
+        text, cleaned = ' dumb ASS ', ' dumb ass '
+        self.assert_match(rules, text, cleaned, 'ass', text)
+        self.assertIsNone(CensorMatcher(rules).search(' class ', ' class '))
+
+    def test_word_needs_surrounding_whitespaces(self):
+        rules = [word_rule('ass', 'ass')]
+        # names are checked without padding: the first and last tokens cannot match
+        self.assertIsNone(CensorMatcher(rules).search('ass', ' xxx '))
+        self.assertIsNone(CensorMatcher(rules).search('ass hole', ' xxx '))
+        cleaned = ' ass hole '
+        self.assert_match(rules, 'ass|hole', cleaned, 'ass', cleaned)
+
+    def test_raw_text_wins_over_cleaned_text(self):
+        rules = [regexp_rule('fuck', r'f[u\*]+ck')]
+        text, cleaned = ' f*ck ', ' fuck '
+        self.assert_match(rules, text, cleaned, 'fuck', text)
+
+    def test_cleaned_text(self):
+        rules = [word_rule('ass', 'ass')]
+        text, cleaned = ' a.s.s! ass! ', ' a s s  ass  '
+        self.assert_match(rules, text, cleaned, 'ass', cleaned)
+
+    def test_rule_order(self):
+        rules = [regexp_rule('first', r'zzz'), word_rule('second', 'ass'), regexp_rule('third', r'as+'),
+                 regexp_rule('fourth', r'a')]
+        text = ' ass '
+        self.assert_match(rules, text, text, 'second', text)
+        self.assert_match(list(reversed(rules)), text, text, 'fourth', text)
+
+    def test_rule_order_when_a_later_rule_matches_first_in_the_text(self):
+        rules = [regexp_rule('late', r'world'), regexp_rule('early', r'hello')]
+        text = ' hello world '
+        self.assert_match(rules, text, text, 'late', text)
+
+    def test_earlier_rule_matching_cleaned_text_wins(self):
+        rules = [regexp_rule('cleaned', r'a s s'), regexp_rule('raw', r'a\.s')]
+        text, cleaned = ' a.s.s ', ' a s s '
+        self.assert_match(rules, text, cleaned, 'cleaned', cleaned)
+
+    def test_regexp_with_groups(self):
+        rules = [regexp_rule('a', r'(x(y)?)z'), regexp_rule('b', r'(?:h)(e)(l+)o'), regexp_rule('c', r'(w)(o)')]
+        text = ' hello world '
+        self.assert_match(rules, text, text, 'b', text)
+
+    def test_regexp_with_backreference(self):
+        rules = [regexp_rule('repeat', r'(\w)\1\1\1'), regexp_rule('hello', r'h[e3]l')]
+        matcher = CensorMatcher(rules)
+        self.assertListEqual([0], matcher._single)
+        self.assertEqual(1, len(matcher._chunks))
+        self.assert_match(rules, ' helloooo ', ' helloooo ', 'repeat', ' helloooo ')
+
+    def test_many_regexps(self):
+        rules = [regexp_rule('rule%s' % i, r'x([a@])([b8]){%s}\b' % (i + 1)) for i in range(200)]
+        matcher = CensorMatcher(rules)
+        self.assertGreater(len(matcher._chunks), 1)
+        self.assertListEqual([], matcher._single)
+        text = ' xa' + 'b' * 150 + ' '
+        self.assert_match(rules, text, text, 'rule149', text)
+        self.assertIsNone(matcher.search(' xc ', ' xc '))
+
+    def test_getRequiredLiteral(self):
+        self.assertEqual('gger', CensorMatcher.getRequiredLiteral(r'n[i!1]gger'))
+        self.assertEqual('cunt', CensorMatcher.getRequiredLiteral(r'\sCUNT\s'))
+        self.assertEqual('ck', CensorMatcher.getRequiredLiteral(r'f[uo0\*]+ck'))
+        self.assertEqual('abc', CensorMatcher.getRequiredLiteral(r'x(abc)+'))
+        self.assertEqual('x', CensorMatcher.getRequiredLiteral(r'x(abc)*'))
+        self.assertEqual('x', CensorMatcher.getRequiredLiteral(r'x(abc|def)'))
+        self.assertEqual('', CensorMatcher.getRequiredLiteral(r'\b[a@][s$]{2}\b'))
+
+    def test_literal_filter(self):
+        rules = [regexp_rule('fuck', r'f[uo0\*]+ck'), regexp_rule('hole', r'[a@][s$]{2}h[o0]le')]
+        matcher = CensorMatcher(rules)
+        self.assertListEqual([('ck', 0), ('le', 1)], matcher._literals)
+        self.assertListEqual([], matcher._chunks)
+        self.assertIsNone(matcher.search(' nice shot ', ' nice shot '))
+        text, cleaned = ' A$$HOLE ', ' a  hole '
+        self.assert_match(rules, text, cleaned, 'hole', text)
+
+    def test_isFor(self):
+        rules = [word_rule('ass', 'ass')]
+        matcher = CensorMatcher(rules)
+        self.assertTrue(matcher.isFor(rules))
+        self.assertFalse(matcher.isFor(list(rules)))
+        rules.append(word_rule('bitch', 'bitch'))
+        self.assertFalse(matcher.isFor(rules))
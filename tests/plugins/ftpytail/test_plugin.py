@@ -16,7 +16,10 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
 
+from mock import Mock
 from tests import B3TestCase
+from b3.logtailer import RemoteLogWriter
+from b3.logtailer import StreamTailer
 from b3.plugins.ftpytail import FtpytailPlugin
 
 
@@ -26,3 +29,68 @@ class FtpytailPluginTestCase(B3TestCase):
         p = FtpytailPlugin(self.console)
         p.onLoadConfig()
 
+
+class FakeFTP(object):
+
+    def __init__(self, content=''):
+        self.content = content
+        self.transfers = 0
+
+    def size(self, filename):
+        return len(self.content)
+
+    def retrbinary(self, cmd, callback, blocksize=8192, rest=None):
+        self.transfers += 1
+        for i in range(rest or 0, len(self.content), blocksize):
+            callback(self.content[i:i + blocksize])
+
+
+class Test_download(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.p = FtpytailPlugin(self.console)
+        self.p.url_path = 'games_mp.log'
+        self.stream = StreamTailer()
+        self.p.writer = RemoteLogWriter(self.stream)
+        self.ftp = FakeFTP('0:00 InitGame: first\n')
+
+    def test_start_at_end_of_remote_file(self):
+        self.assertEqual(0, self.p.download(self.ftp))
+        self.assertEqual(0, self.ftp.transfers)
+        self.ftp.content += '0:01 say: 1 a: hello\n'
+        self.assertEqual(21, self.p.download(self.ftp))
+        self.assertListEqual(['0:01 say: 1 a: hello'], self.stream.read())
+        self.assertEqual(0, self.p.download(self.ftp))
+        self.assertEqual(1, self.ftp.transfers)
+
+    def test_large_catch_up(self):
+        self.p.download(self.ftp)
+        self.p._maxGap = 10 ** 6
+        lines = ['0:01 say: 1 a: line %s' % i for i in range(5000)]
+        self.ftp.content += '\n'.join(lines) + '\n'
+        self.p.download(self.ftp)
+        self.assertListEqual(lines, self.stream.read())
+
+    def test_rotation(self):
+        self.p.download(self.ftp)
+        self.ftp.content += '0:01 say: 1 a: unterminated'
+        self.p.download(self.ftp)
+        self.ftp.content = '0:00 InitGame: new\n'
+        self.p.download(self.ftp)
+        self.assertListEqual(['0:00 InitGame: new'], self.stream.read())
+
+    def test_gap(self):
+        self.p.download(self.ftp)
+        self.p._maxGap = 30
+        self.ftp.content += '0:01 say: 1 a: skipped\n0:02 say: 1 a: kept\n'
+        self.assertEqual(30, self.p.download(self.ftp))
+        self.assertListEqual(['0:02 say: 1 a: kept'], self.stream.read())
+
+    def test_unpause(self):
+        self.p.download(self.ftp)
+        self.console._paused = True
+        self.console.unpause = Mock()
+        self.ftp.content += '0:01 say: 1 a: hello\n'
+        self.p.download(self.ftp)
+        self.assertTrue(self.console.unpause.called)
@@ -15,6 +15,7 @@
 # along with this program; if not, write to the Free Software
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
+import time
 import unittest2
 
 from textwrap import dedent
@@ -60,6 +61,8 @@ class IpbanTestCase(unittest2.TestCase):
         # return some mock data
         when(self.p).getBanIps().thenReturn(['2.2.2.2', '6.6.6.6', '7.7.7.7'])
         when(self.p).getTempBanIps().thenReturn(['3.3.3.3', '8.8.8.8', '9.9.9.9'])
+        expire = int(time.time()) + 3600
+        when(self.p).getTempBans().thenReturn({'3.3.3.3': expire, '8.8.8.8': expire, '9.9.9.9': expire})
 
     def tearDown(self):
         self.console.working = False
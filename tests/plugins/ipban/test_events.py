@@ -16,7 +16,11 @@
 # Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
 
 
+import time
+
 from mock import Mock
+from mockito import when
+from textwrap import dedent
 from tests.plugins.ipban import IpbanTestCase
 
 class Test_events(IpbanTestCase):
@@ -63,4 +67,88 @@ class Test_events(IpbanTestCase):
         self.assertLessEqual(self.paul.maxLevel, self.p._maxLevel)
         self.assertNotIn(self.mary.ip, self.p.getBanIps())
         self.assertNotIn(self.mary.ip, self.p.getTempBanIps())
-        self.assertEqual(self.mary.kick.call_count, 0)
\ No newline at end of file
+        self.assertEqual(self.mary.kick.call_count, 0)
+
+class Test_ban_index(IpbanTestCase):
+
+    def test_ban_event(self):
+        # GIVEN
+        self.init()
+        self.mary.kick = Mock()
+        # WHEN
+        self.console.queueEvent(self.console.getEvent('EVT_CLIENT_BAN', {'reason': 'foo', 'admin': None}, self.mary))
+        self.mary.connects('1')
+        # THEN
+        self.assertTrue(self.p.isBanned('4.4.4.4'))
+        self.mary.kick.assert_called_once_with('IPBan: client refused: 4.4.4.4 (Mary) has an active Ban')
+
+    def test_tempban_event(self):
+        # GIVEN
+        self.init()
+        self.mary.kick = Mock()
+        # WHEN
+        self.console.queueEvent(self.console.getEvent('EVT_CLIENT_BAN_TEMP', {'reason': 'foo', 'duration': 5,
+                                                                              'admin': None}, self.mary))
+        self.mary.connects('1')
+        # THEN
+        self.assertTrue(self.p.isTempBanned('4.4.4.4'))
+        self.mary.kick.assert_called_once_with('IPBan: client refused: 4.4.4.4 (Mary) has an active TempBan')
+
+    def test_unban_event(self):
+        # GIVEN
+        self.init()
+        self.paul.kick = Mock()
+        # WHEN
+        self.console.queueEvent(self.console.getEvent('EVT_CLIENT_UNBAN', '', self.paul))
+        self.paul.connects('1')
+        # THEN
+        self.assertFalse(self.p.isBanned('2.2.2.2'))
+        self.assertEqual(0, self.paul.kick.call_count)
+
+    def test_expired_tempban(self):
+        # GIVEN
+        self.init()
+        self.p._tempBanIps['4.4.4.4'] = time.time() - 1
+        self.mary.kick = Mock()
+        # WHEN
+        self.mary.connects('1')
+        # THEN
+        self.assertFalse(self.p.isTempBanned('4.4.4.4'))
+        self.assertEqual(0, self.mary.kick.call_count)
+
+    def test_reconcile(self):
+        # GIVEN
+        self.init()
+        when(self.p).getBanIps().thenReturn(['4.4.4.4'])
+        when(self.p).getTempBans().thenReturn({})
+        # WHEN
+        self.p.loadBans()
+        # THEN
+        self.assertTrue(self.p.isBanned('4.4.4.4'))
+        self.assertFalse(self.p.isBanned('2.2.2.2'))
+        self.assertFalse(self.p.isTempBanned('3.3.3.3'))
+
+    def test_reconcile_keeps_changes_made_while_loading(self):
+        # GIVEN
+        self.init()
+        def getBanIps():
+            # a player gets banned while the database is being queried
+            self.p.onBan(Mock(client=self.mary))
+            return ['2.2.2.2']
+        self.p.getBanIps = getBanIps
+        # WHEN
+        self.p.loadBans()
+        # THEN
+        self.assertTrue(self.p.isBanned('4.4.4.4'))
+        self.assertTrue(self.p.isBanned('2.2.2.2'))
+        self.assertTrue(self.p.isTempBanned('3.3.3.3'))
+
+    def test_reconcile_crontab(self):
+        # GIVEN
+        self.init(dedent(r"""
+            [settings]
+            reconcile_interval: 5
+        """))
+        # THEN
+        self.assertIsNotNone(self.p._cronTab)
+        self.assertListEqual(range(0, 60, 5), self.p._cronTab.minute)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+#
+# Nickreg Plugin for BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2015 Daniele Pantaleone <fenix@bigbrotherbot.net>
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+
+from mock import Mock
+from mock import patch
+from tests.plugins.nickreg import NickregTestCase
+
+
+class Test_nick_steal(NickregTestCase):
+
+    def setUp(self):
+        NickregTestCase.setUp(self)
+        self.p.warn_client_for_nick_steal = Mock()
+        # name changes trigger a check in another thread: only run the checks called by the tests
+        patcher = patch('b3.plugins.nickreg.thread')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_owner_is_not_warned(self):
+        # GIVEN
+        self.admin.says('!registernick')
+        # WHEN
+        self.p.check_client_for_nick_steal(self.admin)
+        # THEN
+        self.assertFalse(self.p.warn_client_for_nick_steal.called)
+
+    def test_thief_is_warned(self):
+        # GIVEN
+        self.admin.says('!registernick')
+        self.guest.name = '^1ADMIN'
+        # WHEN
+        self.p.check_client_for_nick_steal(self.guest)
+        # THEN
+        self.p.warn_client_for_nick_steal.assert_called_once_with(self.guest)
+
+    def test_similar_name_is_not_warned(self):
+        # GIVEN
+        self.admin.says('!registernick')
+        self.guest.name = 'Admi n'
+        # WHEN
+        self.p.check_client_for_nick_steal(self.guest)
+        # THEN
+        self.assertFalse(self.p.warn_client_for_nick_steal.called)
+
+    def test_deleted_nick(self):
+        # GIVEN
+        self.admin.says('!registernick')
+        nick_id = self.p.nicks.keys()[0]
+        self.admin.says('!delnick %s' % nick_id)
+        self.guest.name = 'Admin'
+        # WHEN
+        self.p.check_client_for_nick_steal(self.guest)
+        # THEN
+        self.assertFalse(self.p.warn_client_for_nick_steal.called)
+
+    def test_nick_registered_by_another_application(self):
+        # GIVEN
+        self.console.storage.query("""INSERT INTO nicks (client_id, name) VALUES ('%s', 'webnick')""" % self.admin.id)
+        self.guest.name = 'WebNick'
+        self.p.check_client_for_nick_steal(self.guest)
+        self.assertFalse(self.p.warn_client_for_nick_steal.called)
+        # WHEN
+        self.console.queueEvent(self.console.getEvent('EVT_GAME_MAP_CHANGE', data={'old': 'a', 'new': 'b'}))
+        self.p.check_client_for_nick_steal(self.guest)
+        # THEN
+        self.p.warn_client_for_nick_steal.assert_called_once_with(self.guest)
@@ -0,0 +1,95 @@
+# -*- encoding: utf-8 -*-
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2005 Michael "ThorN" Thornton
+#
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA 02110-1301 USA
+#
+import random
+import unittest2 as unittest
+
+from b3.plugins.poweradminurt.partition import TeamPartition
+
+
+class Test_TeamPartition(unittest.TestCase):
+
+    def test_even_teams(self):
+        # WHEN
+        split = TeamPartition(scores=[0.9, 0.8, 0.2, 0.1], teams=[True, True, False, False]).split()
+        # THEN
+        self.assertEqual(2, sum(split.blue))
+        self.assertAlmostEqual(0.0, split.diff)
+        self.assertEqual(2, split.moves)
+
+    def test_odd_amount_of_players(self):
+        # WHEN
+        split = TeamPartition(scores=[0.5, 0.4, 0.3, 0.2, 0.1], teams=[True] * 5).split()
+        # THEN
+        self.assertIn(sum(split.blue), (2, 3))
+        self.assertAlmostEqual(0.1, abs(split.diff))
+
+    def test_balanced_teams_are_left_alone(self):
+        # WHEN
+        split = TeamPartition(scores=[0.9, 0.1, 0.8, 0.2], teams=[True, True, False, False]).split()
+        # THEN
+        self.assertListEqual([True, True, False, False], split.blue)
+        self.assertEqual(0, split.moves)
+
+    def test_locked_players_stay(self):
+        # WHEN
+        split = TeamPartition(scores=[0.9, 0.8, 0.2, 0.1], teams=[True, True, False, False],
+                              locked=[True, True, False, False]).split()
+        # THEN
+        self.assertListEqual([True, True, False, False], split.blue)
+
+    def test_maxmoves(self):
+        # GIVEN
+        engine = TeamPartition(scores=[1.0, 0.9, 0.8, 0.7, 0.3, 0.2, 0.1, 0.0], teams=[True] * 4 + [False] * 4)
+        # WHEN
+        split = engine.split(maxmoves=2)
+        # THEN
+        self.assertEqual(2, split.moves)
+        self.assertAlmostEqual(0.8, abs(split.diff))
+        self.assertAlmostEqual(0.0, engine.split().diff)
+
+    def test_cannot_even_teams_with_maxmoves(self):
+        # WHEN
+        split = TeamPartition(scores=[0.5] * 8, teams=[True] * 7 + [False]).split(maxmoves=2)
+        # THEN
+        self.assertIsNone(split)
+
+    def test_snipers_are_distributed_within_slack(self):
+        # GIVEN
+        scores = [0.5, 0.5, 0.5, 0.5]
+        teams = [True, True, False, False]
+        snipers = [True, True, False, False]
+        # WHEN
+        split = TeamPartition(scores, teams, snipers).split(slack=0.1)
+        # THEN
+        self.assertEqual(0, split.sniperdiff)
+        self.assertEqual(2, split.moves)
+
+    def test_deterministic(self):
+        # GIVEN
+        rnd = random.Random(0)
+        scores = [rnd.random() for _ in range(32)]
+        teams = [rnd.random() < 0.5 for _ in range(32)]
+        snipers = [rnd.random() < 0.2 for _ in range(32)]
+        # WHEN
+        splits = [TeamPartition(scores, teams, snipers).split(slack=0.1) for _ in range(3)]
+        # THEN
+        self.assertEqual(1, len(set(tuple(s.blue) for s in splits)))
+        self.assertLessEqual(abs(splits[0].diff), 0.1)
+        self.assertLessEqual(abs(sum(splits[0].blue) * 2 - 32), 0)
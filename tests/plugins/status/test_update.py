@@ -0,0 +1,143 @@
+#
+# BigBrotherBot(B3) (www.bigbrotherbot.net)
+# Copyright (C) 2012 Courgette
+# 
+# This program is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program; if not, write to the Free Software
+# Foundation, Inc., 51 Franklin St, Fifth Floor, Boston, MA  02110-1301  USA
+
+import os
+import shutil
+import tempfile
+
+from mock import Mock
+from mock import patch
+from textwrap import dedent
+from xml.dom.minidom import parse
+from tests import B3TestCase
+from b3.config import CfgConfigParser
+from b3.fake import FakeClient
+from b3.plugins.status import StatusPlugin
+
+
+class Test_update(B3TestCase):
+
+    def setUp(self):
+        B3TestCase.setUp(self)
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'status.xml')
+        conf = CfgConfigParser()
+        conf.loadFromString(dedent(r"""
+            [settings]
+            interval: 60
+            output_file: %s
+            enableDBsvarSaving: yes
+            enableDBclientSaving: yes
+            """ % self.output))
+        self.p = StatusPlugin(self.console, conf)
+        self.p._tables = {'svars': 'current_svars', 'cvars': 'current_clients'}
+        self.p.onLoadConfig()
+        with patch("b3.cron.PluginCronTab"):
+            self.p.onStartup()
+        self.console.getPlayerScores = Mock(return_value={'1': 12})
+        self.joe = FakeClient(self.console, name="Joe", guid="JOEGUID", groupBits=1)
+        self.joe.connects('1')
+        self.mike = FakeClient(self.console, name="M'ike", guid="MIKEGUID", groupBits=1)
+        self.mike.connects('2')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+        B3TestCase.tearDown(self)
+
+    def rows(self, query):
+        cursor = self.console.storage.query(query)
+        rows = []
+        while not cursor.EOF:
+            rows.append(cursor.getRow())
+            cursor.moveNext()
+        cursor.close()
+        return rows
+
+    def test_xml(self):
+        self.p.update()
+        document = parse(self.output)
+        root = document.documentElement
+        self.assertEqual('B3Status', root.tagName)
+        self.assertTrue(root.getAttribute('Time'))
+        self.assertEqual('2', root.getElementsByTagName('Game')[0].getAttribute('OnlinePlayers'))
+        clients = root.getElementsByTagName('Client')
+        self.assertListEqual(['Joe', "M'ike"], sorted(c.getAttribute('Name') for c in clients))
+        joe = [c for c in clients if c.getAttribute('CID') == '1'][0]
+        self.assertEqual('12', joe.getAttribute('Score'))
+        self.assertEqual('JOEGUID', joe.getAttribute('GUID'))
+
+    def test_database(self):
+        self.p.update()
+        rows = self.rows("SELECT * FROM current_clients ORDER BY CID")
+        self.assertListEqual(['Joe', "M'ike"], [r['Name'] for r in rows])
+        self.assertEqual(12, int(rows[0]['Score']))
+        svars = dict((r['name'], r['value']) for r in self.rows("SELECT * FROM current_svars"))
+        self.assertEqual('2', svars['OnlinePlayers'])
+
+    def test_nothing_written_when_nothing_changed(self):
+        self.p.update()
+        self.p.writeXML = Mock()
+        self.console.storage.query = Mock(wraps=self.console.storage.query)
+        # the map time changes but it does not count as a change
+        self.p.update()
+        self.assertFalse(self.p.writeXML.called)
+        self.assertFalse(self.console.storage.query.called)
+
+    def test_clock_values_are_refreshed(self):
+        self.p.update()
+        self.p.writeXML = Mock()
+        self.console.storage.query = Mock(wraps=self.console.storage.query)
+        self.p._lastRefresh -= self.p._refreshInterval
+        self.p.update()
+        self.assertTrue(self.p.writeXML.called)
+        self.assertEqual(1, self.console.storage.query.call_count)
+
+    def test_only_changed_rows_are_written(self):
+        self.p.update()
+        self.console.getPlayerScores = Mock(return_value={'1': 13})
+        self.mike.disconnects()
+        self.console.storage.query = Mock(wraps=self.console.storage.query)
+        self.p.update()
+        queries = [c[0][0] for c in self.console.storage.query.call_args_list]
+        client_queries = [q for q in queries if 'current_clients' in q]
+        self.assertEqual(2, len(client_queries))
+        self.assertTrue(client_queries[0].startswith('DELETE'))
+        rows = self.rows("SELECT * FROM current_clients")
+        self.assertListEqual(['Joe'], [r['Name'] for r in rows])
+        self.assertEqual(13, int(rows[0]['Score']))
+        svars = dict((r['name'], r['value']) for r in self.rows("SELECT * FROM current_svars"))
+        self.assertEqual('1', svars['OnlinePlayers'])
+
+    def test_failed_query_rewrites_everything(self):
+        self.p.update()
+        query = self.console.storage.query
+        self.console.storage.query = Mock(side_effect=Exception('boom'))
+        self.console.getPlayerScores = Mock(return_value={'1': 14})
+        self.p.update()
+        self.assertIsNone(self.p._cvars)
+        self.console.storage.query = query
+        self.p.update()
+        rows = self.rows("SELECT * FROM current_clients ORDER BY CID")
+        self.assertListEqual(['Joe', "M'ike"], [r['Name'] for r in rows])
+        self.assertEqual(14, int(rows[0]['Score']))
+
+    def test_onStop_writes_empty_status(self):
+        self.p.update()
+        self.p.onStop(None)
+        root = parse(self.output).documentElement
+        self.assertEqual([], root.getElementsByTagName('Client'))
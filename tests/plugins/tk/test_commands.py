@@ -18,7 +18,7 @@
 from mock import Mock, patch
 from tests.plugins.tk import Tk_functional_test
 
-@patch("threading.Timer")
+@patch("b3.timer.TimerWheel.schedule")
 class Test_commands(Tk_functional_test):
     def test_forgiveinfo(self, timer_patch):
         self.superadmin.connects(99)
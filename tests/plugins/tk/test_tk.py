@@ -21,7 +21,7 @@ from mock import Mock, patch
 from tests.plugins.tk import Tk_functional_test
 
 
-@patch("threading.Timer")
+@patch("b3.timer.TimerWheel.schedule")
 class Test_tk_detected(Tk_functional_test):
     def test_damage_different_teams(self, timer_patch):
         self.joe.warn = Mock()
@@ -30,6 +30,8 @@ from b3 import TEAM_RED
 from b3 import TEAM_BLUE
 from b3.config import CfgConfigParser
 from b3.plugins.xlrstats import XlrstatsPlugin
+from b3.plugins.xlrstats import PlayerStats
+from b3.plugins.xlrstats import WeaponStats
 from b3.fake import FakeClient
 from b3.plugins.admin import AdminPlugin
 from tests import B3TestCase
@@ -705,4 +707,193 @@ class Test_events(XlrstatsTestCase):
         self.fireEvent("EVT_CLIENT_JOIN", client=self.p1)
         # THEN
         player_stats = self.p.get_PlayerStats(client=self.p1)
-        self.assertEqual(2, player_stats.rounds)
\ No newline at end of file
+        self.assertEqual(2, player_stats.rounds)
+
+class Test_write_behind(XlrstatsTestCase):
+    """
+    Validates that the stats are kept in memory and written back to the database in batches
+    """
+
+    def setUp(self):
+        XlrstatsTestCase.setUp(self)
+        self.init()
+        self.p1 = FakeClient(console=self.console, name="P1", guid="P1_GUID", team=TEAM_BLUE)
+        self.p1.connects("1")
+        self.p1.says("!register")
+        self.p2 = FakeClient(console=self.console, name="P2", guid="P2_GUID", team=TEAM_RED)
+        self.p2.connects("2")
+        self.p2.says("!register")
+        self.p._xlrstats_active = True
+
+    def stored_kills(self, client):
+        cursor = self.console.storage.query("SELECT kills FROM %s WHERE client_id = %s" % (
+                                            self.p.playerstats_table, client.id))
+        return None if cursor.EOF else cursor.getValue('kills')
+
+    def test_kill_is_not_written_before_flush(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p.flushStats()
+        # WHEN
+        self.p1.kills(self.p2)
+        # THEN
+        self.assertEqual(1, self.stored_kills(self.p1))
+        self.assertEqual(2, self.p.get_PlayerStats(self.p1).kills)
+
+    def test_flush(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p1.kills(self.p2)
+        # WHEN
+        self.p.flushStats()
+        # THEN
+        self.assertEqual(2, self.stored_kills(self.p1))
+        self.assertEqual({}, self.p._cache._dirty)
+
+    def test_flush_on_round_end(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        # WHEN
+        self.console.queueEvent(self.console.getEvent('EVT_GAME_ROUND_END'))
+        # THEN
+        self.assertEqual(1, self.stored_kills(self.p1))
+
+    def test_flush_on_stop(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        # WHEN
+        self.p.parseEvent(self.console.getEvent('EVT_STOP'))
+        # THEN
+        self.assertEqual(1, self.stored_kills(self.p1))
+
+    def test_disconnect_evicts_player_after_next_flush(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p.flushStats()
+        self.p1.kills(self.p2)
+        client_id = self.p1.id
+        # WHEN
+        self.p1.disconnects()
+        # THEN
+        self.assertEqual(1, self.stored_kills(self.p1))
+        self.assertTrue([k for k in self.p._cache._rows if k[1] == client_id])
+        # WHEN
+        self.p.flushStats()
+        # THEN
+        self.assertEqual(2, self.stored_kills(self.p1))
+        self.assertFalse([k for k in self.p._cache._rows if k[1] == client_id])
+
+    def test_disconnect_without_pending_changes_evicts_player(self):
+        # GIVEN
+        self.p1.kills(self.p2)
+        self.p.flushStats()
+        client_id = self.p1.id
+        # WHEN
+        self.p1.disconnects()
+        # THEN
+        self.assertFalse([k for k in self.p._cache._rows if k[1] == client_id])
+
+    def test_unsaved_changes_are_discarded(self):
+        # GIVEN
+        s = self.p.get_PlayerStats(self.p1)
+        # WHEN
+        s.kills = 99
+        # THEN
+        self.assertEqual(0, self.p.get_PlayerStats(self.p1).kills)
+
+    def test_write_through_when_disabled(self):
+        # GIVEN
+        self.p._cache = None
+        # WHEN
+        self.p1.kills(self.p2)
+        # THEN
+        self.assertEqual(1, self.stored_kills(self.p1))
+
+
+class Test_get_PlayersStats(XlrstatsTestCase):
+
+    def setUp(self):
+        XlrstatsTestCase.setUp(self)
+        self.init()
+        self.p1 = FakeClient(console=self.console, name="P1", guid="P1_GUID", team=TEAM_BLUE)
+        self.p1.connects("1")
+        self.p1.says("!register")
+        self.p2 = FakeClient(console=self.console, name="P2", guid="P2_GUID", team=TEAM_RED)
+        self.p2.connects("2")
+        self.p2.says("!register")
+        self.p3 = FakeClient(console=self.console, name="P3", guid="P3_GUID", team=TEAM_RED)
+        self.p3.connects("3")
+        self.p._xlrstats_active = True
+        self.p1.kills(self.p2)
+        self.p1.kills(self.p2)
+        self.p.flushStats()
+        s1 = self.p.get_PlayerStats(self.p1)
+        body = self.p.get_PlayerBody(s1.id, 0)
+        body.kills = 5
+        self.p.save_Stat(body)
+        self.p.flushStats()
+        self.p._cache.invalidate()
+        self.query = Mock(wraps=self.p.query)
+        self.p.query = self.query
+
+    def test_single_query(self):
+        # WHEN
+        stats, bodies = self.p.get_PlayersStats([self.p1, self.p2, self.p3], bodypartids=(0, 1))
+        # THEN
+        self.assertEqual(1, self.query.call_count)
+        self.assertSetEqual(set([self.p1.id, self.p2.id]), set(stats))
+        self.assertEqual(2, stats[self.p1.id].kills)
+        self.assertEqual(2, stats[self.p2.id].deaths)
+        s1 = stats[self.p1.id]
+        self.assertEqual(5, bodies[(s1.id, 0)].kills)
+        self.assertNotIn((s1.id, 1), bodies)
+
+    def test_cached_records_are_not_read_again(self):
+        # GIVEN
+        self.p.get_PlayersStats([self.p1, self.p2], bodypartids=(0,))
+        self.p1.kills(self.p2)
+        self.query.reset_mock()
+        # WHEN
+        stats, bodies = self.p.get_PlayersStats([self.p1], bodypartids=(0,))
+        # THEN
+        self.assertEqual(0, self.query.call_count)
+        self.assertEqual(3, stats[self.p1.id].kills)
+
+    def test_new_player(self):
+        # GIVEN
+        p4 = FakeClient(console=self.console, name="P4", guid="P4_GUID", team=TEAM_RED)
+        p4.connects("4")
+        p4.says("!register")
+        # WHEN
+        stats, bodies = self.p.get_PlayersStats([p4])
+        # THEN
+        self.assertTrue(stats[p4.id]._new)
+        self.assertEqual(self.p.defaultskill, stats[p4.id].skill)
+
+
+class Test_upsertqueries(XlrstatsTestCase):
+
+    def setUp(self):
+        XlrstatsTestCase.setUp(self)
+        self.init()
+        self.s1 = WeaponStats()
+        self.s1.id, self.s1.name, self.s1.kills = 1, "ak47", 3
+        self.s2 = WeaponStats()
+        self.s2.id, self.s2.name, self.s2.suicides = 2, "it's a gun", 1
+
+    def test_mysql(self):
+        self.assertListEqual(["INSERT INTO xlr_weaponstats (id, name, kills, suicides, teamkills) "
+                              "VALUES (1, 'ak47', 3, 0, 0), (2, 'it\\'s a gun', 0, 1, 0) "
+                              "ON DUPLICATE KEY UPDATE name=VALUES(name), kills=VALUES(kills), "
+                              "suicides=VALUES(suicides), teamkills=VALUES(teamkills)"],
+                             self.s1._upsertqueries([self.s1, self.s2], 'mysql'))
+
+    def test_postgresql(self):
+        self.assertListEqual(["UPDATE xlr_weaponstats SET name=v.name, kills=v.kills, suicides=v.suicides, "
+                              "teamkills=v.teamkills FROM (VALUES (1, 'ak47', 3, 0, 0), (2, 'it\\'s a gun', 0, 1, 0)) "
+                              "AS v (id, name, kills, suicides, teamkills) WHERE xlr_weaponstats.id = v.id"],
+                             self.s1._upsertqueries([self.s1, self.s2], 'postgresql'))
+
+    def test_sqlite(self):
+        self.assertListEqual([self.s1._updatequery(), self.s2._updatequery()],
+                             self.s1._upsertqueries([self.s1, self.s2], 'sqlite'))
@@ -1554,6 +1554,52 @@ class Test_conf_settings_auto_purge(Conf_settings_test_case):
         self.assertFalse(self.p.auto_purge)
         
         
+class Test_conf_settings_flush_interval(Conf_settings_test_case):
+    DEFAULT_VALUE = 30
+
+    def test_missing(self):
+        # WHEN
+        self.init('')
+        # THEN
+        self.assertEqual(self.DEFAULT_VALUE, self.p.flush_interval)
+
+    def test_junk(self):
+        # WHEN
+        self.init('flush_interval: f00')
+        # THEN
+        self.assertEqual(self.DEFAULT_VALUE, self.p.flush_interval)
+
+    def test_negative(self):
+        # WHEN
+        self.init('flush_interval: -5')
+        # THEN
+        self.assertEqual(0, self.p.flush_interval)
+
+    def test_0(self):
+        # WHEN
+        self.init('flush_interval: 0')
+        # THEN
+        self.assertEqual(0, self.p.flush_interval)
+
+    def test_10(self):
+        # WHEN
+        self.init('flush_interval: 10')
+        # THEN
+        self.assertEqual(10, self.p.flush_interval)
+
+    def test_too_high(self):
+        # WHEN
+        self.init('flush_interval: 600')
+        # THEN
+        self.assertEqual(60, self.p.flush_interval)
+
+    def test_not_a_divisor_of_60(self):
+        # WHEN
+        self.init('flush_interval: 45')
+        # THEN
+        self.assertEqual(30, self.p.flush_interval)
+
+
 class Conf_tables_test_case(XlrstatsTestCase):
 
     def init(self, option_snippet=''):